@@ -12,5 +12,17 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'VetifyBooking.settings')
+# Antes de cargar los ajustes: bajo ASGI no hay conexiones persistentes (ver
+# DATABASES en settings)
+os.environ['VETIFYBOOKING_ASGI'] = '1'
+
+# Se sirve con cualquier servidor ASGI, p. ej.
+#   uvicorn VetifyBooking.asgi:application --workers 4
+#   gunicorn VetifyBooking.asgi:application -k uvicorn.workers.UvicornWorker
+# Todo el middleware del proyecto admite los dos modos, así que las vistas
+# asíncronas (dashboard, reportes y APIs de veterinarios) no ocupan un hilo
+# mientras esperan sus consultas; las síncronas siguen funcionando igual. Los
+# ZIP de exportación se envían como iteradores asíncronos (ver
+# VetifyBooking.asyncviews.streaming_body), trozo a trozo como bajo WSGI.
 
 application = get_asgi_application()
@@ -0,0 +1,93 @@
+"""
+Ayudas para las vistas asíncronas: consultas independientes en paralelo,
+render desde el hilo de la petición y cuerpos en streaming bajo ASGI.
+
+El ORM asíncrono de Django (aget, acount, aaggregate...) manda todas las
+consultas al mismo hilo con sync_to_async, así que un asyncio.gather sobre
+ellas se ejecuta una detrás de otra. Aquí cada consulta corre en un hilo del
+pool con su propia conexión (con WAL, SQLite admite varios lectores a la vez)
+y la vista espera lo que tarde la más lenta, no la suma.
+
+Dentro de una transacción (tests, comandos que envuelven las peticiones) las
+otras conexiones no verían lo que aún no se confirmó: las consultas van
+entonces por la conexión de siempre, en orden. El alias de la réplica y el
+presupuesto de consultas de la petición llegan a los hilos con el contexto.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections, connections
+from django.shortcuts import render as render_sync
+
+
+_DONE = object()
+
+
+def _in_transaction():
+    return any(connections[alias].in_atomic_block for alias in connections)
+
+
+def _isolated(query):
+    # Como una petición aparte: la conexión del hilo se revisa antes y se
+    # cierra después si ya no sirve (la de la réplica siempre, CONN_MAX_AGE=0)
+    def run():
+        close_old_connections()
+        try:
+            return query()
+        finally:
+            close_old_connections()
+    return run
+
+
+async def gather_queries(*queries):
+    """
+    Resultados de `queries`, funciones sin argumentos que consultan la base,
+    en el mismo orden. Cada una debe devolver datos ya evaluados (listas,
+    diccionarios, números), no querysets perezosos.
+    """
+    if await sync_to_async(_in_transaction)():
+        return [await sync_to_async(query)() for query in queries]
+    return await asyncio.gather(*(
+        sync_to_async(_isolated(query), thread_sensitive=False)() for query in queries
+    ))
+
+
+async def run_query(query):
+    """Una sola consulta fuera del hilo de la petición (ver gather_queries)."""
+    (result,) = await gather_queries(query)
+    return result
+
+
+async def render(request, template_name, context=None):
+    """
+    render() para vistas asíncronas. La plantilla puede leer la sesión, los
+    mensajes o el usuario, así que se renderiza en el hilo de la petición; el
+    usuario es el que ya cargó auser() (si no, request.user lo consulta otra vez).
+    """
+    request.user = await request.auser()
+    return await sync_to_async(render_sync)(request, template_name, context)
+
+
+async def iterate_in_thread(chunks):
+    """
+    Versión asíncrona de un iterador síncrono que consulta la base: cada
+    trozo se pide en el hilo de la petición y se envía antes de pedir el
+    siguiente. Con un iterador síncrono, Django bajo ASGI lo junta entero en
+    memoria (sync_to_async(list)) antes de enviar el primer byte.
+    """
+    chunks = iter(chunks)
+    take = sync_to_async(next, thread_sensitive=True)
+    try:
+        while (chunk := await take(chunks, _DONE)) is not _DONE:
+            yield chunk
+    finally:
+        # Si el cliente se va a medias, el generador se cierra en su hilo
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            await sync_to_async(close, thread_sensitive=True)()
+
+
+def streaming_body(request, chunks):
+    """El cuerpo de un StreamingHttpResponse tal como lo envía sin acumular el servidor de `request`."""
+    return iterate_in_thread(chunks) if isinstance(request, ASGIRequest) else chunks
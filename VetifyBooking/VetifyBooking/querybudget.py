@@ -0,0 +1,172 @@
+"""
+Presupuesto de consultas por petición y detector de N+1.
+
+QueryBudgetMiddleware envuelve cada conexión con `execute_wrapper` durante la
+petición y anota cuántas consultas se hicieron, cuánto tardaron y cuántas
+veces se repitió cada consulta con distintos parámetros (su "huella": el SQL
+sin literales y con las listas IN colapsadas). Una huella que se repite
+QUERY_BUDGET_REPEAT_LIMIT veces o más es casi siempre un N+1: una consulta
+dentro de un bucle de la vista o de la plantilla.
+
+Cada respuesta lleva un encabezado Server-Timing con el tiempo de base de
+datos (visible en las herramientas del navegador). Se escribe una línea JSON
+en el logger `VetifyBooking.querybudget` para una muestra de las peticiones
+(QUERY_BUDGET_SAMPLE_RATE) y siempre, como advertencia, cuando la petición
+pasa su presupuesto o tiene un N+1 sospechoso.
+
+Los presupuestos van por nombre de URL en QUERY_BUDGETS, por ejemplo
+{'admin_dashboard:users': 10}; el resto usa QUERY_BUDGET_DEFAULT. Las
+consultas del cuerpo de un StreamingHttpResponse no se cuentan: se hacen
+después de que la respuesta sale del middleware.
+
+Funciona igual con vistas síncronas y asíncronas: el contador de la petición
+vive en una variable de contexto, y cada conexión (también las de los hilos
+de VetifyBooking.asyncviews) lleva un execute_wrapper fijo que anota en él.
+"""
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+logger = logging.getLogger(__name__)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+
+# Contador de la petición en curso (None fuera de una petición)
+_current = ContextVar('querybudget_recorder', default=None)
+
+
+def fingerprint(sql):
+    """El SQL sin valores: dos consultas con la misma huella solo difieren en parámetros."""
+    sql = _LITERALS.sub('?', sql)
+    return _IN_LISTS.sub('IN (...)', sql)
+
+
+def budget_for(view_name):
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    return budgets.get(view_name, getattr(settings, 'QUERY_BUDGET_DEFAULT', 50))
+
+
+class QueryRecorder:
+    """execute_wrapper que cuenta consultas, tiempo y huellas repetidas."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        # Una vista asíncrona puede consultar desde varios hilos a la vez
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            with self._lock:
+                self.duration += duration
+                self.count += 1
+                self.fingerprints[fingerprint(sql)] += 1
+
+    def repeated(self, limit):
+        """Huellas que se repitieron `limit` veces o más, de más a menos repetida."""
+        return [(sql, times) for sql, times in self.fingerprints.most_common() if times >= limit]
+
+
+def _record(execute, sql, params, many, context):
+    recorder = _current.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def watch(connection, **kwargs):
+    """Engancha el contador a la conexión, una sola vez (también receptor de connection_created)."""
+    if _record not in connection.execute_wrappers:
+        # Al principio: execute_wrapper() quita el último de la lista al salir
+        connection.execute_wrappers.insert(0, _record)
+
+
+connection_created.connect(watch)
+
+
+class QueryBudgetMiddleware:
+    """Mide las consultas de cada petición (ver módulo)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # Las conexiones de este hilo pueden ser anteriores a la señal
+        for alias in connections:
+            watch(connections[alias])
+        recorder = QueryRecorder()
+        token = _current.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, recorder, started)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        token = _current.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, recorder, started)
+
+    def _finish(self, request, response, recorder, started):
+        elapsed = time.perf_counter() - started
+        if getattr(settings, 'QUERY_BUDGET_SERVER_TIMING', True):
+            response['Server-Timing'] = (
+                f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} consultas", '
+                f'app;dur={elapsed * 1000:.1f}'
+            )
+        self._report(request, response, recorder, elapsed)
+        return response
+
+    def _report(self, request, response, recorder, elapsed):
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        budget = budget_for(view_name)
+        repeated = recorder.repeated(getattr(settings, 'QUERY_BUDGET_REPEAT_LIMIT', 5))
+        over_budget = recorder.count > budget
+
+        if not (over_budget or repeated) and random.random() >= getattr(settings, 'QUERY_BUDGET_SAMPLE_RATE', 0.1):
+            return
+
+        entry = {
+            'method': request.method,
+            'path': request.path,
+            'view': view_name,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'budget': budget,
+            'db_ms': round(recorder.duration * 1000, 1),
+            'total_ms': round(elapsed * 1000, 1),
+            'n_plus_one': [{'sql': sql[:300], 'times': times} for sql, times in repeated[:3]],
+        }
+        level = logging.WARNING if over_budget or repeated else logging.INFO
+        logger.log(level, json.dumps(entry, ensure_ascii=False))
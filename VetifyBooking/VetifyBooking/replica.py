@@ -0,0 +1,244 @@
+"""
+Réplica de lectura para el dashboard, los reportes y las exportaciones.
+
+La réplica es una copia del archivo SQLite principal que `refresh_replica`
+rehace cada pocos segundos con la API de backup. Las vistas marcadas con
+`reads_from_replica` leen de ella; todo lo demás, y cualquier escritura, va a
+la base principal, así que los agregados pesados no compiten con las reservas.
+
+Lectura de lo propio: cuando una petición escribe, ReplicaPinMiddleware deja
+en una cookie el instante de la escritura, y esa sesión sigue leyendo de la
+principal hasta que exista una copia posterior. Si la réplica falta o tiene
+más de REPLICA_MAX_LAG segundos, nadie la usa.
+"""
+import functools
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+REPLICA_ALIAS = 'replica'
+
+PIN_COOKIE = 'replica_pin'
+
+# Alias de lectura para la vista en curso (None: el de siempre)
+_read_alias = ContextVar('replica_read_alias', default=None)
+
+# La petición en curso escribió en la base principal
+_wrote = ContextVar('replica_wrote', default=False)
+
+# Instante de la última escritura de la sesión (cookie), o None
+_pinned_at = ContextVar('replica_pinned_at', default=None)
+
+
+def max_lag():
+    return getattr(settings, 'REPLICA_MAX_LAG', 300)
+
+
+def snapshot_time():
+    """Instante desde el que la réplica incluye todo lo confirmado, o None si no hay copia."""
+    if REPLICA_ALIAS not in settings.DATABASES:
+        return None
+    try:
+        # En tests el alias es un espejo de la base de pruebas y no hay archivo
+        return os.stat(connections[REPLICA_ALIAS].settings_dict['NAME']).st_mtime
+    except (OSError, TypeError):
+        return None
+
+
+def replica_usable(pinned_at=None):
+    taken = snapshot_time()
+    if taken is None or time.time() - taken > max_lag():
+        return False
+    return pinned_at is None or taken > pinned_at
+
+
+@contextmanager
+def primary_reads():
+    """Lecturas a la base principal aunque la vista use la réplica."""
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def _stream_from_replica(chunks):
+    # El contenido de un StreamingHttpResponse se genera después de la vista
+    chunks = iter(chunks)
+    while True:
+        token = _read_alias.set(REPLICA_ALIAS)
+        try:
+            chunk = next(chunks, None)
+        finally:
+            _read_alias.reset(token)
+        if chunk is None:
+            return
+        yield chunk
+
+
+async def _astream_from_replica(chunks):
+    # Bajo ASGI (ver asyncviews.iterate_in_thread): el hilo que genera cada
+    # trozo hereda el alias con el contexto
+    chunks = aiter(chunks)
+    while True:
+        token = _read_alias.set(REPLICA_ALIAS)
+        try:
+            chunk = await anext(chunks, None)
+        finally:
+            _read_alias.reset(token)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def _from_replica(response):
+    if response.streaming and not _wrote.get():
+        wrap = _astream_from_replica if response.is_async else _stream_from_replica
+        response.streaming_content = wrap(response.streaming_content)
+    return response
+
+
+def reads_from_replica(view):
+    """
+    La vista lee de la réplica si está al día para esta sesión. Va debajo de
+    @admin_required / @login_required: el usuario se carga antes, de la principal.
+    Sirve también para vistas asíncronas (sin contenido en streaming).
+    """
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if not replica_usable(_pinned_at.get()):
+                return await view(request, *args, **kwargs)
+
+            # Los hilos de sync_to_async heredan el alias con el contexto
+            token = _read_alias.set(REPLICA_ALIAS)
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _read_alias.reset(token)
+
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not replica_usable(_pinned_at.get()):
+            return view(request, *args, **kwargs)
+
+        token = _read_alias.set(REPLICA_ALIAS)
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+        return _from_replica(response)
+
+    return wrapper
+
+
+class ReplicaRouter:
+    """Lecturas a la réplica solo dentro de reads_from_replica; escrituras siempre a la principal."""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        # Lo que la vista lea a partir de aquí debe incluir su propia escritura
+        _read_alias.set(None)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Mismos datos en las dos bases
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db == REPLICA_ALIAS:
+            return False
+        return None
+
+
+class ReplicaPinMiddleware:
+    """Marca con una cookie las sesiones que acaban de escribir (ver módulo)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        pinned_at = self._pinned_at(request)
+        pinned_token = _pinned_at.set(pinned_at)
+        wrote_token = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            wrote = _wrote.get()
+        finally:
+            _pinned_at.reset(pinned_token)
+            _wrote.reset(wrote_token)
+        return self._pin(response, pinned_at, wrote)
+
+    async def __acall__(self, request):
+        pinned_at = self._pinned_at(request)
+        pinned_token = _pinned_at.set(pinned_at)
+        wrote_token = _wrote.set(False)
+        try:
+            response = await self.get_response(request)
+            wrote = _wrote.get()
+        finally:
+            _pinned_at.reset(pinned_token)
+            _wrote.reset(wrote_token)
+        return self._pin(response, pinned_at, wrote)
+
+    def _pinned_at(self, request):
+        try:
+            return float(request.COOKIES[PIN_COOKIE])
+        except (KeyError, ValueError):
+            return None
+
+    def _pin(self, response, pinned_at, wrote):
+        if wrote:
+            # Después de la respuesta: la transacción de la vista ya se confirmó
+            response.set_cookie(PIN_COOKIE, f'{time.time():.6f}', max_age=max_lag(), httponly=True, samesite='Lax')
+        elif pinned_at is not None and replica_usable(pinned_at):
+            response.delete_cookie(PIN_COOKIE, samesite='Lax')
+        return response
+
+
+def refresh_replica():
+    """
+    Copia la base principal sobre la réplica y devuelve el instante de la
+    copia. Se escribe en un archivo aparte y se sustituye de golpe, así que
+    quien esté leyendo la réplica nunca ve una copia a medias.
+    """
+    target = Path(connections[REPLICA_ALIAS].settings_dict['NAME'])
+    partial = target.with_name(f'{target.name}.tmp')
+    partial.unlink(missing_ok=True)
+
+    primary = connections[DEFAULT_DB_ALIAS]
+    primary.ensure_connection()
+    started = time.time()
+    copy = sqlite3.connect(partial)
+    try:
+        # Con WAL la copia lee una instantánea sin bloquear a los escritores
+        primary.connection.backup(copy)
+        # Sin WAL en la copia: no debe quedar un -wal viejo junto al archivo nuevo
+        copy.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        copy.close()
+
+    # La fecha del archivo es el inicio de la copia: todo lo confirmado antes está dentro
+    os.utime(partial, (started, started))
+    os.replace(partial, target)
+    return started
@@ -39,10 +39,15 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'admin_dashboard',
     'booking.apps.BookingConfig',
+    'taskqueue',
 ]
 
 MIDDLEWARE = [
+    # El primero: cuenta también las consultas de sesiones y autenticación
+    'VetifyBooking.querybudget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Antes que sesiones y mensajes: sus escrituras también cuentan
+    'VetifyBooking.replica.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -88,9 +93,134 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        # Conexiones persistentes: cada hilo reutiliza la suya entre peticiones.
+        # Bajo ASGI no (VetifyBooking/asgi.py marca el entorno): las consultas
+        # corren en hilos de sync_to_async que no cierran sus conexiones al
+        # terminar la petición, y Django desaconseja mantenerlas abiertas ahí;
+        # abrir un SQLite local cuesta poco
+        'CONN_MAX_AGE': 0 if os.environ.get('VETIFYBOOKING_ASGI') else 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Las transacciones toman el bloqueo de escritura al empezar, donde
+            # SQLite sí espera con busy_timeout (con DEFERRED, subir de lectura
+            # a escritura a mitad de transacción falla sin esperar). El precio:
+            # todo atomic() toma ese bloqueo aunque solo lea, y se pone en la
+            # cola de los escritores. Las lecturas van fuera de atomic()
+            # (autocommit; con WAL no esperan a nadie) y las transacciones
+            # largas, como las reconstrucciones de resúmenes, frenan las
+            # reservas mientras duran
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': ';'.join([
+                # Lectores y escritor no se bloquean entre sí
+                'PRAGMA journal_mode=WAL',
+                # Con WAL es seguro: solo se puede perder la última transacción si se va la luz
+                'PRAGMA synchronous=NORMAL',
+                # Milisegundos que se espera un bloqueo antes de "database is locked"
+                'PRAGMA busy_timeout=5000',
+                'PRAGMA mmap_size=134217728',
+                # Negativo: en KiB (64 MB de caché de páginas por conexión)
+                'PRAGMA cache_size=-65536',
+                'PRAGMA temp_store=MEMORY',
+            ]),
+        },
+    },
+    # Copia de solo lectura para dashboard, reportes y exportaciones; la
+    # rehace `manage.py refresh_replica` (ver VetifyBooking.replica)
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db_replica.sqlite3',
+        # Cada petición abre la copia más reciente
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {
+            'init_command': ';'.join([
+                'PRAGMA query_only=ON',
+                'PRAGMA mmap_size=134217728',
+                'PRAGMA cache_size=-65536',
+                'PRAGMA temp_store=MEMORY',
+            ]),
+        },
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+DATABASE_ROUTERS = ['VetifyBooking.replica.ReplicaRouter']
+
+# Cada cuántos segundos se rehace la réplica, y a partir de qué antigüedad
+# deja de usarse (por ejemplo si refresh_replica no está corriendo)
+REPLICA_REFRESH_INTERVAL = 30
+REPLICA_MAX_LAG = 300
+
+# Reintentos de las transacciones de escritura que aún chocan con
+# "database is locked" después de busy_timeout (ver booking.dbretry)
+DB_WRITE_RETRIES = 4
+DB_WRITE_RETRY_BACKOFF = 0.05
+
+
+# Caché compartida entre procesos (catálogo de servicios, veterinarios y horarios).
+# Con varios servidores usar una caché en red, p. ej.
+# 'django.core.cache.backends.redis.RedisCache'.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+    },
+    # Respuestas del autocompletado del panel: una entrada por prefijo, en su
+    # propio directorio para que su límite no desaloje el catálogo
+    'autocomplete': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache_autocomplete',
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    },
+}
+
+# `manage.py test` cambia todas las cachés por cachés en memoria (ver
+# VetifyBooking.testing.TestRunner)
+TEST_RUNNER = 'VetifyBooking.testing.TestRunner'
+
+# Presupuesto de consultas por petición (VetifyBooking.querybudget): máximo
+# por nombre de URL, máximo para las demás, repeticiones de una misma consulta
+# a partir de las que se avisa de un N+1 y fracción de peticiones registradas
+QUERY_BUDGETS = {
+    'admin_dashboard:omnisearch': 8,
+    'admin_dashboard:users_autocomplete': 8,
+    'admin_dashboard:pets_autocomplete': 5,
+}
+QUERY_BUDGET_DEFAULT = 50
+QUERY_BUDGET_REPEAT_LIMIT = 5
+QUERY_BUDGET_SAMPLE_RATE = 0.1
+QUERY_BUDGET_SERVER_TIMING = True
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'VetifyBooking.querybudget': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# Segundos que se guardan las respuestas del autocompletado de los modales
+# del panel (admin_dashboard.autocomplete)
+AUTOCOMPLETE_CACHE_SECONDS = 30
+
+# Cambios de citas en vivo del panel (admin_dashboard.live): cada cuántos
+# segundos mira cada stream si hay eventos nuevos, cuánto dura una conexión
+# bajo ASGI, tras cuántos segundos se reconecta el navegador (bajo WSGI, tras
+# cada respuesta) y cuántos segundos se guardan los eventos
+LIVE_EVENTS_POLL_INTERVAL = 1
+LIVE_EVENTS_STREAM_SECONDS = 300
+LIVE_EVENTS_RECONNECT = 5
+LIVE_EVENTS_RETENTION = 3600
+
 
 
 # Password validation
@@ -161,4 +291,36 @@ MEDIA_ROOT = BASE_DIR / 'media'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-ADMIN_SECRET_KEY = 'admin'
\ No newline at end of file
+ADMIN_SECRET_KEY = 'admin'
+
+# Caché en disco de los PDF de consultas y recetas (booking.pdfcache)
+PDF_CACHE_DIR = BASE_DIR / 'pdf_cache'
+PDF_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# Camino rápido de PDF dentro de la petición (booking.pdfjobs); el resto va a
+# la cola "pdf" de taskqueue: `python manage.py run_worker --queues pdf --processes 2`
+PDF_SYNC_MAX_HTML = 50_000
+PDF_SYNC_TIMEOUT = 2.0
+PDF_SYNC_WORKERS = 2
+
+# Cola de tareas en la base (taskqueue), que procesa `python manage.py
+# run_worker`: segundos del lease de cada tarea reclamada, intentos antes de
+# descartarla, espera del primer reintento (se duplica en cada fallo, hasta el
+# tope) y segundos que se guardan las tareas terminadas
+TASKQUEUE_LEASE_SECONDS = 300
+TASKQUEUE_MAX_ATTEMPTS = 5
+TASKQUEUE_RETRY_BACKOFF = 10
+TASKQUEUE_RETRY_MAX_DELAY = 3600
+TASKQUEUE_KEEP_DONE = 60 * 60 * 24
+
+# Tareas periódicas que encola la ronda de mantenimiento de run_worker:
+# nombre registrado -> segundos entre ejecuciones
+TASKQUEUE_SCHEDULE = {
+    'booking.tasks.sweep_expired_holds': 60,
+    'booking.tasks.cleanup_pdf_jobs': 60 * 60,
+    'booking.tasks.evict_pdf_cache': 60 * 15,
+    'admin_dashboard.tasks.prune_live_events': 60 * 60,
+    'admin_dashboard.tasks.rebuild_daily_stats': 60 * 60 * 24,
+    'admin_dashboard.tasks.rebuild_report_cube': 60 * 60 * 24,
+    'booking.tasks.reconcile_user_stats': 60 * 60 * 24,
+}
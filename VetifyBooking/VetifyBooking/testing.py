@@ -0,0 +1,133 @@
+"""
+Apoyo compartido por los tests: el runner del proyecto y los datos de prueba
+de booking y del panel.
+"""
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from booking.models import (
+    Appointment, ClinicSchedule, Document, MedicalConsultation, MedicalPrescription,
+    Pet, PrescriptionItem, Service, Vaccine, Veterinarian,
+)
+from booking.occupancy import calendar
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Los tests nunca usan la caché del servidor: cada alias pasa a una caché en
+    memoria propia del proceso de tests. Con la caché en disco compartida, una
+    instantánea del catálogo hecha sobre la base de pruebas (o un cambio de
+    versión) la vería el servidor que corre sobre la misma copia del proyecto.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._caches = override_settings(CACHES={
+            alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'tests-{alias}'}
+            for alias in settings.CACHES
+        })
+        self._caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches.disable()
+        super().teardown_test_environment(**kwargs)
+
+
+class ClinicData:
+    """
+    Clínica de prueba para contar consultas por URL: catálogo fijo (servicios,
+    veterinarios y horario) y `add_rows` para que crezca todo lo demás:
+    usuarios, mascotas, citas, consultas con receta, vacunas y documentos.
+    Cada fila da al cliente de prueba una mascota más con su historial.
+    """
+
+    def create_clinic(self):
+        calendar.clear()
+        self.rows = 0
+        self.customer = User.objects.create_user('cliente', 'cliente@example.com', 'secreto123')
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'secreto123')
+        self.services = [
+            Service.objects.create(name='Consulta', description='General', duration=30, price=300),
+            Service.objects.create(name='Vacunación', description='Vacunas', duration=15, price=200),
+        ]
+        self.vets = []
+        for number, name in enumerate(['Ana', 'Beto'], start=1):
+            vet = Veterinarian.objects.create(
+                name=name, specialty='general', license_number=str(number),
+                email=f'{name.lower()}@example.com', phone='555', years_experience=5,
+                available_days=['monday', 'tuesday', 'wednesday', 'thursday', 'friday'],
+            )
+            vet.services.set(self.services)
+            self.vets.append(vet)
+        for day, _ in ClinicSchedule.DAYS_OF_WEEK:
+            ClinicSchedule.objects.create(day_of_week=day, is_open=day != 'sunday')
+
+    def add_rows(self, count):
+        for row in range(self.rows, self.rows + count):
+            owner = User.objects.create_user(f'usuario{row}', f'usuario{row}@example.com', 'secreto123')
+            for user, vet in ((self.customer, self.vets[0]), (owner, self.vets[1])):
+                self._add_history(user, vet, row)
+            Document.objects.create(
+                title=f'Guía {row}', category='care', file=f'documents/guia{row}.pdf', uploaded_by=self.admin,
+            )
+        self.rows += count
+
+    def _add_history(self, user, vet, row):
+        pet = Pet.objects.create(owner=user, name=f'Mascota {row}', pet_type='dog', breed='Mestizo', weight=10)
+        Vaccine.objects.create(pet=pet, name='Rabia', date=date(2024, 1, 1) + timedelta(days=row))
+
+        past = Appointment.objects.create(
+            user=user, pet=pet, service=self.services[0], veterinarian=vet,
+            date=date(2024, 1, 1), time=self._past_time(row), status='completed',
+        )
+        consultation = MedicalConsultation.objects.create(
+            appointment=past, veterinarian=vet, reason='Revisión', symptoms='Tos',
+            diagnosis='Resfriado', treatment='Reposo',
+        )
+        prescription = MedicalPrescription.objects.create(consultation=consultation, general_instructions='Cada 8 horas')
+        for medication in ('Amoxicilina', 'Meloxicam'):
+            PrescriptionItem.objects.create(
+                prescription=prescription, medication=medication, dose='1 tableta', frequency='8 h', duration='5 días',
+            )
+
+        # Las próximas citas caen en la semana que consulta available_slots
+        Appointment.objects.create(
+            user=user, pet=pet, service=self.services[0], veterinarian=vet,
+            date=date(2030, 1, 7) + timedelta(days=row % 5), time=f'{12 + row // 5}:00', status='pending',
+        )
+
+    def _past_time(self, row):
+        # Todo el historial cae en un mismo día: export_day_prescriptions crece con las filas
+        minutes = 9 * 60 + 15 * row
+        return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+    def count_queries(self, client, method, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, method)(url, data or {})
+            if response.streaming:
+                b''.join(response.streaming_content)
+            response.close()
+        self.assertLess(response.status_code, 400, url)
+        return len(queries)
+
+    def assert_query_counts(self, budgets, measure):
+        """
+        `measure()` devuelve {nombre de URL: consultas}. Se mide con una fila y
+        con GROWTH filas más: ninguna URL puede pasar su presupuesto ni hacer
+        más consultas al crecer la base.
+        """
+        self.add_rows(1)
+        # La primera vuelta llena las cachés (catálogo, calendario de ocupación)
+        measure()
+        small = measure()
+        self.add_rows(self.GROWTH)
+        large = measure()
+        for name, budget in budgets.items():
+            with self.subTest(url=name):
+                self.assertLessEqual(small[name], budget)
+                self.assertEqual(large[name], small[name], 'el número de consultas crece con los datos')
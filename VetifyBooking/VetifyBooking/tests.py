@@ -0,0 +1,206 @@
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.db import OperationalError, connections
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.http import HttpResponse, JsonResponse
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import path
+
+from booking.models import Pet, Service
+from .querybudget import fingerprint
+from .replica import PIN_COOKIE, REPLICA_ALIAS, reads_from_replica, refresh_replica, replica_usable
+from .urls import urlpatterns as site_urlpatterns
+
+
+def n_plus_one_view(request):
+    # Una consulta por usuario dentro del bucle: el N+1 de manual
+    users = list(User.objects.order_by('id'))
+    for user in users:
+        Pet.objects.filter(owner=user).count()
+    return HttpResponse('ok')
+
+
+def over_budget_view(request):
+    User.objects.count()
+    Pet.objects.count()
+    Service.objects.count()
+    return HttpResponse('ok')
+
+
+def cheap_view(request):
+    User.objects.count()
+    return HttpResponse('ok')
+
+
+def service_names():
+    return sorted(Service.objects.values_list('name', flat=True))
+
+
+@reads_from_replica
+def replica_services_view(request):
+    return JsonResponse({'services': service_names()})
+
+
+@reads_from_replica
+def replica_add_service_view(request):
+    # Escribe y vuelve a leer en la misma petición: debe verse lo escrito
+    Service.objects.create(name=request.POST['name'], description='-', duration=30, price=100)
+    return JsonResponse({'services': service_names()})
+
+
+# Las URLs del sitio siguen ahí: las señales de la búsqueda global las usan
+urlpatterns = site_urlpatterns + [
+    path('querybudget/n-plus-one/', n_plus_one_view, name='n_plus_one'),
+    path('querybudget/over-budget/', over_budget_view, name='over_budget'),
+    path('querybudget/cheap/', cheap_view, name='cheap'),
+    path('replica/services/', replica_services_view, name='replica_services'),
+    path('replica/services/add/', replica_add_service_view, name='replica_add_service'),
+]
+
+
+@override_settings(
+    ROOT_URLCONF='VetifyBooking.tests',
+    QUERY_BUDGETS={'over_budget': 2},
+    QUERY_BUDGET_DEFAULT=50,
+    QUERY_BUDGET_REPEAT_LIMIT=5,
+    QUERY_BUDGET_SAMPLE_RATE=0,
+    QUERY_BUDGET_SERVER_TIMING=True,
+)
+class QueryBudgetMiddlewareTests(TestCase):
+    """El middleware cuenta las consultas, avisa de N+1 y presupuestos pasados y muestrea el resto."""
+
+    LOGGER = 'VetifyBooking.querybudget'
+
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(6):
+            User.objects.create_user(f'usuario{number}', f'usuario{number}@example.com', 'secreto123')
+
+    def entry(self, logs):
+        self.assertEqual(len(logs.records), 1)
+        return json.loads(logs.records[0].getMessage())
+
+    def test_fingerprint_ignores_values(self):
+        first = fingerprint('SELECT * FROM pet WHERE owner_id = 1 AND name = \'Firulais\' AND id IN (1, 2, 3)')
+        second = fingerprint('SELECT * FROM pet WHERE owner_id = 27 AND name = \'O\'\'Malley\' AND id IN (9)')
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, fingerprint('SELECT * FROM pet WHERE id = 1'))
+
+    def test_repeated_query_is_reported_as_n_plus_one(self):
+        with self.assertLogs(self.LOGGER, 'WARNING') as logs:
+            response = self.client.get('/querybudget/n-plus-one/')
+
+        self.assertIn('desc="7 consultas"', response['Server-Timing'])
+        entry = self.entry(logs)
+        self.assertEqual((entry['view'], entry['queries'], entry['budget']), ('n_plus_one', 7, 50))
+        self.assertEqual(len(entry['n_plus_one']), 1)
+        self.assertEqual(entry['n_plus_one'][0]['times'], 6)
+        self.assertIn('booking_pet', entry['n_plus_one'][0]['sql'])
+
+    def test_over_budget_url_is_reported(self):
+        with self.assertLogs(self.LOGGER, 'WARNING') as logs:
+            response = self.client.get('/querybudget/over-budget/')
+
+        self.assertIn('desc="3 consultas"', response['Server-Timing'])
+        entry = self.entry(logs)
+        self.assertEqual(
+            (entry['view'], entry['queries'], entry['budget'], entry['n_plus_one']), ('over_budget', 3, 2, []),
+        )
+
+    def test_requests_within_budget_are_sampled(self):
+        with self.assertNoLogs(self.LOGGER):
+            response = self.client.get('/querybudget/cheap/')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="1 consultas", app;dur=[\d.]+$')
+
+        with self.settings(QUERY_BUDGET_SAMPLE_RATE=1):
+            with self.assertLogs(self.LOGGER, 'INFO') as logs:
+                self.client.get('/querybudget/cheap/')
+        self.assertEqual(logs.records[0].levelname, 'INFO')
+        self.assertEqual(self.entry(logs)['queries'], 1)
+
+    def test_server_timing_can_be_disabled(self):
+        with self.settings(QUERY_BUDGET_SERVER_TIMING=False):
+            response = self.client.get('/querybudget/cheap/')
+        self.assertNotIn('Server-Timing', response)
+
+
+@override_settings(ROOT_URLCONF='VetifyBooking.tests', QUERY_BUDGET_SAMPLE_RATE=0, REPLICA_MAX_LAG=300)
+class ReplicaTests(TransactionTestCase):
+    """
+    Réplica en un archivo de verdad (en tests el alias es un espejo de la
+    principal): las vistas leen la copia, quien escribe lee lo suyo y una
+    copia vieja o ausente no se usa.
+    """
+
+    databases = {'default', REPLICA_ALIAS}
+
+    def setUp(self):
+        self.path = Path(self.enterContext(tempfile.TemporaryDirectory())) / 'replica.sqlite3'
+        mirror = connections[REPLICA_ALIAS]
+        replica = DatabaseWrapper({**connections.settings[REPLICA_ALIAS], 'NAME': str(self.path)}, REPLICA_ALIAS)
+        connections[REPLICA_ALIAS] = replica
+        self.addCleanup(setattr, connections._connections, REPLICA_ALIAS, mirror)
+        self.addCleanup(replica.close)
+
+        Service.objects.create(name='Consulta', description='-', duration=30, price=300)
+        self.refresh()
+        # Solo en la principal: si la vista lo ve, no leyó de la réplica
+        Service.objects.create(name='Baño', description='-', duration=30, price=250)
+
+    def refresh(self):
+        taken = refresh_replica()
+        # CONN_MAX_AGE=0 abre la copia nueva en cada petición; el cliente de tests no cierra conexiones
+        connections[REPLICA_ALIAS].close()
+        return taken
+
+    def services(self):
+        return self.client.get('/replica/services/').json()['services']
+
+    def test_views_read_the_copy(self):
+        self.assertEqual(self.services(), ['Consulta'])
+        taken = self.refresh()
+        # La fecha del archivo es el inicio de la copia
+        self.assertAlmostEqual(os.stat(self.path).st_mtime, taken, delta=0.001)
+        self.assertEqual(self.services(), ['Baño', 'Consulta'])
+        with self.assertRaises(OperationalError):
+            Service.objects.using(REPLICA_ALIAS).filter(name='Consulta').update(price=1)
+
+    def test_writes_pin_the_session_to_the_primary(self):
+        response = self.client.post('/replica/services/add/', {'name': 'Vacunación'})
+        self.assertEqual(response.json()['services'], ['Baño', 'Consulta', 'Vacunación'])
+        pinned_at = float(response.cookies[PIN_COOKIE].value)
+        self.assertFalse(replica_usable(pinned_at))
+
+        # Hasta la siguiente copia, la sesión lee de la principal
+        self.assertEqual(self.services(), ['Baño', 'Consulta', 'Vacunación'])
+        self.assertIn(PIN_COOKIE, self.client.cookies)
+        self.assertEqual(self.client.cookies[PIN_COOKIE].value, response.cookies[PIN_COOKIE].value)
+
+        # Con una copia posterior vuelve a la réplica y la cookie se borra
+        self.refresh()
+        Service.objects.create(name='Cirugía', description='-', duration=60, price=900)
+        response = self.client.get('/replica/services/')
+        self.assertEqual(response.json()['services'], ['Baño', 'Consulta', 'Vacunación'])
+        self.assertEqual(response.cookies[PIN_COOKIE].value, '')
+
+        # Otra sesión sin cookie nunca estuvo fijada
+        self.client.cookies.clear()
+        self.assertEqual(self.services(), ['Baño', 'Consulta', 'Vacunación'])
+
+    def test_stale_or_missing_copy_falls_back_to_the_primary(self):
+        stale = time.time() - 301
+        os.utime(self.path, (stale, stale))
+        self.assertFalse(replica_usable())
+        self.assertEqual(self.services(), ['Baño', 'Consulta'])
+
+        with self.settings(REPLICA_MAX_LAG=600):
+            self.assertEqual(self.services(), ['Consulta'])
+
+        self.path.unlink()
+        self.assertFalse(replica_usable())
+        self.assertEqual(self.services(), ['Baño', 'Consulta'])
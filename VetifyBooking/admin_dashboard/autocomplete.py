@@ -0,0 +1,92 @@
+"""
+Opciones de los modales del panel (nueva cita, nueva mascota) bajo demanda.
+
+En lugar de mandar todos los usuarios y mascotas en cada página, los modales
+piden al escribir: usuarios por prefijo de usuario, nombre o correo (sobre las
+palabras indexadas de la búsqueda global) y mascotas de un dueño concreto.
+Las respuestas se guardan unos segundos en su propia caché (alias
+"autocomplete"): una entrada por prefijo tecleado llenaría la caché del
+catálogo y, al pasar su MAX_ENTRIES, el borrado al azar se llevaría sus
+instantáneas. La lista de mascotas de un dueño se borra en cuanto cambia una
+de ellas; las de usuarios llevan una versión que sube al crear, cambiar o
+borrar un usuario.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from booking.models import Pet
+from .omnisearch import MIN_PREFIX, normalize, search
+
+
+# Máximo de mascotas que se ofrecen para un dueño
+PET_LIMIT = 50
+
+
+USERS_VERSION_KEY = 'autocomplete:users:version'
+
+
+def cache_seconds():
+    return getattr(settings, 'AUTOCOMPLETE_CACHE_SECONDS', 30)
+
+
+def _cache():
+    return caches['autocomplete' if 'autocomplete' in settings.CACHES else 'default']
+
+
+def _users_version():
+    cache = _cache()
+    version = cache.get(USERS_VERSION_KEY)
+    if version is None:
+        # Como en el catálogo: un valor que no repita una versión anterior
+        cache.add(USERS_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(USERS_VERSION_KEY)
+    return version
+
+
+def _pets_key(owner_id):
+    return f'autocomplete:pets:{owner_id}'
+
+
+def user_options(text):
+    words = [word for word in normalize(text[:100]) if len(word) >= MIN_PREFIX]
+    if not words:
+        return []
+    cache = _cache()
+    key = f"autocomplete:users:{_users_version()}:{'-'.join(words)}"
+    options = cache.get(key)
+    if options is None:
+        options = [
+            {'id': entry.object_id, 'label': entry.title, 'detail': entry.subtitle}
+            for entry in search(' '.join(words), kind='user')
+        ]
+        cache.set(key, options, cache_seconds())
+    return options
+
+
+def pet_options(owner_id):
+    cache = _cache()
+    key = _pets_key(owner_id)
+    options = cache.get(key)
+    if options is None:
+        pets = Pet.objects.filter(owner_id=owner_id).order_by('name', 'id')[:PET_LIMIT]
+        options = [
+            {'id': pet.id, 'label': pet.name, 'detail': pet.get_pet_type_display()}
+            for pet in pets
+        ]
+        cache.set(key, options, cache_seconds())
+    return options
+
+
+def forget_pets(owner_id):
+    _cache().delete(_pets_key(owner_id))
+
+
+def forget_users():
+    """Descarta todas las listas de usuarios (un usuario nuevo tiene que salir ya)."""
+    cache = _cache()
+    try:
+        cache.incr(USERS_VERSION_KEY)
+    except ValueError:
+        cache.add(USERS_VERSION_KEY, time.time_ns(), timeout=None)
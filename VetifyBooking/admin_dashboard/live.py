@@ -0,0 +1,173 @@
+"""
+Cambios de citas en vivo para el panel (server-sent events).
+
+Las señales de Appointment escriben un AppointmentEvent en la misma
+transacción que el cambio y, al confirmarse, incrementan una versión en la
+caché compartida. Cada stream abierto mira esa versión cada
+LIVE_EVENTS_POLL_INTERVAL segundos sin tocar la base, y solo cuando cambia lee
+los eventos posteriores a su cursor. El bus es la base más la caché, así que
+sirve con varios procesos: cada cambio cuesta una o dos consultas pequeñas por
+panel conectado en lugar de recargas completas de la página.
+
+Bajo ASGI el stream queda abierto hasta LIVE_EVENTS_STREAM_SECONDS. Bajo WSGI
+cada conexión abierta ocuparía un hilo del servidor: se entrega lo pendiente,
+se cierra y el navegador vuelve a conectarse pasados LIVE_EVENTS_RECONNECT
+segundos con Last-Event-ID. Los eventos de más de LIVE_EVENTS_RETENTION
+segundos se borran.
+"""
+import asyncio
+import functools
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from booking.models import Appointment
+from VetifyBooking.asyncviews import run_query
+from .models import AppointmentEvent
+
+
+VERSION_KEY = 'live:appointments:version'
+
+# Eventos por lectura; si hay más, se sigue leyendo desde el nuevo cursor
+BATCH_SIZE = 200
+
+# Cada cuántos eventos se borran los que pasaron la retención
+PRUNE_EVERY = 100
+
+# Segundos sin mensajes tras los que se manda un comentario, para que los
+# proxies no den la conexión por muerta
+HEARTBEAT_SECONDS = 15
+
+STATUS_LABELS = dict(Appointment.STATUS_CHOICES)
+
+_UNSEEN = object()
+
+
+def poll_interval():
+    return getattr(settings, 'LIVE_EVENTS_POLL_INTERVAL', 1)
+
+
+def stream_seconds():
+    return getattr(settings, 'LIVE_EVENTS_STREAM_SECONDS', 300)
+
+
+def reconnect_seconds():
+    return getattr(settings, 'LIVE_EVENTS_RECONNECT', 5)
+
+
+def retention():
+    return getattr(settings, 'LIVE_EVENTS_RETENTION', 3600)
+
+
+# =========================
+#   PUBLICACIÓN
+# =========================
+def _bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def prune():
+    cutoff = timezone.now() - timedelta(seconds=retention())
+    AppointmentEvent.objects.filter(created_at__lt=cutoff).delete()
+
+
+def publish(kind, appointment_id, day, status):
+    """Registra el cambio; los streams lo ven cuando la transacción se confirma."""
+    event = AppointmentEvent.objects.create(
+        kind=kind, appointment_id=appointment_id, date=day, status=status or '',
+    )
+    transaction.on_commit(_bump_version)
+    if event.id % PRUNE_EVERY == 0:
+        transaction.on_commit(prune)
+
+
+# =========================
+#   LECTURA
+# =========================
+def latest_id():
+    """Cursor de una página recién renderizada: el último evento ya incluido en ella."""
+    return AppointmentEvent.objects.aggregate(latest=Max('id'))['latest'] or 0
+
+
+def start_cursor(request):
+    """Last-Event-ID al reconectar, si no el `since` de la página; None si no hay ninguno."""
+    for value in (request.headers.get('Last-Event-ID'), request.GET.get('since')):
+        if value and value.isdigit():
+            return int(value)
+    return None
+
+
+def _delta(event, appointment):
+    delta = {
+        'kind': event.kind,
+        'appointment': event.appointment_id,
+        'date': event.date.isoformat() if event.date else None,
+        'status': event.status,
+        'status_label': STATUS_LABELS.get(event.status, event.status),
+    }
+    if appointment is not None:
+        # Lo que muestran las filas de una cita nueva
+        delta.update({
+            'user': appointment.user.username,
+            'email': appointment.user.email,
+            'pet': appointment.pet.name,
+            'service': appointment.service.name if appointment.service else None,
+            'time': appointment.time.strftime('%H:%M'),
+        })
+    return delta
+
+
+def events_after(cursor):
+    """[(id, cambio)] de los eventos posteriores a `cursor`, con los datos de las citas nuevas."""
+    events = list(AppointmentEvent.objects.filter(id__gt=cursor)[:BATCH_SIZE])
+    created = [event.appointment_id for event in events if event.kind == 'created']
+    appointments = (
+        Appointment.objects.select_related('user', 'pet', 'service').in_bulk(created) if created else {}
+    )
+    return [(event.id, _delta(event, appointments.get(event.appointment_id))) for event in events]
+
+
+def _message(event_id, delta):
+    return f'id: {event_id}\nevent: appointment\ndata: {json.dumps(delta, ensure_ascii=False)}\n\n'
+
+
+async def stream(cursor, keep_open=True):
+    """
+    Mensajes SSE con los cambios posteriores a `cursor`. Con keep_open=False
+    entrega lo pendiente y termina; si no, espera cambios hasta
+    LIVE_EVENTS_STREAM_SECONDS y el navegador se vuelve a conectar.
+    """
+    # El id fija el cursor del navegador aunque todavía no haya eventos
+    yield f'retry: {reconnect_seconds() * 1000}\nid: {cursor}\n\n'
+
+    deadline = time.monotonic() + stream_seconds()
+    last_message = time.monotonic()
+    version = _UNSEEN
+    while True:
+        current = await cache.aget(VERSION_KEY)
+        if current != version:
+            version = current
+            while True:
+                events = await run_query(functools.partial(events_after, cursor))
+                for event_id, delta in events:
+                    cursor = event_id
+                    yield _message(event_id, delta)
+                    last_message = time.monotonic()
+                if len(events) < BATCH_SIZE:
+                    break
+
+        if not keep_open or time.monotonic() >= deadline:
+            return
+        if time.monotonic() - last_message >= HEARTBEAT_SECONDS:
+            yield ': ping\n\n'
+            last_message = time.monotonic()
+        await asyncio.sleep(poll_interval())
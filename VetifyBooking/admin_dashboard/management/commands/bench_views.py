@@ -0,0 +1,426 @@
+import json
+import logging
+import math
+import subprocess
+import time
+import tracemalloc
+from datetime import timedelta
+from http.cookies import SimpleCookie
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from VetifyBooking.querybudget import QueryRecorder
+from admin_dashboard.urls import app_name as ADMIN_NAMESPACE, urlpatterns as admin_urlpatterns
+from booking.availability import build_slot_index, format_minutes
+from booking.models import (
+    Appointment,
+    ClinicSchedule,
+    Document,
+    MedicalConsultation,
+    MedicalPrescription,
+    PdfJob,
+    Pet,
+    Service,
+    SlotHold,
+    Vaccine,
+    Veterinarian,
+)
+from booking.urls import urlpatterns as booking_urlpatterns
+
+
+# Tablas cuyo tamaño se guarda con los resultados
+VOLUMES = {
+    'users': User,
+    'pets': Pet,
+    'appointments': Appointment,
+    'consultations': MedicalConsultation,
+    'prescriptions': MedicalPrescription,
+    'vaccines': Vaccine,
+}
+
+
+def url_names():
+    """Nombre (para reverse) de cada URL de booking y del panel."""
+    return [pattern.name for pattern in booking_urlpatterns] + [
+        f'{ADMIN_NAMESPACE}:{pattern.name}' for pattern in admin_urlpatterns
+    ]
+
+
+def percentile(values, fraction):
+    """Percentil por rango más cercano sobre valores ya ordenados."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(math.ceil(fraction * len(values)) - 1, 0))]
+
+
+def git_commit():
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+# =========================
+#   PETICIONES
+# =========================
+def pick_users(admin_name=None, customer_name=None):
+    """(cliente, superusuario) con los que se piden las URLs; por defecto, un cliente con recetas."""
+    admins = User.objects.filter(is_superuser=True, is_active=True).order_by('id')
+    if admin_name:
+        admins = admins.filter(username=admin_name)
+    admin = admins.first()
+    if admin is None:
+        raise CommandError('Hace falta un superusuario activo (ver --admin)')
+
+    if customer_name:
+        customer = User.objects.filter(username=customer_name).first()
+    else:
+        # Un cliente con historial completo: consultas con receta
+        customer_id = MedicalPrescription.objects.order_by('-id').values_list(
+            'consultation__appointment__user', flat=True
+        ).first()
+        customer = User.objects.filter(id=customer_id).first() or User.objects.filter(
+            is_superuser=False, pets__isnull=False
+        ).order_by('id').first()
+    if customer is None:
+        raise CommandError('No hay ningún cliente con mascotas (ver --customer o seed_synthetic)')
+    return customer, admin
+
+
+def free_slot(service):
+    """(día, veterinario, hora) libre en las próximas semanas para `service`."""
+    start = timezone.localdate() + timedelta(days=7)
+    index = build_slot_index(service, start, days=14)
+    for day in sorted(index.days):
+        for vet in index.vets:
+            if vet.id not in index.days[day].windows:
+                continue
+            slots = index.days[day].free_slots(vet.id, index.duration)
+            if slots:
+                return day, vet, format_minutes(slots[0])
+    return None
+
+
+def view_requests(customer, admin):
+    """
+    {nombre de URL: (método, args, datos, usuario)}. Las URLs que borran o
+    cambian algo apuntan a registros reales: cada petición se deshace.
+    """
+    prescription = MedicalPrescription.objects.filter(
+        consultation__appointment__user=customer
+    ).select_related('consultation__appointment').order_by('-id').first()
+    consultation = prescription.consultation if prescription else (
+        MedicalConsultation.objects.filter(appointment__user=customer).order_by('-id').first()
+    )
+    pet = consultation.appointment.pet if consultation else customer.pets.order_by('id').first()
+    appointment = Appointment.objects.filter(user=customer).order_by('-date', '-time').first()
+    pending = Appointment.objects.filter(status='pending').order_by('-date', '-time').first()
+    bare_consultation = MedicalConsultation.objects.filter(prescription__isnull=True).order_by('-id').first()
+    vaccine = Vaccine.objects.order_by('-id').first()
+    service = Service.objects.filter(is_active=True, veterinarians__is_active=True).order_by('id').first()
+    vet = Veterinarian.objects.order_by('id').first()
+    schedule = ClinicSchedule.objects.order_by('id').first()
+    document = Document.objects.order_by('-id').first()
+    free = free_slot(service) if service else None
+
+    # Registros de apoyo: desaparecen con la transacción de la medición
+    hold = job = None
+    if free:
+        day, free_vet, start = free
+        hold = SlotHold.objects.create(
+            user=customer, veterinarian=free_vet, service=service, date=day, time=start,
+            expires_at=timezone.now() + timedelta(minutes=5),
+        )
+    if consultation:
+        job = PdfJob.objects.create(
+            user=customer, kind='consulta', object_id=consultation.id, path='bench.pdf', html='', status='done',
+        )
+
+    def needs(*objects):
+        return all(obj is not None for obj in objects)
+
+    slot = {'service': service.id, 'date': free[0].isoformat(), 'time': free[2]} if free else None
+    admin_ns = ADMIN_NAMESPACE
+    requests = {
+        'home': ('get', [], None, customer),
+        'login': ('get', [], None, None),
+        'register': ('get', [], None, None),
+        'logout': ('post', [], None, customer),
+        'booking': ('get', [], None, customer),
+        'appointments': ('get', [], None, customer),
+        'delete_appointment': needs(appointment) and ('get', [appointment.id], None, customer),
+        'register_pet': ('get', [], None, customer),
+        'edit_pet': needs(pet) and ('get', [pet.id], None, customer),
+        'delete_pet': needs(pet) and ('post', [pet.id], None, customer),
+        'pet_detail': needs(pet) and ('get', [pet.id], None, customer),
+        'export_pet_record': needs(pet) and ('get', [pet.id], None, customer),
+        'documents': ('get', [], None, customer),
+        'services_schedules': ('get', [], None, customer),
+        'profile': ('get', [], None, customer),
+        'edit_profile': ('get', [], None, customer),
+        'update_avatar': ('post', [], None, customer),
+        'change_password': ('get', [], None, customer),
+        'password_change_done': ('get', [], None, customer),
+        'medical_history': ('get', [], None, customer),
+        'export_consultation_pdf': needs(consultation) and ('get', [consultation.id], None, customer),
+        'export_prescription_pdf': needs(prescription) and ('get', [prescription.id], None, customer),
+        'pdf_job_status': needs(job) and ('get', [job.id], None, customer),
+        'veterinarians': ('get', [], None, customer),
+        'vets_by_service': needs(service) and ('get', [service.id], None, customer),
+        'available_slots': needs(service) and ('get', [service.id], None, customer),
+        'create_slot_hold': needs(slot) and ('post', [], slot, customer),
+        'release_slot_hold': needs(hold) and ('post', [hold.id], None, customer),
+        'all_vets': ('get', [], None, customer),
+
+        f'{admin_ns}:admin_login': ('get', [], None, None),
+        f'{admin_ns}:dashboard': ('get', [], None, admin),
+        f'{admin_ns}:omnisearch': ('get', [], {'q': customer.username[:4]}, admin),
+        f'{admin_ns}:appointments': ('get', [], None, admin),
+        f'{admin_ns}:delete_appointment': needs(appointment) and ('get', [appointment.id], None, admin),
+        f'{admin_ns}:change_appointment_status': needs(pending) and (
+            'post', [pending.id], {'status': 'confirmed'}, admin
+        ),
+        f'{admin_ns}:create_appointment_admin': needs(free, pet) and ('post', [], {
+            'user': customer.id, 'pet': pet.id, 'service': service.id,
+            'veterinarian': free[1].id, 'date': free[0].isoformat(), 'time': free[2],
+        }, admin),
+        f'{admin_ns}:appointment_events': ('get', [], None, admin),
+        f'{admin_ns}:users': ('get', [], None, admin),
+        f'{admin_ns}:toggle_user_status': ('get', [customer.id], None, admin),
+        f'{admin_ns}:create_user': ('post', [], {
+            'username': 'bench_nuevo', 'email': 'bench_nuevo@example.com', 'password': 'secreto123',
+        }, admin),
+        f'{admin_ns}:users_autocomplete': ('get', [], {'q': customer.username[:4]}, admin),
+        f'{admin_ns}:admin_register': ('get', [], None, admin),
+        f'{admin_ns}:admin_profile': ('get', [], None, admin),
+        f'{admin_ns}:pets': ('get', [], None, admin),
+        f'{admin_ns}:delete_pet': needs(pet) and ('get', [pet.id], None, admin),
+        f'{admin_ns}:create_pet': ('post', [], {
+            'owner': customer.id, 'name': 'Nueva', 'pet_type': 'dog', 'weight': 4,
+        }, admin),
+        f'{admin_ns}:pets_autocomplete': ('get', [], {'owner': customer.id}, admin),
+        f'{admin_ns}:pet_vaccines': needs(pet) and ('get', [pet.id], None, admin),
+        f'{admin_ns}:export_pet_record': needs(pet) and ('get', [pet.id], None, admin),
+        f'{admin_ns}:delete_vaccine': needs(vaccine) and ('get', [vaccine.id], None, admin),
+        f'{admin_ns}:veterinarians': ('get', [], None, admin),
+        f'{admin_ns}:toggle_vet_status': needs(vet) and ('get', [vet.id], None, admin),
+        f'{admin_ns}:add_veterinarian': needs(service) and ('post', [], {
+            'name': 'Nuevo', 'email': 'nuevo@example.com', 'license_number': 'B1',
+            'specialty': 'general', 'years_experience': 2, 'services': [service.id],
+        }, admin),
+        f'{admin_ns}:edit_veterinarian': needs(vet) and ('get', [vet.id], None, admin),
+        f'{admin_ns}:services': ('get', [], None, admin),
+        f'{admin_ns}:toggle_service_status': needs(service) and ('get', [service.id], None, admin),
+        f'{admin_ns}:create_service': ('post', [], {
+            'name': 'Nuevo', 'description': '-', 'duration': 20, 'price': 150,
+        }, admin),
+        f'{admin_ns}:edit_service': needs(service) and ('post', [service.id], {
+            'name': service.name, 'description': service.description,
+            'duration': service.duration, 'price': service.price,
+        }, admin),
+        f'{admin_ns}:create_schedule': ('post', [], {
+            'day_of_week': 'monday', 'opening_time': '09:00', 'closing_time': '17:00',
+        }, admin),
+        f'{admin_ns}:edit_schedule': needs(schedule) and ('post', [schedule.id], {
+            'is_open': 'on', 'opening_time': '09:00', 'closing_time': '17:00',
+        }, admin),
+        f'{admin_ns}:schedules': ('get', [], None, admin),
+        f'{admin_ns}:reports': ('get', [], None, admin),
+        f'{admin_ns}:upload_document': ('get', [], None, admin),
+        f'{admin_ns}:delete_document': needs(document) and ('get', [document.id], None, admin),
+        f'{admin_ns}:toggle_document': needs(document) and ('get', [document.id], None, admin),
+        f'{admin_ns}:consultations': ('get', [], None, admin),
+        f'{admin_ns}:add_consultation': ('get', [], None, admin),
+        f'{admin_ns}:edit_consultation': needs(consultation) and ('get', [consultation.id], None, admin),
+        f'{admin_ns}:delete_consultation': needs(consultation) and ('get', [consultation.id], None, admin),
+        f'{admin_ns}:add_prescription': needs(bare_consultation) and (
+            'get', [bare_consultation.id], None, admin
+        ),
+        f'{admin_ns}:edit_prescription': needs(prescription) and ('get', [prescription.id], None, admin),
+        f'{admin_ns}:delete_prescription': needs(prescription) and (
+            'get', [prescription.id], None, admin
+        ),
+        f'{admin_ns}:export_day_prescriptions': needs(consultation) and (
+            'get', [], {'date': consultation.appointment.date.isoformat()}, admin
+        ),
+    }
+    return requests
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide cada vista de booking y del panel (p50/p95/p99, consultas y pico de '
+        'memoria) sobre la base actual y guarda los resultados en JSON para '
+        'compararlos entre commits. Todo lo que escriben las vistas se deshace'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Peticiones medidas por URL')
+        parser.add_argument('--warmup', type=int, default=2, help='Peticiones previas sin medir (cachés)')
+        parser.add_argument('--only', default='', help='Solo las URLs cuyo nombre contiene este texto')
+        parser.add_argument('--customer', help='Usuario cliente (por defecto, uno con recetas)')
+        parser.add_argument('--admin', help='Superusuario para el panel (por defecto, el primero)')
+        parser.add_argument('--output', help='Archivo JSON de resultados')
+        parser.add_argument('--compare', help='JSON de una ejecución anterior para comparar')
+
+    def handle(self, *args, **options):
+        names = [name for name in url_names() if options['only'] in name]
+        if not names:
+            raise CommandError(f'Ninguna URL contiene "{options["only"]}"')
+
+        # Los avisos de presupuesto de cada petición ensuciarían el informe
+        budget_logger = logging.getLogger('VetifyBooking.querybudget')
+        previous_level = budget_logger.level
+        budget_logger.setLevel(logging.ERROR)
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                # Una transacción para toda la medición: sesiones y registros de apoyo
+                # también se deshacen. SQLite queda bloqueado para escribir mientras dura.
+                with transaction.atomic():
+                    views = self._run(names, options)
+                    transaction.set_rollback(True)
+        finally:
+            budget_logger.setLevel(previous_level)
+
+        results = {
+            'commit': git_commit(),
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'volumes': {label: model.objects.count() for label, model in VOLUMES.items()},
+            'iterations': options['iterations'],
+            'views': views,
+        }
+        self._report(views)
+        if options['compare']:
+            self._compare(options['compare'], views)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f'Resultados guardados en {options["output"]}'))
+
+    # =========================
+    #   MEDICIÓN
+    # =========================
+    def _client(self, user, clients):
+        """Un cliente con sesión por usuario; devuelve el cliente y sus cookies de partida."""
+        key = user.id if user else None
+        if key not in clients:
+            client = Client()
+            if user is not None:
+                client.force_login(user)
+            baseline = SimpleCookie()
+            baseline.update(client.cookies)
+            clients[key] = (client, baseline)
+        return clients[key]
+
+    def _request(self, client, baseline, method, url, data):
+        """
+        Una petición dentro de su propia transacción, que se deshace. Devuelve
+        (estado, segundos, consultas, segundos en base de datos).
+        """
+        # Cada petición parte de la misma sesión (logout o mensajes no se arrastran)
+        client.cookies = SimpleCookie()
+        client.cookies.update(baseline)
+        recorder = QueryRecorder()
+        with transaction.atomic():
+            with connections['default'].execute_wrapper(recorder):
+                started = time.perf_counter()
+                response = getattr(client, method)(url, data or {})
+                # El cliente ya cerró la respuesta sin cerrar la conexión (cerrarla
+                # otra vez tiraría la transacción); el cuerpo en streaming se consume aquí
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        return response.status_code, elapsed, recorder.count, recorder.duration
+
+    def _run(self, names, options):
+        customer, admin = pick_users(options['admin'], options['customer'])
+        requests = view_requests(customer, admin)
+        clients = {}
+        views = {}
+        for name in names:
+            spec = requests.get(name)
+            if not spec:
+                self.stdout.write(self.style.WARNING(f'{name}: sin datos para medirla, se omite'))
+                continue
+            method, args, data, user = spec
+            client, baseline = self._client(user, clients)
+            url = reverse(name, args=args)
+
+            for _ in range(options['warmup']):
+                self._request(client, baseline, method, url, data)
+
+            timings = []
+            db_timings = []
+            for _ in range(max(options['iterations'], 1)):
+                status, elapsed, queries, db_seconds = self._request(client, baseline, method, url, data)
+                timings.append(elapsed * 1000)
+                db_timings.append(db_seconds * 1000)
+
+            # El pico de memoria en una pasada aparte: tracemalloc frena las demás
+            tracemalloc.start()
+            try:
+                self._request(client, baseline, method, url, data)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+            timings.sort()
+            db_timings.sort()
+            views[name] = {
+                'method': method.upper(),
+                'url': url,
+                'status': status,
+                'p50_ms': round(percentile(timings, 0.50), 2),
+                'p95_ms': round(percentile(timings, 0.95), 2),
+                'p99_ms': round(percentile(timings, 0.99), 2),
+                'mean_ms': round(sum(timings) / len(timings), 2),
+                'db_p50_ms': round(percentile(db_timings, 0.50), 2),
+                'queries': queries,
+                'peak_kib': round(peak / 1024, 1),
+            }
+            if status >= 400:
+                self.stdout.write(self.style.WARNING(f'{name}: respondió {status}'))
+        return views
+
+    # =========================
+    #   INFORME
+    # =========================
+    def _report(self, views):
+        self.stdout.write(
+            f'{"URL":<45} {"p50":>8} {"p95":>8} {"p99":>8} {"consultas":>9} {"memoria":>10}'
+        )
+        for name, result in views.items():
+            self.stdout.write(
+                f'{name:<45} {result["p50_ms"]:>6.1f}ms {result["p95_ms"]:>6.1f}ms '
+                f'{result["p99_ms"]:>6.1f}ms {result["queries"]:>9} {result["peak_kib"]:>7.0f}KiB'
+            )
+
+    def _compare(self, path, views):
+        with open(path, encoding='utf-8') as previous_file:
+            previous = json.load(previous_file)
+        self.stdout.write(f'\nComparación con {previous.get("commit") or path}:')
+        for name, result in views.items():
+            before = previous.get('views', {}).get(name)
+            if not before:
+                continue
+            change = (result['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0
+            line = (
+                f'{name:<45} p50 {before["p50_ms"]:>7.1f} -> {result["p50_ms"]:>7.1f} ms ({change:+.0f}%)  '
+                f'consultas {before["queries"]} -> {result["queries"]}'
+            )
+            if result['queries'] > before['queries'] or change > 20:
+                line = self.style.WARNING(line)
+            self.stdout.write(line)
@@ -0,0 +1,228 @@
+import logging
+import re
+from http.cookies import SimpleCookie
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from VetifyBooking.querybudget import fingerprint
+from admin_dashboard.management.commands.bench_views import pick_users, url_names, view_requests
+from admin_dashboard.pagination import encode_cursor
+from booking.models import Appointment, MedicalConsultation, Pet
+
+
+# Catálogo y resúmenes: pocas filas, recorrerlas enteras es lo normal
+SMALL_TABLES = {
+    'booking_service',
+    'booking_veterinarian',
+    'booking_veterinarian_services',
+    'booking_clinicschedule',
+    'admin_dashboard_dailystats',
+}
+
+# Recorridos aceptados a sabiendas: (petición, tabla). Las búsquedas de texto
+# de los listados son icontains, un LIKE '%texto%' que ningún índice B-tree
+# puede servir: se recorre la tabla en el orden del listado hasta llenar la
+# página. La búsqueda con índice es la global (omnisearch).
+ACCEPTED_SCANS = {
+    ('admin_dashboard:appointments ?search', 'booking_appointment'),
+    ('admin_dashboard:users ?search', 'auth_user'),
+    ('admin_dashboard:pets ?search', 'booking_pet'),
+}
+
+# Sentencias con plan; INSERT, SAVEPOINT y compañía no recorren tablas
+EXPLAINED = ('SELECT', 'UPDATE', 'DELETE', 'WITH')
+
+# "SCAN tabla" sin "USING ... INDEX" es un recorrido completo de la tabla
+FULL_SCAN = re.compile(r'\bSCAN (\w+)(?: AS \w+)?\s*$')
+ANY_SCAN = re.compile(r'\bSCAN (\w+)')
+
+# Filtro de subcadena (icontains): LIKE con comodín al principio
+SUBSTRING_MATCH = re.compile(r"LIKE '%")
+
+
+def variants(customer, admin):
+    """
+    Peticiones GET de más sobre URLs ya incluidas, con los filtros, búsquedas
+    y cursores que cambian sus consultas: [(nombre de URL, datos)].
+    """
+    today = timezone.localdate().isoformat()
+    admin_ns = 'admin_dashboard'
+    requests = [
+        (f'{admin_ns}:appointments', {'status': 'today'}),
+        (f'{admin_ns}:appointments', {'status': 'upcoming'}),
+        (f'{admin_ns}:appointments', {'status': 'past'}),
+        (f'{admin_ns}:appointments', {'status': 'pending'}),
+        (f'{admin_ns}:appointments', {'date': today}),
+        (f'{admin_ns}:appointments', {'search': customer.username[:4]}),
+        (f'{admin_ns}:users', {'search': customer.username[:4]}),
+        (f'{admin_ns}:pets', {'type': 'dog'}),
+        (f'{admin_ns}:pets', {'search': 'a'}),
+        (f'{admin_ns}:veterinarians', {'specialty': 'general'}),
+        (f'{admin_ns}:veterinarians', {'search': 'a'}),
+        (f'{admin_ns}:services', {'search': 'a'}),
+        (f'{admin_ns}:consultations', {'search': 'revision'}),
+        (f'{admin_ns}:reports', {'period': '365'}),
+        (f'{admin_ns}:omnisearch', {'q': f'{customer.username[:4]} a'}),
+        ('available_slots', {'days': '14'}),
+    ]
+
+    # Páginas siguientes y anteriores, con el cursor de una fila real
+    appointment = Appointment.objects.order_by('-date', '-time', '-id').first()
+    if appointment:
+        cursor = encode_cursor([appointment.date, appointment.time, appointment.id])
+        requests += [(f'{admin_ns}:appointments', {'after': cursor}), (f'{admin_ns}:appointments', {'before': cursor})]
+    requests.append((f'{admin_ns}:users', {'after': encode_cursor([customer.date_joined, customer.id])}))
+    pet = Pet.objects.order_by('-created_at', '-id').first()
+    if pet:
+        requests.append((f'{admin_ns}:pets', {'after': encode_cursor([pet.created_at, pet.id])}))
+    consultation = MedicalConsultation.objects.order_by('-created_at', '-id').first()
+    if consultation:
+        requests.append((f'{admin_ns}:consultations', {'after': encode_cursor([consultation.created_at, consultation.id])}))
+    return requests
+
+
+def explain(sql):
+    """Líneas del plan de SQLite para una sentencia ya capturada (con sus valores)."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def full_scans(plan, tables, substring=False):
+    """
+    Tablas de `tables` que el plan recorre enteras (las subconsultas no
+    cuentan). Con `substring`, la consulta filtra por LIKE '%...%' y recorrer
+    un índice por su orden también lee la tabla entera cuando hay pocas
+    coincidencias.
+    """
+    pattern = ANY_SCAN if substring else FULL_SCAN
+    scanned = []
+    for line in plan:
+        match = pattern.search(line)
+        if match and match.group(1) in tables and match.group(1) not in SMALL_TABLES:
+            scanned.append(match.group(1))
+    return scanned
+
+
+class Command(BaseCommand):
+    help = (
+        'Pide cada URL de booking y del panel sobre la base actual y revisa con '
+        'EXPLAIN QUERY PLAN que las consultas que hace usen índices. Todo lo que '
+        'escriben las vistas se deshace'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--show-plans',
+            action='store_true',
+            help='Muestra el plan de cada consulta',
+        )
+        parser.add_argument('--customer', help='Usuario cliente (por defecto, uno con recetas)')
+        parser.add_argument('--admin', help='Superusuario para el panel (por defecto, el primero)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Solo se revisan planes de SQLite')
+
+        # Los avisos de presupuesto de cada petición ensuciarían el informe
+        budget_logger = logging.getLogger('VetifyBooking.querybudget')
+        previous_level = budget_logger.level
+        budget_logger.setLevel(logging.ERROR)
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                with transaction.atomic():
+                    failures = self._run(options)
+                    transaction.set_rollback(True)
+        finally:
+            budget_logger.setLevel(previous_level)
+
+        if failures:
+            raise CommandError(f'{len(failures)} petición(es) con consultas sin índice: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS('Todas las consultas usan índices'))
+
+    def _requests(self, options):
+        """[(etiqueta, método, URL, datos, usuario)] de todas las URLs y sus variantes."""
+        customer, admin = pick_users(options['admin'], options['customer'])
+        specs = view_requests(customer, admin)
+        requests = []
+        for name in url_names():
+            if not specs.get(name):
+                self.stdout.write(self.style.WARNING(f'{name}: sin datos para pedirla, se omite'))
+                continue
+            method, args, data, user = specs[name]
+            requests.append((name, method, reverse(name, args=args), data, user))
+        for name, data in variants(customer, admin):
+            if not specs.get(name):
+                continue
+            _, args, _, user = specs[name]
+            label = f'{name} ?{"&".join(data)}'
+            requests.append((label, 'get', reverse(name, args=args), data, user))
+        return requests
+
+    def _run(self, options):
+        self.tables = set(connection.introspection.table_names())
+        clients = {}
+        failures = []
+        for label, method, url, data, user in self._requests(options):
+            key = user.id if user else None
+            if key not in clients:
+                client = Client()
+                if user is not None:
+                    client.force_login(user)
+                baseline = SimpleCookie()
+                baseline.update(client.cookies)
+                clients[key] = (client, baseline)
+            client, baseline = clients[key]
+            client.cookies = SimpleCookie()
+            client.cookies.update(baseline)
+
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as captured:
+                    response = getattr(client, method)(url, data or {})
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                # El plan se pide antes de deshacer: las filas que escribió la vista siguen ahí
+                scanned = self._check(label, captured.captured_queries, options)
+                transaction.set_rollback(True)
+
+            if response.status_code >= 400:
+                self.stdout.write(self.style.WARNING(f'{label}: respondió {response.status_code}'))
+            if scanned:
+                failures.append(label)
+        return failures
+
+    def _check(self, label, queries, options):
+        """Revisa cada consulta distinta de la petición; devuelve las tablas recorridas sin aceptar."""
+        seen = set()
+        scanned = []
+        report = []
+        for query in queries:
+            sql = query['sql']
+            key = fingerprint(sql)
+            if key in seen or not sql.lstrip().upper().startswith(EXPLAINED):
+                continue
+            seen.add(key)
+            plan = explain(sql)
+            tables = [
+                table for table in full_scans(plan, self.tables, substring=SUBSTRING_MATCH.search(sql))
+                if (label, table) not in ACCEPTED_SCANS
+            ]
+            if tables:
+                scanned += tables
+                report.append(self.style.ERROR(f'  recorre {", ".join(tables)} completa: {sql}'))
+            if options['show_plans'] or tables:
+                report += [f'    {line}' for line in plan]
+
+        if scanned:
+            self.stdout.write(self.style.ERROR(f'{label}: {len(scanned)} recorrido(s) sin índice'))
+        else:
+            self.stdout.write(f'{label}: ok ({len(seen)} consultas)')
+        for line in report:
+            self.stdout.write(line)
+        return scanned
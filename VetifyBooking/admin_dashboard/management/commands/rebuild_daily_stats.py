@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from admin_dashboard.rollups import rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los resúmenes diarios del dashboard a partir de las tablas de origen'
+
+    def handle(self, *args, **options):
+        days = rebuild_daily_stats()
+        self.stdout.write(self.style.SUCCESS(f'Resúmenes reconstruidos: {days} días'))
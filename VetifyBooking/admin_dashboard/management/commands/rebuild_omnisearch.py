@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from admin_dashboard.models import SearchEntry
+from admin_dashboard.omnisearch import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye la búsqueda global del panel (usuarios, mascotas, veterinarios y citas)'
+
+    def handle(self, *args, **options):
+        counts = rebuild()
+        labels = dict(SearchEntry.KIND_CHOICES)
+        for kind, total in counts.items():
+            self.stdout.write(f'{labels[kind]}: {total}')
+        self.stdout.write(self.style.SUCCESS(f'{sum(counts.values())} registros indexados'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from admin_dashboard.rollups import rebuild_report_cube
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el cubo de reportes (fecha × servicio × estado) desde las citas'
+
+    def handle(self, *args, **options):
+        cells = rebuild_report_cube()
+        self.stdout.write(self.style.SUCCESS(f'Cubo reconstruido: {cells} celdas'))
@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from VetifyBooking.replica import refresh_replica
+
+
+class Command(BaseCommand):
+    help = 'Copia la base principal sobre la réplica de lectura (dashboard, reportes, exportaciones)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=getattr(settings, 'REPLICA_REFRESH_INTERVAL', 30),
+            help='Segundos entre copias',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Hace una copia y termina',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            try:
+                refresh_replica()
+            except Exception as error:
+                if options['once']:
+                    raise
+                # Si falla, la réplica envejece hasta REPLICA_MAX_LAG y deja de usarse
+                self.stderr.write(f'No se pudo copiar la base: {error}')
+            else:
+                self.stdout.write(f'Réplica actualizada en {time.monotonic() - started:.2f} s')
+
+            if options['once']:
+                return
+            time.sleep(max(options['interval'] - (time.monotonic() - started), 0))
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='Fecha')),
+                ('appointments', models.IntegerField(default=0, verbose_name='Citas')),
+                ('pending', models.IntegerField(default=0, verbose_name='Pendientes')),
+                ('confirmed', models.IntegerField(default=0, verbose_name='Confirmadas')),
+                ('completed', models.IntegerField(default=0, verbose_name='Completadas')),
+                ('cancelled', models.IntegerField(default=0, verbose_name='Canceladas')),
+                ('new_users', models.IntegerField(default=0, verbose_name='Usuarios nuevos')),
+                ('new_pets', models.IntegerField(default=0, verbose_name='Mascotas nuevas')),
+            ],
+            options={
+                'verbose_name': 'Resumen diario',
+                'verbose_name_plural': 'Resúmenes diarios',
+                'ordering': ['-date'],
+            },
+        ),
+    ]
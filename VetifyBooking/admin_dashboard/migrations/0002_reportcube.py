@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_dashboard', '0001_initial'),
+        ('booking', '0011_slothold'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportCube',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Fecha')),
+                ('status', models.CharField(max_length=20, verbose_name='Estado')),
+                ('appointments', models.IntegerField(default=0, verbose_name='Citas')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Ingresos')),
+                ('service', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='report_cells', to='booking.service', verbose_name='Servicio')),
+            ],
+            options={
+                'verbose_name': 'Celda de reporte',
+                'verbose_name_plural': 'Cubo de reportes',
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('service__isnull', False)), fields=('date', 'service', 'status'), name='unique_report_cell'), models.UniqueConstraint(condition=models.Q(('service__isnull', True)), fields=('date', 'status'), name='unique_report_cell_without_service')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_dashboard', '0002_reportcube'),
+        ('booking', '0015_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reportcube',
+            index=models.Index(fields=['date'], name='reportcube_date_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_dashboard', '0003_reportcube_date_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('user', 'Usuario'), ('pet', 'Mascota'), ('vet', 'Veterinario'), ('appointment', 'Cita')], max_length=20, verbose_name='Tipo')),
+                ('object_id', models.PositiveIntegerField(verbose_name='Registro')),
+                ('title', models.CharField(max_length=200, verbose_name='Título')),
+                ('subtitle', models.CharField(blank=True, max_length=200, verbose_name='Detalle')),
+                ('url', models.CharField(max_length=300)),
+            ],
+            options={
+                'verbose_name': 'Entrada de búsqueda',
+                'verbose_name_plural': 'Búsqueda global',
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_search_entry')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('entry', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='tokens', to='admin_dashboard.searchentry')),
+            ],
+            options={
+                'verbose_name': 'Palabra de búsqueda',
+                'verbose_name_plural': 'Palabras de búsqueda',
+                'indexes': [models.Index(fields=['token', 'entry'], name='searchtoken_prefix_idx')],
+                'constraints': [models.UniqueConstraint(fields=('entry', 'token'), name='unique_search_token')],
+            },
+        ),
+    ]
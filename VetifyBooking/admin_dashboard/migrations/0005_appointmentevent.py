@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_dashboard', '0004_omnisearch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('created', 'Nueva'), ('status', 'Cambio de estado'), ('deleted', 'Eliminada')], max_length=20, verbose_name='Tipo')),
+                ('appointment_id', models.PositiveIntegerField(verbose_name='Cita')),
+                ('date', models.DateField(null=True, verbose_name='Fecha de la cita')),
+                ('status', models.CharField(blank=True, max_length=20, verbose_name='Estado')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Registrado')),
+            ],
+            options={
+                'verbose_name': 'Evento de cita',
+                'verbose_name_plural': 'Eventos de citas',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_dashboard', '0005_appointmentevent'),
+        ('booking', '0017_plan_check_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reportcube',
+            name='service',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='report_cells', to='booking.service', verbose_name='Servicio'),
+        ),
+    ]
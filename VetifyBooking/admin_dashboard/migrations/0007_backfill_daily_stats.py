@@ -0,0 +1,59 @@
+# DailyStats (0001) para los datos que ya existían: sin esto, el dashboard
+# sale vacío hasta correr rebuild_daily_stats.
+#
+# Copia congelada de admin_dashboard.rollups.rebuild_daily_stats sobre los
+# modelos históricos: la migración no debe cambiar si cambia el módulo.
+
+from django.db import migrations
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+
+
+STATUS_FIELDS = ('pending', 'confirmed', 'completed', 'cancelled')
+
+
+def backfill_daily_stats(apps, schema_editor):
+    DailyStats = apps.get_model('admin_dashboard', 'DailyStats')
+    rows = {}
+
+    def row(day):
+        return rows.setdefault(day, DailyStats(date=day))
+
+    status_counts = {status: Count('id', filter=Q(status=status)) for status in STATUS_FIELDS}
+    appointments = apps.get_model('booking', 'Appointment').objects.order_by()
+    for item in appointments.values('date').annotate(total=Count('id'), **status_counts):
+        stats = row(item['date'])
+        stats.appointments = item['total']
+        for status in STATUS_FIELDS:
+            setattr(stats, status, item[status])
+
+    users = (
+        apps.get_model('auth', 'User').objects.filter(is_superuser=False)
+        .annotate(day=TruncDate('date_joined'))
+        .order_by().values('day').annotate(total=Count('id'))
+    )
+    for item in users:
+        row(item['day']).new_users = item['total']
+
+    pets = (
+        apps.get_model('booking', 'Pet').objects.annotate(day=TruncDate('created_at'))
+        .order_by().values('day').annotate(total=Count('id'))
+    )
+    for item in pets:
+        row(item['day']).new_pets = item['total']
+
+    DailyStats.objects.all().delete()
+    DailyStats.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_dashboard', '0006_reportcube_service_set_null'),
+        ('booking', '0018_backfill_user_stats'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# ReportCube (0002) para las citas que ya existían: sin esto, los reportes
+# salen vacíos hasta correr rebuild_report_cube.
+#
+# Copia congelada de admin_dashboard.rollups.rebuild_report_cube sobre los
+# modelos históricos: la migración no debe cambiar si cambia el módulo.
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def backfill_report_cube(apps, schema_editor):
+    ReportCube = apps.get_model('admin_dashboard', 'ReportCube')
+    appointments = apps.get_model('booking', 'Appointment').objects.order_by()
+    prices = dict(apps.get_model('booking', 'Service').objects.values_list('id', 'price'))
+    cells = [
+        ReportCube(
+            date=item['date'],
+            service_id=item['service'],
+            status=item['status'],
+            appointments=item['total'],
+            revenue=item['total'] * prices.get(item['service'], 0),
+        )
+        for item in appointments.values('date', 'service', 'status').annotate(total=Count('id'))
+    ]
+    ReportCube.objects.all().delete()
+    ReportCube.objects.bulk_create(cells, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_dashboard', '0007_backfill_daily_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_report_cube, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,112 @@
+# Búsqueda global (0004) para los registros que ya existían: sin esto, la
+# búsqueda del panel y el autocompletado de los modales no encuentran nada
+# hasta correr rebuild_omnisearch.
+#
+# Copia congelada de admin_dashboard.omnisearch.rebuild sobre los modelos
+# históricos: la migración no debe cambiar si cambia el módulo.
+
+import re
+import unicodedata
+
+from django.db import migrations
+from django.urls import reverse
+from django.utils.http import urlencode
+
+
+BATCH = 1000
+
+TOKEN_LENGTH = 64
+
+WORD = re.compile(r'[a-z0-9]+')
+
+
+def normalize(text):
+    decomposed = unicodedata.normalize('NFKD', str(text or ''))
+    folded = ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+    return [word[:TOKEN_LENGTH] for word in WORD.findall(folded)]
+
+
+def user_document(user):
+    full_name = f'{user.first_name} {user.last_name}'.strip()
+    return (
+        full_name or user.username,
+        f"@{user.username} · {user.email}" if user.email else f"@{user.username}",
+        f"{reverse('admin_dashboard:users')}?{urlencode({'search': user.username})}",
+        [user.username, user.first_name, user.last_name, user.email],
+    )
+
+
+def pet_document(pet):
+    return (
+        pet.name,
+        f"{pet.get_pet_type_display()} · {pet.owner.username}",
+        reverse('admin_dashboard:pet_vaccines', args=[pet.id]),
+        [pet.name, pet.breed, pet.owner.username],
+    )
+
+
+def vet_document(vet):
+    return (
+        vet.name,
+        f"{vet.get_specialty_display()} · Cédula {vet.license_number}",
+        reverse('admin_dashboard:edit_veterinarian', args=[vet.id]),
+        [vet.name, vet.license_number, vet.email],
+    )
+
+
+def appointment_document(appointment):
+    vet = appointment.veterinarian.name if appointment.veterinarian else 'Sin veterinario'
+    day = appointment.date.strftime('%d/%m/%Y')
+    query = urlencode({'date': appointment.date.isoformat(), 'search': appointment.pet.name})
+    return (
+        f"{appointment.pet.name} · {day} {appointment.time.strftime('%H:%M')}",
+        f"{appointment.user.username} · {vet} · {appointment.get_status_display()}",
+        f"{reverse('admin_dashboard:appointments')}?{query}",
+        [appointment.pet.name, appointment.user.username, vet if appointment.veterinarian else '', day],
+    )
+
+
+def backfill_omnisearch(apps, schema_editor):
+    SearchEntry = apps.get_model('admin_dashboard', 'SearchEntry')
+    SearchToken = apps.get_model('admin_dashboard', 'SearchToken')
+    sources = {
+        'user': (apps.get_model('auth', 'User').objects.filter(is_superuser=False), user_document),
+        'pet': (apps.get_model('booking', 'Pet').objects.select_related('owner'), pet_document),
+        'vet': (apps.get_model('booking', 'Veterinarian').objects.all(), vet_document),
+        'appointment': (
+            apps.get_model('booking', 'Appointment').objects.select_related('pet', 'user', 'veterinarian'),
+            appointment_document,
+        ),
+    }
+
+    SearchToken.objects.all().delete()
+    SearchEntry.objects.all().delete()
+    for kind, (queryset, build) in sources.items():
+        queryset = queryset.order_by('id')
+        last_id = 0
+        while True:
+            batch = list(queryset.filter(id__gt=last_id)[:BATCH])
+            if not batch:
+                break
+            documents = [(obj.id, build(obj)) for obj in batch]
+            entries = SearchEntry.objects.bulk_create([
+                SearchEntry(kind=kind, object_id=object_id, title=title[:200], subtitle=subtitle[:200], url=url)
+                for object_id, (title, subtitle, url, _) in documents
+            ])
+            SearchToken.objects.bulk_create([
+                SearchToken(entry_id=entry.id, token=token)
+                for entry, (_, (_, _, _, texts)) in zip(entries, documents)
+                for token in {token for text in texts for token in normalize(text)}
+            ], batch_size=BATCH)
+            last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_dashboard', '0008_backfill_report_cube'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_omnisearch, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,181 @@
 from django.db import models
 
-# Create your models here.
+
+# =========================
+#   RESUMEN DIARIO (KPIs)
+# =========================
+class DailyStats(models.Model):
+    """
+    Contadores por día que alimentan el dashboard. Se mantienen al día con
+    señales (ver signals.py) y se pueden reconstruir con
+    `manage.py rebuild_daily_stats`.
+    """
+
+    date = models.DateField(unique=True, verbose_name="Fecha")
+
+    # Citas con fecha en este día, en total y por estado
+    appointments = models.IntegerField(default=0, verbose_name="Citas")
+    pending = models.IntegerField(default=0, verbose_name="Pendientes")
+    confirmed = models.IntegerField(default=0, verbose_name="Confirmadas")
+    completed = models.IntegerField(default=0, verbose_name="Completadas")
+    cancelled = models.IntegerField(default=0, verbose_name="Canceladas")
+
+    # Altas registradas en este día
+    new_users = models.IntegerField(default=0, verbose_name="Usuarios nuevos")
+    new_pets = models.IntegerField(default=0, verbose_name="Mascotas nuevas")
+
+    class Meta:
+        verbose_name = "Resumen diario"
+        verbose_name_plural = "Resúmenes diarios"
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"{self.date}: {self.appointments} citas"
+
+
+# =========================
+#   CUBO DE REPORTES
+# =========================
+class ReportCube(models.Model):
+    """
+    Citas preagregadas por fecha × servicio × estado, con los ingresos según
+    el precio del servicio. Cualquier período de reports_view se resuelve con
+    una sola consulta agrupada sobre esta tabla.
+    """
+
+    date = models.DateField(verbose_name="Fecha")
+    # Como Appointment.service: al borrar el servicio sus celdas se suman a
+    # las de sin servicio (rollups.merge_service_cells), no se pierden
+    service = models.ForeignKey(
+        'booking.Service',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='report_cells',
+        verbose_name="Servicio"
+    )
+    status = models.CharField(max_length=20, verbose_name="Estado")
+
+    appointments = models.IntegerField(default=0, verbose_name="Citas")
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Ingresos")
+
+    class Meta:
+        verbose_name = "Celda de reporte"
+        verbose_name_plural = "Cubo de reportes"
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'service', 'status'],
+                condition=models.Q(service__isnull=False),
+                name='unique_report_cell'
+            ),
+            # Citas sin servicio: la restricción anterior no cubre los NULL
+            models.UniqueConstraint(
+                fields=['date', 'status'],
+                condition=models.Q(service__isnull=True),
+                name='unique_report_cell_without_service'
+            ),
+        ]
+        indexes = [
+            # Las restricciones son parciales: los rangos de fechas necesitan su propio índice
+            models.Index(fields=['date'], name='reportcube_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} / {self.service_id} / {self.status}: {self.appointments}"
+
+
+# =========================
+#   BÚSQUEDA GLOBAL
+# =========================
+class SearchEntry(models.Model):
+    """
+    Un usuario, mascota, veterinario o cita tal como aparece en la búsqueda
+    global del panel. Se mantiene con señales (ver omnisearch.py) y se puede
+    reconstruir con `manage.py rebuild_omnisearch`.
+    """
+
+    KIND_CHOICES = [
+        ('user', 'Usuario'),
+        ('pet', 'Mascota'),
+        ('vet', 'Veterinario'),
+        ('appointment', 'Cita'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name="Tipo")
+    object_id = models.PositiveIntegerField(verbose_name="Registro")
+
+    title = models.CharField(max_length=200, verbose_name="Título")
+    subtitle = models.CharField(max_length=200, blank=True, verbose_name="Detalle")
+    url = models.CharField(max_length=300)
+
+    class Meta:
+        verbose_name = "Entrada de búsqueda"
+        verbose_name_plural = "Búsqueda global"
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_search_entry'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.title}"
+
+
+class SearchToken(models.Model):
+    """Palabra normalizada (minúsculas, sin acentos) de una entrada de búsqueda."""
+
+    entry = models.ForeignKey(
+        SearchEntry,
+        on_delete=models.CASCADE,
+        related_name='tokens',
+        # La restricción única (entry, token) ya sirve de índice por entrada
+        db_index=False,
+    )
+    token = models.CharField(max_length=64)
+
+    class Meta:
+        verbose_name = "Palabra de búsqueda"
+        verbose_name_plural = "Palabras de búsqueda"
+        constraints = [
+            models.UniqueConstraint(fields=['entry', 'token'], name='unique_search_token'),
+        ]
+        indexes = [
+            # Búsqueda por prefijo: rango token >= 'gar' AND token < 'gas' (índice cubriente)
+            models.Index(fields=['token', 'entry'], name='searchtoken_prefix_idx'),
+        ]
+
+    def __str__(self):
+        return self.token
+
+
+# =========================
+#   CAMBIOS EN VIVO
+# =========================
+class AppointmentEvent(models.Model):
+    """
+    Alta, cambio de estado o baja de una cita, para los paneles conectados al
+    stream de eventos (ver live.py). Se escribe con señales en la misma
+    transacción que el cambio; el id creciente es el cursor del stream.
+    """
+
+    KIND_CHOICES = [
+        ('created', 'Nueva'),
+        ('status', 'Cambio de estado'),
+        ('deleted', 'Eliminada'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name="Tipo")
+    # Sin clave foránea: el evento de una cita borrada sobrevive a la cita
+    appointment_id = models.PositiveIntegerField(verbose_name="Cita")
+    # Fecha y estado de la cita tras el cambio (antes, si se borró): lo que
+    # necesitan los KPIs del dashboard sin volver a consultar
+    date = models.DateField(null=True, verbose_name="Fecha de la cita")
+    status = models.CharField(max_length=20, blank=True, verbose_name="Estado")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Registrado")
+
+    class Meta:
+        verbose_name = "Evento de cita"
+        verbose_name_plural = "Eventos de citas"
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: cita {self.appointment_id}"
@@ -0,0 +1,221 @@
+"""
+Búsqueda global del panel: usuarios, mascotas, veterinarios y citas desde una
+sola caja.
+
+Cada registro tiene una fila en SearchEntry (título, detalle y enlace ya
+calculados) y una fila en SearchToken por palabra normalizada: minúsculas,
+sin acentos y solo letras y números. Buscar "garcía" o "GARCIA" es buscar el
+prefijo "garcia", que se resuelve como un rango sobre el índice
+(token, entry): token >= 'garcia' AND token < 'garcib'. Con varias palabras
+se recorre el rango más corto y las demás se comprueban sobre la restricción
+única (entry, token).
+
+Las señales de admin_dashboard.signals mantienen las tablas al día;
+`rebuild_omnisearch` las rehace tras cargas masivas (bulk_create o update()
+no disparan señales).
+"""
+import re
+import unicodedata
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from booking.models import Appointment, Pet, Veterinarian
+from .models import SearchEntry, SearchToken
+
+
+# Longitud mínima de una palabra para buscarla
+MIN_PREFIX = 2
+
+# Resultados que devuelve una búsqueda
+RESULTS = 20
+
+# Tope de candidatos por prefijo antes de ordenar
+CANDIDATES = 200
+
+# Filas que se cuentan por palabra para elegir la más selectiva
+SELECTIVITY_PROBE = 1000
+
+# Orden de los tipos en los resultados a igual relevancia
+KIND_ORDER = {kind: position for position, (kind, _) in enumerate(SearchEntry.KIND_CHOICES)}
+
+# Registros por lote al reconstruir
+REBUILD_BATCH = 1000
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+_TOKEN_LENGTH = SearchToken._meta.get_field('token').max_length
+
+_INSERT_TOKEN = f"INSERT INTO {SearchToken._meta.db_table} (entry_id, token) VALUES (%s, %s)"
+
+
+def normalize(text):
+    """Palabras de `text` en minúsculas, sin acentos ni signos."""
+    decomposed = unicodedata.normalize('NFKD', str(text or ''))
+    folded = ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+    return [word[:_TOKEN_LENGTH] for word in _WORD.findall(folded)]
+
+
+def _prefix_range(prefix):
+    # Siguiente cadena después de todas las que empiezan por `prefix` (solo a-z0-9)
+    return {'token__gte': prefix, 'token__lt': prefix[:-1] + chr(ord(prefix[-1]) + 1)}
+
+
+# =========================
+#   DOCUMENTOS POR TIPO
+# =========================
+def _user_document(user):
+    full_name = user.get_full_name()
+    return (
+        full_name or user.username,
+        f"@{user.username} · {user.email}" if user.email else f"@{user.username}",
+        f"{reverse('admin_dashboard:users')}?{urlencode({'search': user.username})}",
+        [user.username, user.first_name, user.last_name, user.email],
+    )
+
+
+def _pet_document(pet):
+    return (
+        pet.name,
+        f"{pet.get_pet_type_display()} · {pet.owner.username}",
+        reverse('admin_dashboard:pet_vaccines', args=[pet.id]),
+        [pet.name, pet.breed, pet.owner.username],
+    )
+
+
+def _vet_document(vet):
+    return (
+        vet.name,
+        f"{vet.get_specialty_display()} · Cédula {vet.license_number}",
+        reverse('admin_dashboard:edit_veterinarian', args=[vet.id]),
+        [vet.name, vet.license_number, vet.email],
+    )
+
+
+def _appointment_document(appointment):
+    vet = appointment.veterinarian.name if appointment.veterinarian else 'Sin veterinario'
+    day = appointment.date.strftime('%d/%m/%Y')
+    query = urlencode({'date': appointment.date.isoformat(), 'search': appointment.pet.name})
+    return (
+        f"{appointment.pet.name} · {day} {appointment.time.strftime('%H:%M')}",
+        f"{appointment.user.username} · {vet} · {appointment.get_status_display()}",
+        f"{reverse('admin_dashboard:appointments')}?{query}",
+        [appointment.pet.name, appointment.user.username, vet if appointment.veterinarian else '', day],
+    )
+
+
+# tipo -> (registros indexables, documento)
+SOURCES = {
+    'user': (lambda: User.objects.filter(is_superuser=False), _user_document),
+    'pet': (lambda: Pet.objects.select_related('owner'), _pet_document),
+    'vet': (lambda: Veterinarian.objects.all(), _vet_document),
+    'appointment': (
+        lambda: Appointment.objects.select_related('pet', 'user', 'veterinarian'),
+        _appointment_document,
+    ),
+}
+
+
+# =========================
+#   INDEXADO
+# =========================
+def _index(kind, objects):
+    build = SOURCES[kind][1]
+    documents = [(obj.id, build(obj)) for obj in objects]
+    entries = SearchEntry.objects.bulk_create([
+        SearchEntry(kind=kind, object_id=object_id, title=title[:200], subtitle=subtitle[:200], url=url)
+        for object_id, (title, subtitle, url, _) in documents
+    ])
+    # Sin instancias: en una reconstrucción son cientos de miles de filas de dos columnas
+    rows = [
+        (entry.id, token)
+        for entry, (_, (_, _, _, texts)) in zip(entries, documents)
+        for token in {token for text in texts for token in normalize(text)}
+    ]
+    if rows:
+        with connection.cursor() as cursor:
+            cursor.executemany(_INSERT_TOKEN, rows)
+    return len(entries)
+
+
+def index_objects(kind, ids):
+    """Vuelve a indexar los registros indicados; los que ya no existen (o no se indexan) salen."""
+    ids = [object_id for object_id in set(ids) if object_id is not None]
+    if not ids:
+        return
+    with transaction.atomic():
+        # Primero la escritura: las lecturas siguientes van a la base principal
+        remove_objects(kind, ids)
+        _index(kind, SOURCES[kind][0]().filter(id__in=ids))
+
+
+def remove_objects(kind, ids):
+    SearchEntry.objects.filter(kind=kind, object_id__in=list(ids)).delete()
+
+
+def rebuild():
+    """Rehace la búsqueda global entera. Devuelve {tipo: registros indexados}."""
+    counts = {}
+    with transaction.atomic():
+        SearchToken.objects.all().delete()
+        SearchEntry.objects.all().delete()
+        for kind, (source, _) in SOURCES.items():
+            queryset = source().order_by('id')
+            counts[kind] = 0
+            last_id = 0
+            while True:
+                batch = list(queryset.filter(id__gt=last_id)[:REBUILD_BATCH])
+                if not batch:
+                    break
+                counts[kind] += _index(kind, batch)
+                last_id = batch[-1].id
+    return counts
+
+
+# =========================
+#   BÚSQUEDA
+# =========================
+def _word_filter(word, exact):
+    return {'token': word} if exact else _prefix_range(word)
+
+
+def entries_matching(words, exact=False, kind=None):
+    """
+    Ids (queryset) de entradas que tienen, para cada palabra, un token igual (o que
+    empieza por ella). Se recorre el rango de la palabra más selectiva y las
+    demás se comprueban por entrada, así que la consulta para en cuanto junta
+    suficientes candidatos.
+    """
+    ranges = sorted(
+        (SearchToken.objects.filter(**_word_filter(word, exact)) for word in words),
+        key=lambda tokens: tokens[:SELECTIVITY_PROBE].count(),
+    )
+    matches = ranges[0]
+    if kind:
+        matches = matches.filter(entry__kind=kind)
+    for tokens in ranges[1:]:
+        matches = matches.filter(Exists(tokens.filter(entry_id=OuterRef('entry_id'))))
+    return matches.values_list('entry_id', flat=True).distinct()
+
+
+def search(text, kind=None):
+    """
+    Hasta RESULTS entradas para `text` (solo de `kind` si se indica): primero
+    las que tienen todas las palabras completas, luego las que solo las tienen
+    como prefijo; a igual relevancia por tipo y título.
+    """
+    words = {word for word in normalize(text) if len(word) >= MIN_PREFIX}
+    if not words:
+        return []
+
+    exact = set(entries_matching(words, exact=True, kind=kind)[:RESULTS])
+    candidates = exact.union(entries_matching(words, kind=kind)[:CANDIDATES])
+    entries = SearchEntry.objects.filter(id__in=candidates)
+    ranked = sorted(
+        entries,
+        key=lambda entry: (entry.id not in exact, KIND_ORDER[entry.kind], entry.title.lower(), entry.id),
+    )
+    return ranked[:RESULTS]
@@ -0,0 +1,195 @@
+"""
+Paginación por cursor (keyset) para los listados del panel.
+
+En lugar de OFFSET, cada página pide "las filas que van después de la última
+que se mostró" según el mismo orden del listado. La consulta usa el índice del
+orden y cuesta lo mismo en la primera página que en la milésima, y nunca se
+carga la tabla completa en memoria.
+
+El cursor es el valor de las columnas de orden de la fila frontera, codificado
+en base64 para poder viajar en la URL junto con los filtros de la vista.
+"""
+import base64
+import json
+from datetime import date, datetime, time
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime, parse_time
+
+
+# Filas por página de los listados del panel
+PAGE_SIZE = 50
+
+# Hasta dónde se cuenta exactamente; por encima se muestra "N+"
+COUNT_CAP = 1000
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return ['dt', value.isoformat()]
+    if isinstance(value, date):
+        return ['d', value.isoformat()]
+    if isinstance(value, time):
+        return ['t', value.isoformat()]
+    return ['v', value]
+
+
+def _decode_value(item):
+    kind, value = item
+    if kind == 'dt':
+        return parse_datetime(value)
+    if kind == 'd':
+        return parse_date(value)
+    if kind == 't':
+        return parse_time(value)
+    return value
+
+
+def encode_cursor(values):
+    raw = json.dumps([_encode_value(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, fields):
+    """
+    Valores del cursor convertidos con los campos del orden (`fields`), o None
+    si no es válido (se vuelve a la primera página). Un cursor manipulado no
+    debe llegar a la consulta: 'abc' contra un id daría un error 500.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = [_decode_value(item) for item in json.loads(raw)]
+        if len(values) != len(fields) or any(v is None for v in values):
+            return None
+        return [field.to_python(value) for field, value in zip(fields, values)]
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+def _field_name(field):
+    return field.lstrip('-')
+
+
+def _keyset_filter(ordering, values, forward):
+    """
+    Condición "fila posterior a `values`" para un orden de varias columnas:
+    (a > x) OR (a = x AND b > y) OR ...  Con forward=False, "anterior".
+    """
+    condition = Q()
+    for position, field in enumerate(ordering):
+        descending = field.startswith('-')
+        lookup = 'lt' if descending == forward else 'gt'
+        term = Q(**{f'{_field_name(field)}__{lookup}': values[position]})
+        for previous, value in zip(ordering[:position], values):
+            term &= Q(**{_field_name(previous): value})
+        condition |= term
+    return condition
+
+
+def _reverse(ordering):
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+
+class KeysetPage:
+    """Una página del listado y los enlaces para moverse desde ella."""
+
+    def __init__(self, items, ordering, params, has_next, has_previous, count=None):
+        self.object_list = items
+        self.ordering = ordering
+        self.params = params
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def _cursor_of(self, obj):
+        return encode_cursor([getattr(obj, _field_name(f)) for f in self.ordering])
+
+    def _query(self, key, obj):
+        params = self.params.copy()
+        params.pop('after', None)
+        params.pop('before', None)
+        params[key] = self._cursor_of(obj)
+        return params.urlencode()
+
+    @property
+    def next_query(self):
+        return self._query('after', self.object_list[-1]) if self.has_next else ''
+
+    @property
+    def previous_query(self):
+        return self._query('before', self.object_list[0]) if self.has_previous else ''
+
+    @property
+    def first_query(self):
+        params = self.params.copy()
+        params.pop('after', None)
+        params.pop('before', None)
+        return params.urlencode()
+
+    @property
+    def count_label(self):
+        """Total para mostrar: exacto hasta COUNT_CAP, "1000+" por encima."""
+        if self.count is None:
+            return ''
+        if self.count > COUNT_CAP:
+            return f'{COUNT_CAP}+'
+        return str(self.count)
+
+
+def keyset_queryset(queryset, ordering, after=None):
+    """`queryset` ordenado por `ordering` y, con cursor, a partir de `after`."""
+    page = queryset.order_by(*ordering)
+    if after is not None:
+        page = page.filter(_keyset_filter(ordering, after, forward=True))
+    return page
+
+
+def estimated_count(queryset, cap=COUNT_CAP):
+    """
+    COUNT acotado: nunca recorre más de `cap` + 1 filas, así que en tablas
+    grandes cuesta lo mismo que en pequeñas. Devuelve un valor mayor que `cap`
+    si hay más filas.
+    """
+    return queryset.order_by()[:cap + 1].count()
+
+
+def keyset_paginate(request, queryset, ordering, per_page=PAGE_SIZE, with_count=True):
+    """
+    Página del `queryset` ordenado por `ordering` a partir de los parámetros
+    `after` / `before` de la petición. El último campo del orden debe ser
+    único (normalmente 'id' o '-id') para que el cursor no se salte filas.
+    """
+    ordering = list(ordering)
+    params = request.GET
+    fields = [queryset.model._meta.get_field(_field_name(field)) for field in ordering]
+
+    after = decode_cursor(params['after'], fields) if params.get('after') else None
+    before = decode_cursor(params['before'], fields) if params.get('before') else None
+
+    count = estimated_count(queryset) if with_count else None
+
+    if before is not None:
+        rows = list(
+            queryset.filter(_keyset_filter(ordering, before, forward=False))
+            .order_by(*_reverse(ordering))[:per_page + 1]
+        )
+        has_previous = len(rows) > per_page
+        items = rows[:per_page][::-1]
+        has_next = bool(items)
+    else:
+        rows = list(keyset_queryset(queryset, ordering, after)[:per_page + 1])
+        has_next = len(rows) > per_page
+        items = rows[:per_page]
+        has_previous = after is not None
+
+    return KeysetPage(items, ordering, params, has_next, has_previous and bool(items), count)
@@ -0,0 +1,213 @@
+"""
+Mantenimiento de los resúmenes del dashboard (DailyStats) y del cubo de
+reportes (ReportCube).
+
+Las señales aplican incrementos con F() sobre una sola fila, de modo que el
+dashboard y los reportes leen tablas pequeñas en lugar de contar
+booking_appointment.
+
+Lo que se escribe sin señales (QuerySet.update(), bulk_create, SQL directo o
+el UPDATE de SET_NULL al borrar un servicio, salvo lo que cubre
+merge_service_cells) no llega a los resúmenes y los desvía. Por eso
+`rebuild_daily_stats` y `rebuild_report_cube` corren a diario desde la cola
+(TASKQUEUE_SCHEDULE) y se pueden lanzar a mano tras una carga masiva.
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from booking.models import Appointment, Pet, Service
+from .models import DailyStats, ReportCube
+
+
+STATUS_FIELDS = ('pending', 'confirmed', 'completed', 'cancelled')
+
+
+def as_date(value):
+    """Fecha local de un date, datetime o texto 'YYYY-MM-DD'."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if hasattr(value, 'tzinfo'):
+        return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+    return value
+
+
+def _increment(model, key, deltas):
+    """Suma `deltas` a la fila `key` de `model`, creándola si no existe."""
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    if model.objects.filter(**key).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **deltas)
+    except IntegrityError:
+        # Otra petición creó la fila entre medias
+        model.objects.filter(**key).update(**changes)
+
+
+def bump(day, **deltas):
+    """Suma `deltas` a los contadores del día, creando la fila si no existe."""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if day is None or not deltas:
+        return
+    _increment(DailyStats, {'date': day}, deltas)
+
+
+def bump_cube(day, service_id, status, sign):
+    """
+    Suma (o resta) una cita a la celda fecha × servicio × estado. El precio
+    del servicio se lee en el mismo UPDATE (subconsulta); solo la primera
+    cita de una celda lo consulta aparte para crearla.
+    """
+    if day is None:
+        return
+    key = {'date': day, 'service_id': service_id, 'status': status}
+    changes = {'appointments': F('appointments') + sign}
+    if service_id is not None:
+        price = Coalesce(
+            Subquery(Service.objects.filter(id=service_id).values('price')[:1]), Value(Decimal(0)),
+        )
+        changes['revenue'] = F('revenue') + price if sign > 0 else F('revenue') - price
+    if ReportCube.objects.filter(**key).update(**changes):
+        return
+
+    price = 0
+    if service_id is not None:
+        price = Service.objects.filter(id=service_id).values_list('price', flat=True).first() or 0
+    _increment(ReportCube, key, {'appointments': sign, 'revenue': sign * price})
+
+
+def reprice_service(service):
+    """
+    Recalcula los ingresos del servicio cuando cambia su precio, también los
+    de días pasados: la clínica no guarda lo cobrado en cada cita, así que los
+    ingresos del cubo son citas × precio de lista actual, lo mismo que da
+    rebuild_report_cube (y el cubo nunca difiere de una reconstrucción).
+    """
+    ReportCube.objects.filter(service=service).update(revenue=F('appointments') * service.price)
+
+
+def merge_service_cells(service):
+    """
+    Pasa las celdas de `service` a las celdas sin servicio antes de borrarlo.
+    Sus citas quedan con service=NULL por un UPDATE que no dispara señales;
+    sin esto desaparecerían de los reportes. Sin servicio no hay precio: los
+    ingresos quedan en 0, igual que al reconstruir el cubo.
+    """
+    cells = list(ReportCube.objects.filter(service=service).values('date', 'status', 'appointments'))
+    if not cells:
+        return
+    with transaction.atomic():
+        merged = {
+            (cell.date, cell.status): cell
+            for cell in ReportCube.objects.filter(
+                service__isnull=True, date__in={cell['date'] for cell in cells},
+            )
+        }
+        new_cells = []
+        for cell in cells:
+            key = (cell['date'], cell['status'])
+            if key in merged:
+                merged[key].appointments += cell['appointments']
+            else:
+                new_cells.append(ReportCube(date=key[0], status=key[1], appointments=cell['appointments']))
+        ReportCube.objects.filter(service=service).delete()
+        ReportCube.objects.bulk_update(merged.values(), ['appointments'], batch_size=1000)
+        ReportCube.objects.bulk_create(new_cells, batch_size=1000)
+
+
+def appointment_deltas(status, sign):
+    deltas = {'appointments': sign}
+    if status in STATUS_FIELDS:
+        deltas[status] = sign
+    return deltas
+
+
+@transaction.atomic
+def rebuild_daily_stats():
+    """
+    Recalcula todos los resúmenes desde cero con tres consultas agrupadas y
+    corrige así la deriva de las escrituras sin señales. Lectura y escritura
+    van en la misma transacción: un incremento concurrente espera y se
+    aplica sobre el resultado, en lugar de perderse.
+    """
+    rows = {}
+
+    def row(day):
+        return rows.setdefault(day, DailyStats(date=day))
+
+    status_counts = {status: Count('id', filter=Q(status=status)) for status in STATUS_FIELDS}
+    appointments = Appointment.objects.order_by()
+    for item in appointments.values('date').annotate(total=Count('id'), **status_counts):
+        stats = row(item['date'])
+        stats.appointments = item['total']
+        for status in STATUS_FIELDS:
+            setattr(stats, status, item[status])
+
+    users = (
+        User.objects.filter(is_superuser=False)
+        .annotate(day=TruncDate('date_joined'))
+        .order_by().values('day').annotate(total=Count('id'))
+    )
+    for item in users:
+        row(item['day']).new_users = item['total']
+
+    pets = (
+        Pet.objects.annotate(day=TruncDate('created_at'))
+        .order_by().values('day').annotate(total=Count('id'))
+    )
+    for item in pets:
+        row(item['day']).new_pets = item['total']
+
+    DailyStats.objects.all().delete()
+    DailyStats.objects.bulk_create(rows.values(), batch_size=1000)
+    return len(rows)
+
+
+@transaction.atomic
+def rebuild_report_cube():
+    """Recalcula el cubo completo con una consulta agrupada por fecha, servicio y estado (en una transacción)."""
+    appointments = Appointment.objects.order_by()
+    prices = dict(Service.objects.values_list('id', 'price'))
+    cells = [
+        ReportCube(
+            date=item['date'],
+            service_id=item['service'],
+            status=item['status'],
+            appointments=item['total'],
+            revenue=item['total'] * prices.get(item['service'], 0),
+        )
+        for item in appointments.values('date', 'service', 'status').annotate(total=Count('id'))
+    ]
+    ReportCube.objects.all().delete()
+    ReportCube.objects.bulk_create(cells, batch_size=1000)
+    return len(cells)
+
+
+def cube_summary(start_date, end_date):
+    """
+    Totales del período desde el cubo en una sola consulta: citas, ingresos
+    (sin canceladas) y uso por servicio.
+    """
+    rows = (
+        ReportCube.objects.filter(date__gte=start_date, date__lte=end_date)
+        .order_by().values('service', 'status')
+        .annotate(total=Sum('appointments'), income=Sum('revenue'))
+    )
+    summary = {'appointments': 0, 'revenue': 0, 'by_status': {}, 'by_service': {}}
+    for row in rows:
+        summary['appointments'] += row['total']
+        summary['by_status'][row['status']] = summary['by_status'].get(row['status'], 0) + row['total']
+        usage = summary['by_service'].setdefault(row['service'], {'appointments': 0, 'revenue': 0})
+        usage['appointments'] += row['total']
+        if row['status'] != 'cancelled':
+            summary['revenue'] += row['income']
+            usage['revenue'] += row['income']
+    return summary
@@ -0,0 +1,232 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+
+from booking.models import Appointment, Pet, Service, Veterinarian
+from .autocomplete import forget_pets, forget_users
+from .live import publish
+from .omnisearch import index_objects, remove_objects
+from .rollups import appointment_deltas, as_date, bump, bump_cube, merge_service_cells, reprice_service
+
+
+# =========================
+#   RESUMEN DIARIO (KPIs)
+# =========================
+# Campos de la cita que mueven los resúmenes y los cambios en vivo
+STATE_FIELDS = ('date', 'status', 'service_id')
+
+
+def _appointment_state(instance, stored=None):
+    # Se lee de __dict__ para no disparar consultas con campos diferidos; un
+    # campo que sigue diferido no cambió y se toma del estado guardado
+    day, status, service_id = (
+        instance.__dict__.get(field, stored[position] if stored else None)
+        for position, field in enumerate(STATE_FIELDS)
+    )
+    return (
+        as_date(day),
+        status,
+        int(service_id) if service_id not in (None, '') else None,
+    )
+
+
+def _rollup_appointment(state, sign):
+    day, status, service_id = state
+    bump(day, **appointment_deltas(status, sign))
+    bump_cube(day, service_id, status, sign)
+
+
+@receiver(post_init, sender=Appointment)
+def remember_appointment_state(sender, instance, **kwargs):
+    # Estado con el que se cargó la cita, para restarlo si cambia al guardar.
+    # Con campos diferidos (only/defer) no se conoce: se lee antes de escribir
+    if any(field not in instance.__dict__ for field in STATE_FIELDS):
+        instance._rollup_state = instance._live_status = None
+        instance._rollup_state_deferred = True
+        return
+    instance._rollup_state = _appointment_state(instance)
+    instance._live_status = instance.__dict__.get('status')
+    instance._rollup_state_deferred = False
+
+
+@receiver(pre_save, sender=Appointment)
+@receiver(pre_delete, sender=Appointment)
+def load_deferred_appointment_state(sender, instance, **kwargs):
+    if not instance._rollup_state_deferred or instance.pk is None:
+        return
+    stored = Appointment.objects.filter(pk=instance.pk).values_list(*STATE_FIELDS).first()
+    instance._rollup_state = stored
+    instance._live_status = stored[1] if stored else None
+    instance._rollup_state_deferred = False
+
+
+@receiver(post_save, sender=Appointment)
+def rollup_appointment_saved(sender, instance, created, **kwargs):
+    old_state = None if created else instance._rollup_state
+    new_state = _appointment_state(instance, old_state)
+
+    if new_state != old_state:
+        if old_state is not None:
+            _rollup_appointment(old_state, -1)
+        _rollup_appointment(new_state, 1)
+
+    instance._rollup_state = new_state
+
+
+@receiver(post_delete, sender=Appointment)
+def rollup_appointment_deleted(sender, instance, **kwargs):
+    if instance._rollup_state is not None:
+        _rollup_appointment(instance._rollup_state, -1)
+
+
+@receiver(post_init, sender=Service)
+def remember_service_price(sender, instance, **kwargs):
+    instance._rollup_price = instance.__dict__.get('price')
+
+
+@receiver(post_save, sender=Service)
+def rollup_service_repriced(sender, instance, created, **kwargs):
+    # Solo un cambio de precio mueve los ingresos (no el nombre, la duración...)
+    price = instance.__dict__.get('price')
+    if not created and price != instance._rollup_price:
+        reprice_service(instance)
+    instance._rollup_price = price
+
+
+@receiver(pre_delete, sender=Service)
+def rollup_service_deleted(sender, instance, **kwargs):
+    merge_service_cells(instance)
+
+
+@receiver(post_save, sender=Pet)
+def rollup_pet_created(sender, instance, created, **kwargs):
+    if created:
+        bump(as_date(instance.created_at), new_pets=1)
+
+
+@receiver(post_delete, sender=Pet)
+def rollup_pet_deleted(sender, instance, **kwargs):
+    bump(as_date(instance.created_at), new_pets=-1)
+
+
+@receiver(post_save, sender=User)
+def rollup_user_created(sender, instance, created, **kwargs):
+    if created and not instance.is_superuser:
+        bump(as_date(instance.date_joined), new_users=1)
+
+
+@receiver(post_delete, sender=User)
+def rollup_user_deleted(sender, instance, **kwargs):
+    if not instance.is_superuser:
+        bump(as_date(instance.date_joined), new_users=-1)
+
+
+# =========================
+#   BÚSQUEDA GLOBAL
+# =========================
+# tipo y campos que aparecen en su entrada de búsqueda (incluidos los
+# relacionados: cambiar el dueño de una mascota cambia su detalle)
+SEARCH_FIELDS = {
+    User: ('user', ('username', 'first_name', 'last_name', 'email', 'is_superuser')),
+    Pet: ('pet', ('name', 'pet_type', 'breed', 'owner_id')),
+    Veterinarian: ('vet', ('name', 'specialty', 'license_number', 'email')),
+    Appointment: ('appointment', ('pet_id', 'user_id', 'veterinarian_id', 'date', 'time', 'status')),
+}
+
+# Campo cuyo cambio se ve en las entradas de otros registros
+SHOWN_ELSEWHERE = {User: 'username', Pet: 'name', Veterinarian: 'name'}
+
+
+def _search_signature(instance):
+    # Igual que en los KPIs: __dict__ para no cargar campos diferidos. str()
+    # porque las vistas del panel asignan fecha y hora como texto del formulario
+    _, fields = SEARCH_FIELDS[type(instance)]
+    return tuple(str(instance.__dict__.get(field)) for field in fields)
+
+
+def _reindex_dependents(instance):
+    if isinstance(instance, User):
+        index_objects('pet', instance.pets.values_list('id', flat=True))
+        index_objects('appointment', instance.appointments.values_list('id', flat=True))
+    else:
+        index_objects('appointment', instance.appointments.values_list('id', flat=True))
+
+
+@receiver(post_init, sender=User)
+@receiver(post_init, sender=Pet)
+@receiver(post_init, sender=Veterinarian)
+@receiver(post_init, sender=Appointment)
+def remember_search_signature(sender, instance, **kwargs):
+    instance._omnisearch_signature = _search_signature(instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Pet)
+@receiver(post_save, sender=Veterinarian)
+@receiver(post_save, sender=Appointment)
+def index_search_entry(sender, instance, created, **kwargs):
+    old_signature = None if created else instance._omnisearch_signature
+    new_signature = _search_signature(instance)
+    # Un login solo guarda last_login: no hay nada que reindexar
+    if new_signature == old_signature:
+        return
+
+    kind, fields = SEARCH_FIELDS[sender]
+    index_objects(kind, [instance.id])
+
+    shown = SHOWN_ELSEWHERE.get(sender)
+    if old_signature is not None and shown:
+        position = fields.index(shown)
+        if old_signature[position] != new_signature[position]:
+            _reindex_dependents(instance)
+
+    instance._omnisearch_signature = new_signature
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Pet)
+@receiver(post_delete, sender=Veterinarian)
+@receiver(post_delete, sender=Appointment)
+def remove_search_entry(sender, instance, **kwargs):
+    kind, _ = SEARCH_FIELDS[sender]
+    remove_objects(kind, [instance.id])
+
+
+# =========================
+#   AUTOCOMPLETADO
+# =========================
+@receiver(post_save, sender=Pet)
+@receiver(post_delete, sender=Pet)
+def forget_owner_pets(sender, instance, **kwargs):
+    # La mascota nueva tiene que aparecer ya en el modal de nueva cita
+    forget_pets(instance.owner_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user_options(sender, instance, **kwargs):
+    # Un login solo cambia last_login: las listas de usuarios siguen valiendo
+    if kwargs.get('update_fields') != frozenset({'last_login'}):
+        forget_users()
+
+
+# =========================
+#   CAMBIOS EN VIVO
+# =========================
+# El estado anterior (_live_status) lo guardan remember_appointment_state y,
+# si la cita se cargó con campos diferidos, load_deferred_appointment_state
+@receiver(post_save, sender=Appointment)
+def publish_appointment_saved(sender, instance, created, **kwargs):
+    # rollup_appointment_saved ya dejó en _rollup_state el estado nuevo
+    day, status, _ = instance._rollup_state
+    if created:
+        publish('created', instance.id, day, status)
+    elif status != instance._live_status:
+        publish('status', instance.id, day, status)
+    instance._live_status = status
+
+
+@receiver(post_delete, sender=Appointment)
+def publish_appointment_deleted(sender, instance, **kwargs):
+    day, status, _ = _appointment_state(instance, instance._rollup_state)
+    publish('deleted', instance.id, day, status)
@@ -0,0 +1,51 @@
+// Opciones de los modales bajo demanda (ver admin_dashboard/autocomplete.py)
+
+function fillOptions(select, results, emptyLabel) {
+    select.replaceChildren();
+
+    const placeholder = document.createElement('option');
+    placeholder.value = '';
+    placeholder.textContent = results.length ? 'Seleccionar...' : emptyLabel;
+    select.appendChild(placeholder);
+
+    results.forEach(function(result) {
+        const option = document.createElement('option');
+        option.value = result.id;
+        option.textContent = result.detail ? result.label + ' — ' + result.detail : result.label;
+        select.appendChild(option);
+    });
+
+    // Con un único resultado se elige directamente
+    if (results.length === 1) {
+        select.value = results[0].id;
+        select.dispatchEvent(new Event('change'));
+    }
+}
+
+function loadOptions(select, url, emptyLabel) {
+    // Solo cuenta la última petición: las respuestas pueden llegar desordenadas
+    const request = select.dataset.request = String(Number(select.dataset.request || 0) + 1);
+    return fetch(url)
+        .then(function(response) { return response.json(); })
+        .then(function(data) {
+            if (select.dataset.request === request) {
+                fillOptions(select, data.results, emptyLabel);
+            }
+        });
+}
+
+// Busca al escribir en `input` (con pausa) y llena `select` con los resultados
+function bindSearchSelect(input, select, url, emptyLabel) {
+    let timer = null;
+    input.addEventListener('input', function() {
+        clearTimeout(timer);
+        const query = input.value.trim();
+        if (query.length < 2) {
+            fillOptions(select, [], 'Escribe al menos 2 letras...');
+            return;
+        }
+        timer = setTimeout(function() {
+            loadOptions(select, url + '?q=' + encodeURIComponent(query), emptyLabel);
+        }, 200);
+    });
+}
@@ -0,0 +1,42 @@
+// Cambios de citas en vivo por server-sent events (ver admin_dashboard/live.py)
+
+// Llama a handlers[cambio.kind](cambio) por cada cambio de cita posterior a `cursor`
+function listenAppointments(url, cursor, handlers) {
+    if (!window.EventSource) {
+        return null;
+    }
+    // Al reconectar el navegador manda Last-Event-ID, que manda sobre `since`
+    const source = new EventSource(url + '?since=' + encodeURIComponent(cursor));
+    source.addEventListener('appointment', function(event) {
+        const delta = JSON.parse(event.data);
+        const handler = handlers[delta.kind];
+        if (handler) {
+            handler(delta);
+        }
+    });
+    return source;
+}
+
+function findAppointmentRow(container, appointmentId) {
+    return container.querySelector('[data-appointment="' + appointmentId + '"]');
+}
+
+// Suma `amount` al número que muestra `element`
+function bumpCounter(element, amount) {
+    if (element) {
+        element.textContent = Number(element.textContent) + amount;
+    }
+}
+
+// Quita la fila un momento después de marcarla, para que se note el cambio
+function fadeOutRow(row) {
+    row.style.transition = 'opacity 0.4s';
+    row.style.opacity = '0';
+    setTimeout(function() { row.remove(); }, 400);
+}
+
+function flashRow(row) {
+    row.style.transition = 'background-color 1.5s';
+    row.style.backgroundColor = '#fef9c3';
+    setTimeout(function() { row.style.backgroundColor = ''; }, 1500);
+}
@@ -0,0 +1,27 @@
+"""
+Tareas de mantenimiento del panel para la cola (ver taskqueue). Son las
+mismas reconstrucciones que los comandos rebuild_*, encolables desde código.
+"""
+from taskqueue.queue import task
+
+from . import live, omnisearch, rollups
+
+
+@task(queue='maintenance')
+def rebuild_daily_stats():
+    return rollups.rebuild_daily_stats()
+
+
+@task(queue='maintenance')
+def rebuild_report_cube():
+    return rollups.rebuild_report_cube()
+
+
+@task(queue='maintenance')
+def rebuild_omnisearch():
+    return omnisearch.rebuild()
+
+
+@task(queue='maintenance', priority=-1)
+def prune_live_events():
+    live.prune()
@@ -1,3 +1,676 @@
-from django.test import TestCase
+import json
+import os
+import re
+import tempfile
+import zipfile
+from datetime import date, timedelta
+from importlib import import_module
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import Sum
+from django.core.management import call_command
+from django.test import AsyncClient, Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from booking.models import (
+    Appointment, ClinicSchedule, Document, MedicalConsultation, MedicalPrescription, Pet, Service, Vaccine, Veterinarian,
+)
+from VetifyBooking.testing import ClinicData
+
+from . import autocomplete, omnisearch, urls
+from .models import AppointmentEvent, DailyStats, ReportCube, SearchEntry, SearchToken
+from .omnisearch import _prefix_range, normalize
+from .pagination import encode_cursor
+from .rollups import rebuild_report_cube
+from .management.commands.bench_views import url_names
+
+
+class KeysetPaginationTests(TestCase):
+    """Un cursor manipulado vuelve a la primera página en lugar de dar un error."""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'secreto123')
+        self.owner = User.objects.create_user('cliente', 'cliente@example.com', 'secreto123')
+        for number in range(3):
+            Pet.objects.create(owner=self.owner, name=f'Mascota {number}', pet_type='dog', weight=10)
+        self.client.force_login(self.admin)
+
+    def test_malformed_cursors_fall_back_to_first_page(self):
+        cursors = [
+            encode_cursor(['2024-01-01T00:00:00+00:00', 'abc']),
+            encode_cursor(['2024-01-01T00:00:00+00:00', {'x': 1}]),
+            encode_cursor(['ayer', 1]),
+            encode_cursor([1]),
+            'no-es-base64!',
+        ]
+        for name in ('users', 'pets', 'appointments', 'veterinarians', 'services', 'consultations'):
+            first = self.client.get(reverse(f'admin_dashboard:{name}'))
+            for cursor in cursors:
+                for key in ('after', 'before'):
+                    with self.subTest(url=name, cursor=cursor, key=key):
+                        response = self.client.get(reverse(f'admin_dashboard:{name}'), {key: cursor})
+                        self.assertEqual(response.status_code, 200)
+                        self.assertEqual(list(response.context['page']), list(first.context['page']))
+
+
+class ReportCubeTests(TestCase):
+    """El cubo sigue a citas y servicios (borrados o con otro precio) igual que una reconstrucción."""
+
+    def cube(self):
+        # Las celdas que quedan en cero equivalen a no tenerlas
+        cells = ReportCube.objects.exclude(appointments=0)
+        return set(cells.values_list('date', 'service', 'status', 'appointments', 'revenue'))
+
+    def test_deleted_service_cells_merge_into_cells_without_service(self):
+        user = User.objects.create_user('cliente', 'cliente@example.com', 'secreto123')
+        pet = Pet.objects.create(owner=user, name='Firulais', pet_type='dog', weight=10)
+        doomed = Service.objects.create(name='Baño', description='-', duration=30, price=250)
+        kept = Service.objects.create(name='Consulta', description='-', duration=30, price=300)
+        day = date(2024, 5, 6)
+        for service, status, hour in ((doomed, 'pending', 9), (None, 'pending', 10), (doomed, 'completed', 11),
+                                      (kept, 'completed', 12)):
+            Appointment.objects.create(user=user, pet=pet, service=service, date=day, time=f'{hour}:00', status=status)
+
+        doomed.delete()
+
+        self.assertEqual(Appointment.objects.filter(service__isnull=True).count(), 3)
+        cube = self.cube()
+        self.assertIn((day, None, 'pending', 2, 0), cube)
+        self.assertIn((day, None, 'completed', 1, 0), cube)
+        self.assertIn((day, kept.id, 'completed', 1, 300), cube)
+        rebuild_report_cube()
+        self.assertEqual(self.cube(), cube)
+
+
+    def test_only_price_changes_reprice_cells(self):
+        user = User.objects.create_user('cliente', 'cliente@example.com', 'secreto123')
+        pet = Pet.objects.create(owner=user, name='Firulais', pet_type='dog', weight=10)
+        service = Service.objects.create(name='Consulta', description='-', duration=30, price=300)
+        past, future = date(2024, 5, 6), date.today() + timedelta(days=3)
+        for day in (past, future):
+            Appointment.objects.create(user=user, pet=pet, service=service, date=day, time='09:00', status='pending')
+
+        with CaptureQueriesContext(connection) as queries:
+            service.description = 'Revisión general'
+            service.save()
+        self.assertFalse([q for q in queries if 'admin_dashboard_reportcube' in q['sql']])
+
+        # Los ingresos son citas × precio de lista: también se mueven los pasados
+        service.price = 350
+        service.save()
+        self.assertEqual(
+            set(ReportCube.objects.values_list('date', 'revenue')), {(past, 350), (future, 350)},
+        )
+        cube = self.cube()
+        rebuild_report_cube()
+        self.assertEqual(self.cube(), cube)
+
+    def test_existing_cell_reads_price_inside_update(self):
+        user = User.objects.create_user('cliente', 'cliente@example.com', 'secreto123')
+        pet = Pet.objects.create(owner=user, name='Firulais', pet_type='dog', weight=10)
+        service = Service.objects.create(name='Consulta', description='-', duration=30, price=300)
+        day = date(2024, 5, 6)
+        Appointment.objects.create(user=user, pet=pet, service=service, date=day, time='09:00', status='pending')
+
+        with CaptureQueriesContext(connection) as queries:
+            second = Appointment.objects.create(
+                user=user, pet=pet, service=service, date=day, time='10:00', status='pending',
+            )
+        self.assertFalse([q for q in queries if q['sql'].startswith('SELECT') and 'booking_service' in q['sql']])
+        self.assertIn((day, service.id, 'pending', 2, 600), self.cube())
+
+        second.status = 'cancelled'
+        second.save()
+        self.assertIn((day, service.id, 'pending', 1, 300), self.cube())
+        self.assertIn((day, service.id, 'cancelled', 1, 300), self.cube())
+
+    def test_deferred_instances_move_counts_once(self):
+        user = User.objects.create_user('cliente', 'cliente@example.com', 'secreto123')
+        pet = Pet.objects.create(owner=user, name='Firulais', pet_type='dog', weight=10)
+        service = Service.objects.create(name='Consulta', description='-', duration=30, price=300)
+        day = date(2024, 5, 6)
+        for hour in (9, 10):
+            Appointment.objects.create(user=user, pet=pet, service=service, date=day, time=f'{hour}:00', status='pending')
+
+        # Sin fecha ni estado cargados, el estado anterior se lee antes de guardar
+        appointment = Appointment.objects.only('id').order_by('id').first()
+        appointment.status = 'completed'
+        appointment.save()
+        stats = DailyStats.objects.get(date=day)
+        self.assertEqual((stats.appointments, stats.pending, stats.completed), (2, 1, 1))
+        self.assertIn((day, service.id, 'completed', 1, 300), self.cube())
+
+        Appointment.objects.only('id').order_by('id').last().delete()
+        stats.refresh_from_db()
+        self.assertEqual((stats.appointments, stats.pending, stats.completed), (1, 0, 1))
+
+        cube = self.cube()
+        rebuild_report_cube()
+        self.assertEqual(self.cube(), cube)
+
+
+class RollupBackfillTests(TestCase):
+    """Las migraciones de los resúmenes los llenan con los datos que ya existían."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('cliente', 'cliente@example.com', 'secreto123')
+        self.pet = Pet.objects.create(owner=self.user, name='Firulais', pet_type='dog', weight=10)
+        self.service = Service.objects.create(name='Consulta', description='-', duration=30, price=300)
+        self.day = date(2024, 5, 6)
+        for hour, status in ((9, 'completed'), (10, 'cancelled')):
+            Appointment.objects.create(
+                user=self.user, pet=self.pet, service=self.service, date=self.day, time=f'{hour}:00', status=status,
+            )
+
+    def test_daily_stats_backfill(self):
+        backfill = import_module('admin_dashboard.migrations.0007_backfill_daily_stats').backfill_daily_stats
+        DailyStats.objects.all().delete()
+
+        backfill(django_apps, None)
+
+        stats = DailyStats.objects.get(date=self.day)
+        self.assertEqual((stats.appointments, stats.completed, stats.cancelled), (2, 1, 1))
+        self.assertEqual(DailyStats.objects.aggregate(total=Sum('new_pets'))['total'], 1)
+
+    def test_report_cube_backfill(self):
+        backfill = import_module('admin_dashboard.migrations.0008_backfill_report_cube').backfill_report_cube
+        ReportCube.objects.all().delete()
+
+        backfill(django_apps, None)
+
+        self.assertEqual(
+            set(ReportCube.objects.values_list('date', 'service', 'status', 'appointments', 'revenue')),
+            {(self.day, self.service.id, 'completed', 1, 300), (self.day, self.service.id, 'cancelled', 1, 300)},
+        )
+
+
+class OmnisearchTests(TestCase):
+    """Palabras normalizadas, prefijos como rangos del índice y la migración que llena la búsqueda."""
+
+    def test_normalize(self):
+        self.assertEqual(normalize('García-LÓPEZ, Ñandú #42'), ['garcia', 'lopez', 'nandu', '42'])
+        self.assertEqual(normalize(None), [])
+        self.assertEqual(normalize('a' * 100), ['a' * 64])
+
+    def test_prefix_range(self):
+        self.assertEqual(_prefix_range('garcia'), {'token__gte': 'garcia', 'token__lt': 'garcib'})
+        # Después de la z no queda ninguna letra ni número
+        bounds = _prefix_range('ez')
+        self.assertTrue(all(bounds['token__gte'] <= word < bounds['token__lt'] for word in ('ez', 'ezequiel', 'ez9')))
+        self.assertFalse(bounds['token__gte'] <= 'f' < bounds['token__lt'])
+
+    def test_multi_word_search_looks_past_first_candidates(self):
+        many = omnisearch.CANDIDATES + 50
+        User.objects.bulk_create(
+            [User(username=f'cr{number}', first_name='Carlos', last_name=f'Ruiz{number}') for number in range(many)]
+            + [User(username=f'az{number}', first_name=f'Ana{number}', last_name='Zapata') for number in range(many)]
+        )
+        target = User.objects.create_user('objetivo', first_name='Carlos', last_name='Zapata')
+        omnisearch.rebuild()
+
+        # Cada palabra por separado tiene más candidatos que el tope, y el usuario buscado es el último
+        self.assertGreater(SearchToken.objects.filter(**_prefix_range('carl')).count(), omnisearch.CANDIDATES)
+        for text in ('carl zapa', 'carlos zapata', 'zapata carl'):
+            results = omnisearch.search(text, kind='user')
+            self.assertEqual([entry.object_id for entry in results], [target.id], text)
+
+    def test_exact_words_rank_first(self):
+        prefix = User.objects.create_user('marian', first_name='Mariano')
+        exact = User.objects.create_user('maria', first_name='Maria')
+        self.assertEqual([entry.object_id for entry in omnisearch.search('maria')], [exact.id, prefix.id])
+
+    def test_backfill_indexes_existing_records(self):
+        user = User.objects.create_user('cliente', 'cliente@example.com', 'secreto123', first_name='Lucía')
+        pet = Pet.objects.create(owner=user, name='Firulais', pet_type='dog', breed='Mestizo', weight=10)
+        service = Service.objects.create(name='Consulta', description='-', duration=30, price=300)
+        Appointment.objects.create(user=user, pet=pet, service=service, date=date(2030, 3, 4), time='09:00')
+        omnisearch.rebuild()
+        rebuilt = set(SearchEntry.objects.values_list('kind', 'object_id', 'title', 'subtitle', 'url'))
+        tokens = set(SearchToken.objects.values_list('entry__kind', 'entry__object_id', 'token'))
+
+        # Como una base anterior a la búsqueda global
+        SearchEntry.objects.all().delete()
+        backfill = import_module('admin_dashboard.migrations.0009_backfill_omnisearch').backfill_omnisearch
+        backfill(django_apps, None)
+
+        self.assertEqual(set(SearchEntry.objects.values_list('kind', 'object_id', 'title', 'subtitle', 'url')), rebuilt)
+        self.assertEqual(set(SearchToken.objects.values_list('entry__kind', 'entry__object_id', 'token')), tokens)
+        self.assertEqual([entry.object_id for entry in omnisearch.search('luci', kind='user')], [user.id])
+        self.assertEqual([entry.object_id for entry in omnisearch.search('mesti firu')], [pet.id])
+
+
+class AutocompleteTests(TestCase):
+    """Las opciones de los modales viven en su propia caché y caducan al cambiar usuarios o mascotas."""
+
+    def setUp(self):
+        for alias in caches:
+            caches[alias].clear()
+        self.owner = User.objects.create_user('cliente', 'cliente@example.com', 'secreto123', first_name='Lucía')
+
+    def test_options_use_their_own_cache(self):
+        autocomplete.pet_options(self.owner.id)
+        key = f'autocomplete:pets:{self.owner.id}'
+        self.assertIsNotNone(caches['autocomplete'].get(key))
+        self.assertIsNone(caches['default'].get(key))
+
+    def test_new_user_drops_cached_user_lists(self):
+        self.assertEqual([option['id'] for option in autocomplete.user_options('luc')], [self.owner.id])
+        with self.assertNumQueries(0):
+            autocomplete.user_options('luc')
+
+        other = User.objects.create_user('lucas', 'lucas@example.com', 'secreto123')
+        self.assertCountEqual([option['id'] for option in autocomplete.user_options('luc')], [self.owner.id, other.id])
+
+        # Iniciar sesión no invalida las listas
+        self.client.login(username='lucas', password='secreto123')
+        with self.assertNumQueries(0):
+            autocomplete.user_options('luc')
+
+    def test_new_pet_drops_owner_pet_list(self):
+        self.assertEqual(autocomplete.pet_options(self.owner.id), [])
+        pet = Pet.objects.create(owner=self.owner, name='Firulais', pet_type='dog', weight=10)
+        self.assertEqual([option['id'] for option in autocomplete.pet_options(self.owner.id)], [pet.id])
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    QUERY_BUDGET_SAMPLE_RATE=0,
+)
+class QueryCountTests(ClinicData, TestCase):
+    """Cada URL del panel hace un número fijo de consultas."""
+
+    GROWTH = 20
+
+    # Máximo de consultas por URL, con sesión, usuario y mensajes incluidos
+    BUDGETS = {
+        'admin_login': 2,
+        'dashboard': 10,
+        'omnisearch': 7,
+        'appointments': 8,
+        'delete_appointment': 22,
+        'change_appointment_status': 32,
+        'create_appointment_admin': 23,
+        'appointment_events': 4,
+        'users': 5,
+        'toggle_user_status': 6,
+        'create_user': 16,
+        # create_user acaba de invalidar las listas: se mide sin caché
+        'users_autocomplete': 7,
+        'admin_register': 2,
+        'admin_profile': 3,
+        'pets': 8,
+        'delete_pet': 30,
+        'create_pet': 11,
+        'pets_autocomplete': 3,
+        'pet_vaccines': 8,
+        'export_pet_record': 7,
+        'delete_vaccine': 5,
+        'veterinarians': 6,
+        'toggle_vet_status': 4,
+        'add_veterinarian': 12,
+        'edit_veterinarian': 6,
+        'services': 6,
+        'toggle_service_status': 5,
+        'create_service': 3,
+        'edit_service': 5,
+        'create_schedule': 3,
+        'edit_schedule': 4,
+        'schedules': 5,
+        'reports': 8,
+        'upload_document': 5,
+        'delete_document': 4,
+        'toggle_document': 4,
+        'consultations': 5,
+        'add_consultation': 5,
+        'edit_consultation': 9,
+        'delete_consultation': 10,
+        'add_prescription': 8,
+        'edit_prescription': 9,
+        'delete_prescription': 8,
+        'export_day_prescriptions': 4,
+    }
+
+    def setUp(self):
+        pdf_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(self.settings(PDF_CACHE_DIR=pdf_dir))
+        self.create_clinic()
+
+    def test_every_url_has_a_budget(self):
+        self.assertEqual({pattern.name for pattern in urls.urlpatterns}, set(self.BUDGETS))
+
+    def _doomed_history(self, hour):
+        """Mascota con cita, consulta, receta y vacuna propias, para las URLs que las borran."""
+        pet = Pet.objects.create(owner=self.customer, name='Temporal', pet_type='cat', weight=3)
+        appointment = Appointment.objects.create(
+            user=self.customer, pet=pet, service=self.services[1], veterinarian=self.vets[1],
+            date=date(2024, 1, 2), time=f'{hour}:00', status='completed',
+        )
+        consultation = MedicalConsultation.objects.create(
+            appointment=appointment, veterinarian=self.vets[1], reason='Control', symptoms='-',
+            diagnosis='Sano', treatment='-',
+        )
+        prescription = MedicalPrescription.objects.create(consultation=consultation, general_instructions='-')
+        vaccine = Vaccine.objects.create(pet=pet, name='Parvovirus', date=date(2024, 1, 2))
+        return pet, appointment, consultation, prescription, vaccine
+
+    def _requests(self):
+        """(nombre, método, args, datos) de una petición típica a cada URL."""
+        count = Pet.objects.count()
+        pet = Pet.objects.filter(owner=self.customer, name__startswith='Mascota').latest('id')
+        consultation = MedicalConsultation.objects.filter(appointment__pet=pet).get()
+        service = self.services[0]
+        vet = self.vets[0]
+        schedule = ClinicSchedule.objects.get(day_of_week='monday')
+
+        # Lo que la petición borra o cambia de estado se crea antes de medir
+        doomed_pet = self._doomed_history(9)[0]
+        doomed_appointment = self._doomed_history(10)[1]
+        doomed_consultation = self._doomed_history(11)[2]
+        _, _, _, doomed_prescription, doomed_vaccine = self._doomed_history(12)
+        bare_consultation = self._doomed_history(13)[2]
+        bare_consultation.prescription.delete()
+        toggled_user = User.objects.create_user(f'temporal{count}', password='secreto123')
+        toggled_vet = Veterinarian.objects.create(
+            name=f'Temporal {count}', specialty='general', license_number='9',
+            email='temporal@example.com', phone='555', years_experience=1,
+        )
+        toggled_service = Service.objects.create(name=f'Temporal {count}', description='-', duration=15, price=100)
+        document = Document.objects.create(title='Temporal', file='documents/temporal.pdf', uploaded_by=self.admin)
+        doomed_document = Document.objects.create(title='Temporal', file='documents/borrar.pdf', uploaded_by=self.admin)
+        free_day = date(2030, 3, 4) + timedelta(weeks=count)
+        pending = Appointment.objects.create(
+            user=self.customer, pet=pet, service=service, veterinarian=self.vets[1], date=free_day, time='15:00',
+        )
+
+        return [
+            ('admin_login', 'get', [], None),
+            ('dashboard', 'get', [], None),
+            ('omnisearch', 'get', [], {'q': 'mascota'}),
+            ('appointments', 'get', [], None),
+            ('delete_appointment', 'get', [doomed_appointment.id], None),
+            ('change_appointment_status', 'post', [pending.id], {'status': 'confirmed'}),
+            ('create_appointment_admin', 'post', [], {
+                'user': self.customer.id, 'pet': pet.id, 'service': service.id,
+                'veterinarian': vet.id, 'date': free_day.isoformat(), 'time': '10:00',
+            }),
+            ('appointment_events', 'get', [], {'since': 0}),
+            ('users', 'get', [], None),
+            ('toggle_user_status', 'get', [toggled_user.id], None),
+            ('create_user', 'post', [], {
+                'username': f'nuevo{count}', 'email': f'nuevo{count}@example.com', 'password': 'secreto123',
+            }),
+            ('users_autocomplete', 'get', [], {'q': 'usuario'}),
+            ('admin_register', 'get', [], None),
+            ('admin_profile', 'get', [], None),
+            ('pets', 'get', [], None),
+            ('delete_pet', 'get', [doomed_pet.id], None),
+            ('create_pet', 'post', [], {'owner': self.customer.id, 'name': 'Nueva', 'pet_type': 'dog', 'weight': 4}),
+            ('pets_autocomplete', 'get', [], {'owner': self.customer.id}),
+            ('pet_vaccines', 'get', [pet.id], None),
+            ('export_pet_record', 'get', [pet.id], None),
+            ('delete_vaccine', 'get', [doomed_vaccine.id], None),
+            ('veterinarians', 'get', [], None),
+            ('toggle_vet_status', 'get', [toggled_vet.id], None),
+            ('add_veterinarian', 'post', [], {
+                'name': 'Nuevo', 'email': 'nuevo@example.com', 'license_number': '10',
+                'specialty': 'general', 'years_experience': 2, 'services': [service.id],
+            }),
+            ('edit_veterinarian', 'get', [vet.id], None),
+            ('services', 'get', [], None),
+            ('toggle_service_status', 'get', [toggled_service.id], None),
+            ('create_service', 'post', [], {'name': 'Nuevo', 'description': '-', 'duration': 20, 'price': 150}),
+            ('edit_service', 'post', [service.id], {
+                'name': service.name, 'description': service.description, 'duration': 30, 'price': 300,
+            }),
+            ('create_schedule', 'post', [], {'day_of_week': 'monday', 'opening_time': '09:00', 'closing_time': '17:00'}),
+            ('edit_schedule', 'post', [schedule.id], {'is_open': 'on', 'opening_time': '09:00', 'closing_time': '17:00'}),
+            ('schedules', 'get', [], None),
+            ('reports', 'get', [], None),
+            ('upload_document', 'get', [], None),
+            ('delete_document', 'get', [doomed_document.id], None),
+            ('toggle_document', 'get', [document.id], None),
+            ('consultations', 'get', [], None),
+            ('add_consultation', 'get', [], None),
+            ('edit_consultation', 'get', [consultation.id], None),
+            ('delete_consultation', 'get', [doomed_consultation.id], None),
+            ('add_prescription', 'get', [bare_consultation.id], None),
+            ('edit_prescription', 'get', [consultation.prescription.id], None),
+            ('delete_prescription', 'get', [doomed_prescription.id], None),
+            ('export_day_prescriptions', 'get', [], {'date': '2024-01-01'}),
+        ]
+
+    def _measure(self):
+        client = Client()
+        counts = {}
+        for name, method, args, data in self._requests():
+            client.force_login(self.admin)
+            url = reverse(f'admin_dashboard:{name}', args=args)
+            counts[name] = self.count_queries(client, method, url, data)
+        return counts
+
+    def test_query_counts_do_not_grow_with_data(self):
+        self.assert_query_counts(self.BUDGETS, self._measure)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    QUERY_BUDGET_SAMPLE_RATE=0,
+)
+class BenchViewsTests(ClinicData, TestCase):
+    """bench_views mide todas las URLs y no deja rastro de lo que escriben."""
+
+    def setUp(self):
+        self.tmp = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(self.settings(PDF_CACHE_DIR=self.tmp))
+        self.create_clinic()
+        self.add_rows(1)
+        # Una consulta sin receta para la URL que la añade
+        MedicalPrescription.objects.exclude(consultation__appointment__user=self.customer).delete()
+
+    def test_every_url_is_measured_and_rolled_back(self):
+        output = os.path.join(self.tmp, 'bench.json')
+        before = (Pet.objects.count(), Appointment.objects.count(), User.objects.count())
+
+        call_command('bench_views', iterations=2, warmup=0, output=output, stdout=StringIO())
+
+        with open(output, encoding='utf-8') as results_file:
+            results = json.load(results_file)
+        self.assertEqual(set(results['views']), set(url_names()))
+        for name, result in results['views'].items():
+            with self.subTest(url=name):
+                self.assertLess(result['status'], 400)
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        self.assertEqual((Pet.objects.count(), Appointment.objects.count(), User.objects.count()), before)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    QUERY_BUDGET_SAMPLE_RATE=0,
+)
+class CheckQueryPlansTests(ClinicData, TestCase):
+    """check_query_plans explica lo que consultan de verdad las vistas, búsquedas incluidas."""
+
+    def setUp(self):
+        self.enterContext(self.settings(PDF_CACHE_DIR=self.enterContext(tempfile.TemporaryDirectory())))
+        self.create_clinic()
+        self.add_rows(1)
+
+    def test_every_view_query_uses_an_index(self):
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        output = out.getvalue()
+        self.assertIn('Todas las consultas usan índices', output)
+        for label in ('admin_dashboard:users: ok', 'admin_dashboard:appointments ?search: ok', 'profile: ok'):
+            self.assertIn(label, output)
+
+
+def sse_events(body):
+    """(id, cambio) de cada evento `appointment` de un cuerpo SSE."""
+    events = []
+    for block in body.split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line)
+        if fields.get('event') == 'appointment':
+            events.append((int(fields['id']), json.loads(fields['data'])))
+    return events
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    QUERY_BUDGET_SAMPLE_RATE=0,
+)
+class LiveEventsTests(TestCase):
+    """Altas, cambios de estado y bajas de citas llegan al stream del panel."""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'secreto123')
+        self.customer = User.objects.create_user('cliente', 'cliente@example.com', 'secreto123')
+        self.pet = Pet.objects.create(owner=self.customer, name='Firulais', pet_type='dog', weight=10)
+        self.service = Service.objects.create(name='Consulta', description='-', duration=30, price=300)
+        self.vet = Veterinarian.objects.create(
+            name='Ana', specialty='general', license_number='123',
+            email='ana@example.com', phone='555', years_experience=5,
+        )
+        # Una cita previa: el stream ya tiene un evento antes de cada test
+        Appointment.objects.create(
+            user=self.customer, pet=self.pet, service=self.service, veterinarian=self.vet,
+            date=date(2030, 3, 1), time='10:00',
+        )
+        self.client.force_login(self.admin)
+        self.url = reverse('admin_dashboard:appointment_events')
+
+    def test_stream_delivers_changes_after_cursor(self):
+        cursor = AppointmentEvent.objects.latest('id').id
+        appointment = Appointment.objects.create(
+            user=self.customer, pet=self.pet, service=self.service, veterinarian=self.vet,
+            date=date(2030, 3, 4), time='09:00',
+        )
+        appointment.status = 'confirmed'
+        appointment.save()
+        # Guardar sin cambiar el estado no es un evento
+        appointment.save()
+
+        # Bajo WSGI el stream entrega lo pendiente y se cierra
+        response = self.client.get(self.url, {'since': cursor})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = sse_events(b''.join(response.streaming_content).decode())
+        self.assertEqual([delta['kind'] for _, delta in events], ['created', 'status'])
+        created, changed = events[0][1], events[1][1]
+        self.assertEqual(created['appointment'], appointment.id)
+        self.assertEqual((created['user'], created['pet'], created['time']), ('cliente', 'Firulais', '09:00'))
+        self.assertEqual((changed['status'], changed['status_label']), ('confirmed', 'Confirmada'))
+
+        appointment_id = appointment.id
+        appointment.delete()
+
+        # Al reconectar el navegador manda Last-Event-ID, que manda sobre `since`
+        response = self.client.get(self.url, {'since': cursor}, headers={'Last-Event-ID': str(events[-1][0])})
+        events = sse_events(b''.join(response.streaming_content).decode())
+        self.assertEqual([delta for _, delta in events], [{
+            'kind': 'deleted', 'appointment': appointment_id, 'date': '2030-03-04',
+            'status': 'confirmed', 'status_label': 'Confirmada',
+        }])
+
+    def test_without_cursor_starts_at_latest_event(self):
+        response = self.client.get(self.url)
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(sse_events(body), [])
+        self.assertIn(f'id: {AppointmentEvent.objects.latest("id").id}\n', body)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    QUERY_BUDGET_SAMPLE_RATE=0,
+)
+class AsyncViewsTests(TransactionTestCase):
+    """Dashboard y reportes por la pila ASGI, con sus consultas en paralelo (fuera de una transacción)."""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'secreto123')
+        self.customer = User.objects.create_user('cliente', 'cliente@example.com', 'secreto123')
+        pet = Pet.objects.create(owner=self.customer, name='Firulais', pet_type='dog', weight=10)
+        self.service = Service.objects.create(name='Consulta', description='-', duration=30, price=300)
+        vet = Veterinarian.objects.create(
+            name='Ana', specialty='general', license_number='123',
+            email='ana@example.com', phone='555', years_experience=5,
+        )
+        vet.services.set([self.service])
+        for day, status in ((date(2024, 1, 1), 'completed'), (date(2030, 3, 1), 'pending')):
+            Appointment.objects.create(
+                user=self.customer, pet=pet, service=self.service, veterinarian=vet,
+                date=day, time='10:00', status=status,
+            )
+        self.active_vets = Veterinarian.objects.filter(is_active=True).count()
+        # Desde la cita pasada (2024-01-01) hasta hoy
+        self.period = (date.today() - date(2024, 1, 1)).days
+        self.reported = ReportCube.objects.filter(date__lte=date.today()).aggregate(total=Sum('appointments'))['total']
+        self.appointments = DailyStats.objects.aggregate(total=Sum('appointments'))['total']
+
+    def _queries(self, response):
+        return int(re.search(r'"(\d+) consultas"', response['Server-Timing']).group(1))
+
+    async def test_dashboard_and_reports(self):
+        client = AsyncClient()
+        await client.aforce_login(self.admin)
+
+        response = await client.get(reverse('admin_dashboard:dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_vets'], self.active_vets)
+        self.assertEqual(response.context['total_appointments'], self.appointments)
+        # Las consultas de los hilos también cuentan para el presupuesto
+        self.assertGreaterEqual(self._queries(response), 6)
+
+        response = await client.get(reverse('admin_dashboard:reports'), {'period': self.period})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_appointments'], self.reported)
+        self.assertGreaterEqual(self._queries(response), 5)
+
+    async def test_vets_api(self):
+        client = AsyncClient()
+        await client.aforce_login(self.customer)
+        response = await client.get(reverse('all_vets'))
+        self.assertEqual(len(response.json()['vets']), self.active_vets)
+        response = await client.get(reverse('vets_by_service', args=[self.service.id]))
+        self.assertTrue(response.json()['vets'])
+
+    @override_settings(LIVE_EVENTS_STREAM_SECONDS=0)
+    async def test_live_events_stream(self):
+        client = AsyncClient()
+        await client.aforce_login(self.admin)
+        response = await client.get(reverse('admin_dashboard:appointment_events'), {'since': 0})
+        body = ''.join([chunk.decode() async for chunk in response.streaming_content])
+        self.assertEqual(len(sse_events(body)), await AppointmentEvent.objects.acount())
+
+    async def test_zip_export_streams_asynchronously(self):
+        """Por ASGI el ZIP sale como iterador asíncrono, sin que Django lo acumule en memoria."""
+        def prescribe():
+            appointment = Appointment.objects.get(date=date(2024, 1, 1))
+            consultation = MedicalConsultation.objects.create(
+                appointment=appointment, veterinarian=appointment.veterinarian, reason='Control', symptoms='-',
+                diagnosis='Sano', treatment='-',
+            )
+            MedicalPrescription.objects.create(consultation=consultation, general_instructions='-')
+
+        await sync_to_async(prescribe)()
+        client = AsyncClient()
+        await client.aforce_login(self.admin)
+        with tempfile.TemporaryDirectory() as directory, self.settings(PDF_CACHE_DIR=directory):
+            response = await client.get(reverse('admin_dashboard:export_day_prescriptions'), {'date': '2024-01-01'})
+            self.assertTrue(response.is_async)
+            body = b''.join([chunk async for chunk in response.streaming_content])
+        with zipfile.ZipFile(BytesIO(body)) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(len(archive.namelist()), 1)
+            self.assertTrue(archive.namelist()[0].endswith('.pdf'))
+
+    def test_zip_export_stays_sync_under_wsgi(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin_dashboard:export_day_prescriptions'), {'date': '2030-03-01'})
+        self.assertFalse(response.is_async)
+        with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(archive.namelist(), [])
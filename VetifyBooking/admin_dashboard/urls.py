@@ -8,16 +8,21 @@ urlpatterns = [
     # Dashboard principal
     path('', views.dashboard_view, name='dashboard'),
 
+    # Búsqueda global
+    path('search/', views.omnisearch_view, name='omnisearch'),
+
     # Gestión de citas
     path('appointments/', views.appointments_view, name='appointments'),
     path('appointments/delete/<int:appointment_id>/', views.delete_appointment, name='delete_appointment'),
     path('appointments/<int:appointment_id>/status/', views.change_appointment_status, name='change_appointment_status'),
     path('appointments/create/', views.create_appointment_admin, name='create_appointment_admin'),
+    path('appointments/events/', views.appointment_events, name='appointment_events'),
 
     # Gestión de usuarios
     path('users/', views.users_view, name='users'),
     path('users/toggle/<int:user_id>/', views.toggle_user_status, name='toggle_user_status'),
     path('users/create/', views.create_user_view, name='create_user'),
+    path('users/autocomplete/', views.users_autocomplete, name='users_autocomplete'),
     path('register/', views.admin_register_view, name='admin_register'),
     path('profile/', views.admin_profile_view, name='admin_profile'),
 
@@ -25,7 +30,9 @@ urlpatterns = [
     path('pets/', views.pets_view, name='pets'),
     path('pets/delete/<int:pet_id>/', views.delete_pet, name='delete_pet'),
     path('pets/create/', views.create_pet, name='create_pet'),
+    path('pets/autocomplete/', views.pets_autocomplete, name='pets_autocomplete'),
     path('pets/<int:pet_id>/vaccines/', views.pet_vaccines_view, name='pet_vaccines'),
+    path('pets/<int:pet_id>/record.zip', views.export_pet_record_admin, name='export_pet_record'),
     path('vaccines/<int:vaccine_id>/delete/', views.delete_vaccine_view, name='delete_vaccine'),
 
     # Gestión de veterinarios
@@ -61,5 +68,6 @@ urlpatterns = [
     path('consultations/<int:consultation_id>/prescription/add/', views.add_prescription_view, name='add_prescription'),
     path('prescriptions/<int:prescription_id>/edit/', views.edit_prescription_view, name='edit_prescription'),
     path('prescriptions/<int:prescription_id>/delete/', views.delete_prescription_view, name='delete_prescription'),
+    path('prescriptions/day.zip', views.export_day_prescriptions, name='export_day_prescriptions'),
 
 ]
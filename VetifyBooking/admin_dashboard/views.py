@@ -1,12 +1,32 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Count, Q
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncMonth
 from django.utils import timezone
 from datetime import timedelta, datetime
 from django.contrib.auth.models import User
 from booking.models import Appointment, Pet, Service, Veterinarian, ClinicSchedule
+from booking.availability import build_slot_index
+from booking.catalog import active_services
+from booking.pdfcache import invalidate_consultation_pdfs
+from booking.recordexport import day_prescriptions_zip, pet_record_zip, zip_response
+from booking.reservations import reserve_appointment, SlotUnavailable
+from booking.search import deferred_indexing, search_consultations
+from booking.userstats import refresh_upcoming_dates
+from VetifyBooking import asyncviews
+from VetifyBooking.asyncviews import gather_queries, run_query
+from VetifyBooking.replica import reads_from_replica
 from .decorators import admin_required
+from .models import DailyStats, ReportCube
+from . import live
+from .autocomplete import pet_options, user_options
+from .omnisearch import search as omnisearch
+from .pagination import keyset_paginate
+from .rollups import cube_summary
 import json
 from django.contrib.auth import update_session_auth_hash
 
@@ -34,63 +54,72 @@ def admin_login_view(request):
 
 
 @admin_required
-def dashboard_view(request):
+@reads_from_replica
+async def dashboard_view(request):
     """Vista principal del dashboard con estadísticas"""
     
-    # KPIs generales
-    total_appointments = Appointment.objects.count()
-    total_users = User.objects.filter(is_superuser=False).count()
-    total_pets = Pet.objects.count()
-    total_vets = Veterinarian.objects.filter(is_active=True).count()
-    
-    # Citas de hoy
     today = timezone.now().date()
-    today_appointments = Appointment.objects.filter(date=today).count()
-    
-    # Citas pendientes (futuras)
-    pending_appointments = Appointment.objects.filter(date__gte=today).count()
-    
-    # Estadísticas de los últimos 7 días
-    last_7_days = today - timedelta(days=7)
-    recent_appointments = Appointment.objects.filter(date__gte=last_7_days)
-    
-    # Datos para gráfica de citas por día (últimos 7 días)
+    week_start = today - timedelta(days=6)
+
+    # Las consultas no dependen unas de otras: van en paralelo
+    totals, total_vets, per_day, pets_by_type, latest_appointments, active_vets, live_cursor = await gather_queries(
+        # KPIs generales desde los resúmenes diarios (una fila por día)
+        lambda: DailyStats.objects.aggregate(
+            total_appointments=Coalesce(Sum('appointments'), 0),
+            total_users=Coalesce(Sum('new_users'), 0),
+            total_pets=Coalesce(Sum('new_pets'), 0),
+            # Citas pendientes (futuras)
+            pending_appointments=Coalesce(Sum('appointments', filter=Q(date__gte=today)), 0),
+        ),
+        Veterinarian.objects.filter(is_active=True).count,
+        # Citas por día (últimos 7 días, incluye hoy)
+        lambda: dict(
+            DailyStats.objects.filter(date__gte=week_start, date__lte=today)
+            .values_list('date', 'appointments')
+        ),
+        # Mascotas por tipo
+        lambda: list(Pet.objects.values('pet_type').annotate(count=Count('id'))),
+        # Últimas citas registradas
+        lambda: list(Appointment.objects.select_related('user').order_by('-created_at')[:10]),
+        # Veterinarios activos
+        lambda: list(Veterinarian.objects.filter(is_active=True)[:5]),
+        # Desde dónde sigue la página con los cambios en vivo
+        live.latest_id,
+    )
+
+    # Datos para gráfica de citas por día
     appointments_by_day = []
     for i in range(6, -1, -1):
         day = today - timedelta(days=i)
-        count = Appointment.objects.filter(date=day).count()
         appointments_by_day.append({
             'date': day.strftime('%d/%m'),
-            'count': count
+            'count': per_day.get(day, 0)
         })
+
+    # Citas de hoy
+    today_appointments = per_day.get(today, 0)
     
-    # Mascotas por tipo
-    pets_by_type = Pet.objects.values('pet_type').annotate(count=Count('id'))
-    
-    # Servicios más solicitados
+    # Servicios más solicitados (perezoso: solo se consulta si la plantilla lo usa)
     top_services = Service.objects.filter(is_active=True)[:5]
     
-    # Últimas citas registradas
-    latest_appointments = Appointment.objects.select_related('user').order_by('-created_at')[:10]
-    
-    # Veterinarios activos
-    active_vets = Veterinarian.objects.filter(is_active=True)[:5]
-    
     context = {
-        'total_appointments': total_appointments,
-        'total_users': total_users,
-        'total_pets': total_pets,
+        'total_appointments': totals['total_appointments'],
+        'total_users': totals['total_users'],
+        'total_pets': totals['total_pets'],
         'total_vets': total_vets,
         'today_appointments': today_appointments,
-        'pending_appointments': pending_appointments,
+        'pending_appointments': totals['pending_appointments'],
         'appointments_by_day': json.dumps(appointments_by_day),
         'pets_by_type': pets_by_type,
         'top_services': top_services,
         'latest_appointments': latest_appointments,
         'active_vets': active_vets,
+        'today': today,
+        'live_cursor': live_cursor,
     }
     
-    return render(request, 'admin_dashboard/dashboard.html', context)
+    return await asyncviews.render(request, 'admin_dashboard/dashboard.html', context)
+
 
 @admin_required
 def appointments_view(request):
@@ -98,7 +127,7 @@ def appointments_view(request):
     date_filter = request.GET.get('date', '')
     search = request.GET.get('search', '')
 
-    appointments = Appointment.objects.select_related('user', 'pet').order_by('-date', '-time')
+    appointments = Appointment.objects.select_related('user', 'pet', 'service', 'consultation')
 
     if status_filter == 'today':
         appointments = appointments.filter(date=timezone.now().date())
@@ -119,26 +148,47 @@ def appointments_view(request):
             Q(pet__name__icontains=search)
         )
 
-    # Para el modal de crear cita
-    from django.contrib.auth.models import User
-    users = User.objects.filter(is_superuser=False).order_by('username')
-    pets = Pet.objects.select_related('owner').order_by('name')
+    # Para el modal de crear cita (usuarios y mascotas se piden al escribir)
     services = Service.objects.filter(is_active=True)
+    veterinarians = Veterinarian.objects.filter(is_active=True)
+
+    page = keyset_paginate(request, appointments, ('-date', '-time', '-id'))
 
     context = {
-        'appointments': appointments,
+        'appointments': page,
+        'page': page,
         'status_filter': status_filter,
         'date_filter': date_filter,
         'search': search,
-        'total_count': appointments.count(),
+        'total_count': page.count_label,
         'today': timezone.now().date(),
-        'users': users,
-        'pets': pets,
         'services': services,
+        'veterinarians': veterinarians,
+        'live_cursor': live.latest_id(),
     }
     return render(request, 'admin_dashboard/appointments.html', context)
 
 
+@admin_required
+async def appointment_events(request):
+    """Cambios de citas en vivo como server-sent events (ver live.py)"""
+    cursor = live.start_cursor(request)
+    if cursor is None:
+        cursor = await run_query(live.latest_id)
+
+    # Bajo WSGI cada conexión abierta ocuparía un hilo del servidor
+    keep_open = isinstance(request, ASGIRequest)
+    chunks = live.stream(cursor, keep_open)
+    if not keep_open:
+        chunks = [chunk async for chunk in chunks]
+
+    response = StreamingHttpResponse(chunks, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Sin búfer en nginx: cada evento sale en cuanto se escribe
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @admin_required
 def change_appointment_status(request, appointment_id):
     appointment = get_object_or_404(Appointment, id=appointment_id)
@@ -146,24 +196,46 @@ def change_appointment_status(request, appointment_id):
         new_status = request.POST.get('status')
         if new_status in ['pending', 'confirmed', 'completed', 'cancelled']:
             appointment.status = new_status
-            appointment.save()
-            messages.success(request, f'Estado actualizado a {appointment.get_status_display()}')
+            # Cancelar libera el horario; reactivar vuelve a reclamarlo
+            try:
+                reserve_appointment(appointment)
+            except SlotUnavailable as exc:
+                messages.error(request, str(exc))
+            else:
+                messages.success(request, f'Estado actualizado a {appointment.get_status_display()}')
     return redirect('admin_dashboard:appointments')
 
 
 @admin_required
 def create_appointment_admin(request):
     if request.method == 'POST':
-        Appointment.objects.create(
+        appointment = Appointment(
             user_id=request.POST.get('user'),
             pet_id=request.POST.get('pet'),
             service_id=request.POST.get('service'),
+            veterinarian_id=request.POST.get('veterinarian') or None,
             date=request.POST.get('date'),
             time=request.POST.get('time'),
             notes=request.POST.get('notes', ''),
             status='confirmed'
         )
-        messages.success(request, 'Cita creada exitosamente.')
+
+        # Sin veterinario elegido se asigna el primero libre en ese horario
+        if appointment.veterinarian_id is None:
+            service = Service.objects.filter(id=appointment.service_id).first()
+            day = datetime.strptime(appointment.date, '%Y-%m-%d').date()
+            vet = build_slot_index(service, day, days=1).first_free_vet(day, appointment.time)
+            if vet is None:
+                messages.error(request, 'No hay veterinarios disponibles en ese horario.')
+                return redirect('admin_dashboard:appointments')
+            appointment.veterinarian = vet
+
+        try:
+            reserve_appointment(appointment)
+        except SlotUnavailable as exc:
+            messages.error(request, str(exc))
+        else:
+            messages.success(request, 'Cita creada exitosamente.')
     return redirect('admin_dashboard:appointments')
 
 
@@ -172,7 +244,7 @@ def users_view(request):
     """Vista de gestión de usuarios"""
     
     search = request.GET.get('search', '')
-    users = User.objects.filter(is_superuser=False).order_by('-date_joined')
+    users = User.objects.filter(is_superuser=False).select_related('profile')
     
     if search:
         users = users.filter(
@@ -182,19 +254,26 @@ def users_view(request):
             Q(last_name__icontains=search)
         )
     
-    # Agregar estadísticas por usuario
+    page = keyset_paginate(request, users, ('-date_joined', '-id'))
+
+    # Estadísticas por usuario, desnormalizadas en su perfil; las próximas
+    # citas que ya pasaron se recalculan para toda la página de una vez
+    refresh_upcoming_dates([user.profile for user in page if hasattr(user, 'profile')])
     users_data = []
-    for user in users:
+    for user in page:
+        profile = getattr(user, 'profile', None)
         users_data.append({
             'user': user,
-            'pets_count': Pet.objects.filter(owner=user).count(),
-            'appointments_count': Appointment.objects.filter(user=user).count(),
+            'pets_count': profile.pets_count if profile else 0,
+            'appointments_count': profile.appointments_count if profile else 0,
+            'next_appointment_date': profile.next_appointment_date if profile else None,
         })
     
     context = {
         'users_data': users_data,
+        'page': page,
         'search': search,
-        'total_count': users.count(),
+        'total_count': page.count_label,
     }
     
     return render(request, 'admin_dashboard/users.html', context)
@@ -207,7 +286,7 @@ def pets_view(request):
     type_filter = request.GET.get('type', 'all')
     search = request.GET.get('search', '')
     
-    pets = Pet.objects.select_related('owner').order_by('-created_at')
+    pets = Pet.objects.select_related('owner')
     
     if type_filter != 'all':
         pets = pets.filter(pet_type=type_filter)
@@ -223,17 +302,18 @@ def pets_view(request):
     total_dogs = Pet.objects.filter(pet_type='dog').count()
     total_cats = Pet.objects.filter(pet_type='cat').count()
     total_others = Pet.objects.filter(pet_type='other').count()
-    users = User.objects.filter(is_superuser=False).order_by('username')
+
+    page = keyset_paginate(request, pets, ('-created_at', '-id'))
 
     context = {
-        'pets': pets,
+        'pets': page,
+        'page': page,
         'type_filter': type_filter,
         'search': search,
-        'total_count': pets.count(),
+        'total_count': page.count_label,
         'total_dogs': total_dogs,
         'total_cats': total_cats,
         'total_others': total_others,
-        'users': users,
         'today': date.today().isoformat()
     }
 
@@ -247,7 +327,7 @@ def veterinarians_view(request):
     specialty_filter = request.GET.get('specialty', 'all')
     search = request.GET.get('search', '')
     
-    vets = Veterinarian.objects.all().order_by('name')
+    vets = Veterinarian.objects.all()
     
     if specialty_filter != 'all':
         vets = vets.filter(specialty=specialty_filter)
@@ -259,18 +339,16 @@ def veterinarians_view(request):
             Q(license_number__icontains=search)
         )
     
+    page = keyset_paginate(request, vets, ('name', 'id'))
+
     context = {
-        'veterinarians': vets,
-        'specialty_filter': specialty_filter,
-        'search': search,
-        'total_count': vets.count(),
-        'active_count': vets.filter(is_active=True).count(),
-        'veterinarians': vets,
+        'veterinarians': page,
+        'page': page,
         'specialty_filter': specialty_filter,
         'search': search,
-        'total_count': vets.count(),
+        'total_count': page.count_label,
         'active_count': vets.filter(is_active=True).count(),
-        'services': Service.objects.filter(is_active=True),
+        'services': active_services(),
     }
     
     return render(request, 'admin_dashboard/veterinarians.html', context)
@@ -282,7 +360,7 @@ def services_view(request):
     
     search = request.GET.get('search', '')
     
-    services = Service.objects.all().order_by('name')
+    services = Service.objects.all()
     
     if search:
         services = services.filter(
@@ -290,10 +368,13 @@ def services_view(request):
             Q(description__icontains=search)
         )
     
+    page = keyset_paginate(request, services, ('name', 'id'))
+
     context = {
-        'services': services,
+        'services': page,
+        'page': page,
         'search': search,
-        'total_count': services.count(),
+        'total_count': page.count_label,
         'active_count': services.filter(is_active=True).count(),
     }
     
@@ -315,76 +396,76 @@ def schedules_view(request):
 
 
 @admin_required
-def reports_view(request):
+@reads_from_replica
+async def reports_view(request):
     """Vista de reportes y estadísticas avanzadas"""
     
     # Período de reporte
     period = request.GET.get('period', '30')  # días
-    days = int(period)
+    try:
+        days = max(int(period), 1)
+    except ValueError:
+        period, days = '30', 30
     
     end_date = timezone.now().date()
     start_date = end_date - timedelta(days=days)
     
-    # Citas en el período
-    appointments_in_period = Appointment.objects.filter(
-        date__gte=start_date,
-        date__lte=end_date
-    )
-    
-    # Nuevos usuarios en el período
-    new_users = User.objects.filter(
-        date_joined__gte=start_date,
-        is_superuser=False
-    ).count()
-    
-    # Nuevas mascotas en el período
-    new_pets = Pet.objects.filter(
-        created_at__gte=start_date
-    ).count()
-    
-    # Citas por mes (últimos 6 meses)
-    appointments_by_month = []
-    for i in range(5, -1, -1):
-        month_date = end_date - timedelta(days=30*i)
-        month_start = month_date.replace(day=1)
-        if month_date.month == 12:
-            month_end = month_date.replace(year=month_date.year + 1, month=1, day=1)
-        else:
-            month_end = month_date.replace(month=month_date.month + 1, day=1)
-        
-        count = Appointment.objects.filter(
-            date__gte=month_start,
-            date__lt=month_end
-        ).count()
-        
-        appointments_by_month.append({
-            'month': month_date.strftime('%B'),
-            'count': count
-        })
+    # Citas por mes (últimos 6 meses de calendario)
+    months = []
+    month_start = end_date.replace(day=1)
+    for _ in range(6):
+        months.insert(0, month_start)
+        month_start = (month_start - timedelta(days=1)).replace(day=1)
     
-    # Top 5 usuarios con más citas
-    top_users = User.objects.filter(is_superuser=False).annotate(
-        appointments_count=Count('appointments')
-    ).order_by('-appointments_count')[:5]
+    # Las consultas no dependen unas de otras: van en paralelo
+    summary, growth, monthly_counts, top_users, service_stats = await gather_queries(
+        # Citas, ingresos y uso por servicio del período: una consulta agrupada al cubo
+        lambda: cube_summary(start_date, end_date),
+        # Nuevos usuarios y mascotas desde los resúmenes diarios
+        lambda: DailyStats.objects.filter(date__gte=start_date, date__lte=end_date).aggregate(
+            new_users=Coalesce(Sum('new_users'), 0),
+            new_pets=Coalesce(Sum('new_pets'), 0),
+        ),
+        lambda: dict(
+            ReportCube.objects.filter(date__gte=months[0], date__lte=end_date)
+            .annotate(month=TruncMonth('date'))
+            .order_by().values('month')
+            .annotate(total=Sum('appointments'))
+            .values_list('month', 'total')
+        ),
+        # Top 5 usuarios con más citas
+        lambda: list(User.objects.filter(is_superuser=False, profile__isnull=False).annotate(
+            appointments_count=F('profile__appointments_count')
+        ).order_by('-appointments_count')[:5]),
+        lambda: list(Service.objects.filter(is_active=True)),
+    )
+    appointments_by_month = [
+        {'month': month.strftime('%B'), 'count': monthly_counts.get(month, 0)}
+        for month in months
+    ]
     
-    # Servicios más solicitados (simulado con citas)
-    service_stats = Service.objects.filter(is_active=True).annotate(
-        usage_count=Count('id')
-    )[:10]
+    # Servicios más solicitados en el período
+    for service in service_stats:
+        usage = summary['by_service'].get(service.id, {})
+        service.usage_count = usage.get('appointments', 0)
+        service.revenue = usage.get('revenue', 0)
+    service_stats.sort(key=lambda service: (-service.usage_count, service.name))
+    service_stats = service_stats[:10]
     
     context = {
         'period': period,
         'start_date': start_date,
         'end_date': end_date,
-        'total_appointments': appointments_in_period.count(),
-        'new_users': new_users,
-        'new_pets': new_pets,
+        'total_appointments': summary['appointments'],
+        'total_revenue': summary['revenue'],
+        'new_users': growth['new_users'],
+        'new_pets': growth['new_pets'],
         'appointments_by_month': json.dumps(appointments_by_month),
         'top_users': top_users,
         'service_stats': service_stats,
     }
     
-    return render(request, 'admin_dashboard/reports.html', context)
+    return await asyncviews.render(request, 'admin_dashboard/reports.html', context)
 
 
 @admin_required
@@ -571,20 +652,29 @@ def consultations_view(request):
     consultations = MedicalConsultation.objects.select_related(
         'appointment__pet',
         'appointment__user',
-        'veterinarian'
-    ).order_by('-created_at')
+        'veterinarian',
+        'prescription'
+    )
     
     if search:
-        consultations = consultations.filter(
-            Q(appointment__pet__name__icontains=search) |
-            Q(appointment__user__username__icontains=search) |
-            Q(diagnosis__icontains=search)
-        )
-    
+        # Texto completo: resultados por relevancia, con el fragmento que coincidió
+        results, total = search_consultations(consultations, search)
+        context = {
+            'consultations': results,
+            'page': None,
+            'search': search,
+            'total_count': total,
+            'search_limited': total > len(results),
+        }
+        return render(request, 'admin_dashboard/consultations.html', context)
+
+    page = keyset_paginate(request, consultations, ('-created_at', '-id'))
+
     context = {
-        'consultations': consultations,
+        'consultations': page,
+        'page': page,
         'search': search,
-        'total_count': consultations.count(),
+        'total_count': page.count_label,
     }
     return render(request, 'admin_dashboard/consultations.html', context)
 
@@ -682,31 +772,33 @@ def add_prescription_view(request, consultation_id):
         return redirect('admin_dashboard:edit_prescription', prescription_id=consultation.prescription.id)
 
     if request.method == 'POST':
-        prescription = MedicalPrescription.objects.create(
-            consultation=consultation,
-            general_instructions=request.POST.get('general_instructions'),
-            warnings=request.POST.get('warnings', ''),
-        )
+        # La búsqueda se reindexa una vez por receta, no por medicamento
+        with transaction.atomic(savepoint=False), deferred_indexing():
+            prescription = MedicalPrescription.objects.create(
+                consultation=consultation,
+                general_instructions=request.POST.get('general_instructions'),
+                warnings=request.POST.get('warnings', ''),
+            )
 
-        # Medicamentos (pueden venir múltiples)
-        medications = request.POST.getlist('medication')
-        doses = request.POST.getlist('dose')
-        frequencies = request.POST.getlist('frequency')
-        durations = request.POST.getlist('duration')
-        routes = request.POST.getlist('route')
-        instructions_list = request.POST.getlist('instructions')
-
-        for i in range(len(medications)):
-            if medications[i]:
-                PrescriptionItem.objects.create(
-                    prescription=prescription,
-                    medication=medications[i],
-                    dose=doses[i] if i < len(doses) else '',
-                    frequency=frequencies[i] if i < len(frequencies) else '',
-                    duration=durations[i] if i < len(durations) else '',
-                    route=routes[i] if i < len(routes) else 'oral',
-                    instructions=instructions_list[i] if i < len(instructions_list) else '',
-                )
+            # Medicamentos (pueden venir múltiples)
+            medications = request.POST.getlist('medication')
+            doses = request.POST.getlist('dose')
+            frequencies = request.POST.getlist('frequency')
+            durations = request.POST.getlist('duration')
+            routes = request.POST.getlist('route')
+            instructions_list = request.POST.getlist('instructions')
+
+            for i in range(len(medications)):
+                if medications[i]:
+                    PrescriptionItem.objects.create(
+                        prescription=prescription,
+                        medication=medications[i],
+                        dose=doses[i] if i < len(doses) else '',
+                        frequency=frequencies[i] if i < len(frequencies) else '',
+                        duration=durations[i] if i < len(durations) else '',
+                        route=routes[i] if i < len(routes) else 'oral',
+                        instructions=instructions_list[i] if i < len(instructions_list) else '',
+                    )
 
         messages.success(request, 'Receta creada exitosamente.')
         return redirect('admin_dashboard:consultations')
@@ -724,31 +816,36 @@ def edit_prescription_view(request, prescription_id):
     prescription = get_object_or_404(MedicalPrescription, id=prescription_id)
 
     if request.method == 'POST':
-        prescription.general_instructions = request.POST.get('general_instructions')
-        prescription.warnings = request.POST.get('warnings', '')
-        prescription.save()
-
-        # Eliminar items anteriores y recrear
-        prescription.items.all().delete()
-
-        medications = request.POST.getlist('medication')
-        doses = request.POST.getlist('dose')
-        frequencies = request.POST.getlist('frequency')
-        durations = request.POST.getlist('duration')
-        routes = request.POST.getlist('route')
-        instructions_list = request.POST.getlist('instructions')
-
-        for i in range(len(medications)):
-            if medications[i]:
-                PrescriptionItem.objects.create(
-                    prescription=prescription,
-                    medication=medications[i],
-                    dose=doses[i] if i < len(doses) else '',
-                    frequency=frequencies[i] if i < len(frequencies) else '',
-                    duration=durations[i] if i < len(durations) else '',
-                    route=routes[i] if i < len(routes) else 'oral',
-                    instructions=instructions_list[i] if i < len(instructions_list) else '',
-                )
+        # La búsqueda se reindexa una vez por receta, no por medicamento
+        with transaction.atomic(savepoint=False), deferred_indexing():
+            prescription.general_instructions = request.POST.get('general_instructions')
+            prescription.warnings = request.POST.get('warnings', '')
+            prescription.save()
+
+            # Eliminar items anteriores y recrear
+            prescription.items.all().delete()
+
+            medications = request.POST.getlist('medication')
+            doses = request.POST.getlist('dose')
+            frequencies = request.POST.getlist('frequency')
+            durations = request.POST.getlist('duration')
+            routes = request.POST.getlist('route')
+            instructions_list = request.POST.getlist('instructions')
+
+            for i in range(len(medications)):
+                if medications[i]:
+                    PrescriptionItem.objects.create(
+                        prescription=prescription,
+                        medication=medications[i],
+                        dose=doses[i] if i < len(doses) else '',
+                        frequency=frequencies[i] if i < len(frequencies) else '',
+                        duration=durations[i] if i < len(durations) else '',
+                        route=routes[i] if i < len(routes) else 'oral',
+                        instructions=instructions_list[i] if i < len(instructions_list) else '',
+                    )
+
+        # Los medicamentos cambian después de guardar la receta
+        invalidate_consultation_pdfs(prescription.consultation_id)
 
         messages.success(request, 'Receta actualizada exitosamente.')
         return redirect('admin_dashboard:consultations')
@@ -764,7 +861,8 @@ def edit_prescription_view(request, prescription_id):
 def delete_prescription_view(request, prescription_id):
     prescription = get_object_or_404(MedicalPrescription, id=prescription_id)
     consultation_id = prescription.consultation.id
-    prescription.delete()
+    with transaction.atomic(savepoint=False), deferred_indexing():
+        prescription.delete()
     messages.success(request, 'Receta eliminada.')
     return redirect('admin_dashboard:consultations')
 
@@ -1024,4 +1122,58 @@ def edit_veterinarian_view(request, vet_id):
         'services': services,
         'selected_services': list(vet.services.values_list('id', flat=True)),
     }
-    return render(request, 'admin_dashboard/edit_veterinarian.html', context)
\ No newline at end of file
+    return render(request, 'admin_dashboard/edit_veterinarian.html', context)
+
+
+@admin_required
+@reads_from_replica
+def export_pet_record_admin(request, pet_id):
+    """ZIP con el historial completo de una mascota (consultas, recetas y vacunas)"""
+    pet = get_object_or_404(Pet, id=pet_id)
+    return zip_response(request, pet_record_zip(pet), f'historial_{pet.id}_{pet.name}.zip'.replace('"', ''))
+
+
+@admin_required
+@reads_from_replica
+def export_day_prescriptions(request):
+    """ZIP con todas las recetas de un día de clínica, listas para imprimir"""
+    try:
+        day = datetime.strptime(request.GET.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        day = timezone.localdate()
+    return zip_response(request, day_prescriptions_zip(day), f'recetas_{day.isoformat()}.zip')
+
+
+@admin_required
+def omnisearch_view(request):
+    """Búsqueda global del encabezado: usuarios, mascotas, veterinarios y citas (JSON)"""
+    results = omnisearch(request.GET.get('q', ''))
+    return JsonResponse({
+        'results': [
+            {
+                'kind': entry.kind,
+                'kind_label': entry.get_kind_display(),
+                'id': entry.object_id,
+                'title': entry.title,
+                'subtitle': entry.subtitle,
+                'url': entry.url,
+            }
+            for entry in results
+        ],
+    })
+
+
+@admin_required
+def users_autocomplete(request):
+    """Usuarios (no administradores) cuyo usuario, nombre o correo empieza por `q` (JSON)"""
+    return JsonResponse({'results': user_options(request.GET.get('q', ''))})
+
+
+@admin_required
+def pets_autocomplete(request):
+    """Mascotas del dueño `owner` (JSON)"""
+    try:
+        owner_id = int(request.GET.get('owner', ''))
+    except ValueError:
+        return JsonResponse({'results': []})
+    return JsonResponse({'results': pet_options(owner_id)})
@@ -0,0 +1,198 @@
+"""
+Motor de disponibilidad de citas.
+
+Combina el horario de la clínica (ClinicSchedule), la jornada de cada
+veterinario (available_days / start_time / end_time), la duración del
+servicio y las citas ya registradas para calcular los horarios reservables.
+
+Todo se resuelve con un índice por día que se construye una sola vez; el
+horario y los veterinarios salen del catálogo en caché y la ocupación del
+calendario de bitsets de `occupancy`, así que comprobar un hueco es una
+operación de bits.
+"""
+from datetime import date, timedelta
+
+from django.utils import timezone
+
+from .catalog import active_veterinarians, clinic_schedules
+from .occupancy import (
+    DEFAULT_DURATION_MINUTES,
+    FULL_DAY,
+    SLOT_MINUTES,
+    calendar,
+    grid_mask,
+    iter_bits,
+    span_mask,
+    to_minutes,
+    window_mask,
+)
+
+
+# Separación entre horarios ofrecidos al cliente
+SLOT_STEP_MINUTES = 15
+
+# Máximo de días que se pueden pedir de una vez a la API
+MAX_DAYS = 14
+
+DAY_KEYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+SLOT_GRID = grid_mask(SLOT_STEP_MINUTES)
+
+
+def format_minutes(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def vet_works_on(vet, day_key):
+    """Un veterinario sin días configurados trabaja todos los días que abre la clínica."""
+    days = [str(d).lower() for d in (vet.available_days or [])]
+    return not days or day_key in days
+
+
+class DayIndex:
+    """Ventanas de atención y ocupación de cada veterinario para un día."""
+
+    __slots__ = ('day', 'windows', 'occupancy')
+
+    def __init__(self, day):
+        self.day = day
+        # vet_id -> bitset de la jornada, ya recortada al horario de la clínica
+        self.windows = {}
+        # vet_id -> DayOccupancy
+        self.occupancy = {}
+
+    def is_free(self, vet_id, start, duration, exclude_hold=None):
+        window = self.windows.get(vet_id)
+        if window is None:
+            return False
+        mask = span_mask(start, start + duration)
+        return not (mask & ~window) and not self.occupancy[vet_id].overlaps(mask, exclude_hold)
+
+    def free_slots(self, vet_id, duration, not_before=0):
+        window = self.windows.get(vet_id)
+        if window is None:
+            return []
+        starts = self.occupancy[vet_id].free_starts(duration, window)
+        starts &= SLOT_GRID & (FULL_DAY ^ span_mask(0, not_before))
+        return [bit * SLOT_MINUTES for bit in iter_bits(starts)]
+
+
+class SlotIndex:
+    """Índice precalculado de disponibilidad para un rango de días."""
+
+    def __init__(self, vets, days, duration, exclude_hold=None):
+        self.vets = vets
+        self.days = days
+        self.duration = duration
+        # Retención que no cuenta como ocupada (la del propio cliente)
+        self.exclude_hold = exclude_hold
+
+    def day(self, day):
+        return self.days.get(day)
+
+    def is_available(self, vet_id, day, start_time, duration=None):
+        day_index = self.days.get(day)
+        if day_index is None:
+            return False
+        start = to_minutes(start_time)
+        if start < _not_before(day):
+            return False
+        return day_index.is_free(vet_id, start, duration or self.duration, self.exclude_hold)
+
+    def first_free_vet(self, day, start_time, duration=None):
+        """Primer veterinario libre en ese horario (para reservas sin preferencia)."""
+        for vet in self.vets:
+            if self.is_available(vet.id, day, start_time, duration):
+                return vet
+        return None
+
+    def as_json(self):
+        days = []
+        for day in sorted(self.days):
+            day_index = self.days[day]
+            not_before = _not_before(day)
+            days.append({
+                'date': day.isoformat(),
+                'vets': [
+                    {
+                        'id': vet.id,
+                        'name': vet.name,
+                        'slots': [
+                            format_minutes(m)
+                            for m in day_index.free_slots(vet.id, self.duration, not_before)
+                        ],
+                    }
+                    for vet in self.vets
+                    if vet.id in day_index.windows
+                ],
+            })
+        return days
+
+
+def _not_before(day):
+    """Los horarios de hoy que ya pasaron no se ofrecen."""
+    now = timezone.localtime()
+    if day < now.date():
+        return 24 * 60
+    if day == now.date():
+        return now.hour * 60 + now.minute + 1
+    return 0
+
+
+def service_duration(service):
+    if service is not None and service.duration:
+        return int(service.duration)
+    return DEFAULT_DURATION_MINUTES
+
+
+def build_slot_index(service, start_date, days=7, vet_id=None, exclude_hold=None):
+    """
+    Construye el índice de disponibilidad de `days` días a partir de `start_date`
+    para los veterinarios activos que ofrecen `service`. `exclude_hold` es el id
+    de una retención cuyos bloques se tratan como libres en is_available.
+
+    Horarios y veterinarios salen del catálogo en caché; solo consulta la base
+    de datos si el calendario de ocupación no tiene ya el rango en memoria.
+    """
+    days = max(1, min(int(days), MAX_DAYS))
+    end_date = start_date + timedelta(days=days - 1)
+    duration = service_duration(service)
+
+    schedules = {day: s for day, s in clinic_schedules().items() if s.is_open}
+
+    vets = active_veterinarians()
+    if service is not None:
+        vets = [vet for vet in vets if service.id in vet.service_ids]
+    if vet_id:
+        vets = [vet for vet in vets if vet.id == vet_id]
+
+    occupancy = calendar.load([v.id for v in vets], start_date, end_date)
+
+    index = {}
+    for offset in range(days):
+        day = start_date + timedelta(days=offset)
+        day_index = DayIndex(day)
+        schedule = schedules.get(DAY_KEYS[day.weekday()])
+        if schedule is not None:
+            open_at, close_at = to_minutes(schedule.opening_time), to_minutes(schedule.closing_time)
+            for vet in vets:
+                if not vet_works_on(vet, DAY_KEYS[day.weekday()]):
+                    continue
+                window = window_mask(
+                    max(open_at, to_minutes(vet.start_time)),
+                    min(close_at, to_minutes(vet.end_time)),
+                )
+                if window:
+                    day_index.windows[vet.id] = window
+                    day_index.occupancy[vet.id] = occupancy[(vet.id, day)]
+        index[day] = day_index
+
+    return SlotIndex(vets, index, duration, exclude_hold)
+
+
+def parse_start_date(value):
+    """Fecha inicial de la consulta; hoy si no viene o es inválida."""
+    try:
+        return date.fromisoformat(value) if value else timezone.localdate()
+    except ValueError:
+        return timezone.localdate()
@@ -0,0 +1,142 @@
+"""
+Caché versionada del catálogo: servicios, veterinarios y horario de la clínica.
+
+Son datos que cambian poco y se leen en casi todas las páginas. Cada
+instantánea se guarda en la caché compartida bajo una clave que incluye la
+versión del catálogo; las señales de Service, Veterinarian (y su relación con
+servicios) y ClinicSchedule incrementan esa versión al confirmarse la
+transacción. Como la versión vive en la misma caché, todos los procesos dejan
+de ver las instantáneas viejas a la vez, y un acierto no hace ninguna consulta.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.forms.models import ModelChoiceField, ModelChoiceIterator
+from django.utils.functional import cached_property
+
+from VetifyBooking.replica import primary_reads
+
+from .models import ClinicSchedule, Service, Veterinarian
+
+
+VERSION_KEY = 'catalog:version'
+
+# Las instantáneas de versiones viejas simplemente caducan
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
+_MISSING = object()
+
+
+def catalog_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Arrancar desde un valor que no pueda repetir una versión anterior
+        # si la clave se perdió (reinicio o desalojo de la caché)
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def invalidate_catalog():
+    """Descarta todas las instantáneas cuando la transacción actual se confirme."""
+    transaction.on_commit(_bump_version)
+
+
+def _snapshot(name, build):
+    key = f'catalog:{name}:{catalog_version()}'
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        # La instantánea vale para toda la versión: nunca desde una réplica atrasada
+        with primary_reads():
+            value = build()
+        cache.set(key, value, SNAPSHOT_TIMEOUT)
+    return value
+
+
+def _with_services(vets):
+    # Ids de servicios ya resueltos para que las plantillas no consulten por veterinario
+    vets = list(vets.prefetch_related('services').order_by('name'))
+    for vet in vets:
+        vet.service_ids = sorted(service.id for service in vet.services.all())
+        vet.first_service_id = vet.service_ids[0] if vet.service_ids else None
+        # La caché de prefetch no hace falta en la instantánea
+        vet._prefetched_objects_cache = {}
+    return vets
+
+
+def active_services():
+    return _snapshot('services', lambda: list(Service.objects.filter(is_active=True).order_by('name')))
+
+
+def all_veterinarians():
+    return _snapshot('vets', lambda: _with_services(Veterinarian.objects.all()))
+
+
+def active_veterinarians():
+    return [vet for vet in all_veterinarians() if vet.is_active]
+
+
+def veterinarians_for_service(service_id):
+    return [vet for vet in active_veterinarians() if service_id in vet.service_ids]
+
+
+def clinic_schedules():
+    """{día: ClinicSchedule} con los días configurados (abiertos o no)."""
+    return _snapshot('schedules', lambda: {s.day_of_week: s for s in ClinicSchedule.objects.all()})
+
+
+def vets_json():
+    """Datos de veterinarios activos listos para las APIs JSON."""
+    return _snapshot('vets_json', lambda: [
+        {
+            'id': vet.id,
+            'name': vet.name,
+            'specialty': vet.get_specialty_display(),
+            'photo': vet.photo.url if vet.photo else None,
+            'service_ids': vet.service_ids,
+        }
+        for vet in active_veterinarians()
+    ])
+
+
+class CatalogChoiceIterator(ModelChoiceIterator):
+    """Opciones de un ModelChoiceField servidas desde una instantánea del catálogo."""
+
+    @cached_property
+    def objects(self):
+        # Perezoso: el campo crea el iterador al definirse el formulario
+        return self.field.catalog()
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for obj in self.objects:
+            yield self.choice(obj)
+
+    def __len__(self):
+        return len(self.objects) + (1 if self.field.empty_label is not None else 0)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.objects)
+
+
+class CatalogChoiceField(ModelChoiceField):
+    """
+    ModelChoiceField que pinta sus opciones desde una instantánea del catálogo
+    (`catalog` es la función que la devuelve). La validación sigue usando
+    `queryset`.
+    """
+
+    iterator = CatalogChoiceIterator
+
+    def __init__(self, *args, catalog, **kwargs):
+        self.catalog = catalog
+        super().__init__(*args, **kwargs)
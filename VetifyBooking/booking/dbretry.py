@@ -0,0 +1,65 @@
+"""
+Reintento de transacciones de escritura cuando SQLite sigue ocupado.
+
+Con WAL, BEGIN IMMEDIATE y busy_timeout (ver DATABASES en settings) casi
+todas las esperas se resuelven dentro de SQLite. Si aun así vence el tiempo
+durante una ráfaga de escrituras, la transacción completa se repite con
+espera exponencial y algo de azar, para que los reintentos de varios hilos
+no vuelvan a coincidir.
+"""
+import copy
+import random
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+
+BUSY_MESSAGES = ('database is locked', 'database table is locked', 'database is busy')
+
+
+def is_busy_error(error):
+    return isinstance(error, OperationalError) and any(message in str(error) for message in BUSY_MESSAGES)
+
+
+def _snapshot(instance):
+    state = instance.__dict__.copy()
+    state['_state'] = copy.copy(instance._state)
+    return state
+
+
+def _restore(instance, state):
+    # Un intento fallido deja pk, _state y las marcas de las señales
+    # (_stats_state, _rollup_state) como si el guardado se hubiera confirmado
+    instance.__dict__.clear()
+    instance.__dict__.update(state)
+    instance._state = copy.copy(state['_state'])
+
+
+def run_write_transaction(func, *args, instances=(), using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Ejecuta `func` en una transacción y la repite si SQLite sigue bloqueado.
+    `instances` son los modelos que `func` guarda: vuelven a su estado
+    anterior antes de cada reintento.
+
+    Dentro de una transacción ya abierta no se reintenta (no se puede repetir
+    solo una parte): el error sube para que la repita quien la abrió.
+    """
+    if connections[using].in_atomic_block:
+        with transaction.atomic(using=using):
+            return func(*args, **kwargs)
+
+    retries = getattr(settings, 'DB_WRITE_RETRIES', 4)
+    backoff = getattr(settings, 'DB_WRITE_RETRY_BACKOFF', 0.05)
+    snapshots = [(instance, _snapshot(instance)) for instance in instances]
+
+    for attempt in range(retries + 1):
+        try:
+            with transaction.atomic(using=using):
+                return func(*args, **kwargs)
+        except OperationalError as error:
+            if not is_busy_error(error) or attempt == retries:
+                raise
+        for instance, state in snapshots:
+            _restore(instance, state)
+        time.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
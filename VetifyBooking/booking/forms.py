@@ -21,19 +21,34 @@ class RegisterForm(UserCreationForm):
 
 
 from django import forms
-from .models import Appointment, Pet, Service
+from .models import Appointment, Pet, Service, Veterinarian
+from .availability import build_slot_index
+from .catalog import CatalogChoiceField, active_services, active_veterinarians
+from .reservations import active_hold
 
 class AppointmentForm(forms.ModelForm):
 
-    service = forms.ModelChoiceField(
+    service = CatalogChoiceField(
         queryset=Service.objects.filter(is_active=True).order_by('name'),
+        catalog=active_services,
         empty_label="Seleccionar servicio...",
         label="Servicio"
     )
 
+    veterinarian = CatalogChoiceField(
+        queryset=Veterinarian.objects.filter(is_active=True),
+        catalog=active_veterinarians,
+        required=False,
+        empty_label="Sin preferencia",
+        label="Veterinario"
+    )
+
+    # Retención temporal creada al elegir un horario en booking.html
+    hold = forms.IntegerField(required=False, widget=forms.HiddenInput)
+
     class Meta:
         model = Appointment
-        fields = ['pet', 'service', 'date', 'time', 'notes']
+        fields = ['pet', 'service', 'veterinarian', 'date', 'time', 'notes']
         widgets = {
             'date': forms.DateInput(attrs={'type': 'date'}),
             'time': forms.TimeInput(attrs={'type': 'time'}),
@@ -43,9 +58,55 @@ class AppointmentForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
+        self.user = user
+        self.slot_hold = None
         if user:
             self.fields['pet'].queryset = Pet.objects.filter(owner=user)
 
+    def clean(self):
+        cleaned_data = super().clean()
+        service = cleaned_data.get('service')
+        vet = cleaned_data.get('veterinarian')
+        day = cleaned_data.get('date')
+        start_time = cleaned_data.get('time')
+
+        if not (service and day and start_time):
+            return cleaned_data
+
+        # Si el horario está retenido por este usuario, ya está garantizado.
+        # Si eligió otro, su retención se libera al reservar, así que no debe
+        # contar como ocupada al validar el nuevo horario.
+        hold = active_hold(self.user, cleaned_data.get('hold'))
+        self.slot_hold = hold
+        if (
+            hold is not None
+            and hold.service_id == service.id
+            and hold.date == day
+            and hold.time == start_time
+            and (vet is None or vet.id == hold.veterinarian_id)
+        ):
+            cleaned_data['veterinarian'] = hold.veterinarian
+            return cleaned_data
+
+        # Validar contra la disponibilidad real antes de guardar
+        index = build_slot_index(
+            service, day, days=1, vet_id=vet.id if vet else None, exclude_hold=hold.id if hold else None,
+        )
+        if vet:
+            if not index.is_available(vet.id, day, start_time):
+                raise forms.ValidationError(
+                    'El veterinario seleccionado no está disponible en ese horario.'
+                )
+        else:
+            vet = index.first_free_vet(day, start_time)
+            if vet is None:
+                raise forms.ValidationError(
+                    'No hay veterinarios disponibles en ese horario. Elige otro.'
+                )
+            cleaned_data['veterinarian'] = vet
+
+        return cleaned_data
+
 
 from django import forms
 from django.contrib.auth.models import User
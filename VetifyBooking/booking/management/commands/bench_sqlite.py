@@ -0,0 +1,199 @@
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+
+from booking.dbretry import is_busy_error, run_write_transaction
+from booking.models import Appointment, Pet, Service, Veterinarian
+
+
+# (nombre, cambios sobre DATABASES['default'], reintentar escrituras)
+PROFILES = [
+    ('sin ajustes', {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {}}, False),
+    ('producción', {}, True),
+]
+
+USERS = 50
+APPOINTMENTS = 2000
+STATUSES = ['pending', 'confirmed', 'completed', 'cancelled']
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide lecturas y escrituras concurrentes en una base SQLite temporal, '
+        'con la configuración por defecto y con la de settings (WAL, pragmas, '
+        'conexiones persistentes y reintentos)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Hilos concurrentes')
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duración de cada medición')
+        parser.add_argument(
+            '--writes',
+            type=float,
+            default=0.2,
+            help='Fracción de operaciones que son escrituras (0-1)',
+        )
+
+    def handle(self, *args, **options):
+        base = connections['default'].settings_dict
+        with tempfile.TemporaryDirectory() as tmp:
+            for index, (label, overrides, retry) in enumerate(PROFILES):
+                alias = f'bench_{index}'
+                connections.settings[alias] = {
+                    **base,
+                    **overrides,
+                    'NAME': os.path.join(tmp, f'{alias}.sqlite3'),
+                }
+                try:
+                    self.stdout.write(f'Preparando "{label}"...')
+                    call_command('migrate', database=alias, verbosity=0, interactive=False)
+                    ids = self._seed(alias)
+                    connections[alias].close()
+                    stats = self._measure(alias, ids, retry, options)
+                finally:
+                    connections[alias].close()
+                    del connections.settings[alias]
+                self._report(label, stats, options['seconds'])
+
+    def _seed(self, alias):
+        """Datos de prueba con bulk_create: las señales escribirían en 'default'."""
+        rng = random.Random(0)
+        password = make_password('bench')
+        users = User.objects.using(alias).bulk_create([
+            User(username=f'bench{n}', password=password) for n in range(USERS)
+        ])
+        pets = Pet.objects.using(alias).bulk_create([
+            Pet(owner=user, name=f'Mascota {user.id}', pet_type='dog', weight=10) for user in users
+        ])
+        service = Service.objects.using(alias).bulk_create([
+            Service(name='Consulta', description='General', duration=30, price=300),
+        ])[0]
+        vet = Veterinarian.objects.using(alias).bulk_create([
+            Veterinarian(
+                name='Ana', specialty='general', license_number='1',
+                email='ana@example.com', phone='555', years_experience=5,
+            ),
+        ])[0]
+
+        start = date.today()
+        appointments = Appointment.objects.using(alias).bulk_create([
+            self._appointment(rng, pets, service, vet, start) for _ in range(APPOINTMENTS)
+        ], batch_size=500)
+        return {
+            'pets': pets,
+            'service': service,
+            'vet': vet,
+            'start': start,
+            'appointments': [appointment.id for appointment in appointments],
+        }
+
+    def _appointment(self, rng, pets, service, vet, start):
+        pet = rng.choice(pets)
+        return Appointment(
+            user_id=pet.owner_id,
+            pet=pet,
+            service=service,
+            veterinarian=vet,
+            date=start + timedelta(days=rng.randrange(60)),
+            time=f'{rng.randrange(9, 18):02d}:{rng.choice(["00", "30"])}',
+            status=rng.choice(STATUSES),
+        )
+
+    def _read(self, alias, rng, ids):
+        pet = rng.choice(ids['pets'])
+        list(
+            Appointment.objects.using(alias)
+            .filter(user_id=pet.owner_id)
+            .select_related('pet')
+            .order_by('-date', '-time')[:20]
+        )
+        Appointment.objects.using(alias).filter(date=ids['start'] + timedelta(days=rng.randrange(60))).count()
+
+    def _write(self, alias, rng, ids):
+        # Lee y luego escribe en la misma transacción, como una reserva
+        appointment = self._appointment(rng, ids['pets'], ids['service'], ids['vet'], ids['start'])
+        Appointment.objects.using(alias).filter(date=appointment.date, veterinarian=ids['vet']).count()
+        Appointment.objects.using(alias).bulk_create([appointment])
+        Appointment.objects.using(alias).filter(
+            id=rng.choice(ids['appointments'])
+        ).update(status=rng.choice(STATUSES))
+
+    def _worker(self, alias, ids, retry, write_ratio, seed, barrier, deadline, stats, lock):
+        rng = random.Random(seed)
+        connection = connections[alias]
+        local = {'reads': 0, 'writes': 0, 'locked': 0, 'write_latencies': []}
+        barrier.wait()
+        try:
+            while time.perf_counter() < deadline[0]:
+                is_write = rng.random() < write_ratio
+                started = time.perf_counter()
+                try:
+                    if not is_write:
+                        self._read(alias, rng, ids)
+                    elif retry:
+                        run_write_transaction(self._write, alias, rng, ids, using=alias)
+                    else:
+                        with transaction.atomic(using=alias):
+                            self._write(alias, rng, ids)
+                except OperationalError as error:
+                    if not is_busy_error(error):
+                        raise
+                    local['locked'] += 1
+                else:
+                    if is_write:
+                        local['writes'] += 1
+                        local['write_latencies'].append(time.perf_counter() - started)
+                    else:
+                        local['reads'] += 1
+                finally:
+                    # Fin de la "petición": lo mismo que hace request_finished
+                    connection.close_if_unusable_or_obsolete()
+        finally:
+            connection.close()
+            with lock:
+                for key in ('reads', 'writes', 'locked'):
+                    stats[key] += local[key]
+                stats['write_latencies'].extend(local['write_latencies'])
+
+    def _measure(self, alias, ids, retry, options):
+        threads_count = max(options['threads'], 1)
+        stats = {'reads': 0, 'writes': 0, 'locked': 0, 'write_latencies': []}
+        lock = threading.Lock()
+        # El reloj empieza cuando todos los hilos están listos
+        deadline = []
+        barrier = threading.Barrier(
+            threads_count,
+            action=lambda: deadline.append(time.perf_counter() + options['seconds']),
+        )
+        threads = [
+            threading.Thread(
+                target=self._worker,
+                args=(alias, ids, retry, options['writes'], seed, barrier, deadline, stats, lock),
+            )
+            for seed in range(threads_count)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return stats
+
+    def _report(self, label, stats, seconds):
+        latencies = sorted(stats['write_latencies'])
+        p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0
+        self.stdout.write(
+            f'{label:>12}: {stats["reads"] / seconds:8.0f} lecturas/s  '
+            f'{stats["writes"] / seconds:7.0f} escrituras/s  '
+            f'{stats["locked"]:5d} "database is locked"  '
+            f'p95 escritura {p95:6.1f} ms'
+        )
+
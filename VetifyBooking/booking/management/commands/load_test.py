@@ -0,0 +1,501 @@
+import json
+import logging
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from datetime import timedelta
+from http.cookiejar import CookieJar
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from booking.dbretry import is_busy_error
+from booking.models import Appointment, MedicalConsultation, Service
+
+
+# Nota que llevan las citas de la prueba, para borrarlas al terminar
+LOAD_TEST_NOTE = 'Prueba de carga'
+
+# Límites superiores (ms) de las barras del histograma de latencias
+HISTOGRAM_BUCKETS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+# Consultas al estado de un PDF encolado antes de darlo por perdido
+PDF_POLLS = 10
+PDF_POLL_INTERVAL = 0.5
+
+BUSY_TEXT = b'database is locked'
+
+# Intentos de inicio de sesión cuando SQLite está bloqueado: todos los
+# usuarios entran a la vez y sin sesión no hay escenario que medir
+LOGIN_ATTEMPTS = 5
+
+
+# =========================
+#   TRANSPORTES
+# =========================
+class InProcessTransport:
+    """Peticiones a la aplicación WSGI en el mismo proceso (el cliente de pruebas de Django)."""
+
+    def __init__(self):
+        self.client = Client(enforce_csrf_checks=True)
+
+    def request(self, method, path, data=None, headers=None):
+        """Devuelve (estado, cuerpo). Los errores de base de datos se relanzan."""
+        response = getattr(self.client, method)(path, data or {}, headers=headers or {})
+        if response.streaming:
+            return response.status_code, b''.join(response.streaming_content)
+        return response.status_code, response.content
+
+    def csrf_token(self):
+        cookie = self.client.cookies.get(settings.CSRF_COOKIE_NAME)
+        return cookie.value if cookie else ''
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Igual que el cliente de pruebas: una redirección es la respuesta, no se sigue
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpTransport:
+    """Peticiones HTTP a un servidor en marcha, con cookies propias por sesión."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect)
+
+    def request(self, method, path, data=None, headers=None):
+        url = self.base_url + path
+        body = None
+        if method == 'get' and data:
+            url = f'{url}?{urllib.parse.urlencode(data, doseq=True)}'
+        elif method == 'post':
+            body = urllib.parse.urlencode(data or {}, doseq=True).encode()
+        request = urllib.request.Request(url, data=body, headers=headers or {}, method=method.upper())
+        try:
+            with self.opener.open(request, timeout=60) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, error.read()
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == settings.CSRF_COOKIE_NAME:
+                return cookie.value
+        return ''
+
+
+# =========================
+#   SESIONES
+# =========================
+class Session:
+    """Un usuario virtual: su transporte, sus datos y las mediciones de sus pasos."""
+
+    def __init__(self, transport, stats, rng):
+        self.transport = transport
+        self.stats = stats
+        self.rng = rng
+        self.last_outcome = None
+
+    def step(self, scenario, name, method, path, data=None, ok=(200,), conflict=(409,), headers=None):
+        """
+        Hace una petición y la anota como ok, conflicto (el horario ya se lo
+        llevó otro), bloqueo de SQLite o error. Devuelve (estado, cuerpo), con
+        estado None si la petición lanzó una excepción.
+        """
+        if method == 'post':
+            data = {**(data or {}), 'csrfmiddlewaretoken': self.transport.csrf_token()}
+        started = time.perf_counter()
+        try:
+            status, body = self.transport.request(method, path, data, headers)
+        except Exception as error:
+            outcome = 'locked' if is_busy_error(error) else 'error'
+            status, body = None, b''
+        else:
+            if status in ok:
+                outcome = 'ok'
+            elif status in conflict:
+                outcome = 'conflict'
+            elif status >= 500 and BUSY_TEXT in body:
+                outcome = 'locked'
+            else:
+                outcome = 'error'
+        entry = self.stats[(scenario, name)]
+        entry['latencies'].append((time.perf_counter() - started) * 1000)
+        entry[outcome] += 1
+        self.last_outcome = outcome
+        return status, body
+
+    def login(self, scenario, path, username, password):
+        self.step(scenario, 'form', 'get', path)
+        for attempt in range(LOGIN_ATTEMPTS):
+            status, _ = self.step(
+                scenario, 'submit', 'post', path, {'username': username, 'password': password}, ok=(302,)
+            )
+            if self.last_outcome != 'locked':
+                return status == 302
+            # Cada intento espera un poco más, con azar para no chocar otra vez
+            time.sleep(self.rng.uniform(0.05, 0.2) * (attempt + 1))
+        return False
+
+
+def empty_entry():
+    return {'latencies': [], 'ok': 0, 'conflict': 0, 'locked': 0, 'error': 0}
+
+
+# =========================
+#   ESCENARIOS
+# =========================
+def booking_flow(session, customer, options):
+    """Elige servicio, día y horario libre, lo aparta y confirma la cita."""
+    session.step('booking', 'form', 'get', reverse('booking'))
+    service_id = session.rng.choice(customer['services'])
+    day = timezone.localdate() + timedelta(days=session.rng.randrange(1, options['days'] + 1))
+    status, body = session.step(
+        'booking', 'slots', 'get', reverse('available_slots', args=[service_id]),
+        {'date': day.isoformat(), 'days': 1},
+    )
+    if status != 200:
+        return
+    free = [
+        (vet['id'], slot)
+        for day_slots in json.loads(body)['days']
+        for vet in day_slots['vets']
+        for slot in vet['slots']
+    ]
+    if not free:
+        return
+    vet_id, start = session.rng.choice(free)
+
+    slot = {'service': service_id, 'date': day.isoformat(), 'time': start, 'vet': vet_id}
+    status, body = session.step('booking', 'hold', 'post', reverse('create_slot_hold'), slot, ok=(201,))
+    if status != 201:
+        return
+    hold = json.loads(body)['hold']
+    # Un formulario con errores (el horario ya no está) vuelve con 200: es un conflicto
+    session.step('booking', 'submit', 'post', reverse('booking'), {
+        'pet': session.rng.choice(customer['pets']),
+        'service': service_id,
+        'veterinarian': vet_id,
+        'date': day.isoformat(),
+        'time': start,
+        'hold': hold,
+        'notes': LOAD_TEST_NOTE,
+    }, ok=(302,), conflict=(200, 409))
+    session.step('booking', 'appointments', 'get', reverse('appointments'))
+
+
+def history_flow(session, customer, options):
+    """Revisa sus citas y su historial y descarga el PDF de una consulta."""
+    session.step('history', 'appointments', 'get', reverse('appointments'))
+    session.step('history', 'medical_history', 'get', reverse('medical_history'))
+    if not customer['consultations']:
+        return
+    consultation_id = session.rng.choice(customer['consultations'])
+    status, body = session.step(
+        'history', 'pdf', 'get', reverse('export_consultation_pdf', args=[consultation_id]),
+        ok=(200, 202), headers={'Accept': 'application/json'},
+    )
+    if status != 202:
+        return
+    # Encolado: se consulta el estado como lo haría la página
+    status_url = json.loads(body)['status_url']
+    for _ in range(PDF_POLLS):
+        time.sleep(PDF_POLL_INTERVAL)
+        status, body = session.step('history', 'pdf_status', 'get', status_url)
+        if status == 200 and json.loads(body)['ready']:
+            session.step('history', 'pdf', 'get', json.loads(body)['download_url'])
+            return
+
+
+SCENARIOS = {
+    'booking': booking_flow,
+    'history': history_flow,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga con usuarios virtuales concurrentes (hilos): inicio de '
+        'sesión, reservas, citas, historial con PDF y consultas periódicas al '
+        'dashboard, contra la aplicación en el mismo proceso o contra un '
+        'servidor local (--url). Informa de rendimiento, latencias y tasas de '
+        'error y de bloqueo por escenario. Las citas creadas se borran al final'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Servidor en marcha (p. ej. http://127.0.0.1:8000); sin él, en proceso')
+        parser.add_argument('--threads', type=int, default=8, help='Clientes concurrentes')
+        parser.add_argument('--admins', type=int, default=1, help='Administradores consultando el dashboard')
+        parser.add_argument('--seconds', type=float, default=30.0, help='Duración de la prueba')
+        parser.add_argument(
+            '--mix',
+            default='booking=3,history=2',
+            help='Peso de cada escenario de cliente (booking, history)',
+        )
+        parser.add_argument('--think', type=float, default=0.0, help='Pausa media entre escenarios (s)')
+        parser.add_argument('--poll-interval', type=float, default=5.0, help='Cada cuánto se recarga el dashboard (s)')
+        parser.add_argument('--days', type=int, default=30, help='Días hacia delante en los que se reserva')
+        parser.add_argument('--password', default='vetify123', help='Contraseña de los clientes')
+        parser.add_argument('--admin', help='Superusuario del dashboard (por defecto, el primero)')
+        parser.add_argument('--admin-password', help='Contraseña del superusuario (por defecto, --password)')
+        parser.add_argument('--seed', type=int, default=0, help='Semilla')
+        parser.add_argument('--output', help='Archivo JSON con los resultados')
+        parser.add_argument('--keep', action='store_true', help='No borra las citas creadas por la prueba')
+
+    def handle(self, *args, **options):
+        mix = self._mix(options['mix'])
+        customers = self._customers(options['threads'], options['seed'])
+        admin = self._admin(options) if options['admins'] else None
+        started_at = timezone.now()
+
+        # Los avisos de presupuesto de consultas de cada petición taparían el informe
+        budget_logger = logging.getLogger('VetifyBooking.querybudget')
+        previous_level = budget_logger.level
+        budget_logger.setLevel(logging.ERROR)
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                stats, elapsed = self._run(customers, admin, mix, options)
+        finally:
+            budget_logger.setLevel(previous_level)
+
+        results = self._summary(stats, elapsed)
+        self._report(results, elapsed)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f'Resultados guardados en {options["output"]}'))
+
+        if not options['keep']:
+            created = Appointment.objects.filter(notes=LOAD_TEST_NOTE, created_at__gte=started_at)
+            deleted, _ = created.delete()
+            self.stdout.write(f'Borrados {deleted} registros creados por la prueba')
+
+    def _mix(self, value):
+        mix = {}
+        for part in value.split(','):
+            name, _, weight = part.partition('=')
+            name = name.strip()
+            if name not in SCENARIOS:
+                raise CommandError(f'Escenario desconocido: {name} (válidos: {", ".join(SCENARIOS)})')
+            try:
+                mix[name] = float(weight or 1)
+            except ValueError:
+                raise CommandError(f'Peso inválido para {name}: {weight}')
+        return mix
+
+    def _customers(self, count, seed):
+        """Clientes con mascotas, con sus ids precargados para que los hilos no consulten la base."""
+        services = list(Service.objects.filter(is_active=True).values_list('id', flat=True))
+        if not services:
+            raise CommandError('No hay servicios activos')
+        candidates = list(
+            User.objects.filter(is_superuser=False, is_active=True, pets__isnull=False)
+            .distinct().order_by('id').values_list('id', 'username')[:max(count, 1) * 20]
+        )
+        if not candidates:
+            raise CommandError('No hay clientes con mascotas (ver seed_synthetic)')
+        chosen = random.Random(seed).sample(candidates, min(count, len(candidates)))
+
+        customers = []
+        for user_id, username in chosen:
+            user = User.objects.get(id=user_id)
+            customers.append({
+                'username': username,
+                'pets': list(user.pets.values_list('id', flat=True)),
+                'consultations': list(
+                    MedicalConsultation.objects.filter(appointment__user=user)
+                    .order_by('-id').values_list('id', flat=True)[:20]
+                ),
+                'services': services,
+            })
+        # Con menos clientes que hilos, varios hilos comparten usuario
+        return [customers[index % len(customers)] for index in range(count)]
+
+    def _admin(self, options):
+        admins = User.objects.filter(is_superuser=True, is_active=True).order_by('id')
+        if options['admin']:
+            admins = admins.filter(username=options['admin'])
+        username = admins.values_list('username', flat=True).first()
+        if username is None:
+            raise CommandError('Hace falta un superusuario activo para el dashboard (o --admins 0)')
+        return {'username': username, 'password': options['admin_password'] or options['password']}
+
+    def _transport(self, options):
+        return HttpTransport(options['url']) if options['url'] else InProcessTransport()
+
+    # =========================
+    #   HILOS
+    # =========================
+    def _customer_worker(self, customer, mix, options, seed, barrier, deadline, stats, lock):
+        rng = random.Random(seed)
+        local = defaultdict(empty_entry)
+        session = Session(self._transport(options), local, rng)
+        names, weights = list(mix), list(mix.values())
+        try:
+            # El inicio de sesión se mide, pero fuera de la ventana: el hash de la
+            # contraseña de todos los hilos a la vez no es el régimen normal
+            logged_in = session.login('login', reverse('login'), customer['username'], options['password'])
+            barrier.wait()
+            if logged_in:
+                while time.perf_counter() < deadline[0]:
+                    SCENARIOS[rng.choices(names, weights)[0]](session, customer, options)
+                    if options['think']:
+                        time.sleep(rng.expovariate(1 / options['think']))
+        finally:
+            connection.close()
+            self._merge(stats, local, lock)
+
+    def _admin_worker(self, admin, options, seed, barrier, deadline, stats, lock):
+        rng = random.Random(seed)
+        local = defaultdict(empty_entry)
+        session = Session(self._transport(options), local, rng)
+        try:
+            path = reverse('admin_dashboard:admin_login')
+            logged_in = session.login('admin_login', path, admin['username'], admin['password'])
+            barrier.wait()
+            if logged_in:
+                while time.perf_counter() < deadline[0]:
+                    session.step('dashboard', 'poll', 'get', reverse('admin_dashboard:dashboard'))
+                    time.sleep(options['poll_interval'])
+        finally:
+            connection.close()
+            self._merge(stats, local, lock)
+
+    def _merge(self, stats, local, lock):
+        with lock:
+            for key, entry in local.items():
+                total = stats[key]
+                total['latencies'].extend(entry['latencies'])
+                for outcome in ('ok', 'conflict', 'locked', 'error'):
+                    total[outcome] += entry[outcome]
+
+    def _run(self, customers, admin, mix, options):
+        stats = defaultdict(empty_entry)
+        lock = threading.Lock()
+        admins = options['admins'] if admin else 0
+        # El reloj empieza cuando todos los hilos están listos
+        deadline = []
+        barrier = threading.Barrier(
+            len(customers) + admins,
+            action=lambda: deadline.append(time.perf_counter() + options['seconds']),
+        )
+        threads = [
+            threading.Thread(
+                target=self._customer_worker,
+                args=(customer, mix, options, options['seed'] + index, barrier, deadline, stats, lock),
+            )
+            for index, customer in enumerate(customers)
+        ] + [
+            threading.Thread(
+                target=self._admin_worker,
+                args=(admin, options, options['seed'] - index - 1, barrier, deadline, stats, lock),
+            )
+            for index in range(admins)
+        ]
+        self.stdout.write(
+            f'{len(customers)} clientes y {admins} administradores durante {options["seconds"]:.0f} s '
+            f'contra {options["url"] or "la aplicación en proceso"}...'
+        )
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Los que seguían en su último escenario terminan después del plazo
+        return stats, max(time.perf_counter() - (deadline[0] - options['seconds']), options['seconds'])
+
+    # =========================
+    #   INFORME
+    # =========================
+    def _summary(self, stats, elapsed):
+        steps = {}
+        scenarios = defaultdict(empty_entry)
+        for (scenario, name), entry in sorted(stats.items()):
+            steps[f'{scenario}:{name}'] = self._figures(entry, elapsed)
+            total = scenarios[scenario]
+            total['latencies'].extend(entry['latencies'])
+            for outcome in ('ok', 'conflict', 'locked', 'error'):
+                total[outcome] += entry[outcome]
+
+        booked = stats.get(('booking', 'submit'), empty_entry())['ok']
+        return {
+            'seconds': round(elapsed, 1),
+            'bookings_per_second': round(booked / elapsed, 2),
+            'requests_per_second': round(sum(len(e['latencies']) for e in stats.values()) / elapsed, 1),
+            'scenarios': {
+                scenario: {**self._figures(entry, elapsed), 'histogram': self._histogram(entry['latencies'])}
+                for scenario, entry in scenarios.items()
+            },
+            'steps': steps,
+        }
+
+    def _figures(self, entry, elapsed):
+        latencies = sorted(entry['latencies'])
+        requests = len(latencies)
+
+        def percentile(fraction):
+            return round(latencies[min(requests - 1, int(requests * fraction))], 1) if requests else None
+
+        return {
+            'requests': requests,
+            'per_second': round(requests / elapsed, 2),
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+            'p99_ms': percentile(0.99),
+            'max_ms': round(latencies[-1], 1) if requests else None,
+            'error_rate': round(entry['error'] / requests, 4) if requests else 0,
+            'lock_rate': round(entry['locked'] / requests, 4) if requests else 0,
+            'conflict_rate': round(entry['conflict'] / requests, 4) if requests else 0,
+        }
+
+    def _histogram(self, latencies):
+        """{'<=N ms': peticiones}, con una barra final para lo que pasa del último límite."""
+        counts = dict.fromkeys([f'<={bound}ms' for bound in HISTOGRAM_BUCKETS] + [f'>{HISTOGRAM_BUCKETS[-1]}ms'], 0)
+        labels = list(counts)
+        for latency in latencies:
+            index = next(
+                (position for position, bound in enumerate(HISTOGRAM_BUCKETS) if latency <= bound),
+                len(HISTOGRAM_BUCKETS),
+            )
+            counts[labels[index]] += 1
+        return counts
+
+    def _report(self, results, elapsed):
+        self.stdout.write(
+            f'\n{"Paso":<32} {"peticiones":>10} {"req/s":>8} {"p50":>8} {"p95":>8} {"p99":>8} '
+            f'{"errores":>8} {"bloqueos":>8} {"conflictos":>10}'
+        )
+        for name, figures in results['steps'].items():
+            self.stdout.write(self._row(name, figures))
+
+        for scenario, figures in results['scenarios'].items():
+            self.stdout.write(f'\n{self._row(scenario, figures)}')
+            most = max(figures['histogram'].values()) or 1
+            for label, count in figures['histogram'].items():
+                self.stdout.write(f'  {label:>9} {count:>8} {"#" * round(40 * count / most)}')
+
+        self.stdout.write(
+            f'\n{results["requests_per_second"]:.1f} peticiones/s, '
+            f'{results["bookings_per_second"]:.2f} reservas confirmadas/s en {elapsed:.1f} s'
+        )
+
+    def _row(self, name, figures):
+        def ms(value):
+            return f'{value:>6.1f}ms' if value is not None else f'{"-":>8}'
+
+        return (
+            f'{name:<32} {figures["requests"]:>10} {figures["per_second"]:>8.1f} '
+            f'{ms(figures["p50_ms"])} {ms(figures["p95_ms"])} {ms(figures["p99_ms"])} '
+            f'{figures["error_rate"]:>8.1%} {figures["lock_rate"]:>8.1%} {figures["conflict_rate"]:>10.1%}'
+        )
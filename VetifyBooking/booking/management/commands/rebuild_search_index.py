@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from booking.search import fts_enabled, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de texto completo de las consultas'
+
+    def handle(self, *args, **options):
+        if not fts_enabled():
+            self.stdout.write('La base de datos no es SQLite: la búsqueda usa icontains, no hay índice')
+            return
+        with transaction.atomic():
+            total = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'{total} consultas indexadas'))
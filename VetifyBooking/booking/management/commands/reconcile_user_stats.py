@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from booking.userstats import reconcile_user_stats
+
+
+class Command(BaseCommand):
+    help = 'Verifica las estadísticas por usuario de UserProfile y corrige las desviaciones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo informa de las diferencias, sin corregirlas',
+        )
+
+    def handle(self, *args, **options):
+        drifted, created = reconcile_user_stats(dry_run=options['dry_run'])
+        for user_id, changed in drifted:
+            self.stdout.write(f'Usuario {user_id}: {", ".join(changed)}')
+
+        if options['dry_run']:
+            self.stdout.write(
+                f'{len(drifted)} perfil(es) con desviación y {created} usuario(s) sin perfil'
+            )
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Corregidos {len(drifted)} perfil(es); creados {created} perfil(es)'
+        ))
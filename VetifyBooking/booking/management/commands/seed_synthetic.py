@@ -0,0 +1,558 @@
+import math
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from booking.catalog import invalidate_catalog
+from booking.models import (
+    Appointment,
+    ClinicSchedule,
+    MedicalConsultation,
+    MedicalPrescription,
+    Pet,
+    PrescriptionItem,
+    Service,
+    SlotClaim,
+    Vaccine,
+    Veterinarian,
+)
+from booking.occupancy import BLOCKING_STATUSES, SLOT_MINUTES
+from booking.reservations import claimed_slots
+
+
+# =========================
+#   CATÁLOGOS DE EJEMPLO
+# =========================
+FIRST_NAMES = [
+    'María', 'José', 'Juan', 'Ana', 'Luis', 'Carmen', 'Carlos', 'Laura', 'Jorge', 'Sofía',
+    'Miguel', 'Lucía', 'Javier', 'Elena', 'Pedro', 'Paula', 'Andrés', 'Valeria', 'Fernando', 'Daniela',
+    'Ricardo', 'Gabriela', 'Alejandro', 'Mónica', 'Raúl', 'Patricia', 'Diego', 'Adriana', 'Héctor', 'Verónica',
+]
+LAST_NAMES = [
+    'García', 'Hernández', 'Martínez', 'López', 'González', 'Pérez', 'Rodríguez', 'Sánchez', 'Ramírez', 'Cruz',
+    'Flores', 'Gómez', 'Morales', 'Vázquez', 'Jiménez', 'Reyes', 'Díaz', 'Torres', 'Gutiérrez', 'Ruiz',
+    'Mendoza', 'Aguilar', 'Ortiz', 'Moreno', 'Castillo', 'Romero', 'Álvarez', 'Méndez', 'Chávez', 'Rivera',
+]
+EMAIL_DOMAINS = ['gmail.com', 'hotmail.com', 'outlook.com', 'yahoo.com.mx', 'icloud.com']
+
+PET_NAMES = [
+    'Max', 'Luna', 'Rocky', 'Kira', 'Toby', 'Nala', 'Coco', 'Lola', 'Bruno', 'Mia',
+    'Simba', 'Canela', 'Thor', 'Frida', 'Chispa', 'Milo', 'Pelusa', 'Oreo', 'Manchas', 'Princesa',
+    'Zeus', 'Bella', 'Firulais', 'Michi', 'Nieve', 'Tommy', 'Pirata', 'Chocolate', 'Pancho', 'Lucky',
+]
+# tipo -> (peso en la población, razas, rango de peso en kg)
+PET_TYPES = {
+    'dog': (55, ['Mestizo', 'Labrador', 'Chihuahua', 'Pastor Alemán', 'Poodle', 'Schnauzer', 'Pug', 'Beagle'], (2.5, 45)),
+    'cat': (35, ['Mestizo', 'Siamés', 'Persa', 'Maine Coon', 'Bengalí'], (2.5, 7.5)),
+    'other': (10, ['Conejo', 'Hurón', 'Hámster', 'Tortuga', 'Periquito'], (0.1, 4)),
+}
+VACCINES = {
+    'dog': ['Rabia', 'Múltiple canina', 'Parvovirus', 'Moquillo', 'Bordetella', 'Leptospirosis'],
+    'cat': ['Rabia', 'Triple felina', 'Leucemia felina'],
+    'other': ['Mixomatosis', 'Hemorrágica vírica'],
+}
+
+# nombre, duración, precio, peso en la demanda
+SERVICES = [
+    ('Consulta general', 30, 350, 40),
+    ('Vacunación', 15, 250, 25),
+    ('Desparasitación', 15, 200, 10),
+    ('Estética', 60, 400, 10),
+    ('Limpieza dental', 60, 900, 7),
+    ('Cirugía menor', 60, 1800, 8),
+]
+SPECIALTIES = [code for code, _ in Veterinarian.SPECIALTIES]
+WORK_DAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday']
+
+# motivo, síntomas, diagnóstico, tratamiento
+CLINICAL_CASES = [
+    ('Revisión anual', 'Sin síntomas aparentes', 'Paciente sano', 'Continuar con dieta y ejercicio habituales'),
+    ('Vómito y diarrea', 'Vómito intermitente, heces blandas, apatía', 'Gastroenteritis aguda', 'Dieta blanda, hidratación y antiemético'),
+    ('Comezón constante', 'Rascado, enrojecimiento y pérdida de pelo', 'Dermatitis alérgica', 'Antihistamínico y baño medicado'),
+    ('Cojera', 'Apoyo parcial de la extremidad posterior', 'Esguince leve', 'Reposo y antiinflamatorio'),
+    ('Tos', 'Tos seca y estornudos', 'Traqueobronquitis infecciosa', 'Antibiótico y antitusivo'),
+    ('Otitis', 'Sacude la cabeza, secreción en el oído', 'Otitis externa', 'Limpieza ótica y gotas'),
+    ('Sarro', 'Mal aliento y encías inflamadas', 'Enfermedad periodontal', 'Limpieza dental programada'),
+    ('Pérdida de apetito', 'Come poco desde hace tres días', 'Gingivitis', 'Analgésico y alimento húmedo'),
+    ('Herida', 'Corte en almohadilla', 'Laceración superficial', 'Limpieza, sutura y antibiótico tópico'),
+    ('Control de peso', 'Aumento de peso progresivo', 'Sobrepeso', 'Plan de alimentación y control mensual'),
+]
+# medicamento, dosis, frecuencia, duración, vía
+MEDICATIONS = [
+    ('Amoxicilina', '250 mg', 'Cada 12 horas', '7 días', 'oral'),
+    ('Meloxicam', '0.1 mg/kg', 'Cada 24 horas', '5 días', 'oral'),
+    ('Metronidazol', '15 mg/kg', 'Cada 12 horas', '5 días', 'oral'),
+    ('Maropitant', '1 mg/kg', 'Cada 24 horas', '3 días', 'injectable'),
+    ('Clorhexidina', 'Aplicación local', 'Cada 12 horas', '10 días', 'topical'),
+    ('Otomax', '4 gotas', 'Cada 12 horas', '7 días', 'otic'),
+    ('Tobramicina', '1 gota', 'Cada 8 horas', '7 días', 'ophthalmic'),
+    ('Prednisolona', '0.5 mg/kg', 'Cada 24 horas', '10 días', 'oral'),
+    ('Cefalexina', '22 mg/kg', 'Cada 12 horas', '10 días', 'oral'),
+    ('Ivermectina', '0.2 mg/kg', 'Dosis única', '1 día', 'injectable'),
+]
+
+# Estados según la cita ya pasó o está por venir
+PAST_STATUSES = (['completed', 'cancelled', 'confirmed', 'pending'], [82, 12, 3, 3])
+FUTURE_STATUSES = (['pending', 'confirmed', 'cancelled'], [55, 40, 5])
+
+# Demanda relativa por día de la semana (lunes = 0)
+WEEKDAY_DEMAND = [1.2, 1.0, 1.0, 1.05, 1.15, 0.8, 0.0]
+
+# Ocupación media de las agendas al calcular cuántos veterinarios hacen falta
+TARGET_OCCUPANCY = 0.7
+
+# Consultas completadas que terminan con receta y medicamentos por receta
+PRESCRIPTION_RATE = 0.7
+ITEMS_PER_PRESCRIPTION = ([1, 2, 3, 4], [45, 30, 18, 7])
+
+_INSERT_CLAIM = (
+    f"INSERT INTO {SlotClaim._meta.db_table} (veterinarian_id, date, slot, appointment_id) "
+    "VALUES (%s, %s, %s, %s)"
+)
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """
+    Desactiva auto_now/auto_now_add mientras se carga, para repartir las
+    fechas de alta en el tiempo en lugar de dejarlas todas en el momento de
+    la carga.
+    """
+    fields = [
+        (field, field.auto_now, field.auto_now_add)
+        for model in models
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    for field, _, _ in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in fields:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def skewed_index(rng, size, skew):
+    """Índice en [0, size) con más peso en los primeros: unos pocos clientes concentran la actividad."""
+    return min(int(size * rng.random() ** skew), size - 1)
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera datos sintéticos a escala de producción (usuarios, mascotas, citas, '
+        'consultas con recetas y vacunas) con bulk_create por lotes, y reconstruye '
+        'después las tablas derivadas'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000, help='Usuarios')
+        parser.add_argument('--pets', type=int, default=250_000, help='Mascotas')
+        parser.add_argument('--appointments', type=int, default=2_000_000, help='Citas')
+        parser.add_argument('--consultations', type=int, default=300_000, help='Consultas (con receta la mayoría)')
+        parser.add_argument('--vaccines', type=int, default=1_000_000, help='Vacunas aplicadas')
+        parser.add_argument(
+            '--vets',
+            type=int,
+            default=0,
+            help='Veterinarios nuevos (por defecto, los necesarios para una ocupación del 70%%)',
+        )
+        parser.add_argument('--past-days', type=int, default=5 * 365, help='Días de historial')
+        parser.add_argument('--future-days', type=int, default=90, help='Días de agenda futura')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Filas por bulk_create')
+        parser.add_argument('--seed', type=int, default=0, help='Semilla (misma semilla, mismos datos)')
+        parser.add_argument('--prefix', default='synth', help='Prefijo de los usuarios generados')
+        parser.add_argument('--password', default='vetify123', help='Contraseña de los usuarios generados')
+        parser.add_argument(
+            '--no-rebuild',
+            action='store_true',
+            help='No reconstruye estadísticas, resúmenes ni índices de búsqueda al terminar',
+        )
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=options['prefix']).exists():
+            raise CommandError(
+                f'Ya hay usuarios con el prefijo "{options["prefix"]}": usa otro --prefix'
+            )
+        if options['pets'] and not options['users']:
+            raise CommandError('Las mascotas necesitan al menos un usuario')
+        if options['appointments'] and not options['pets']:
+            raise CommandError('Las citas necesitan al menos una mascota')
+        if options['vaccines'] and not options['pets']:
+            raise CommandError('Las vacunas necesitan al menos una mascota')
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = max(options['batch_size'], 1)
+        self.today = timezone.localdate()
+        self.first_day = self.today - timedelta(days=options['past_days'])
+        self.last_day = self.today + timedelta(days=options['future_days'])
+
+        with explicit_timestamps(Pet, Appointment, MedicalConsultation, MedicalPrescription, Vaccine):
+            services = self._phase('Catálogo', self._catalog)
+            users = self._phase('Usuarios', self._users, options['users'], options['prefix'], options['password'])
+            pets = self._phase('Mascotas', self._pets, users, options['pets'])
+            vets = self._phase('Veterinarios', self._vets, services, options['vets'], options['appointments'])
+            self._phase('Citas', self._appointments, pets, services, vets, options['appointments'])
+            self._phase('Consultas y recetas', self._consultations, vets, options['consultations'])
+            self._phase('Vacunas', self._vaccines, pets, options['vaccines'])
+
+        # bulk_create no dispara señales: catálogo, estadísticas e índices se rehacen aquí
+        invalidate_catalog()
+        if not options['no_rebuild']:
+            for command in (
+                'reconcile_user_stats', 'rebuild_daily_stats', 'rebuild_report_cube',
+                'rebuild_search_index', 'rebuild_omnisearch',
+            ):
+                self._phase(command, call_command, command, stdout=self.stdout)
+
+    def _phase(self, label, func, *args, **kwargs):
+        started = time.perf_counter()
+        self.stdout.write(f'{label}...')
+        result = func(*args, **kwargs)
+        self.stdout.write(f'  {time.perf_counter() - started:.1f} s')
+        return result
+
+    def _bulk(self, model, rows):
+        """Inserta `rows` (iterable) por lotes; devuelve las instancias creadas."""
+        created = []
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                created.extend(self._insert(model, batch))
+                batch = []
+        if batch:
+            created.extend(self._insert(model, batch))
+        return created
+
+    def _insert(self, model, batch):
+        with transaction.atomic():
+            return model.objects.bulk_create(batch, batch_size=self.batch_size)
+
+    def _moment(self, day, start_hour=8, end_hour=20):
+        """Fecha y hora consciente en horario de la clínica de `day`."""
+        value = datetime.combine(day, datetime.min.time()) + timedelta(
+            minutes=self.rng.randrange(start_hour * 60, end_hour * 60)
+        )
+        return timezone.make_aware(value)
+
+    def _past_day(self, start=None):
+        start = max(start or self.first_day, self.first_day)
+        return start + timedelta(days=self.rng.randrange(max((self.today - start).days, 1)))
+
+    # =========================
+    #   CATÁLOGO
+    # =========================
+    def _catalog(self):
+        """Servicios activos (se crean los de ejemplo si no hay) y el horario de la clínica."""
+        if not Service.objects.filter(is_active=True).exists():
+            Service.objects.bulk_create([
+                Service(name=name, description=name, duration=duration, price=price)
+                for name, duration, price, _ in SERVICES
+            ])
+        existing = set(ClinicSchedule.objects.values_list('day_of_week', flat=True))
+        ClinicSchedule.objects.bulk_create([
+            ClinicSchedule(day_of_week=day, is_open=day != 'sunday', opening_time='08:00', closing_time='20:00')
+            for day, _ in ClinicSchedule.DAYS_OF_WEEK
+            if day not in existing
+        ])
+
+        demand = {name: weight for name, _, _, weight in SERVICES}
+        services = list(Service.objects.filter(is_active=True).order_by('id'))
+        # Los servicios que no son del catálogo de ejemplo se piden como una consulta rápida
+        return [(service, demand.get(service.name, 10)) for service in services]
+
+    # =========================
+    #   USUARIOS Y MASCOTAS
+    # =========================
+    def _users(self, count, prefix, password):
+        # Todos comparten el mismo hash: calcularlo 100k veces llevaría horas
+        password = make_password(password)
+        days = (self.today - self.first_day).days or 1
+
+        def rows():
+            for number in range(count):
+                first = self.rng.choice(FIRST_NAMES)
+                last = self.rng.choice(LAST_NAMES)
+                yield User(
+                    username=f'{prefix}{number:06d}',
+                    first_name=first,
+                    last_name=f'{last} {self.rng.choice(LAST_NAMES)}',
+                    email=f'{prefix}{number}@{self.rng.choice(EMAIL_DOMAINS)}',
+                    password=password,
+                    # Altas crecientes con el tiempo
+                    date_joined=self._moment(self.first_day + timedelta(days=int(days * self.rng.random() ** 0.6))),
+                )
+
+        return [(user.id, user.date_joined.date()) for user in self._bulk(User, rows())]
+
+    def _pets(self, users, count):
+        types = list(PET_TYPES)
+        type_weights = [PET_TYPES[pet_type][0] for pet_type in types]
+
+        def rows():
+            for _ in range(count):
+                owner_id, joined = users[skewed_index(self.rng, len(users), 1.15)]
+                pet_type = self.rng.choices(types, type_weights)[0]
+                _, breeds, (lightest, heaviest) = PET_TYPES[pet_type]
+                breed = self.rng.choice(breeds)
+                created = self._moment(self._past_day(joined))
+                yield Pet(
+                    owner_id=owner_id,
+                    name=self.rng.choice(PET_NAMES),
+                    pet_type=pet_type,
+                    other_type=breed if pet_type == 'other' else None,
+                    breed=breed,
+                    date_of_birth=created.date() - timedelta(days=self.rng.randrange(60, 15 * 365)),
+                    weight=round(self.rng.uniform(lightest, heaviest), 2),
+                    vaccination_status=self.rng.choices(['updated', 'pending', 'none'], [60, 30, 10])[0],
+                    nervous_at_vet=self.rng.random() < 0.2,
+                    special_care=self.rng.random() < 0.05,
+                    created_at=created,
+                    updated_at=created,
+                )
+
+        return [(pet.id, pet.owner_id, pet.pet_type) for pet in self._bulk(Pet, rows())]
+
+    # =========================
+    #   AGENDA
+    # =========================
+    def _vets(self, services, count, appointments):
+        """
+        Veterinarios nuevos con agenda vacía: así las citas generadas nunca
+        chocan con las que ya había en la base.
+        """
+        longest = max(service.duration for service, _ in services)
+        per_day = 8 * 60 // self._placed(longest)
+        if not count:
+            working_days = (self.last_day - self.first_day).days * 5 / 7
+            count = max(math.ceil(appointments / (working_days * per_day * TARGET_OCCUPANCY)), 1)
+
+        vets = []
+        for number in range(count):
+            first = self.rng.choice(FIRST_NAMES)
+            start = self.rng.choice([8, 9, 10])
+            vets.append(Veterinarian(
+                name=f'{first} {self.rng.choice(LAST_NAMES)} {number + 1}',
+                specialty=self.rng.choice(SPECIALTIES),
+                license_number=f'S{number + 1:07d}',
+                email=f'vet{number + 1}@vetify.example.com',
+                phone=f'55{self.rng.randrange(10 ** 8):08d}',
+                years_experience=self.rng.randrange(1, 30),
+                available_days=sorted(self.rng.sample(WORK_DAYS, 5), key=WORK_DAYS.index),
+                # Jornadas de 8 horas
+                start_time=f'{start:02d}:00',
+                end_time=f'{start + 8:02d}:00',
+            ))
+        vets = self._bulk(Veterinarian, vets)
+
+        through = Veterinarian.services.through
+        self._bulk(through, (
+            through(veterinarian_id=vet.id, service_id=service.id)
+            for vet in vets
+            for service, _ in services
+        ))
+        return [(vet, per_day) for vet in vets]
+
+    @staticmethod
+    def _placed(minutes):
+        # Las citas se colocan en bloques completos de 5 minutos para no compartir bloque
+        return -(-minutes // SLOT_MINUTES) * SLOT_MINUTES
+
+    def _demand(self, day):
+        """Demanda relativa del día: más citas con los años, en primavera-verano y cerca de hoy."""
+        weight = WEEKDAY_DEMAND[day.weekday()]
+        if day < self.today:
+            age = (self.today - day).days / max((self.today - self.first_day).days, 1)
+            weight *= 1 - 0.4 * age
+        else:
+            # La agenda futura se llena poco a poco
+            weight *= math.exp(-(day - self.today).days / 30)
+        return weight * (1.15 if day.month in (3, 4, 5, 6, 7) else 1.0)
+
+    def _quotas(self, vets, count):
+        """Citas por (veterinario, día), proporcionales a la demanda y sin pasar la capacidad."""
+        slots = []
+        day = self.first_day
+        while day <= self.last_day:
+            weekday = WORK_DAYS[day.weekday()] if day.weekday() < len(WORK_DAYS) else None
+            demand = self._demand(day)
+            for vet, capacity in vets:
+                if weekday in vet.available_days and demand:
+                    slots.append([day, vet, capacity, demand])
+            day += timedelta(days=1)
+        if sum(capacity for _, _, capacity, _ in slots) < count:
+            raise CommandError('No caben tantas citas: aumenta --vets o --past-days')
+
+        total = sum(demand for _, _, _, demand in slots)
+        quotas = []
+        for _, _, capacity, demand in slots:
+            expected = count * demand / total
+            quota = int(expected) + (self.rng.random() < expected % 1)
+            quotas.append(min(quota, capacity))
+
+        # El redondeo deja unas pocas de más o de menos: se ajustan al azar
+        difference = count - sum(quotas)
+        while difference:
+            index = self.rng.randrange(len(slots))
+            if difference > 0 and quotas[index] < slots[index][2]:
+                quotas[index] += 1
+                difference -= 1
+            elif difference < 0 and quotas[index] > 0:
+                quotas[index] -= 1
+                difference += 1
+        return [(day, vet, quota) for (day, vet, _, _), quota in zip(slots, quotas) if quota]
+
+    def _day_schedule(self, vet, quota, services, weights):
+        """`quota` horarios sin solape dentro de la jornada del veterinario, con huecos al azar."""
+        chosen = self.rng.choices(services, weights, k=quota)
+        start = int(vet.start_time[:2]) * 60
+        busy = sum(self._placed(service.duration) for service in chosen)
+        free_blocks = (8 * 60 - busy) // SLOT_MINUTES
+        cuts = sorted(self.rng.randrange(free_blocks + 1) for _ in range(quota))
+        minute = start
+        previous = 0
+        for service, cut in zip(chosen, cuts):
+            minute += (cut - previous) * SLOT_MINUTES
+            previous = cut
+            yield service, f'{minute // 60:02d}:{minute % 60:02d}'
+            minute += self._placed(service.duration)
+
+    def _appointments(self, pets, services, vets, count):
+        if not count:
+            return
+        weights = [weight for _, weight in services]
+        services = [service for service, _ in services]
+
+        def rows():
+            for day, vet, quota in self._quotas(vets, count):
+                statuses, status_weights = PAST_STATUSES if day < self.today else FUTURE_STATUSES
+                for service, start in self._day_schedule(vet, quota, services, weights):
+                    pet_id, owner_id, _ = pets[skewed_index(self.rng, len(pets), 1.2)]
+                    booked = day - timedelta(days=self.rng.randrange(0, 21))
+                    if booked > self.today:
+                        booked = self.today - timedelta(days=self.rng.randrange(1, 15))
+                    yield Appointment(
+                        user_id=owner_id,
+                        pet_id=pet_id,
+                        service=service,
+                        veterinarian_id=vet.id,
+                        date=day,
+                        time=start,
+                        status=self.rng.choices(statuses, status_weights)[0],
+                        notes='Primera visita' if self.rng.random() < 0.05 else '',
+                        created_at=min(self._moment(booked), timezone.now()),
+                    )
+
+        # Por lotes: las citas y sus bloques de agenda en la misma transacción
+        batch = []
+        for appointment in rows():
+            batch.append(appointment)
+            if len(batch) >= self.batch_size:
+                self._insert_appointments(batch)
+                batch = []
+        if batch:
+            self._insert_appointments(batch)
+
+    def _insert_appointments(self, batch):
+        with transaction.atomic():
+            created = Appointment.objects.bulk_create(batch, batch_size=self.batch_size)
+            # Sin instancias: son varios bloques por cita
+            adapt_date = connection.ops.adapt_datefield_value
+            claims = []
+            for appointment in created:
+                if appointment.status in BLOCKING_STATUSES:
+                    day = adapt_date(appointment.date)
+                    claims.extend(
+                        (appointment.veterinarian_id, day, slot, appointment.id)
+                        for slot in claimed_slots(appointment.time, appointment.service.duration)
+                    )
+            with connection.cursor() as cursor:
+                cursor.executemany(_INSERT_CLAIM, claims)
+
+    # =========================
+    #   HISTORIAL CLÍNICO
+    # =========================
+    def _consultations(self, vets, count):
+        completed = Appointment.objects.filter(
+            veterinarian__in=[vet.id for vet, _ in vets],
+            status='completed',
+        ).order_by('?').values_list('id', 'veterinarian_id', 'date', 'time', 'pet__weight', 'pet__pet_type')
+        # Una sola muestra: cada corte con order_by('?') sortearía de nuevo
+        completed = list(completed[:count])
+
+        for offset in range(0, len(completed), self.batch_size):
+            with transaction.atomic():
+                self._consultation_batch(completed[offset:offset + self.batch_size])
+
+    def _consultation_batch(self, rows):
+        consultations = []
+        for appointment_id, vet_id, day, start, weight, pet_type in rows:
+            reason, symptoms, diagnosis, treatment = self.rng.choice(CLINICAL_CASES)
+            attended = timezone.make_aware(datetime.combine(day, start))
+            consultations.append(MedicalConsultation(
+                appointment_id=appointment_id,
+                veterinarian_id=vet_id,
+                reason=reason,
+                symptoms=symptoms,
+                diagnosis=diagnosis,
+                treatment=treatment,
+                notes='Se recomienda seguimiento' if self.rng.random() < 0.2 else '',
+                weight_at_visit=round(float(weight) * self.rng.uniform(0.9, 1.1), 2),
+                temperature=round(self.rng.uniform(37.5, 39.5) if pet_type != 'other' else self.rng.uniform(36, 39), 1),
+                next_visit=day + timedelta(days=self.rng.choice([7, 15, 30])) if self.rng.random() < 0.3 else None,
+                created_at=attended,
+                updated_at=attended,
+            ))
+        consultations = MedicalConsultation.objects.bulk_create(consultations, batch_size=self.batch_size)
+
+        prescriptions = MedicalPrescription.objects.bulk_create([
+            MedicalPrescription(
+                consultation_id=consultation.id,
+                general_instructions='Administrar con alimento',
+                warnings='Suspender si hay reacción' if self.rng.random() < 0.3 else '',
+                created_at=consultation.created_at,
+                updated_at=consultation.created_at,
+            )
+            for consultation in consultations
+            if self.rng.random() < PRESCRIPTION_RATE
+        ], batch_size=self.batch_size)
+
+        items = []
+        for prescription in prescriptions:
+            for medication, dose, frequency, duration, route in self.rng.sample(
+                MEDICATIONS, self.rng.choices(*ITEMS_PER_PRESCRIPTION)[0]
+            ):
+                items.append(PrescriptionItem(
+                    prescription_id=prescription.id,
+                    medication=medication,
+                    dose=dose,
+                    frequency=frequency,
+                    duration=duration,
+                    route=route,
+                ))
+        PrescriptionItem.objects.bulk_create(items, batch_size=self.batch_size)
+
+    def _vaccines(self, pets, count):
+        def rows():
+            for _ in range(count):
+                pet_id, _, pet_type = pets[skewed_index(self.rng, len(pets), 1.1)]
+                applied = self._past_day()
+                yield Vaccine(
+                    pet_id=pet_id,
+                    name=self.rng.choice(VACCINES[pet_type]),
+                    date=applied,
+                    next_date=applied + timedelta(days=365) if pet_type != 'other' else None,
+                    notes='Lote ' + str(self.rng.randrange(1000, 9999)) if self.rng.random() < 0.3 else '',
+                    created_at=self._moment(applied),
+                )
+
+        self._bulk(Vaccine, rows())
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from booking.reservations import sweep_expired_holds
+
+
+class Command(BaseCommand):
+    help = 'Libera las retenciones de horario caducadas (una vez o en bucle con --every)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--every',
+            type=int,
+            default=0,
+            help='Segundos entre barridos; 0 para ejecutar una sola vez',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            released = sweep_expired_holds()
+            self.stdout.write(f'Retenciones liberadas: {released}')
+            if not options['every']:
+                break
+            time.sleep(options['every'])
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0008_veterinarian_services'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='veterinarian',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='appointments', to='booking.veterinarian', verbose_name='Veterinario'),
+        ),
+    ]
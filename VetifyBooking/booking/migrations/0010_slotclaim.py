@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0009_appointment_veterinarian'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotClaim',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Fecha')),
+                ('slot', models.PositiveSmallIntegerField(verbose_name='Bloque de 5 minutos')),
+                ('appointment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_claims', to='booking.appointment', verbose_name='Cita')),
+                ('veterinarian', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_claims', to='booking.veterinarian', verbose_name='Veterinario')),
+            ],
+            options={
+                'verbose_name': 'Bloque reservado',
+                'verbose_name_plural': 'Bloques reservados',
+                'constraints': [models.UniqueConstraint(fields=('veterinarian', 'date', 'slot'), name='unique_vet_date_slot_claim')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0010_slotclaim'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='slotclaim',
+            name='appointment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='slot_claims', to='booking.appointment', verbose_name='Cita'),
+        ),
+        migrations.CreateModel(
+            name='SlotHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Fecha')),
+                ('time', models.TimeField(verbose_name='Hora')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Caduca')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_holds', to='booking.service', verbose_name='Servicio')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_holds', to=settings.AUTH_USER_MODEL)),
+                ('veterinarian', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_holds', to='booking.veterinarian', verbose_name='Veterinario')),
+            ],
+            options={
+                'verbose_name': 'Retención de horario',
+                'verbose_name_plural': 'Retenciones de horario',
+                'ordering': ['expires_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='slotclaim',
+            name='hold',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='slot_claims', to='booking.slothold', verbose_name='Retención'),
+        ),
+        migrations.AddConstraint(
+            model_name='slotclaim',
+            constraint=models.CheckConstraint(condition=models.Q(models.Q(('appointment__isnull', False), ('hold__isnull', True)), models.Q(('appointment__isnull', True), ('hold__isnull', False)), _connector='OR'), name='slot_claim_single_owner'),
+        ),
+    ]
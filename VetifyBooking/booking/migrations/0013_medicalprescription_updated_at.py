@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:10
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0012_userprofile_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicalprescription',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0013_medicalprescription_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PdfJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('consulta', 'Consulta'), ('receta', 'Receta')], max_length=20, verbose_name='Documento')),
+                ('object_id', models.PositiveIntegerField(verbose_name='Registro')),
+                ('path', models.CharField(db_index=True, max_length=500)),
+                ('html', models.TextField()),
+                ('status', models.CharField(choices=[('queued', 'En cola'), ('running', 'Generando'), ('done', 'Listo'), ('failed', 'Fallido')], default='queued', max_length=20, verbose_name='Estado')),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pdf_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Trabajo PDF',
+                'verbose_name_plural': 'Trabajos PDF',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='pdfjob_status_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0014_pdfjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        # Después de la última migración de auth: rehacer la tabla borraría el índice
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['date', 'time'], name='appt_date_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['user', 'date'], name='appt_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['status', 'date'], name='appt_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['pet', '-date', '-time'], name='appt_pet_date_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['veterinarian', 'date'], name='appt_vet_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['-created_at'], name='appt_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at'], name='document_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicalconsultation',
+            index=models.Index(fields=['-created_at'], name='consult_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pet',
+            index=models.Index(fields=['-created_at'], name='pet_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pet',
+            index=models.Index(fields=['pet_type', '-created_at'], name='pet_type_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pet',
+            index=models.Index(fields=['owner', '-created_at'], name='pet_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['-appointments_count'], name='profile_appointments_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vaccine',
+            index=models.Index(fields=['pet', '-date'], name='vaccine_pet_date_idx'),
+        ),
+        # auth_user no es nuestro: índice para el listado de usuarios del
+        # dashboard (clientes ordenados por fecha de alta)
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS auth_user_customer_joined_idx ON auth_user (date_joined) WHERE NOT is_superuser',
+            reverse_sql='DROP INDEX IF EXISTS auth_user_customer_joined_idx',
+        ),
+    ]
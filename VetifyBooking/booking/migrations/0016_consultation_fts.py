@@ -0,0 +1,51 @@
+# Tabla virtual FTS5 para la búsqueda en el historial clínico (ver booking.search).
+# Solo existe en SQLite; en otras bases la búsqueda usa icontains.
+
+from django.db import migrations
+
+
+CREATE_FTS = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS booking_consultation_fts USING fts5(
+        reason, symptoms, diagnosis, treatment, notes, medications, pet_name, owner,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+"""
+
+POPULATE_FTS = """
+    INSERT INTO booking_consultation_fts
+        (rowid, reason, symptoms, diagnosis, treatment, notes, medications, pet_name, owner)
+    SELECT c.id, c.reason, c.symptoms, c.diagnosis, c.treatment, c.notes,
+           COALESCE((SELECT group_concat(i.medication, ' ')
+                     FROM booking_prescriptionitem i
+                     JOIN booking_medicalprescription p ON p.id = i.prescription_id
+                     WHERE p.consultation_id = c.id), ''),
+           pet.name, u.username
+    FROM booking_medicalconsultation c
+    JOIN booking_appointment a ON a.id = c.appointment_id
+    JOIN booking_pet pet ON pet.id = a.pet_id
+    JOIN auth_user u ON u.id = a.user_id
+"""
+
+
+def create_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_FTS)
+    schema_editor.execute(POPULATE_FTS)
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS booking_consultation_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0015_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
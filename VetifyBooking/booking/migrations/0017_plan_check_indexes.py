@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0016_consultation_fts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['-created_at'], name='document_created_idx'),
+        ),
+        # Alta de usuarios desde el panel: comprueba que el email no esté en uso
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS auth_user_email_idx ON auth_user (email)',
+            reverse_sql='DROP INDEX IF EXISTS auth_user_email_idx',
+        ),
+    ]
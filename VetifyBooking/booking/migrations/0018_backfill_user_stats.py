@@ -0,0 +1,88 @@
+# Contadores de UserProfile (0012) para los usuarios que ya existían: sin
+# esto, listados y perfiles muestran 0 hasta correr reconcile_user_stats.
+#
+# Copia congelada de booking.userstats.reconcile_user_stats sobre los modelos
+# históricos: la migración no debe cambiar si cambia el módulo.
+
+from django.db import migrations
+from django.db.models import Count, Min
+from django.utils import timezone
+
+
+STATUS_COUNTERS = {
+    'pending': 'pending_count',
+    'confirmed': 'confirmed_count',
+    'completed': 'completed_count',
+    'cancelled': 'cancelled_count',
+}
+
+UPCOMING_STATUSES = ('pending', 'confirmed')
+
+STAT_FIELDS = ('pets_count', 'appointments_count', *STATUS_COUNTERS.values(), 'next_appointment_date')
+
+
+def empty_stats():
+    values = {field: 0 for field in STAT_FIELDS}
+    values['next_appointment_date'] = None
+    return values
+
+
+def compute_user_stats(apps):
+    pets = apps.get_model('booking', 'Pet').objects.order_by()
+    appointments = apps.get_model('booking', 'Appointment').objects.order_by()
+    stats = {}
+
+    def entry(user_id):
+        return stats.setdefault(user_id, empty_stats())
+
+    for row in pets.values('owner').annotate(total=Count('id')):
+        entry(row['owner'])['pets_count'] = row['total']
+
+    for row in appointments.values('user', 'status').annotate(total=Count('id')):
+        values = entry(row['user'])
+        values['appointments_count'] += row['total']
+        field = STATUS_COUNTERS.get(row['status'])
+        if field:
+            values[field] += row['total']
+
+    upcoming = appointments.filter(
+        status__in=UPCOMING_STATUSES,
+        date__gte=timezone.localdate(),
+    ).values('user').annotate(next_date=Min('date'))
+    for row in upcoming:
+        entry(row['user'])['next_appointment_date'] = row['next_date']
+
+    return stats
+
+
+def backfill_user_stats(apps, schema_editor):
+    UserProfile = apps.get_model('booking', 'UserProfile')
+    expected = compute_user_stats(apps)
+
+    # Usuarios sin perfil (creados antes de la señal o con el perfil borrado)
+    missing = apps.get_model('auth', 'User').objects.filter(profile__isnull=True).values_list('id', flat=True)
+    UserProfile.objects.bulk_create([
+        UserProfile(user_id=user_id, **expected.get(user_id, empty_stats()))
+        for user_id in missing
+    ], batch_size=1000)
+
+    drifted = []
+    for profile in UserProfile.objects.only('id', 'user_id', *STAT_FIELDS).iterator(chunk_size=2000):
+        values = expected.get(profile.user_id, empty_stats())
+        if any(getattr(profile, field) != values[field] for field in STAT_FIELDS):
+            for field in STAT_FIELDS:
+                setattr(profile, field, values[field])
+            drifted.append(profile)
+    UserProfile.objects.bulk_update(drifted, STAT_FIELDS, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0017_plan_check_indexes'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_user_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def drop_duplicate_active_jobs(apps, schema_editor):
+    # Antes de la restricción: de los trabajos pendientes de un mismo PDF queda el más antiguo
+    PdfJob = apps.get_model('booking', 'PdfJob')
+    seen = set()
+    duplicates = []
+    active = PdfJob.objects.filter(status__in=['queued', 'running']).order_by('created_at', 'id')
+    for job_id, path in active.values_list('id', 'path'):
+        if path in seen:
+            duplicates.append(job_id)
+        seen.add(path)
+    PdfJob.objects.filter(id__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0018_backfill_user_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_active_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='pdfjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('path',), name='pdfjob_one_active_per_path'),
+        ),
+    ]
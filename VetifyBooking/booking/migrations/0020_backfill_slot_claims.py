@@ -0,0 +1,103 @@
+# Citas registradas antes de 0009 y 0010: no tienen veterinario ni bloques en
+# SlotClaim, así que la agenda no las ve y su horario se puede volver a
+# reservar. A las citas futuras que ocupan agenda se les asigna (si no lo
+# tienen) el primer veterinario activo que ofrece el servicio, trabaja ese día
+# y tiene el horario libre, y se reclaman sus bloques. Las que no tienen un
+# veterinario posible, o chocan con otra cita del mismo veterinario, se dejan
+# como están: hay que asignarlas desde el panel.
+#
+# Copia congelada de booking.reservations.claimed_slots y de las reglas de
+# jornada de booking.availability: la migración no debe cambiar si cambian.
+
+from django.db import migrations
+from django.utils import timezone
+
+
+SLOT_MINUTES = 5
+
+DEFAULT_DURATION_MINUTES = 30
+
+BLOCKING_STATUSES = ('pending', 'confirmed', 'completed')
+
+DAY_KEYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+BATCH = 1000
+
+
+def to_minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def claimed_slots(start_time, minutes):
+    start = to_minutes(start_time)
+    end = start + (minutes or DEFAULT_DURATION_MINUTES)
+    return range(start // SLOT_MINUTES, -(-end // SLOT_MINUTES))
+
+
+def vet_can_take(vet, day, start_time, minutes):
+    days = [str(d).lower() for d in (vet.available_days or [])]
+    if days and DAY_KEYS[day.weekday()] not in days:
+        return False
+    start = to_minutes(start_time)
+    return to_minutes(vet.start_time) <= start and start + minutes <= to_minutes(vet.end_time)
+
+
+def backfill_slot_claims(apps, schema_editor):
+    Appointment = apps.get_model('booking', 'Appointment')
+    SlotClaim = apps.get_model('booking', 'SlotClaim')
+    Veterinarian = apps.get_model('booking', 'Veterinarian')
+    today = timezone.localdate()
+
+    taken = set(
+        SlotClaim.objects.filter(date__gte=today).values_list('veterinarian_id', 'date', 'slot')
+    )
+    vets = list(Veterinarian.objects.filter(is_active=True).order_by('id').prefetch_related('services'))
+    offered = {vet.id: {service.id for service in vet.services.all()} for vet in vets}
+
+    pending = (
+        Appointment.objects.filter(date__gte=today, status__in=BLOCKING_STATUSES, slot_claims__isnull=True)
+        .select_related('service').order_by('date', 'time', 'id')
+    )
+    assigned = []
+    claims = []
+    for appointment in pending.iterator(chunk_size=BATCH):
+        minutes = appointment.service.duration if appointment.service_id else DEFAULT_DURATION_MINUTES
+        slots = claimed_slots(appointment.time, minutes)
+        if appointment.veterinarian_id is not None:
+            candidates = [appointment.veterinarian_id]
+        else:
+            candidates = [
+                vet.id for vet in vets
+                if appointment.service_id in offered[vet.id]
+                and vet_can_take(vet, appointment.date, appointment.time, minutes)
+            ]
+
+        for vet_id in candidates:
+            keys = [(vet_id, appointment.date, slot) for slot in slots]
+            if not taken.intersection(keys):
+                break
+        else:
+            continue
+
+        taken.update(keys)
+        if appointment.veterinarian_id is None:
+            appointment.veterinarian_id = vet_id
+            assigned.append(appointment)
+        claims.extend(
+            SlotClaim(veterinarian_id=vet_id, date=appointment.date, slot=slot, appointment_id=appointment.id)
+            for slot in slots
+        )
+
+    Appointment.objects.bulk_update(assigned, ['veterinarian'], batch_size=BATCH)
+    SlotClaim.objects.bulk_create(claims, batch_size=BATCH)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0019_pdfjob_one_active_per_path'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_slot_claims, migrations.RunPython.noop),
+    ]
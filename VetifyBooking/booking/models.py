@@ -55,6 +55,11 @@ class Pet(models.Model):
         verbose_name = "Mascota"
         verbose_name_plural = "Mascotas"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='pet_created_idx'),
+            models.Index(fields=['pet_type', '-created_at'], name='pet_type_created_idx'),
+            models.Index(fields=['owner', '-created_at'], name='pet_owner_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.get_pet_type_display()})"
@@ -94,6 +99,15 @@ class Appointment(models.Model):
         verbose_name="Servicio"
     )
 
+    veterinarian = models.ForeignKey(
+        'Veterinarian',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='appointments',
+        verbose_name="Veterinario"
+    )
+
     date = models.DateField()
     time = models.TimeField()
 
@@ -108,6 +122,20 @@ class Appointment(models.Model):
 
     class Meta:
         ordering = ['date', 'time']
+        indexes = [
+            # Orden por defecto, agenda del día y filtros por rango de fechas
+            models.Index(fields=['date', 'time'], name='appt_date_time_idx'),
+            # Citas y próxima cita de un usuario
+            models.Index(fields=['user', 'date'], name='appt_user_date_idx'),
+            # Filtros por estado (pendientes, completadas sin consulta, etc.)
+            models.Index(fields=['status', 'date'], name='appt_status_date_idx'),
+            # Última cita de una mascota
+            models.Index(fields=['pet', '-date', '-time'], name='appt_pet_date_time_idx'),
+            # Ocupación de agenda por veterinario
+            models.Index(fields=['veterinarian', 'date'], name='appt_vet_date_idx'),
+            # Últimas citas registradas en el dashboard
+            models.Index(fields=['-created_at'], name='appt_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.pet.name} - {self.date} {self.time} ({self.status})"
@@ -268,6 +296,12 @@ class Document(models.Model):
         ordering = ['-created_at']
         verbose_name = "Documento"
         verbose_name_plural = "Documentos"
+        indexes = [
+            # Parcial: SQLite compara los booleanos como "WHERE is_active", sin "= 1"
+            models.Index(fields=['-created_at'], condition=models.Q(is_active=True), name='document_active_created_idx'),
+            # Lista completa del panel, activos e inactivos
+            models.Index(fields=['-created_at'], name='document_created_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -297,10 +331,31 @@ class UserProfile(models.Model):
 
     bio = models.TextField(max_length=500, blank=True, null=True)
 
+    # Estadísticas desnormalizadas, mantenidas por señales (booking.userstats)
+    pets_count = models.IntegerField(default=0)
+
+    appointments_count = models.IntegerField(default=0)
+
+    pending_count = models.IntegerField(default=0)
+
+    confirmed_count = models.IntegerField(default=0)
+
+    completed_count = models.IntegerField(default=0)
+
+    cancelled_count = models.IntegerField(default=0)
+
+    next_appointment_date = models.DateField(null=True, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
 
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Ranking de usuarios con más citas en reportes
+            models.Index(fields=['-appointments_count'], name='profile_appointments_idx'),
+        ]
+
     def __str__(self):
         return f"Perfil de {self.user.username}"
     
@@ -350,6 +405,9 @@ class MedicalConsultation(models.Model):
         verbose_name = "Consulta Médica"
         verbose_name_plural = "Consultas Médicas"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='consult_created_idx'),
+        ]
 
     def __str__(self):
         return f"Consulta - {self.appointment.pet.name} ({self.appointment.date})"
@@ -376,6 +434,7 @@ class MedicalPrescription(models.Model):
     )
 
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = "Receta Médica"
@@ -446,6 +505,163 @@ class Vaccine(models.Model):
         verbose_name = "Vacuna"
         verbose_name_plural = "Vacunas"
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['pet', '-date'], name='vaccine_pet_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} - {self.pet.name} ({self.date})"
+
+# =========================
+#       SLOT CLAIM
+# =========================
+class SlotClaim(models.Model):
+    """
+    Bloque de 5 minutos de agenda reclamado por una cita. La restricción única
+    sobre (veterinario, fecha, bloque) hace que dos reservas simultáneas del
+    mismo horario no puedan confirmarse a la vez.
+    """
+
+    veterinarian = models.ForeignKey(
+        Veterinarian,
+        on_delete=models.CASCADE,
+        related_name='slot_claims',
+        verbose_name="Veterinario"
+    )
+    date = models.DateField(verbose_name="Fecha")
+    slot = models.PositiveSmallIntegerField(verbose_name="Bloque de 5 minutos")
+
+    # Un bloque pertenece a una cita confirmada o a una retención temporal
+    appointment = models.ForeignKey(
+        Appointment,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='slot_claims',
+        verbose_name="Cita"
+    )
+    hold = models.ForeignKey(
+        'SlotHold',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='slot_claims',
+        verbose_name="Retención"
+    )
+
+    class Meta:
+        verbose_name = "Bloque reservado"
+        verbose_name_plural = "Bloques reservados"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['veterinarian', 'date', 'slot'],
+                name='unique_vet_date_slot_claim'
+            ),
+            models.CheckConstraint(
+                condition=(
+                    models.Q(appointment__isnull=False, hold__isnull=True) |
+                    models.Q(appointment__isnull=True, hold__isnull=False)
+                ),
+                name='slot_claim_single_owner'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.veterinarian_id} - {self.date} #{self.slot}"
+
+
+# =========================
+#        SLOT HOLD
+# =========================
+class SlotHold(models.Model):
+    """
+    Retención temporal de un horario mientras el cliente completa el
+    formulario de reserva. Caduca sola a los pocos minutos.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='slot_holds')
+    veterinarian = models.ForeignKey(
+        Veterinarian,
+        on_delete=models.CASCADE,
+        related_name='slot_holds',
+        verbose_name="Veterinario"
+    )
+    service = models.ForeignKey(
+        Service,
+        on_delete=models.CASCADE,
+        related_name='slot_holds',
+        verbose_name="Servicio"
+    )
+
+    date = models.DateField(verbose_name="Fecha")
+    time = models.TimeField(verbose_name="Hora")
+
+    # Indexado: el barrido de retenciones caducadas recorre solo este índice
+    expires_at = models.DateTimeField(db_index=True, verbose_name="Caduca")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Retención de horario"
+        verbose_name_plural = "Retenciones de horario"
+        ordering = ['expires_at']
+
+    def __str__(self):
+        return f"{self.veterinarian_id} - {self.date} {self.time} (hasta {self.expires_at})"
+
+
+# =========================
+#         PDF JOB
+# =========================
+class PdfJob(models.Model):
+    """
+    Generación de un PDF en segundo plano (ver booking.pdfjobs). El HTML se
+    pinta en la petición; el worker solo ejecuta xhtml2pdf y deja el fichero
+    en la caché de PDF.
+    """
+
+    STATUS_CHOICES = [
+        ('queued', 'En cola'),
+        ('running', 'Generando'),
+        ('done', 'Listo'),
+        ('failed', 'Fallido'),
+    ]
+
+    KIND_CHOICES = [
+        ('consulta', 'Consulta'),
+        ('receta', 'Receta'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='pdf_jobs')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name="Documento")
+    object_id = models.PositiveIntegerField(verbose_name="Registro")
+
+    # Fichero de destino en la caché de PDF (clave de contenido)
+    path = models.CharField(max_length=500, db_index=True)
+    html = models.TextField()
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued', verbose_name="Estado")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Trabajo PDF"
+        verbose_name_plural = "Trabajos PDF"
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='pdfjob_status_created_idx'),
+        ]
+        constraints = [
+            # Un solo trabajo pendiente por documento, aunque dos peticiones lo encolen a la vez
+            models.UniqueConstraint(
+                fields=['path'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='pdfjob_one_active_per_path',
+            ),
+        ]
 
     def __str__(self):
-        return f"{self.name} - {self.pet.name} ({self.date})"
\ No newline at end of file
+        return f"{self.kind} #{self.object_id} ({self.status})"
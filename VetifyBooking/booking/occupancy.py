@@ -0,0 +1,301 @@
+"""
+Calendario de ocupación de veterinarios en forma de bitsets.
+
+Cada día de cada veterinario se representa con un entero de 288 bits (uno por
+bloque de 5 minutos). Comprobar solapes es un AND y buscar el primer hueco
+libre de N minutos son unas pocas operaciones de desplazamiento, sin recorrer
+filas ni hacer aritmética de horas en Python.
+
+El calendario vive en memoria del proceso, se carga por lotes (citas y
+retenciones temporales del rango) y se actualiza de forma incremental con las
+señales de Appointment y SlotHold. Las entradas caducan a los
+OCCUPANCY_TTL_SECONDS para recoger los cambios hechos desde otros procesos.
+"""
+import threading
+import time as _time
+from datetime import date, time, timedelta
+
+from django.db import transaction
+
+
+SLOT_MINUTES = 5
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+FULL_DAY = (1 << SLOTS_PER_DAY) - 1
+
+OCCUPANCY_TTL_SECONDS = 60
+
+# Las citas canceladas no ocupan agenda
+BLOCKING_STATUSES = ('pending', 'confirmed', 'completed')
+
+# Duración asumida para citas sin servicio asignado
+DEFAULT_DURATION_MINUTES = 30
+
+
+def to_minutes(value):
+    """Convierte un time (o 'HH:MM') en minutos desde medianoche."""
+    if isinstance(value, str):
+        value = time.fromisoformat(value)
+    return value.hour * 60 + value.minute
+
+
+def span_mask(start_minute, end_minute):
+    """Bits de los bloques de 5 minutos que toca el intervalo [inicio, fin)."""
+    first = max(start_minute, 0) // SLOT_MINUTES
+    last = min(-(-end_minute // SLOT_MINUTES), SLOTS_PER_DAY)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def window_mask(start_minute, end_minute):
+    """Bits de los bloques completos dentro de una jornada [inicio, fin)."""
+    first = -(-max(start_minute, 0) // SLOT_MINUTES)
+    last = min(end_minute // SLOT_MINUTES, SLOTS_PER_DAY)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def runs_of(free, blocks):
+    """
+    Devuelve un bitset donde el bit i está activo si `free` tiene `blocks`
+    bits consecutivos activos a partir de i. Usa duplicación: O(log blocks).
+    """
+    result, length = free, 1
+    while length < blocks:
+        step = min(length, blocks - length)
+        result &= result >> step
+        length += step
+    return result
+
+
+def iter_bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def grid_mask(step_minutes):
+    """Bits de los inicios permitidos cada `step_minutes` minutos."""
+    step = max(step_minutes // SLOT_MINUTES, 1)
+    mask = 0
+    for bit in range(0, SLOTS_PER_DAY, step):
+        mask |= 1 << bit
+    return mask
+
+
+class DayOccupancy:
+    """Ocupación de un veterinario en un día."""
+
+    __slots__ = ('mask', 'appointments', 'holds', 'loaded_at')
+
+    def __init__(self):
+        self.mask = 0
+        # appointment_id -> máscara, para poder quitar citas sin recalcular el día
+        self.appointments = {}
+        # hold_id -> (máscara, caducidad como timestamp)
+        self.holds = {}
+        self.loaded_at = _time.monotonic()
+
+    def add(self, appointment_id, mask):
+        self.appointments[appointment_id] = mask
+        self.mask |= mask
+
+    def remove(self, appointment_id):
+        if self.appointments.pop(appointment_id, None) is None:
+            return
+        # Recalcular por si había citas solapadas de antes del calendario
+        mask = 0
+        for other in self.appointments.values():
+            mask |= other
+        self.mask = mask
+
+    def add_hold(self, hold_id, mask, expires_ts):
+        self.holds[hold_id] = (mask, expires_ts)
+
+    def remove_hold(self, hold_id):
+        self.holds.pop(hold_id, None)
+
+    def busy_mask(self, exclude_hold=None):
+        """
+        Citas más retenciones vigentes; las caducadas se descartan al vuelo.
+        `exclude_hold` no cuenta la retención de quien está reservando.
+        """
+        mask = self.mask
+        if self.holds:
+            now = _time.time()
+            for hold_id, (hold_mask, expires_ts) in list(self.holds.items()):
+                if expires_ts <= now:
+                    del self.holds[hold_id]
+                elif hold_id != exclude_hold:
+                    mask |= hold_mask
+        return mask
+
+    def overlaps(self, mask, exclude_hold=None):
+        return bool(self.busy_mask(exclude_hold) & mask)
+
+    def free_starts(self, minutes, window=FULL_DAY):
+        """Bitset de inicios donde caben `minutes` minutos libres dentro de la ventana."""
+        blocks = -(-minutes // SLOT_MINUTES)
+        return runs_of(window & ~self.busy_mask(), blocks)
+
+    def first_free_gap(self, minutes, window=FULL_DAY):
+        """Minuto de inicio del primer hueco libre de `minutes` minutos, o None."""
+        starts = self.free_starts(minutes, window)
+        if not starts:
+            return None
+        return ((starts & -starts).bit_length() - 1) * SLOT_MINUTES
+
+
+class OccupancyCalendar:
+    """Registro en memoria de DayOccupancy por (veterinario, día)."""
+
+    def __init__(self, ttl=OCCUPANCY_TTL_SECONDS):
+        self.ttl = ttl
+        self._days = {}
+        # appointment_id -> (vet_id, día), para mover citas que cambian de fecha
+        self._locations = {}
+        # hold_id -> (vet_id, día)
+        self._hold_locations = {}
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._days.clear()
+            self._locations.clear()
+            self._hold_locations.clear()
+
+    def _fresh(self, key):
+        day = self._days.get(key)
+        if day is not None and _time.monotonic() - day.loaded_at < self.ttl:
+            return day
+        return None
+
+    def load(self, vet_ids, start_date, end_date):
+        """
+        Devuelve {(vet_id, día): DayOccupancy} para el rango pedido, cargando
+        solo los días que no estén ya en memoria (una consulta de citas y otra
+        de retenciones para todo el rango).
+        """
+        from django.utils import timezone
+
+        from .models import Appointment, SlotHold
+
+        keys = [
+            (vet_id, start_date + timedelta(days=offset))
+            for vet_id in vet_ids
+            for offset in range((end_date - start_date).days + 1)
+        ]
+        with self._lock:
+            result = {key: self._fresh(key) for key in keys}
+        missing = [key for key, day in result.items() if day is None]
+        if not missing:
+            return result
+
+        missing_vets = {vet_id for vet_id, _ in missing}
+        missing_dates = [day for _, day in missing]
+        rows = Appointment.objects.filter(
+            veterinarian__in=missing_vets,
+            date__gte=min(missing_dates),
+            date__lte=max(missing_dates),
+            status__in=BLOCKING_STATUSES,
+        ).values_list('id', 'veterinarian_id', 'date', 'time', 'service__duration')
+
+        holds = SlotHold.objects.filter(
+            veterinarian__in=missing_vets,
+            date__gte=min(missing_dates),
+            date__lte=max(missing_dates),
+            expires_at__gt=timezone.now(),
+        ).values_list('id', 'veterinarian_id', 'date', 'time', 'service__duration', 'expires_at')
+
+        loaded = {key: DayOccupancy() for key in missing}
+        for appointment_id, vet_id, day, start_time, minutes in rows:
+            occupancy = loaded.get((vet_id, day))
+            if occupancy is not None:
+                occupancy.add(appointment_id, appointment_mask(start_time, minutes))
+        for hold_id, vet_id, day, start_time, minutes, expires_at in holds:
+            occupancy = loaded.get((vet_id, day))
+            if occupancy is not None:
+                occupancy.add_hold(hold_id, appointment_mask(start_time, minutes), expires_at.timestamp())
+
+        with self._lock:
+            for key, occupancy in loaded.items():
+                self._days[key] = occupancy
+                for appointment_id in occupancy.appointments:
+                    self._locations[appointment_id] = key
+                for hold_id in occupancy.holds:
+                    self._hold_locations[hold_id] = key
+        result.update(loaded)
+        return result
+
+    def get(self, vet_id, day):
+        return self.load([vet_id], day, day)[(vet_id, day)]
+
+    def discard(self, appointment_id):
+        with self._lock:
+            key = self._locations.pop(appointment_id, None)
+            if key is not None and key in self._days:
+                self._days[key].remove(appointment_id)
+
+    def apply(self, appointment_id, vet_id, day, start_time, minutes, status):
+        """Refleja el estado actual de una cita (alta, cambio o cancelación)."""
+        self.discard(appointment_id)
+        if vet_id is None or status not in BLOCKING_STATUSES:
+            return
+        with self._lock:
+            # Si el día no está en memoria se cargará completo la próxima vez
+            occupancy = self._days.get((vet_id, day))
+            if occupancy is not None:
+                occupancy.add(appointment_id, appointment_mask(start_time, minutes))
+                self._locations[appointment_id] = (vet_id, day)
+
+
+    def apply_hold(self, hold_id, vet_id, day, start_time, minutes, expires_ts):
+        with self._lock:
+            occupancy = self._days.get((vet_id, day))
+            if occupancy is not None:
+                occupancy.add_hold(hold_id, appointment_mask(start_time, minutes), expires_ts)
+                self._hold_locations[hold_id] = (vet_id, day)
+
+    def discard_hold(self, hold_id):
+        with self._lock:
+            key = self._hold_locations.pop(hold_id, None)
+            if key is not None and key in self._days:
+                self._days[key].remove_hold(hold_id)
+
+
+def appointment_mask(start_time, minutes):
+    start = to_minutes(start_time)
+    return span_mask(start, start + (minutes or DEFAULT_DURATION_MINUTES))
+
+
+calendar = OccupancyCalendar()
+
+
+def sync_appointment(appointment):
+    """Actualiza el calendario cuando la transacción que guardó la cita se confirma."""
+    day, start_time = appointment.date, appointment.time
+    # Las vistas de admin guardan fecha y hora como texto del formulario
+    if isinstance(day, str):
+        day = date.fromisoformat(day)
+    minutes = appointment.service.duration if appointment.service_id else None
+
+    transaction.on_commit(lambda: calendar.apply(
+        appointment.pk, appointment.veterinarian_id, day, start_time, minutes, appointment.status
+    ))
+
+
+def forget_appointment(appointment_id):
+    transaction.on_commit(lambda: calendar.discard(appointment_id))
+
+
+def sync_hold(hold):
+    minutes = hold.service.duration if hold.service_id else None
+    transaction.on_commit(lambda: calendar.apply_hold(
+        hold.pk, hold.veterinarian_id, hold.date, hold.time, minutes, hold.expires_at.timestamp()
+    ))
+
+
+def forget_hold(hold_id):
+    transaction.on_commit(lambda: calendar.discard_hold(hold_id))
@@ -0,0 +1,193 @@
+"""
+Caché en disco de los PDF de consultas y recetas.
+
+Generar un PDF con xhtml2pdf cuesta cientos de milisegundos de CPU, mientras
+que pintar la plantilla HTML es casi gratis. Por eso la clave del fichero es el
+hash del HTML ya renderizado (más el id y `updated_at` del registro): cualquier
+cambio en la consulta, la receta, sus medicamentos, la mascota o el
+veterinario produce otra clave, y un PDF guardado nunca puede quedar viejo.
+
+Los ficheros se agrupan por consulta para poder borrarlos al editarla, y el
+total se mantiene bajo PDF_CACHE_MAX_BYTES borrando los menos usados (la
+fecha de modificación se actualiza en cada acierto). Cada proceso lleva la
+cuenta de lo que ocupa la caché sumando lo que escribe, así que solo recorre
+el directorio al pasar del límite; lo que escriben los demás procesos lo
+recoge la tarea periódica booking.tasks.evict_pdf_cache.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from xhtml2pdf import pisa
+
+
+def cache_dir():
+    return Path(getattr(settings, 'PDF_CACHE_DIR', Path(settings.BASE_DIR) / 'pdf_cache'))
+
+
+def max_bytes():
+    return getattr(settings, 'PDF_CACHE_MAX_BYTES', 200 * 1024 * 1024)
+
+
+# Tamaño estimado de la caché en este proceso: (directorio, bytes) medido en
+# el último evict() más lo escrito desde entonces
+_usage = None
+_usage_lock = threading.Lock()
+
+
+class PdfRenderError(Exception):
+    """xhtml2pdf no pudo generar el documento."""
+
+
+def render_pdf(html):
+    buffer = BytesIO()
+    result = pisa.CreatePDF(html, dest=buffer)
+    if result.err:
+        raise PdfRenderError(f'Error al generar el PDF ({result.err} errores)')
+    return buffer.getvalue()
+
+
+def cache_path(consultation_id, kind, key, html):
+    digest = hashlib.sha256(f'{kind}:{key}\n{html}'.encode()).hexdigest()
+    return cache_dir() / str(consultation_id) / f'{kind}-{digest}.pdf'
+
+
+def _write_atomic(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def evict(limit=None):
+    """Borra los PDF menos usados hasta que el total quepa en `limit` bytes."""
+    global _usage
+    limit = max_bytes() if limit is None else limit
+    directory = cache_dir()
+    entries = []
+    total = 0
+    for path in directory.glob('*/*.pdf'):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+
+    removed = 0
+    if total > limit:
+        for _, size, path in sorted(entries):
+            if total <= limit:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+    with _usage_lock:
+        _usage = (directory, total)
+    return removed
+
+
+def record_written(size):
+    """
+    Suma a la cuenta del proceso un PDF recién escrito de `size` bytes y solo
+    llama a evict() si es la primera escritura o si la cuenta pasa del límite.
+    """
+    global _usage
+    directory = cache_dir()
+    with _usage_lock:
+        known = _usage is not None and _usage[0] == directory
+        if known:
+            _usage = (directory, _usage[1] + size)
+            known = _usage[1] <= max_bytes()
+    return 0 if known else evict()
+
+
+def prepare_pdf(consultation_id, kind, key, template, context):
+    """HTML del documento y ruta que le corresponde en la caché."""
+    html = render_to_string(template, context)
+    return html, cache_path(consultation_id, kind, key, html)
+
+
+def consultation_pdf(consultation):
+    """(html, ruta) del PDF de una consulta."""
+    return prepare_pdf(
+        consultation.id,
+        'consulta',
+        f'{consultation.id}:{consultation.updated_at.isoformat()}',
+        'booking/pdf_consultation.html',
+        {'consultation': consultation},
+    )
+
+
+def prescription_pdf(prescription):
+    """(html, ruta) del PDF de una receta; se guarda junto a su consulta."""
+    return prepare_pdf(
+        prescription.consultation_id,
+        'receta',
+        f'{prescription.id}:{prescription.updated_at.isoformat()}',
+        'booking/pdf_prescription.html',
+        {'prescription': prescription},
+    )
+
+
+def open_cached(path):
+    """
+    El PDF abierto en modo binario si ya está en caché, o None. Se devuelve el
+    fichero ya abierto para que un borrado concurrente por LRU no afecte a la
+    descarga en curso.
+    """
+    try:
+        handle = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    # Marca de uso para el LRU
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    return handle
+
+
+def render_to_file(html, path):
+    """
+    Genera el PDF y lo deja en `path`. No usa la base de datos ni los
+    ajustes de Django, así que puede ejecutarse en un proceso del pool.
+    """
+    data = render_pdf(html)
+    _write_atomic(Path(path), data)
+    return len(data)
+
+
+def init_pdf_process():
+    """Inicializador del pool: carga xhtml2pdf y sus fuentes una vez por proceso."""
+    render_pdf('<p></p>')
+
+
+def open_cached_pdf(consultation_id, kind, key, template, context):
+    """Devuelve el PDF abierto, generándolo en esta misma llamada si no está en caché."""
+    html, path = prepare_pdf(consultation_id, kind, key, template, context)
+    handle = open_cached(path)
+    if handle is None:
+        record_written(render_to_file(html, path))
+        handle = open(path, 'rb')
+    return handle
+
+
+def invalidate_consultation_pdfs(consultation_id):
+    """Borra los PDF de la consulta y de su receta."""
+    shutil.rmtree(cache_dir() / str(consultation_id), ignore_errors=True)
@@ -0,0 +1,172 @@
+"""
+Generación de PDF en segundo plano.
+
+Una descarga que no está en la caché de PDF intenta primero el camino rápido:
+si el documento es pequeño y hay un hilo libre en un pool acotado, se genera
+en la petición con un tiempo máximo. Si no, se crea un PdfJob (el estado que
+consulta el cliente en `pdf_job_status`) y se encola la tarea
+booking.tasks.render_pdf en la cola "pdf" de taskqueue, que la ejecuta
+`run_worker --queues pdf --processes N` fuera de los workers web. Los
+reintentos con espera y los leases de workers caídos son los de la cola.
+
+Un trabajo que agotó sus intentos queda "failed" y se devuelve tal cual a
+quien vuelva a pedir el mismo documento (hasta que se purga), en lugar de
+encolar otro que fallaría igual. Uno que lleva más de WORKER_WAIT en cola sin
+que nadie lo tome indica que el worker no está corriendo: la descarga deja de
+reintentarse sola.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import PdfJob
+from .pdfcache import record_written, render_to_file
+
+
+# Tamaño máximo de HTML que se intenta generar dentro de la petición
+SYNC_MAX_HTML = getattr(settings, 'PDF_SYNC_MAX_HTML', 50_000)
+
+# Segundos que la petición espera al camino rápido antes de encolar
+SYNC_TIMEOUT = getattr(settings, 'PDF_SYNC_TIMEOUT', 2.0)
+
+# Hilos por proceso web dedicados al camino rápido
+SYNC_WORKERS = getattr(settings, 'PDF_SYNC_WORKERS', 2)
+
+MAX_ATTEMPTS = 3
+
+# Trabajos "running" más antiguos que esto (más que el lease de la cola) con
+# los intentos gastados son de una tarea que ya no se reintentará
+STALE_AFTER = timedelta(minutes=10)
+
+# Los trabajos terminados se borran pasado este tiempo
+KEEP_FINISHED = timedelta(days=1)
+
+# Un trabajo en cola más tiempo que esto no tiene worker que lo atienda
+WORKER_WAIT = timedelta(minutes=2)
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+_sync_pool = ThreadPoolExecutor(max_workers=SYNC_WORKERS, thread_name_prefix='pdf-sync')
+_sync_slots = threading.BoundedSemaphore(SYNC_WORKERS)
+
+
+def render_sync(html, path, timeout=None):
+    """
+    Camino rápido: genera el PDF en un hilo del pool acotado y espera como
+    mucho `timeout` segundos. Devuelve False (sin bloquear) si el documento es
+    grande, si no hay hilos libres o si se agota el tiempo; en este último caso
+    el hilo termina por su cuenta y la tarea encontrará el fichero hecho.
+    """
+    if len(html) > SYNC_MAX_HTML or not _sync_slots.acquire(blocking=False):
+        return False
+    try:
+        future = _sync_pool.submit(render_to_file, html, path)
+    except RuntimeError:
+        _sync_slots.release()
+        return False
+    future.add_done_callback(lambda _: _sync_slots.release())
+    try:
+        size = future.result(timeout=SYNC_TIMEOUT if timeout is None else timeout)
+    except FutureTimeout:
+        return False
+    except Exception:
+        # El worker lo reintentará y dejará el error registrado en el trabajo
+        return False
+    record_written(size)
+    return True
+
+
+def enqueue_pdf(user, kind, object_id, html, path):
+    """
+    Encola el PDF, reutilizando el trabajo pendiente del mismo documento o el
+    que ya falló (con su error) en lugar de repetirlo.
+    """
+    # booking.tasks importa este módulo
+    from .tasks import render_pdf
+
+    existing = (
+        PdfJob.objects.filter(path=str(path), status__in=(*ACTIVE_STATUSES, 'failed'))
+        .order_by('-created_at').first()
+    )
+    if existing is not None:
+        return existing
+    try:
+        # Si otra petición lo encoló entre la consulta y el INSERT, gana la suya.
+        # La tarea se inserta en la misma transacción que el trabajo
+        with transaction.atomic():
+            job = PdfJob.objects.create(user=user, kind=kind, object_id=object_id, path=str(path), html=html)
+            render_pdf.enqueue(job.id)
+            return job
+    except IntegrityError:
+        return PdfJob.objects.filter(path=str(path)).latest('created_at')
+
+
+def is_stalled(job):
+    """El trabajo sigue en cola demasiado tiempo: no hay worker procesando."""
+    waiting_since = job.started_at or job.created_at
+    return job.status == 'queued' and waiting_since < timezone.now() - WORKER_WAIT
+
+
+def render_job(job_id):
+    """
+    Genera el PDF del trabajo (tarea booking.tasks.render_pdf). Un fallo se
+    anota en el trabajo y se relanza para que la cola lo reintente; agotados
+    los intentos el trabajo queda "failed". Repetir la tarea no hace daño:
+    un trabajo terminado se ignora y un fichero ya generado no se rehace.
+    """
+    claimed = PdfJob.objects.filter(id=job_id, status__in=ACTIVE_STATUSES).update(
+        status='running',
+        started_at=timezone.now(),
+        attempts=F('attempts') + 1,
+    )
+    if not claimed:
+        return
+    job = PdfJob.objects.get(id=job_id)
+    size = 0
+    try:
+        if not os.path.exists(job.path):
+            size = render_to_file(job.html, job.path)
+    except Exception as error:
+        finish_job(job, error=f'{type(error).__name__}: {error}')
+        raise
+    finish_job(job)
+    if size:
+        record_written(size)
+
+
+def finish_job(job, error=None):
+    """Cierra el trabajo; si falló y le quedan intentos vuelve a la cola."""
+    job.refresh_from_db(fields=['attempts'])
+    if error is None:
+        job.status, job.error, job.html = 'done', '', ''
+    elif job.attempts >= MAX_ATTEMPTS:
+        job.status, job.error = 'failed', error
+    else:
+        job.status, job.error = 'queued', error
+    job.finished_at = timezone.now() if job.status != 'queued' else None
+    job.save(update_fields=['status', 'error', 'html', 'finished_at'])
+
+
+def fail_abandoned_jobs():
+    """
+    Trabajos que siguen "running" con los intentos gastados: su tarea murió
+    con el worker y la cola la descartó, así que quedan "failed".
+    """
+    return PdfJob.objects.filter(
+        status='running',
+        attempts__gte=MAX_ATTEMPTS,
+        started_at__lt=timezone.now() - STALE_AFTER,
+    ).update(status='failed', error='El worker no terminó el trabajo', finished_at=timezone.now())
+
+
+def purge_finished_jobs():
+    return PdfJob.objects.filter(
+        status__in=('done', 'failed'),
+        finished_at__lt=timezone.now() - KEEP_FINISHED,
+    ).delete()[0]
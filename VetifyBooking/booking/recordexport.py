@@ -0,0 +1,269 @@
+"""
+Exportación en ZIP del historial médico (por mascota o por día de clínica).
+
+El ZIP se escribe sobre un destino no buscable y se envía por trozos con
+StreamingHttpResponse, así que la memoria no crece con el número de
+documentos (bajo ASGI como iterador asíncrono, ver VetifyBooking.asyncviews).
+Los PDF salen de la caché de `pdfcache`; los que faltan se generan en
+paralelo en un pool de procesos, con unos pocos por delante del que se está
+enviando, y quedan en la caché para la próxima vez. Un documento que no se
+puede generar no corta la descarga: en su lugar va un .txt con el error.
+"""
+import atexit
+import csv
+import io
+import logging
+import multiprocessing
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils.text import slugify
+
+from VetifyBooking.asyncviews import streaming_body
+
+from .models import MedicalConsultation, MedicalPrescription, Vaccine
+from .pdfcache import (
+    consultation_pdf, init_pdf_process, open_cached, prescription_pdf, record_written, render_to_file,
+)
+
+
+# Procesos dedicados a generar los PDF que falten en una exportación
+EXPORT_PROCESSES = getattr(settings, 'PDF_EXPORT_PROCESSES', 2)
+
+# Documentos que se generan por delante del que se está enviando
+RENDER_AHEAD = EXPORT_PROCESSES * 2
+
+CHUNK_SIZE = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _render_pool():
+    """
+    Pool compartido por las exportaciones del proceso; se crea al primer uso
+    y se cierra al salir el proceso (ver shutdown_pool).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: el proceso web tiene hilos y no conviene hacer fork
+            _pool = ProcessPoolExecutor(
+                max_workers=EXPORT_PROCESSES,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_pdf_process,
+            )
+        return _pool
+
+
+def shutdown_pool(broken=None):
+    """
+    Cierra el pool sin esperar a los PDF que aún no empezaron; el siguiente
+    uso crea otro. Con `broken` solo lo cierra si sigue siendo ese pool (un
+    proceso murió y el pool ya no acepta trabajos).
+    """
+    global _pool
+    with _pool_lock:
+        pool = _pool
+        if pool is None or (broken is not None and pool is not broken):
+            return
+        _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(shutdown_pool)
+
+
+class ZipStream:
+    """Destino no buscable para ZipFile: acumula lo escrito hasta que se recoge."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _open_rendered(html, path, future, pool=None):
+    if future is not None:
+        try:
+            record_written(future.result())
+        except BrokenProcessPool:
+            # Se perdió el proceso, no el documento: se genera aquí mismo
+            shutdown_pool(broken=pool)
+    try:
+        return open(path, 'rb')
+    except FileNotFoundError:
+        # El LRU lo borró entre medias: generarlo aquí mismo
+        record_written(render_to_file(html, path))
+        return open(path, 'rb')
+
+
+def _error_entry(name, error):
+    """Sustituto de un PDF que no se pudo generar: un .txt con el error."""
+    logger.warning('No se pudo generar %s para la exportación', name, exc_info=error)
+    text = f'No se pudo generar {name}.\n{type(error).__name__}: {error}\n'
+    return f'{name.rsplit(".", 1)[0]}.error.txt', io.BytesIO(text.encode('utf-8'))
+
+
+def _pdf_files(documents):
+    """
+    Recorre (nombre, html, ruta) y devuelve (nombre, fichero abierto) en el
+    mismo orden, generando en paralelo los que no estén en caché. Un fallo
+    al generar uno se devuelve como entrada de error y se sigue con el resto.
+    """
+    pending = deque()
+
+    def start(document):
+        name, html, path = document
+        handle = open_cached(path)
+        if handle is not None:
+            return name, html, path, handle, None, None
+        pool = _render_pool()
+        try:
+            future = pool.submit(render_to_file, html, str(path))
+        except (BrokenProcessPool, RuntimeError):
+            # Pool roto o cerrándose: _open_rendered lo genera sin él
+            shutdown_pool(broken=pool)
+            future = None
+        return name, html, path, None, future, pool
+
+    documents = iter(documents)
+    for document in documents:
+        pending.append(start(document))
+        if len(pending) >= RENDER_AHEAD:
+            break
+
+    try:
+        while pending:
+            name, html, path, handle, future, pool = pending.popleft()
+            following = next(documents, None)
+            if following is not None:
+                pending.append(start(following))
+            if handle is None:
+                try:
+                    handle = _open_rendered(html, path, future, pool)
+                except Exception as error:
+                    name, handle = _error_entry(name, error)
+            yield name, handle
+    finally:
+        # Descarga cortada: se sueltan los ficheros abiertos y los PDF sin empezar
+        for _, _, _, handle, future, _ in pending:
+            if handle is not None:
+                handle.close()
+            if future is not None:
+                future.cancel()
+
+
+def stream_zip(documents, extra_files=()):
+    """
+    Genera los bytes de un ZIP con los PDF de `documents` y los ficheros
+    pequeños de `extra_files` ((nombre, bytes)).
+    """
+    sink = ZipStream()
+    with zipfile.ZipFile(sink, mode='w') as archive:
+        for name, data in extra_files:
+            archive.writestr(name, data, compress_type=zipfile.ZIP_DEFLATED)
+            yield sink.take()
+
+        for name, handle in _pdf_files(documents):
+            # Los PDF ya van comprimidos: se guardan tal cual
+            with handle, archive.open(zipfile.ZipInfo(name, time.localtime()[:6]), mode='w') as entry:
+                while chunk := handle.read(CHUNK_SIZE):
+                    entry.write(chunk)
+                    yield sink.take()
+            yield sink.take()
+    yield sink.take()
+
+
+def _date_prefix(appointment):
+    return appointment.date.isoformat() if appointment else 'sin-fecha'
+
+
+def pet_documents(pet):
+    """Consultas y recetas de la mascota, de la más antigua a la más reciente."""
+    consultations = MedicalConsultation.objects.filter(
+        appointment__pet=pet
+    ).select_related(
+        'appointment__pet', 'appointment__user', 'veterinarian'
+    ).order_by('appointment__date', 'id')
+
+    for consultation in consultations.iterator(chunk_size=100):
+        prefix = f'{_date_prefix(consultation.appointment)}_{consultation.id:05d}'
+        html, path = consultation_pdf(consultation)
+        yield f'consultas/{prefix}_consulta.pdf', html, path
+
+    prescriptions = MedicalPrescription.objects.filter(
+        consultation__appointment__pet=pet
+    ).select_related(
+        'consultation__appointment__pet', 'consultation__appointment__user', 'consultation__veterinarian'
+    ).prefetch_related('items').order_by('consultation__appointment__date', 'id')
+
+    for prescription in prescriptions.iterator(chunk_size=100):
+        prefix = f'{_date_prefix(prescription.consultation.appointment)}_{prescription.id:05d}'
+        html, path = prescription_pdf(prescription)
+        yield f'recetas/{prefix}_receta.pdf', html, path
+
+
+def vaccine_summary(pet):
+    """CSV con las vacunas de la mascota."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['Vacuna', 'Fecha de aplicación', 'Próxima dosis', 'Notas'])
+    for vaccine in Vaccine.objects.filter(pet=pet).order_by('date', 'id'):
+        writer.writerow([
+            vaccine.name,
+            vaccine.date.isoformat(),
+            vaccine.next_date.isoformat() if vaccine.next_date else '',
+            vaccine.notes,
+        ])
+    # BOM para que Excel reconozca los acentos
+    return ('\ufeff' + buffer.getvalue()).encode('utf-8')
+
+
+def pet_record_zip(pet):
+    return stream_zip(pet_documents(pet), extra_files=[('vacunas.csv', vaccine_summary(pet))])
+
+
+def day_prescription_documents(day):
+    """Recetas de las citas de un día, en orden de hora, para imprimir."""
+    prescriptions = MedicalPrescription.objects.filter(
+        consultation__appointment__date=day
+    ).select_related(
+        'consultation__appointment__pet', 'consultation__appointment__user', 'consultation__veterinarian'
+    ).prefetch_related('items').order_by('consultation__appointment__time', 'id')
+
+    for prescription in prescriptions.iterator(chunk_size=100):
+        appointment = prescription.consultation.appointment
+        label = slugify(f'{appointment.pet.name} {appointment.user.username}') or 'mascota'
+        html, path = prescription_pdf(prescription)
+        yield f'{appointment.time.strftime("%H%M")}_{label}_receta_{prescription.id:05d}.pdf', html, path
+
+
+def day_prescriptions_zip(day):
+    return stream_zip(day_prescription_documents(day))
+
+
+def zip_response(request, chunks, filename):
+    response = StreamingHttpResponse(
+        streaming_body(request, (chunk for chunk in chunks if chunk)), content_type='application/zip',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
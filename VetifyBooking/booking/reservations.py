@@ -0,0 +1,138 @@
+"""
+Reserva de citas segura ante concurrencia.
+
+Guardar la cita y reclamar sus bloques de agenda (SlotClaim) ocurre en la misma
+transacción. Si otra reserva ya tiene alguno de esos bloques, la restricción
+única de la tabla hace fallar el INSERT, se deshace todo y se lanza
+SlotUnavailable: el segundo cliente recibe un error en vez de una doble cita.
+
+Las retenciones (SlotHold) reclaman los mismos bloques mientras el cliente
+termina el formulario; al confirmar la cita se convierten en la reserva
+definitiva dentro de la misma transacción.
+
+Ambas escrituras se repiten si SQLite sigue bloqueado (ver booking.dbretry).
+"""
+from datetime import date, timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .dbretry import run_write_transaction
+from .models import SlotClaim, SlotHold
+from .occupancy import BLOCKING_STATUSES, DEFAULT_DURATION_MINUTES, SLOT_MINUTES, to_minutes
+
+
+# Tiempo que un horario queda apartado mientras se completa el formulario
+HOLD_TTL = timedelta(minutes=5)
+
+
+class SlotUnavailable(Exception):
+    """El horario pedido ya está reservado para ese veterinario."""
+
+
+def claimed_slots(start_time, minutes):
+    """Índices de los bloques de 5 minutos que ocupa un horario."""
+    start = to_minutes(start_time)
+    end = start + (minutes or DEFAULT_DURATION_MINUTES)
+    return range(start // SLOT_MINUTES, -(-end // SLOT_MINUTES))
+
+
+def _insert_claims(claims):
+    try:
+        with transaction.atomic():
+            SlotClaim.objects.bulk_create(claims)
+    except IntegrityError:
+        raise SlotUnavailable('El horario seleccionado acaba de ser reservado por otra persona.')
+
+
+def claim_slots(appointment):
+    """
+    Sustituye los bloques reclamados por la cita según su estado actual.
+    Debe llamarse dentro de una transacción.
+    """
+    SlotClaim.objects.filter(appointment=appointment).delete()
+
+    if appointment.veterinarian_id is None or appointment.status not in BLOCKING_STATUSES:
+        return
+
+    day = appointment.date
+    if isinstance(day, str):
+        day = date.fromisoformat(day)
+
+    minutes = appointment.service.duration if appointment.service_id else None
+    _insert_claims([
+        SlotClaim(
+            veterinarian_id=appointment.veterinarian_id,
+            date=day,
+            slot=slot,
+            appointment=appointment,
+        )
+        for slot in claimed_slots(appointment.time, minutes)
+    ])
+
+
+def sweep_expired_holds(now=None):
+    """
+    Borra las retenciones caducadas (y sus bloques). Solo recorre el índice
+    de `expires_at` hasta el instante actual, nunca la tabla completa.
+    """
+    _, deleted = SlotHold.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted.get(SlotHold._meta.label, 0)
+
+
+def hold_slot(user, vet, service, day, start_time):
+    """
+    Aparta un horario durante HOLD_TTL. Cada usuario tiene como mucho una
+    retención activa: pedir otra libera la anterior.
+    """
+    def create_hold():
+        sweep_expired_holds()
+        SlotHold.objects.filter(user=user).delete()
+
+        hold = SlotHold.objects.create(
+            user=user,
+            veterinarian=vet,
+            service=service,
+            date=day,
+            time=start_time,
+            expires_at=timezone.now() + HOLD_TTL,
+        )
+        _insert_claims([
+            SlotClaim(veterinarian=vet, date=day, slot=slot, hold=hold)
+            for slot in claimed_slots(start_time, service.duration)
+        ])
+        return hold
+
+    return run_write_transaction(create_hold)
+
+
+def release_hold(user, hold_id):
+    _, deleted = SlotHold.objects.filter(id=hold_id, user=user).delete()
+    return deleted.get(SlotHold._meta.label, 0) > 0
+
+
+def active_hold(user, hold_id):
+    """Retención vigente del usuario, o None si no existe o ya caducó."""
+    if not hold_id:
+        return None
+    return SlotHold.objects.select_related('veterinarian', 'service').filter(
+        id=hold_id,
+        user=user,
+        expires_at__gt=timezone.now(),
+    ).first()
+
+
+def reserve_appointment(appointment, hold=None):
+    """
+    Guarda la cita y reclama su horario de forma atómica. Si viene de una
+    retención, sus bloques pasan a la cita sin quedar libres en ningún momento.
+    """
+    def reserve():
+        sweep_expired_holds()
+        appointment.save()
+        if hold is not None:
+            hold.delete()
+        claim_slots(appointment)
+
+    run_write_transaction(reserve, instances=[appointment] + ([hold] if hold is not None else []))
+    return appointment
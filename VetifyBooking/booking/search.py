@@ -0,0 +1,209 @@
+"""
+Búsqueda de texto completo en el historial clínico (SQLite FTS5).
+
+Cada consulta tiene una fila en la tabla virtual `booking_consultation_fts`
+(rowid = id de la consulta) con sus campos clínicos, los medicamentos de su
+receta, el nombre de la mascota y el usuario del dueño. Las señales de
+booking.signals la mantienen al día dentro de la misma transacción;
+`rebuild_search_index` la rehace entera tras cargas masivas (bulk_create o
+update() no disparan señales). Dentro de `deferred_indexing()` los cambios
+se acumulan y cada consulta se reindexa una sola vez al salir del bloque
+(p. ej. al recrear todos los medicamentos de una receta).
+
+Los resultados salen ordenados por bm25 con un fragmento del texto que
+coincidió. En bases que no son SQLite se vuelve a icontains.
+"""
+import re
+from contextlib import contextmanager
+from threading import local
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import MedicalConsultation
+
+
+FTS_TABLE = 'booking_consultation_fts'
+
+# Orden de las columnas de la tabla virtual y su peso en bm25
+COLUMNS = (
+    ('reason', 2.0),
+    ('symptoms', 1.0),
+    ('diagnosis', 3.0),
+    ('treatment', 1.0),
+    ('notes', 0.5),
+    ('medications', 2.0),
+    ('pet_name', 2.0),
+    ('owner', 1.0),
+)
+
+# Máximo de resultados de una búsqueda
+SEARCH_LIMIT = 50
+
+# Marcas del fragmento: caracteres de control que no pueden venir del formulario
+_MARK_START = '\x02'
+_MARK_END = '\x03'
+
+_SELECT_DOCUMENTS = """
+    SELECT c.id, c.reason, c.symptoms, c.diagnosis, c.treatment, c.notes,
+           COALESCE((SELECT group_concat(i.medication, ' ')
+                     FROM booking_prescriptionitem i
+                     JOIN booking_medicalprescription p ON p.id = i.prescription_id
+                     WHERE p.consultation_id = c.id), ''),
+           pet.name, u.username
+    FROM booking_medicalconsultation c
+    JOIN booking_appointment a ON a.id = c.appointment_id
+    JOIN booking_pet pet ON pet.id = a.pet_id
+    JOIN auth_user u ON u.id = a.user_id
+"""
+
+_INSERT = f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(name for name, _ in COLUMNS)}) "
+
+
+_deferred = local()
+
+
+def fts_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def _ids_placeholders(ids):
+    return ', '.join(['%s'] * len(ids))
+
+
+@contextmanager
+def deferred_indexing():
+    """
+    Acumula los reindexados del bloque y los hace juntos al final. Si el
+    bloque falla no se indexa nada: úsese dentro de transaction.atomic().
+    """
+    if getattr(_deferred, 'ids', None) is not None:
+        yield
+        return
+    _deferred.ids = pending = set()
+    try:
+        yield
+    finally:
+        _deferred.ids = None
+    index_consultations(pending)
+
+
+def index_consultations(consultation_ids):
+    """Vuelve a indexar las consultas indicadas (las borradas simplemente desaparecen)."""
+    ids = [consultation_id for consultation_id in set(consultation_ids) if consultation_id is not None]
+    if not ids or not fts_enabled():
+        return
+    pending = getattr(_deferred, 'ids', None)
+    if pending is not None:
+        pending.update(ids)
+        return
+    placeholders = _ids_placeholders(ids)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', ids)
+        cursor.execute(f'{_INSERT}{_SELECT_DOCUMENTS} WHERE c.id IN ({placeholders})', ids)
+
+
+def remove_consultation(consultation_id):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [consultation_id])
+
+
+def index_pet(pet_id):
+    index_consultations(
+        MedicalConsultation.objects.filter(appointment__pet_id=pet_id).values_list('id', flat=True)
+    )
+
+
+def index_owner(user_id):
+    index_consultations(
+        MedicalConsultation.objects.filter(appointment__user_id=user_id).values_list('id', flat=True)
+    )
+
+
+def rebuild_index():
+    """Rehace el índice completo con una sola sentencia. Devuelve las filas indexadas."""
+    if not fts_enabled():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(f'{_INSERT}{_SELECT_DOCUMENTS}')
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f'SELECT count(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def match_expression(text):
+    """
+    Convierte lo que escribió el usuario en una consulta FTS5: cada palabra
+    entre comillas (sin operadores ni sintaxis propia) y como prefijo, para
+    que la búsqueda funcione mientras se escribe. Todas deben aparecer.
+    """
+    words = re.findall(r'\w+', text)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _snippet_html(snippet):
+    # El texto viene de la base: se escapa y solo se dejan pasar las marcas propias
+    html = escape(snippet).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+    return mark_safe(html)
+
+
+def search_consultations(queryset, text, limit=SEARCH_LIMIT):
+    """
+    Consultas de `queryset` que coinciden con `text`, de más a menos
+    relevante, cada una con `search_snippet` (HTML seguro). Devuelve
+    (resultados, total de coincidencias). Los filtros de `queryset` se
+    aplican dentro de la consulta FTS, así que el límite y el total ya
+    cuentan solo las consultas visibles.
+    """
+    if not fts_enabled():
+        matches = queryset.filter(
+            Q(reason__icontains=text) |
+            Q(symptoms__icontains=text) |
+            Q(diagnosis__icontains=text) |
+            Q(treatment__icontains=text) |
+            Q(notes__icontains=text) |
+            Q(prescription__items__medication__icontains=text) |
+            Q(appointment__pet__name__icontains=text) |
+            Q(appointment__user__username__icontains=text)
+        ).distinct().order_by('-created_at', '-id')
+        results = list(matches[:limit])
+        for consultation in results:
+            consultation.search_snippet = ''
+        return results, matches.count()
+
+    expression = match_expression(text)
+    if not expression:
+        return [], 0
+
+    weights = ', '.join(str(weight) for _, weight in COLUMNS)
+    scope, scope_params = queryset.order_by().values('id').query.sql_with_params()
+    where = f'{FTS_TABLE} MATCH %s AND rowid IN ({scope})'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT rowid,
+                   snippet({FTS_TABLE}, -1, %s, %s, '…', 16)
+            FROM {FTS_TABLE}
+            WHERE {where}
+            ORDER BY bm25({FTS_TABLE}, {weights}), rowid DESC
+            LIMIT %s
+            """,
+            [_MARK_START, _MARK_END, expression, *scope_params, limit],
+        )
+        ranked = cursor.fetchall()
+        cursor.execute(f'SELECT count(*) FROM {FTS_TABLE} WHERE {where}', [expression, *scope_params])
+        total = cursor.fetchone()[0]
+
+    by_id = queryset.in_bulk([consultation_id for consultation_id, _ in ranked])
+    results = []
+    for consultation_id, snippet in ranked:
+        consultation = by_id.get(consultation_id)
+        if consultation is not None:
+            consultation.search_snippet = _snippet_html(snippet)
+            results.append(consultation)
+    return results, total
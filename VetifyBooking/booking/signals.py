@@ -1,7 +1,22 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_init, post_save, post_delete, pre_delete, pre_save
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.dispatch import receiver
-from .models import UserProfile
+from .models import (
+    UserProfile, Appointment, Pet, SlotHold, Service, Veterinarian, ClinicSchedule,
+    MedicalConsultation, MedicalPrescription, PrescriptionItem,
+)
+from .catalog import invalidate_catalog
+from .pdfcache import invalidate_consultation_pdfs
+from .search import index_consultations, index_owner, index_pet, remove_consultation
+from .occupancy import sync_appointment, forget_appointment, sync_hold, forget_hold
+from .userstats import STAT_FIELDS, appointment_deltas, bump_user_stats, is_upcoming
+
+
+PROFILE_FIELDS = [
+    field.name for field in UserProfile._meta.concrete_fields
+    if not field.primary_key and field.name not in STAT_FIELDS
+]
 
 
 @receiver(post_save, sender=User)
@@ -13,4 +28,207 @@ def create_user_profile(sender, instance, created, **kwargs):
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
     if hasattr(instance, 'profile'):
-        instance.profile.save()
\ No newline at end of file
+        # El perfil en caché puede tener contadores viejos: no pisarlos
+        instance.profile.save(update_fields=PROFILE_FIELDS)
+
+
+# Calendario de ocupación: cubre las altas, cambios de estado y borrados de
+# citas hechos tanto desde booking.views como desde admin_dashboard.views
+@receiver(post_save, sender=Appointment)
+def update_occupancy(sender, instance, **kwargs):
+    sync_appointment(instance)
+
+
+@receiver(post_delete, sender=Appointment)
+def release_occupancy(sender, instance, **kwargs):
+    forget_appointment(instance.pk)
+
+
+@receiver(post_save, sender=SlotHold)
+def update_hold_occupancy(sender, instance, **kwargs):
+    sync_hold(instance)
+
+
+@receiver(post_delete, sender=SlotHold)
+def release_hold_occupancy(sender, instance, **kwargs):
+    forget_hold(instance.pk)
+
+
+# Estadísticas por usuario en UserProfile (ver booking.userstats)
+STATS_FIELDS = ('user_id', 'status', 'date')
+
+
+def _stats_state(instance, stored=None):
+    # Se lee de __dict__ para no disparar consultas con campos diferidos; un
+    # campo que sigue diferido no cambió y se toma del estado guardado
+    user_id, status, day = (
+        instance.__dict__.get(field, stored[position] if stored else None)
+        for position, field in enumerate(STATS_FIELDS)
+    )
+    return user_id, status, _as_date(day)
+
+
+def _as_date(value):
+    # La fecha puede venir como texto si se asignó así (y aún sin validar)
+    try:
+        return Appointment._meta.get_field('date').to_python(value)
+    except ValidationError:
+        return None
+
+
+@receiver(post_init, sender=Appointment)
+def remember_stats_state(sender, instance, **kwargs):
+    # Con campos diferidos (only/defer) el estado se lee antes de escribir
+    deferred = any(field not in instance.__dict__ for field in STATS_FIELDS)
+    instance._stats_state = None if deferred else _stats_state(instance)
+    instance._stats_state_deferred = deferred
+
+
+@receiver(pre_save, sender=Appointment)
+@receiver(pre_delete, sender=Appointment)
+def load_deferred_stats_state(sender, instance, **kwargs):
+    if not instance._stats_state_deferred or instance.pk is None:
+        return
+    instance._stats_state = Appointment.objects.filter(pk=instance.pk).values_list(*STATS_FIELDS).first()
+    instance._stats_state_deferred = False
+
+
+@receiver(post_save, sender=Appointment)
+def update_user_appointment_stats(sender, instance, created, **kwargs):
+    old_state = None if created else instance._stats_state
+    new_state = _stats_state(instance, old_state)
+    instance._stats_state = new_state
+
+    if new_state == old_state:
+        return
+    if old_state is not None and old_state[0] != new_state[0]:
+        bump_user_stats(
+            old_state[0], refresh_next=is_upcoming(*old_state[1:]), **appointment_deltas(old_state[1], -1),
+        )
+        old_state = None
+
+    deltas = appointment_deltas(new_state[1], 1)
+    was_upcoming = old_state is not None and is_upcoming(*old_state[1:])
+    if old_state is not None:
+        # Mismo usuario: solo se mueve de un estado a otro
+        for field, delta in appointment_deltas(old_state[1], -1).items():
+            deltas[field] = deltas.get(field, 0) + delta
+
+    # La próxima cita solo cambia si la cita era o pasa a ser próxima: si se
+    # quita o se mueve una próxima se recalcula, si se añade solo puede adelantarla
+    upcoming = new_state[2] if is_upcoming(*new_state[1:]) else None
+    refresh_next = was_upcoming and upcoming != old_state[2]
+    bump_user_stats(new_state[0], refresh_next=refresh_next, upcoming=upcoming, **deltas)
+
+
+@receiver(post_delete, sender=Appointment)
+def release_user_appointment_stats(sender, instance, **kwargs):
+    if instance._stats_state is None:
+        return
+    user_id, status, day = instance._stats_state
+    bump_user_stats(user_id, refresh_next=is_upcoming(status, day), **appointment_deltas(status, -1))
+
+
+@receiver(post_init, sender=Pet)
+def remember_pet_owner(sender, instance, **kwargs):
+    instance._stats_owner = instance.__dict__.get('owner_id')
+
+
+@receiver(post_save, sender=Pet)
+def update_user_pet_stats(sender, instance, created, **kwargs):
+    previous = None if created else instance._stats_owner
+    if previous != instance.owner_id:
+        bump_user_stats(previous, pets_count=-1)
+        bump_user_stats(instance.owner_id, pets_count=1)
+    instance._stats_owner = instance.owner_id
+
+
+@receiver(post_delete, sender=Pet)
+def release_user_pet_stats(sender, instance, **kwargs):
+    bump_user_stats(instance._stats_owner, pets_count=-1)
+
+
+# Catálogo en caché (ver booking.catalog): cualquier cambio invalida todas
+# las instantáneas de todos los procesos
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=Veterinarian)
+@receiver(post_delete, sender=Veterinarian)
+@receiver(post_save, sender=ClinicSchedule)
+@receiver(post_delete, sender=ClinicSchedule)
+def catalog_changed(sender, **kwargs):
+    invalidate_catalog()
+
+
+@receiver(m2m_changed, sender=Veterinarian.services.through)
+def catalog_services_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_catalog()
+
+
+# PDF en caché (ver booking.pdfcache): la clave ya cambia con el contenido,
+# esto solo libera enseguida el disco de las versiones viejas
+@receiver(post_save, sender=MedicalConsultation)
+@receiver(post_delete, sender=MedicalConsultation)
+def discard_consultation_pdfs(sender, instance, **kwargs):
+    invalidate_consultation_pdfs(instance.pk)
+
+
+@receiver(post_save, sender=MedicalPrescription)
+@receiver(post_delete, sender=MedicalPrescription)
+def discard_prescription_pdfs(sender, instance, **kwargs):
+    invalidate_consultation_pdfs(instance.consultation_id)
+
+
+# Búsqueda de texto completo (ver booking.search): se reindexa la consulta
+# afectada en la misma transacción que el cambio
+@receiver(post_save, sender=MedicalConsultation)
+def index_consultation_text(sender, instance, **kwargs):
+    index_consultations([instance.pk])
+
+
+@receiver(post_delete, sender=MedicalConsultation)
+def remove_consultation_text(sender, instance, **kwargs):
+    remove_consultation(instance.pk)
+
+
+@receiver(post_delete, sender=MedicalPrescription)
+def index_prescription_removed(sender, instance, **kwargs):
+    index_consultations([instance.consultation_id])
+
+
+@receiver(post_save, sender=PrescriptionItem)
+@receiver(post_delete, sender=PrescriptionItem)
+def index_prescription_items(sender, instance, **kwargs):
+    # Al crear o borrar desde la receta, ya viene cargada: sin consulta extra
+    if PrescriptionItem.prescription.is_cached(instance):
+        consultation_id = instance.prescription.consultation_id
+    else:
+        consultation_id = MedicalPrescription.objects.filter(
+            pk=instance.prescription_id
+        ).values_list('consultation_id', flat=True).first()
+    index_consultations([consultation_id])
+
+
+@receiver(post_init, sender=Pet)
+def remember_pet_name(sender, instance, **kwargs):
+    instance._search_name = instance.__dict__.get('name')
+
+
+@receiver(post_save, sender=Pet)
+def index_pet_name(sender, instance, created, **kwargs):
+    if not created and instance.name != instance._search_name:
+        index_pet(instance.pk)
+    instance._search_name = instance.name
+
+
+@receiver(post_init, sender=User)
+def remember_username(sender, instance, **kwargs):
+    instance._search_username = instance.__dict__.get('username')
+
+
+@receiver(post_save, sender=User)
+def index_username(sender, instance, created, **kwargs):
+    if not created and instance.username != instance._search_username:
+        index_owner(instance.pk)
+    instance._search_username = instance.username
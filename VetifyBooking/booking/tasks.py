@@ -0,0 +1,35 @@
+"""Tareas de reservas para la cola (ver taskqueue)."""
+from taskqueue.queue import task
+
+from . import pdfcache, pdfjobs, reservations, userstats
+
+
+@task(queue='maintenance')
+def sweep_expired_holds():
+    return reservations.sweep_expired_holds()
+
+
+@task
+def refresh_user_stats(user_id):
+    userstats.refresh_user_stats(user_id)
+
+
+@task(queue='maintenance')
+def reconcile_user_stats():
+    drifted, created = userstats.reconcile_user_stats()
+    return len(drifted), created
+
+
+@task(queue='pdf', max_attempts=pdfjobs.MAX_ATTEMPTS)
+def render_pdf(job_id):
+    pdfjobs.render_job(job_id)
+
+
+@task(queue='maintenance')
+def cleanup_pdf_jobs():
+    return pdfjobs.fail_abandoned_jobs(), pdfjobs.purge_finished_jobs()
+
+
+@task(queue='maintenance')
+def evict_pdf_cache():
+    return pdfcache.evict()
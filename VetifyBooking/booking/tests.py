@@ -1,3 +1,1108 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, time as dt_time, timedelta
+from importlib import import_module
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from admin_dashboard.models import DailyStats, ReportCube
+from taskqueue.models import Task
+from VetifyBooking.testing import ClinicData
+
+from . import catalog, pdfcache, pdfjobs, recordexport, reservations, search, urls
+from .availability import build_slot_index
+from .forms import AppointmentForm
+from .models import (
+    Appointment, MedicalConsultation, MedicalPrescription, PdfJob, Pet, PrescriptionItem, Service, SlotClaim, SlotHold,
+    UserProfile, Vaccine, Veterinarian,
+)
+from .occupancy import FULL_DAY, SLOTS_PER_DAY, DayOccupancy, calendar, runs_of, span_mask, window_mask
+from .reservations import (
+    HOLD_TTL, SlotUnavailable, active_hold, hold_slot, release_hold, reserve_appointment, sweep_expired_holds,
+)
+
+
+class ConcurrentReservationTests(TransactionTestCase):
+    """Muchas reservas simultáneas del mismo horario: solo una puede ganar."""
+
+    BOOKINGS = 200
+
+    def setUp(self):
+        calendar.clear()
+        self.user = User.objects.create_user('cliente', 'cliente@example.com', 'secreto123')
+        self.pet = Pet.objects.create(owner=self.user, name='Firulais', pet_type='dog', weight=10)
+        self.service = Service.objects.create(name='Consulta', description='General', duration=30, price=300)
+        self.vet = Veterinarian.objects.create(
+            name='Ana', specialty='general', license_number='123',
+            email='ana@example.com', phone='555', years_experience=5,
+        )
+
+    def _book(self, barrier, results):
+        appointment = Appointment(
+            user=self.user, pet=self.pet, service=self.service, veterinarian=self.vet,
+            date=date(2030, 1, 7), time='10:00', status='confirmed',
+        )
+        barrier.wait()
+        try:
+            while True:
+                try:
+                    reserve_appointment(appointment)
+                    results.append('ok')
+                    return
+                except SlotUnavailable:
+                    results.append('taken')
+                    return
+                except OperationalError:
+                    # Bloqueo transitorio de SQLite: reintentar, no es una respuesta
+                    appointment.pk = None
+                    time.sleep(0.01)
+        finally:
+            connection.close()
+
+    def test_exactly_one_booking_wins(self):
+        barrier = threading.Barrier(self.BOOKINGS)
+        results = []
+        threads = [
+            threading.Thread(target=self._book, args=(barrier, results))
+            for _ in range(self.BOOKINGS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count('ok'), 1)
+        self.assertEqual(results.count('taken'), self.BOOKINGS - 1)
+        self.assertEqual(Appointment.objects.count(), 1)
+        self.assertEqual(SlotClaim.objects.count(), 6)
+
+    def test_cancelling_releases_the_slot(self):
+        first = reserve_appointment(Appointment(
+            user=self.user, pet=self.pet, service=self.service, veterinarian=self.vet,
+            date=date(2030, 1, 7), time='10:00',
+        ))
+        first.status = 'cancelled'
+        reserve_appointment(first)
+
+        second = reserve_appointment(Appointment(
+            user=self.user, pet=self.pet, service=self.service, veterinarian=self.vet,
+            date=date(2030, 1, 7), time='10:15',
+        ))
+        self.assertEqual(SlotClaim.objects.filter(appointment=second).count(), 6)
+
+        first.status = 'confirmed'
+        with self.assertRaises(SlotUnavailable):
+            reserve_appointment(first)
+
+
+@override_settings(DB_WRITE_RETRIES=2, DB_WRITE_RETRY_BACKOFF=0)
+class WriteRetryTests(TransactionTestCase):
+    """Un intento que SQLite rechaza por bloqueo se deshace entero: los contadores no se saltan ni se duplican."""
+
+    def setUp(self):
+        calendar.clear()
+        self.user = User.objects.create_user('cliente', 'cliente@example.com', 'secreto123')
+        self.pet = Pet.objects.create(owner=self.user, name='Firulais', pet_type='dog', weight=10)
+        self.service = Service.objects.create(name='Consulta', description='General', duration=30, price=300)
+        self.vet = Veterinarian.objects.create(
+            name='Ana', specialty='general', license_number='123',
+            email='ana@example.com', phone='555', years_experience=5,
+        )
+        self.day = date(2030, 1, 7)
+
+    def reserve_with_busy_first_attempt(self, appointment):
+        """Reserva forzando "database is locked" en el primer intento, ya guardada la cita."""
+        real_claim = reservations.claim_slots
+        attempts = []
+
+        def claim(instance):
+            attempts.append(instance.pk)
+            if len(attempts) == 1:
+                raise OperationalError('database is locked')
+            real_claim(instance)
+
+        with mock.patch.object(reservations, 'claim_slots', side_effect=claim):
+            reserve_appointment(appointment)
+        return attempts
+
+    def counters(self):
+        profile = UserProfile.objects.get(user=self.user)
+        stats = DailyStats.objects.get(date=self.day)
+        return (
+            profile.appointments_count, profile.completed_count,
+            stats.appointments, stats.pending, stats.completed,
+            dict(ReportCube.objects.filter(date=self.day).values_list('status', 'appointments')),
+        )
+
+    def test_retried_create_counts_once(self):
+        appointment = Appointment(
+            user=self.user, pet=self.pet, service=self.service, veterinarian=self.vet,
+            date=self.day, time='10:00', status='pending',
+        )
+        attempts = self.reserve_with_busy_first_attempt(appointment)
+
+        # El segundo intento vuelve a insertar: el primero se deshizo con su pk
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(Appointment.objects.get().pk, appointment.pk)
+        self.assertEqual(self.counters(), (1, 0, 1, 1, 0, {'pending': 1}))
+        self.assertEqual(SlotClaim.objects.filter(appointment=appointment).count(), 6)
+        self.assertEqual(calendar.get(self.vet.id, self.day).busy_mask(), span_mask(600, 630))
+
+    def test_retried_update_moves_counters_once(self):
+        appointment = reserve_appointment(Appointment(
+            user=self.user, pet=self.pet, service=self.service, veterinarian=self.vet,
+            date=self.day, time='10:00', status='pending',
+        ))
+        appointment.status = 'completed'
+        self.reserve_with_busy_first_attempt(appointment)
+
+        self.assertEqual(self.counters(), (1, 1, 1, 0, 1, {'pending': 0, 'completed': 1}))
+
+        # Un error que no es de bloqueo no se reintenta
+        appointment.status = 'cancelled'
+        with mock.patch.object(reservations, 'claim_slots', side_effect=OperationalError('no such table')):
+            with self.assertRaises(OperationalError):
+                reserve_appointment(appointment)
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.status, 'completed')
+        self.assertEqual(self.counters(), (1, 1, 1, 0, 1, {'pending': 0, 'completed': 1}))
+
+
+class OccupancyTests(TestCase):
+    """Bordes de los bitsets del día y sincronización del calendario al confirmar o deshacer."""
+
+    def test_span_mask_edges(self):
+        self.assertEqual(span_mask(0, 5), 1)
+        # Un intervalo más corto que un bloque ocupa su bloque entero
+        self.assertEqual(span_mask(602, 603), 1 << 120)
+        self.assertEqual(span_mask(603, 607), 0b11 << 120)
+        self.assertEqual(span_mask(600, 600), 0)
+        self.assertEqual(span_mask(610, 600), 0)
+        # Hasta medianoche llega al bit 288 (índice 287) y nunca lo pasa
+        self.assertEqual(span_mask(1435, 1440), 1 << (SLOTS_PER_DAY - 1))
+        self.assertEqual(span_mask(1410, 1500), span_mask(1410, 1440))
+        self.assertEqual(span_mask(-30, 1440), FULL_DAY)
+        self.assertEqual(FULL_DAY.bit_length(), SLOTS_PER_DAY)
+
+    def test_window_mask_keeps_only_whole_blocks(self):
+        self.assertEqual(window_mask(0, 24 * 60), FULL_DAY)
+        self.assertEqual(window_mask(540, 1020), span_mask(540, 1020))
+        # Jornadas que no empiezan o acaban en un bloque exacto pierden los bloques partidos
+        self.assertEqual(window_mask(542, 553), 1 << 109)
+        self.assertEqual(window_mask(602, 608), 0)
+        self.assertEqual(window_mask(1437, 1440), 0)
+        self.assertEqual(window_mask(1435, 2000), 1 << (SLOTS_PER_DAY - 1))
+
+    def test_runs_of_edges(self):
+        free = span_mask(600, 630)
+        self.assertEqual(runs_of(free, 1), free)
+        self.assertEqual(runs_of(free, 6), 1 << 120)
+        self.assertEqual(runs_of(free, 5), 0b11 << 120)
+        self.assertEqual(runs_of(free, 7), 0)
+        # Un hueco que acaba a medianoche sigue contando su último bloque
+        late = span_mask(1410, 1440)
+        self.assertEqual(runs_of(late, 6), 1 << 282)
+        self.assertEqual(runs_of(FULL_DAY, SLOTS_PER_DAY), 1)
+        self.assertEqual(runs_of(FULL_DAY, SLOTS_PER_DAY + 1), 0)
+
+        day = DayOccupancy()
+        day.add(1, span_mask(0, 1410))
+        self.assertEqual(day.first_free_gap(30), 1410)
+        self.assertIsNone(day.first_free_gap(35))
+        day.remove(1)
+        self.assertEqual(day.first_free_gap(24 * 60), 0)
+
+    def test_calendar_follows_commits_only(self):
+        calendar.clear()
+        user = User.objects.create_user('cliente', 'cliente@example.com', 'secreto123')
+        pet = Pet.objects.create(owner=user, name='Firulais', pet_type='dog', weight=10)
+        service = Service.objects.create(name='Consulta', description='General', duration=30, price=300)
+        vet = Veterinarian.objects.create(
+            name='Ana', specialty='general', license_number='123',
+            email='ana@example.com', phone='555', years_experience=5,
+        )
+        monday, tuesday = date(2030, 1, 7), date(2030, 1, 8)
+        calendar.load([vet.id], monday, tuesday)
+
+        def busy(day):
+            return calendar.get(vet.id, day).busy_mask()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            appointment = Appointment.objects.create(
+                user=user, pet=pet, service=service, veterinarian=vet, date=monday, time='10:00',
+            )
+        # Hasta que la transacción se confirma, el calendario no cambia
+        self.assertEqual(busy(monday), 0)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(busy(monday), span_mask(600, 630))
+
+        # Una transacción deshecha no deja rastro
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    appointment.time = '11:00'
+                    appointment.save()
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+        appointment.refresh_from_db()
+        self.assertEqual(busy(monday), span_mask(600, 630))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.date = tuesday
+            appointment.save()
+        self.assertEqual((busy(monday), busy(tuesday)), (0, span_mask(600, 630)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.status = 'cancelled'
+            appointment.save()
+        self.assertEqual(busy(tuesday), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.status = 'pending'
+            appointment.save()
+        self.assertEqual(busy(tuesday), span_mask(600, 630))
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.delete()
+        self.assertEqual(busy(tuesday), 0)
+
+
+class SlotHoldTests(ClinicData, TestCase):
+    """Las retenciones apartan el horario durante HOLD_TTL y nunca le cierran el paso a su dueño."""
+
+    def setUp(self):
+        cache.clear()
+        self.create_clinic()
+        self.vet = self.vets[0]
+        self.service = self.services[0]
+        # Martes: Ana atiende de 9:00 a 17:00
+        self.day = date(2030, 1, 8)
+        self.pet = Pet.objects.create(owner=self.customer, name='Firulais', pet_type='dog', weight=10)
+        self.other = User.objects.create_user('otro', 'otro@example.com', 'secreto123')
+
+    def hold(self, user, start_time):
+        with self.captureOnCommitCallbacks(execute=True):
+            return hold_slot(user, self.vet, self.service, self.day, dt_time.fromisoformat(start_time))
+
+    def is_available(self, start_time):
+        index = build_slot_index(self.service, self.day, days=1, vet_id=self.vet.id)
+        return index.is_available(self.vet.id, self.day, dt_time.fromisoformat(start_time))
+
+    def form(self, user, start_time, hold=None):
+        return AppointmentForm({
+            'pet': self.pet.id, 'service': self.service.id, 'veterinarian': self.vet.id,
+            'date': self.day.isoformat(), 'time': start_time, 'hold': hold.id if hold else '',
+        }, user=user)
+
+    def test_hold_claims_slots_and_replaces_the_previous_one(self):
+        before = timezone.now()
+        first = self.hold(self.customer, '10:00')
+        self.assertFalse(self.is_available('10:00'))
+        self.assertFalse(self.is_available('10:15'))
+
+        second = self.hold(self.customer, '11:00')
+        self.assertEqual(list(SlotHold.objects.filter(user=self.customer)), [second])
+        self.assertEqual(
+            set(SlotClaim.objects.values_list('hold', 'slot')), {(second.id, slot) for slot in range(132, 138)},
+        )
+        self.assertLessEqual(second.expires_at - before, HOLD_TTL + timedelta(seconds=5))
+        self.assertTrue(self.is_available('10:00'))
+        self.assertFalse(self.is_available('11:00'))
+        self.assertIsNone(active_hold(self.customer, first.id))
+
+        with self.assertRaises(SlotUnavailable):
+            self.hold(self.other, '11:15')
+
+    def test_expired_holds_stop_blocking_and_are_swept(self):
+        hold = self.hold(self.customer, '10:00')
+        self.assertEqual(active_hold(self.customer, hold.id), hold)
+
+        # El calendario en memoria descarta la retención al pasar su caducidad
+        later = hold.expires_at.timestamp() + 1
+        with mock.patch('booking.occupancy._time.time', return_value=later):
+            self.assertTrue(self.is_available('10:00'))
+
+        SlotHold.objects.filter(id=hold.id).update(expires_at=timezone.now() - timedelta(seconds=1))
+        calendar.clear()
+        self.assertIsNone(active_hold(self.customer, hold.id))
+        self.assertTrue(self.is_available('10:00'))
+
+        self.assertEqual(sweep_expired_holds(), 1)
+        self.assertFalse(SlotHold.objects.exists())
+        self.assertFalse(SlotClaim.objects.exists())
+        self.assertEqual(sweep_expired_holds(), 0)
+
+    def test_release_frees_the_slot_for_its_owner_only(self):
+        hold = self.hold(self.customer, '10:00')
+        self.assertFalse(release_hold(self.other, hold.id))
+        self.assertFalse(self.is_available('10:00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(release_hold(self.customer, hold.id))
+        self.assertFalse(SlotClaim.objects.exists())
+        self.assertTrue(self.is_available('10:00'))
+
+    def test_own_hold_does_not_block_a_nearby_time(self):
+        hold = self.hold(self.customer, '10:00')
+
+        # Para los demás el horario sigue apartado
+        self.assertFalse(self.form(self.other, '10:15').is_valid())
+
+        form = self.form(self.customer, '10:15', hold)
+        self.assertTrue(form.is_valid(), form.errors)
+        appointment = form.save(commit=False)
+        appointment.user = self.customer
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_appointment(appointment, hold=form.slot_hold)
+
+        self.assertFalse(SlotHold.objects.exists())
+        self.assertEqual(
+            set(SlotClaim.objects.values_list('appointment', 'slot')), {(appointment.id, slot) for slot in range(123, 129)},
+        )
+        self.assertTrue(self.is_available('09:30'))
+        self.assertFalse(self.is_available('10:30'))
+
+
+class CatalogCacheTests(TestCase):
+    """Las instantáneas del catálogo se sirven sin consultas y caducan al confirmarse un cambio."""
+
+    def setUp(self):
+        cache.clear()
+        self.service = Service.objects.create(name='Consulta', description='General', duration=30, price=300)
+        self.vet = Veterinarian.objects.create(
+            name='Ana', specialty='general', license_number='123',
+            email='ana@example.com', phone='555', years_experience=5,
+        )
+
+    def test_tests_never_use_the_server_cache(self):
+        for alias in caches:
+            self.assertIsInstance(caches[alias], LocMemCache)
+
+    def test_service_change_invalidates_snapshot(self):
+        self.assertEqual(catalog.active_services(), [self.service])
+        with self.assertNumQueries(0):
+            catalog.active_services()
+
+        # Sin confirmar la transacción la versión no cambia
+        with self.captureOnCommitCallbacks(execute=True):
+            other = Service.objects.create(name='Baño', description='-', duration=30, price=250)
+        self.assertEqual(catalog.active_services(), [other, self.service])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.is_active = False
+            self.service.save()
+        self.assertEqual(catalog.active_services(), [other])
+
+    def test_veterinarian_change_invalidates_snapshot(self):
+        self.assertEqual(catalog.veterinarians_for_service(self.service.id), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vet.services.add(self.service)
+        self.assertEqual(catalog.veterinarians_for_service(self.service.id), [self.vet])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vet.is_active = False
+            self.vet.save()
+        self.assertEqual(catalog.vets_json(), [])
+
+
+class ConsultationSearchTests(ClinicData, TestCase):
+    """El índice FTS sigue a las señales y la búsqueda respeta el queryset, el orden y el escape."""
+
+    def setUp(self):
+        self.create_clinic()
+        self.add_rows(2)
+        self.consultations = MedicalConsultation.objects.order_by('id')
+
+    def _found(self, text, queryset=None):
+        results, total = search.search_consultations(queryset or self.consultations, text)
+        return [consultation.id for consultation in results], total
+
+    def test_signals_keep_index_current(self):
+        consultation = self.consultations.filter(appointment__user=self.customer).first()
+        pet = consultation.appointment.pet
+        self.assertEqual(self._found('Amoxicilina')[1], 4)
+
+        pet.name = 'Canela'
+        pet.save()
+        self.assertEqual(self._found('canela'), ([consultation.id], 1))
+
+        PrescriptionItem.objects.create(
+            prescription=consultation.prescription, medication='Prednisolona', dose='-', frequency='-', duration='-',
+        )
+        self.assertEqual(self._found('predni'), ([consultation.id], 1))
+
+        consultation.prescription.delete()
+        self.assertEqual(self._found('predni'), ([], 0))
+        self.assertEqual(self._found('Amoxicilina')[1], 3)
+
+        consultation.delete()
+        self.assertEqual(self._found('canela'), ([], 0))
+
+    def test_queryset_filters_apply_before_limit_and_count(self):
+        mine = self.consultations.filter(appointment__user=self.customer)
+        found, total = self._found('resfriado', mine)
+        self.assertEqual(total, 2)
+        self.assertEqual(sorted(found), sorted(mine.values_list('id', flat=True)))
+
+        results, total = search.search_consultations(mine, 'resfriado', limit=1)
+        self.assertEqual((len(results), total), (1, 2))
+
+    def test_diagnosis_outranks_notes(self):
+        first, second = self.consultations[:2]
+        first.notes = 'Posible otitis'
+        first.save()
+        second.diagnosis = 'Otitis externa'
+        second.save()
+        self.assertEqual(self._found('otitis')[0], [second.id, first.id])
+
+    def test_snippet_is_escaped(self):
+        consultation = self.consultations.first()
+        consultation.diagnosis = '<script>alert(1)</script> gastritis'
+        consultation.save()
+        results, _ = search.search_consultations(self.consultations, 'gastritis')
+        self.assertIn('&lt;script&gt;', results[0].search_snippet)
+        self.assertIn('<mark>gastritis</mark>', results[0].search_snippet)
+        self.assertNotIn('<script>', results[0].search_snippet)
+
+    def test_match_expression_quotes_words(self):
+        self.assertEqual(search.match_expression('otitis OR "x*'), '"otitis"* "OR"* "x"*')
+        self.assertEqual(self._found('"*'), ([], 0))
+
+    def test_prescription_edit_reindexes_once(self):
+        prescription = MedicalPrescription.objects.filter(consultation__appointment__user=self.customer).first()
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse('admin_dashboard:edit_prescription', args=[prescription.id]),
+                {'general_instructions': '-', 'medication': ['Cefalexina', 'Omeprazol', 'Tramadol']},
+            )
+        self.assertEqual(response.status_code, 302)
+        reindexed = [query for query in queries if query['sql'].startswith(f'DELETE FROM {search.FTS_TABLE}')]
+        self.assertEqual(len(reindexed), 1)
+        self.assertEqual(self._found('omeprazol'), ([prescription.consultation_id], 1))
+        self.assertEqual(self._found('amoxicilina')[1], 3)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    QUERY_BUDGET_SAMPLE_RATE=0,
+)
+class QueryCountTests(ClinicData, TestCase):
+    """Cada URL del sitio de clientes hace un número fijo de consultas."""
+
+    GROWTH = 20
+
+    # Máximo de consultas por URL, con sesión, usuario y mensajes incluidos
+    BUDGETS = {
+        'home': 3,
+        'login': 0,
+        'register': 0,
+        'logout': 4,
+        'booking': 4,
+        'appointments': 4,
+        'delete_appointment': 15,
+        'register_pet': 3,
+        'edit_pet': 4,
+        'delete_pet': 11,
+        'pet_detail': 7,
+        'export_pet_record': 7,
+        'documents': 4,
+        'services_schedules': 3,
+        'profile': 5,
+        'edit_profile': 4,
+        'update_avatar': 2,
+        'change_password': 3,
+        'password_change_done': 3,
+        'medical_history': 8,
+        'export_consultation_pdf': 3,
+        'export_prescription_pdf': 4,
+        'pdf_job_status': 3,
+        'veterinarians': 3,
+        'vets_by_service': 2,
+        'available_slots': 3,
+        'create_slot_hold': 13,
+        'release_slot_hold': 3,
+        'all_vets': 0,
+    }
+
+    def setUp(self):
+        pdf_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(self.settings(PDF_CACHE_DIR=pdf_dir))
+        self.create_clinic()
+
+    def test_every_url_has_a_budget(self):
+        self.assertEqual({pattern.name for pattern in urls.urlpatterns}, set(self.BUDGETS))
+
+    def _requests(self):
+        """(nombre, método, args, datos, sesión) de una petición típica a cada URL."""
+        pet = Pet.objects.filter(owner=self.customer).latest('id')
+        consultation = MedicalConsultation.objects.filter(appointment__pet=pet).get()
+        service = self.services[0]
+        # Lo que la petición borra se crea antes de medir
+        doomed_pet = Pet.objects.create(owner=self.customer, name='Temporal', pet_type='cat', weight=3)
+        doomed_appointment = Appointment.objects.create(
+            user=self.customer, pet=pet, service=service, veterinarian=self.vets[0],
+            date=date(2030, 2, 4), time='16:00',
+        )
+        hold = SlotHold.objects.create(
+            user=self.customer, veterinarian=self.vets[1], service=service,
+            date=date(2030, 2, 5), time='16:00', expires_at=timezone.now() + timedelta(minutes=5),
+        )
+        job = PdfJob.objects.create(
+            user=self.customer, kind='consulta', object_id=consultation.id, path='x.pdf', html='', status='done',
+        )
+        slot = {'service': service.id, 'date': '2030-02-06', 'time': '16:00'}
+        return [
+            ('home', 'get', [], None, True),
+            ('login', 'get', [], None, False),
+            ('register', 'get', [], None, False),
+            ('logout', 'post', [], None, True),
+            ('booking', 'get', [], None, True),
+            ('appointments', 'get', [], None, True),
+            ('delete_appointment', 'get', [doomed_appointment.id], None, True),
+            ('register_pet', 'get', [], None, True),
+            ('edit_pet', 'get', [pet.id], None, True),
+            ('delete_pet', 'post', [doomed_pet.id], None, True),
+            ('pet_detail', 'get', [pet.id], None, True),
+            ('export_pet_record', 'get', [pet.id], None, True),
+            ('documents', 'get', [], None, True),
+            ('services_schedules', 'get', [], None, True),
+            ('profile', 'get', [], None, True),
+            ('edit_profile', 'get', [], None, True),
+            ('update_avatar', 'post', [], None, True),
+            ('change_password', 'get', [], None, True),
+            ('password_change_done', 'get', [], None, True),
+            ('medical_history', 'get', [], None, True),
+            ('export_consultation_pdf', 'get', [consultation.id], None, True),
+            ('export_prescription_pdf', 'get', [consultation.prescription.id], None, True),
+            ('pdf_job_status', 'get', [job.id], None, True),
+            ('veterinarians', 'get', [], None, True),
+            ('vets_by_service', 'get', [service.id], None, True),
+            ('available_slots', 'get', [service.id], {'date': '2030-01-07'}, True),
+            ('create_slot_hold', 'post', [], slot, True),
+            ('release_slot_hold', 'post', [hold.id], None, True),
+            ('all_vets', 'get', [], None, True),
+        ]
+
+    def _measure(self):
+        counts = {}
+        for name, method, args, data, logged_in in self._requests():
+            client = Client()
+            if logged_in:
+                client.force_login(self.customer)
+            counts[name] = self.count_queries(client, method, reverse(name, args=args), data)
+        return counts
+
+    def test_query_counts_do_not_grow_with_data(self):
+        self.assert_query_counts(self.BUDGETS, self._measure)
+
+
+@override_settings(QUERY_BUDGET_SAMPLE_RATE=0)
+class PdfJobTests(TestCase):
+    """Un PDF encolado se reutiliza mientras está pendiente y un fallo no se repite solo."""
+
+    def setUp(self):
+        self.enterContext(self.settings(PDF_CACHE_DIR=self.enterContext(tempfile.TemporaryDirectory())))
+        self.user = User.objects.create_user('cliente', 'cliente@example.com', 'secreto123')
+        pet = Pet.objects.create(owner=self.user, name='Firulais', pet_type='dog', weight=10)
+        service = Service.objects.create(name='Consulta', description='General', duration=30, price=300)
+        vet = Veterinarian.objects.create(
+            name='Ana', specialty='general', license_number='123',
+            email='ana@example.com', phone='555', years_experience=5,
+        )
+        appointment = Appointment.objects.create(
+            user=self.user, pet=pet, service=service, veterinarian=vet,
+            date=date(2024, 1, 1), time='09:00', status='completed',
+        )
+        self.consultation = MedicalConsultation.objects.create(
+            appointment=appointment, veterinarian=vet, reason='Revisión', symptoms='Tos',
+            diagnosis='Resfriado', treatment='Reposo',
+        )
+        self.url = reverse('export_consultation_pdf', args=[self.consultation.id])
+        self.client.force_login(self.user)
+
+    def enqueue(self, path='a.pdf'):
+        return pdfjobs.enqueue_pdf(self.user, 'consulta', self.consultation.id, '<p>PDF</p>', path)
+
+    def download(self, **headers):
+        # Sin camino rápido: la descarga siempre pasa por la cola
+        with mock.patch('booking.views.render_sync', return_value=False):
+            return self.client.get(self.url, headers=headers)
+
+    def test_enqueue_reuses_pending_and_failed_jobs(self):
+        job = self.enqueue()
+        self.assertEqual(self.enqueue(), job)
+        # La tarea que lo genera se encola una sola vez, con el trabajo
+        self.assertEqual(list(Task.objects.values_list('name', 'queue', 'args')), [
+            ('booking.tasks.render_pdf', 'pdf', [job.id]),
+        ])
+
+        PdfJob.objects.filter(id=job.id).update(status='failed', error='PdfRenderError: sin fuentes')
+        self.assertEqual(self.enqueue(), job)
+        self.assertEqual(PdfJob.objects.count(), 1)
+
+        # Un PDF terminado (y luego desalojado de la caché) sí se vuelve a encolar
+        PdfJob.objects.filter(id=job.id).update(status='done')
+        self.assertNotEqual(self.enqueue(), job)
+        self.assertNotEqual(self.enqueue('b.pdf'), job)
+        self.assertEqual(Task.objects.count(), 3)
+
+    def test_one_active_job_per_document(self):
+        self.enqueue()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            PdfJob.objects.create(user=self.user, kind='consulta', object_id=self.consultation.id, path='a.pdf', html='')
+
+    def test_abandoned_jobs_fail_once_attempts_run_out(self):
+        started = timezone.now() - pdfjobs.STALE_AFTER - timedelta(minutes=1)
+        retry = self.enqueue('a.pdf')
+        spent = self.enqueue('b.pdf')
+        PdfJob.objects.filter(id=retry.id).update(status='running', started_at=started, attempts=1)
+        PdfJob.objects.filter(id=spent.id).update(status='running', started_at=started, attempts=pdfjobs.MAX_ATTEMPTS)
+
+        self.assertEqual(pdfjobs.fail_abandoned_jobs(), 1)
+        # Al primero aún le queda la tarea, que la cola reintenta al vencer el lease
+        self.assertEqual(PdfJob.objects.get(id=retry.id).status, 'running')
+        spent.refresh_from_db()
+        self.assertEqual(spent.status, 'failed')
+        self.assertTrue(spent.error)
+
+    def test_repeated_task_does_not_render_again(self):
+        job = self.enqueue(str(Path(settings.PDF_CACHE_DIR) / 'a.pdf'))
+        pdfjobs.render_job(job.id)
+        with mock.patch('booking.pdfjobs.render_to_file') as render:
+            pdfjobs.render_job(job.id)
+        render.assert_not_called()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('done', 1))
+
+    def test_download_waits_for_queued_job(self):
+        response = self.download()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response['Refresh'], '3')
+
+        response = self.download(Accept='application/json')
+        self.assertEqual(response.status_code, 202)
+        job = PdfJob.objects.get()
+        self.assertEqual(response.json()['job'], job.id)
+        status = self.client.get(response.json()['status_url']).json()
+        self.assertEqual((status['ready'], status['stalled']), (False, False))
+
+    def test_failed_job_stops_retrying(self):
+        self.download()
+        PdfJob.objects.update(status='failed', error='PdfRenderError: sin fuentes')
+
+        response = self.download()
+        self.assertEqual(response.status_code, 500)
+        self.assertNotIn('Refresh', response)
+        self.assertIn('sin fuentes', response.content.decode())
+        response = self.download(Accept='application/json')
+        self.assertEqual((response.status_code, response.json()['status']), (500, 'failed'))
+        self.assertEqual(PdfJob.objects.count(), 1)
+
+    def test_job_without_worker_stops_retrying(self):
+        self.download()
+        PdfJob.objects.update(created_at=timezone.now() - pdfjobs.WORKER_WAIT - timedelta(seconds=1))
+
+        response = self.download()
+        self.assertEqual(response.status_code, 503)
+        self.assertNotIn('Refresh', response)
+        job = PdfJob.objects.get()
+        self.assertTrue(self.client.get(reverse('pdf_job_status', args=[job.id])).json()['stalled'])
+
+
+class PdfCacheTests(ClinicData, TestCase):
+    """La clave del PDF sigue al contenido y a `updated_at`; la caché solo se recorre al pasar del límite."""
+
+    def setUp(self):
+        self.tmp = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(self.settings(PDF_CACHE_DIR=self.tmp))
+        self.create_clinic()
+        self.add_rows(1)
+        self.consultation = MedicalConsultation.objects.select_related(
+            'appointment__pet', 'appointment__user', 'veterinarian',
+        ).filter(appointment__user=self.customer).get()
+
+    def test_key_follows_content_and_updated_at(self):
+        html, path = pdfcache.consultation_pdf(self.consultation)
+        self.assertEqual(pdfcache.consultation_pdf(self.consultation), (html, path))
+        self.assertEqual(path.parent, self.tmp / str(self.consultation.id))
+        self.assertTrue(path.name.startswith('consulta-'))
+
+        base = pdfcache.cache_path(1, 'consulta', 'k', '<p>a</p>')
+        self.assertNotEqual(base, pdfcache.cache_path(1, 'consulta', 'k', '<p>b</p>'))
+        self.assertNotEqual(base, pdfcache.cache_path(1, 'receta', 'k', '<p>a</p>'))
+
+        # Mismo HTML con otro updated_at: otra clave
+        self.consultation.updated_at += timedelta(seconds=1)
+        same_html, moved = pdfcache.consultation_pdf(self.consultation)
+        self.assertEqual(same_html, html)
+        self.assertNotEqual(moved, path)
+
+    def test_editing_a_consultation_drops_its_pdfs(self):
+        prescription = MedicalPrescription.objects.get(consultation=self.consultation)
+        paths = [pdfcache.consultation_pdf(self.consultation)[1], pdfcache.prescription_pdf(prescription)[1]]
+        for path in paths:
+            pdfcache._write_atomic(path, b'%PDF-viejo')
+        handle = pdfcache.open_cached(paths[0])
+        self.assertIsNotNone(handle)
+        handle.close()
+
+        self.consultation.diagnosis = 'Bronquitis'
+        self.consultation.save()
+
+        self.assertFalse(any(path.exists() for path in paths))
+        _, path = pdfcache.consultation_pdf(self.consultation)
+        self.assertNotEqual(path, paths[0])
+        self.assertIsNone(pdfcache.open_cached(path))
+
+    @override_settings(PDF_CACHE_MAX_BYTES=100)
+    def test_writes_only_scan_the_directory_over_the_limit(self):
+        def write(name):
+            path = self.tmp / '1' / f'{name}.pdf'
+            pdfcache._write_atomic(path, b'x' * 40)
+            pdfcache.record_written(40)
+            return path
+
+        with mock.patch.object(pdfcache, 'evict', wraps=pdfcache.evict) as evict:
+            oldest = write('a')
+            os.utime(oldest, (0, 0))
+            self.assertEqual(evict.call_count, 1)
+            write('b')
+            self.assertEqual(evict.call_count, 1)
+            write('c')
+            self.assertEqual(evict.call_count, 2)
+
+        self.assertFalse(oldest.exists())
+        self.assertEqual(sorted(path.name for path in self.tmp.glob('*/*.pdf')), ['b.pdf', 'c.pdf'])
+
+
+class RecordExportTests(ClinicData, TestCase):
+    """El ZIP del historial es válido y un PDF que falla se sustituye por un .txt sin cortar la descarga."""
+
+    def setUp(self):
+        self.tmp = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(self.settings(PDF_CACHE_DIR=self.tmp))
+
+    def archive(self, chunks):
+        archive = zipfile.ZipFile(BytesIO(b''.join(chunks)))
+        self.addCleanup(archive.close)
+        self.assertIsNone(archive.testzip())
+        return archive
+
+    def documents(self, *names):
+        return [(name, f'<p>{name}</p>', self.tmp / '1' / name) for name in names]
+
+    def fake_render(self, html, path):
+        if 'roto' in html:
+            raise pdfcache.PdfRenderError('Error al generar el PDF (1 errores)')
+        pdfcache._write_atomic(Path(path), html.encode())
+        return len(html)
+
+    def test_pet_record_has_every_document(self):
+        self.create_clinic()
+        self.add_rows(1)
+        pet = Pet.objects.get(owner=self.customer)
+        consultation = MedicalConsultation.objects.get(appointment__pet=pet)
+        prescription = MedicalPrescription.objects.get(consultation=consultation)
+
+        archive = self.archive(recordexport.pet_record_zip(pet))
+        self.assertEqual(archive.namelist(), [
+            'vacunas.csv',
+            f'consultas/2024-01-01_{consultation.id:05d}_consulta.pdf',
+            f'recetas/2024-01-01_{prescription.id:05d}_receta.pdf',
+        ])
+        self.assertIn('Rabia', archive.read('vacunas.csv').decode('utf-8-sig'))
+        for name in archive.namelist()[1:]:
+            self.assertTrue(archive.read(name).startswith(b'%PDF'), name)
+
+        # La segunda exportación sale entera de la caché
+        with mock.patch.object(recordexport, 'render_to_file') as render:
+            again = self.archive(recordexport.pet_record_zip(pet))
+        render.assert_not_called()
+        self.assertEqual(again.namelist(), archive.namelist())
+
+    def test_failed_render_becomes_an_error_entry(self):
+        pool = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(pool.shutdown)
+        with mock.patch.object(recordexport, '_render_pool', return_value=pool), \
+                mock.patch.object(recordexport, 'render_to_file', side_effect=self.fake_render), \
+                self.assertLogs('booking.recordexport', 'WARNING'):
+            archive = self.archive(recordexport.stream_zip(self.documents('a.pdf', 'roto.pdf', 'c.pdf')))
+
+        self.assertEqual(archive.namelist(), ['a.pdf', 'roto.error.txt', 'c.pdf'])
+        self.assertIn('PdfRenderError', archive.read('roto.error.txt').decode())
+        self.assertEqual(archive.read('c.pdf'), b'<p>c.pdf</p>')
+
+    def test_broken_pool_is_replaced_and_the_document_rendered_here(self):
+        broken = Future()
+        broken.set_exception(BrokenProcessPool('Un proceso del pool murió'))
+        pool = mock.Mock(submit=mock.Mock(return_value=broken))
+        self.enterContext(mock.patch.object(recordexport, '_pool', pool))
+        with mock.patch.object(recordexport, 'render_to_file', side_effect=self.fake_render):
+            archive = self.archive(recordexport.stream_zip(self.documents('a.pdf')))
+
+        self.assertEqual(archive.read('a.pdf'), b'<p>a.pdf</p>')
+        pool.shutdown.assert_called_once_with(wait=False, cancel_futures=True)
+        self.assertIsNone(recordexport._pool)
+
+
+@override_settings(TASKQUEUE_SCHEDULE={})
+class PdfWorkerTests(TransactionTestCase):
+    """El worker de la cola genera los PDF y reintenta los fallos hasta MAX_ATTEMPTS."""
+
+    def setUp(self):
+        self.tmp = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(self.settings(PDF_CACHE_DIR=self.tmp))
+        self.user = User.objects.create_user('cliente', 'cliente@example.com', 'secreto123')
+
+    def run_worker(self):
+        # Los reintentos esperan: se adelantan para no depender del reloj
+        Task.objects.filter(status='queued').update(run_at=timezone.now())
+        call_command('run_worker', once=True, queues='pdf', threads=1, stdout=StringIO())
+
+    def test_worker_renders_and_fails_jobs(self):
+        ok = pdfjobs.enqueue_pdf(self.user, 'consulta', 1, '<p>Receta</p>', self.tmp / '1' / 'ok.pdf')
+        # El directorio de destino es un fichero: escribir falla en cada intento
+        (self.tmp / 'bloqueado').write_text('')
+        broken = pdfjobs.enqueue_pdf(self.user, 'consulta', 2, '<p>Receta</p>', self.tmp / 'bloqueado' / 'x.pdf')
+
+        self.run_worker()
+        ok.refresh_from_db()
+        self.assertEqual((ok.status, ok.attempts, ok.html), ('done', 1, ''))
+        self.assertTrue(Path(ok.path).read_bytes().startswith(b'%PDF'))
+        broken.refresh_from_db()
+        self.assertEqual((broken.status, broken.attempts), ('queued', 1))
+
+        for _ in range(pdfjobs.MAX_ATTEMPTS - 1):
+            self.run_worker()
+        broken.refresh_from_db()
+        self.assertEqual((broken.status, broken.attempts), ('failed', pdfjobs.MAX_ATTEMPTS))
+        self.assertTrue(broken.error)
+        self.assertEqual(Task.objects.get(args=[broken.id]).status, 'dead')
+
+
+class SlotClaimBackfillTests(TestCase):
+    """La migración de bloques asigna veterinario a las citas futuras antiguas y reclama su horario."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('cliente', 'cliente@example.com', 'secreto123')
+        self.pet = Pet.objects.create(owner=self.user, name='Firulais', pet_type='dog', weight=10)
+        self.service = Service.objects.create(name='Consulta', description='General', duration=30, price=300)
+        self.vets = []
+        for number, name in enumerate(['Ana', 'Beto'], start=1):
+            vet = Veterinarian.objects.create(
+                name=name, specialty='general', license_number=str(number),
+                email=f'{name.lower()}@example.com', phone='555', years_experience=5,
+            )
+            vet.services.set([self.service])
+            self.vets.append(vet)
+        self.day = timezone.localdate() + timedelta(days=7)
+
+    def book(self, time, vet=None, service=True, day=None, status='pending'):
+        # Como antes de 0010: sin bloques reclamados
+        return Appointment.objects.create(
+            user=self.user, pet=self.pet, service=self.service if service else None, veterinarian=vet,
+            date=day or self.day, time=time, status=status,
+        )
+
+    def test_backfill_assigns_vets_and_claims_slots(self):
+        backfill = import_module('booking.migrations.0020_backfill_slot_claims').backfill_slot_claims
+        with_vet = self.book('10:00', vet=self.vets[0])
+        first = self.book('10:00')
+        second = self.book('10:30')
+        # Los dos veterinarios ya tienen las 10:15 ocupadas: no hay a quién darla
+        third = self.book('10:15')
+        unknown_service = self.book('12:00', service=False)
+        past = self.book('10:00', day=date(2024, 1, 1))
+        cancelled = self.book('11:00', status='cancelled')
+
+        backfill(django_apps, None)
+
+        for appointment in (with_vet, first, second, third, unknown_service, past, cancelled):
+            appointment.refresh_from_db()
+        self.assertEqual(first.veterinarian, self.vets[1])
+        self.assertEqual(second.veterinarian, self.vets[0])
+        self.assertIsNone(third.veterinarian)
+        self.assertIsNone(unknown_service.veterinarian)
+        claims = SlotClaim.objects.values_list('appointment', 'veterinarian', 'slot')
+        self.assertCountEqual(claims, [
+            *[(with_vet.id, self.vets[0].id, slot) for slot in range(120, 126)],
+            *[(first.id, self.vets[1].id, slot) for slot in range(120, 126)],
+            *[(second.id, self.vets[0].id, slot) for slot in range(126, 132)],
+        ])
+
+        # Volver a correrla no duplica nada
+        backfill(django_apps, None)
+        self.assertEqual(SlotClaim.objects.count(), 18)
+
+
+class UserStatsBackfillTests(TestCase):
+    """La migración de los contadores rellena los perfiles de los usuarios que ya existían."""
+
+    def test_backfill_fills_existing_profiles(self):
+        backfill = import_module('booking.migrations.0018_backfill_user_stats').backfill_user_stats
+        user = User.objects.create_user('cliente', 'cliente@example.com', 'secreto123')
+        pet = Pet.objects.create(owner=user, name='Firulais', pet_type='dog', weight=10)
+        Appointment.objects.create(user=user, pet=pet, date=date(2024, 1, 1), time='09:00', status='completed')
+        # Como antes de 0012: perfiles a cero, o sin perfil
+        UserProfile.objects.update(pets_count=0, appointments_count=0, completed_count=0)
+        orphan = User.objects.create_user('sinperfil', 'sinperfil@example.com', 'secreto123')
+        UserProfile.objects.filter(user=orphan).delete()
+
+        backfill(django_apps, None)
+
+        profile = UserProfile.objects.get(user=user)
+        self.assertEqual((profile.pets_count, profile.appointments_count, profile.completed_count), (1, 1, 1))
+        self.assertTrue(UserProfile.objects.filter(user=orphan).exists())
+
+
+class UserStatsTests(TestCase):
+    """La próxima cita se mantiene sin recalcular el mínimo salvo cuando se quita o se mueve una próxima."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('cliente', 'cliente@example.com', 'secreto123')
+        self.pet = Pet.objects.create(owner=self.user, name='Firulais', pet_type='dog', weight=10)
+        self.today = timezone.localdate()
+
+    def book(self, days, status='pending'):
+        return Appointment.objects.create(
+            user=self.user, pet=self.pet, date=self.today + timedelta(days=days), time='09:00', status=status,
+        )
+
+    def next_date(self):
+        return UserProfile.objects.get(user=self.user).next_appointment_date
+
+    def min_recalculations(self, queries):
+        return [query['sql'] for query in queries if 'MIN(' in query['sql']]
+
+    def test_deferred_instances_move_counters_once(self):
+        self.book(3)
+        appointment = Appointment.objects.only('id').get()
+        appointment.status = 'completed'
+        appointment.save()
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual((profile.appointments_count, profile.completed_count), (1, 1))
+
+        Appointment.objects.only('id').get().delete()
+        profile.refresh_from_db()
+        self.assertEqual((profile.appointments_count, profile.completed_count), (0, 0))
+        self.assertIsNone(profile.next_appointment_date)
+
+    def test_next_date_follows_upcoming_appointments(self):
+        with CaptureQueriesContext(connection) as queries:
+            later = self.book(10)
+            earlier = self.book(3)
+            self.book(-5, status='completed')
+        # Las altas solo adelantan la fecha: ningún mínimo
+        self.assertEqual(self.min_recalculations(queries), [])
+        self.assertEqual(self.next_date(), earlier.date)
+
+        with CaptureQueriesContext(connection) as queries:
+            earlier.status = 'confirmed'
+            earlier.save()
+            earlier.notes = 'Traer cartilla'
+            earlier.save()
+        self.assertEqual(self.min_recalculations(queries), [])
+        self.assertEqual(self.next_date(), earlier.date)
+
+        earlier.status = 'cancelled'
+        earlier.save()
+        self.assertEqual(self.next_date(), later.date)
+
+        later.date = self.today + timedelta(days=20)
+        later.save()
+        self.assertEqual(self.next_date(), later.date)
+
+        later.delete()
+        self.assertIsNone(self.next_date())
+
+    def test_users_list_refreshes_past_next_dates(self):
+        upcoming = self.book(4)
+        UserProfile.objects.filter(user=self.user).update(next_appointment_date=self.today - timedelta(days=1))
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'secreto123')
+        self.client.force_login(admin)
+
+        response = self.client.get(reverse('admin_dashboard:users'))
+        row, = [row for row in response.context['users_data'] if row['user'] == self.user]
+        self.assertEqual(row['next_appointment_date'], upcoming.date)
+        self.assertEqual(self.next_date(), upcoming.date)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class SeedSyntheticTests(TestCase):
+    """seed_synthetic genera los volúmenes pedidos y deja las tablas derivadas al día."""
+
+    def test_generates_requested_volumes(self):
+        call_command(
+            'seed_synthetic', users=30, pets=60, appointments=300, consultations=40, vaccines=80,
+            past_days=60, future_days=14, stdout=StringIO(),
+        )
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Pet.objects.count(), 60)
+        self.assertEqual(Appointment.objects.count(), 300)
+        self.assertEqual(Vaccine.objects.count(), 80)
+        self.assertEqual(MedicalConsultation.objects.filter(appointment__status='completed').count(), 40)
+        self.assertTrue(PrescriptionItem.objects.exists())
+
+        # Cada cita que ocupa agenda tiene sus bloques (la restricción única impide solapes)
+        self.assertFalse(Appointment.objects.filter(
+            status__in=['pending', 'confirmed', 'completed'], slot_claims__isnull=True,
+        ).exists())
+        self.assertFalse(SlotClaim.objects.filter(appointment__status='cancelled').exists())
+
+        profiles = UserProfile.objects.filter(user__appointments__isnull=False).distinct()
+        self.assertEqual(UserProfile.objects.count(), 30)
+        self.assertTrue(all(profile.appointments_count for profile in profiles))
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    QUERY_BUDGET_SAMPLE_RATE=0,
+)
+class LoadTestCommandTests(ClinicData, TransactionTestCase):
+    """load_test recorre todos los escenarios con hilos y borra lo que reservó."""
+
+    def setUp(self):
+        self.tmp = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(self.settings(PDF_CACHE_DIR=self.tmp))
+        self.create_clinic()
+        self.add_rows(1)
+
+    def test_runs_every_scenario(self):
+        output = os.path.join(self.tmp, 'load.json')
+        appointments = Appointment.objects.count()
+
+        call_command(
+            'load_test', threads=2, seconds=1, poll_interval=0.2, days=5,
+            password='secreto123', output=output, stdout=StringIO(),
+        )
+
+        with open(output, encoding='utf-8') as results_file:
+            results = json.load(results_file)
+        self.assertEqual(set(results['scenarios']), {'login', 'admin_login', 'booking', 'history', 'dashboard'})
+        for step, figures in results['steps'].items():
+            with self.subTest(step=step):
+                self.assertEqual(figures['error_rate'], 0)
+        self.assertGreater(results['steps']['booking:submit']['requests'], 0)
+        self.assertEqual(Appointment.objects.count(), appointments)
@@ -17,6 +17,7 @@ urlpatterns = [
     path('pet/<int:pet_id>/edit/', views.edit_pet, name='edit_pet'),
     path('pet/<int:pet_id>/delete/', views.delete_pet, name='delete_pet'),
     path('pet/<int:pet_id>/', views.pet_detail_view, name='pet_detail'),
+    path('pet/<int:pet_id>/historial.zip', views.export_pet_record, name='export_pet_record'),
 
     path('documents/', views.documents_view, name='documents'),
     path('services-schedules/', views.services_schedules_view, name='services_schedules'),
@@ -46,7 +47,11 @@ urlpatterns = [
     path('historial/', views.medical_history_view, name='medical_history'),
     path('historial/consulta/<int:consultation_id>/pdf/', views.export_consultation_pdf, name='export_consultation_pdf'),
     path('historial/receta/<int:prescription_id>/pdf/', views.export_prescription_pdf, name='export_prescription_pdf'),
+    path('api/pdf-jobs/<int:job_id>/', views.pdf_job_status, name='pdf_job_status'),
     path('veterinarios/', views.veterinarians_view, name='veterinarians'),
     path('api/vets-by-service/<int:service_id>/', views.vets_by_service, name='vets_by_service'),
+    path('api/available-slots/<int:service_id>/', views.available_slots, name='available_slots'),
+    path('api/slot-holds/', views.create_slot_hold, name='create_slot_hold'),
+    path('api/slot-holds/<int:hold_id>/release/', views.release_slot_hold, name='release_slot_hold'),
     path('api/all-vets/', views.all_vets, name='all_vets'),
 ]
\ No newline at end of file
@@ -0,0 +1,207 @@
+"""
+Estadísticas desnormalizadas por usuario (en UserProfile).
+
+Las señales de Pet y Appointment suman o restan con F() sobre la fila del
+perfil, así que los listados leen los contadores con un select_related en
+lugar de contar mascotas y citas por cada usuario. `reconcile_user_stats`
+recalcula todo con consultas agrupadas y corrige cualquier desviación.
+
+La próxima cita se mantiene en el mismo UPDATE que los contadores: una cita
+nueva solo puede adelantarla (CASE sobre la fecha guardada) y solo cuando se
+quita o se mueve una cita próxima hace falta recalcular el mínimo (subconsulta
+dentro del UPDATE). Como el calendario avanza sin que nada se guarde, quien
+muestra la fecha la revisa con `upcoming_appointment_date` o, en listados,
+`refresh_upcoming_dates`.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Case, Count, F, Min, OuterRef, Q, Subquery, Value, When
+from django.utils import timezone
+
+from .models import Appointment, Pet, UserProfile
+
+
+STATUS_COUNTERS = {
+    'pending': 'pending_count',
+    'confirmed': 'confirmed_count',
+    'completed': 'completed_count',
+    'cancelled': 'cancelled_count',
+}
+
+# Estados que cuentan como "próxima cita"
+UPCOMING_STATUSES = ('pending', 'confirmed')
+
+STAT_FIELDS = ('pets_count', 'appointments_count', *STATUS_COUNTERS.values(), 'next_appointment_date')
+
+
+def appointment_deltas(status, sign):
+    deltas = {'appointments_count': sign}
+    field = STATUS_COUNTERS.get(status)
+    if field:
+        deltas[field] = sign
+    return deltas
+
+
+def is_upcoming(status, day):
+    """La cita cuenta para la próxima cita del usuario."""
+    return status in UPCOMING_STATUSES and day is not None and day >= timezone.localdate()
+
+
+def next_appointment_date(user_id):
+    return Appointment.objects.filter(
+        user_id=user_id,
+        status__in=UPCOMING_STATUSES,
+        date__gte=timezone.localdate(),
+    ).aggregate(next_date=Min('date'))['next_date']
+
+
+def _next_date_subquery():
+    return Subquery(
+        Appointment.objects.filter(
+            user_id=OuterRef('user_id'),
+            status__in=UPCOMING_STATUSES,
+            date__gte=timezone.localdate(),
+        ).order_by().values('user_id').annotate(next_date=Min('date')).values('next_date')[:1]
+    )
+
+
+def bump_user_stats(user_id, refresh_next=False, upcoming=None, **deltas):
+    """
+    Suma `deltas` a los contadores del usuario. `upcoming` es la fecha de una
+    cita próxima nueva (adelanta la próxima cita si es anterior);
+    `refresh_next` recalcula la próxima cita. Todo en un solo UPDATE.
+    """
+    if user_id is None:
+        return
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if refresh_next:
+        changes['next_appointment_date'] = _next_date_subquery()
+    elif upcoming is not None:
+        changes['next_appointment_date'] = Case(
+            When(Q(next_appointment_date__isnull=True) | Q(next_appointment_date__gt=upcoming), then=Value(upcoming)),
+            default=F('next_appointment_date'),
+        )
+    if not changes:
+        return
+    updated = UserProfile.objects.filter(user_id=user_id).update(**changes)
+    # Solo las altas recrean un perfil ausente: al borrar un usuario en cascada
+    # su perfil puede desaparecer antes que sus citas y mascotas
+    if not updated and any(delta > 0 for delta in deltas.values()):
+        refresh_user_stats(user_id)
+
+
+def empty_stats():
+    values = {field: 0 for field in STAT_FIELDS}
+    values['next_appointment_date'] = None
+    return values
+
+
+def compute_user_stats(user_ids=None):
+    """
+    Valores correctos de STAT_FIELDS por usuario, con tres consultas agrupadas.
+    Devuelve {user_id: {campo: valor}} solo para usuarios con mascotas o citas.
+    """
+    pets = Pet.objects.order_by()
+    appointments = Appointment.objects.order_by()
+    if user_ids is not None:
+        pets = pets.filter(owner_id__in=user_ids)
+        appointments = appointments.filter(user_id__in=user_ids)
+
+    stats = {}
+
+    def entry(user_id):
+        return stats.setdefault(user_id, empty_stats())
+
+    for row in pets.values('owner').annotate(total=Count('id')):
+        entry(row['owner'])['pets_count'] = row['total']
+
+    for row in appointments.values('user', 'status').annotate(total=Count('id')):
+        values = entry(row['user'])
+        values['appointments_count'] += row['total']
+        field = STATUS_COUNTERS.get(row['status'])
+        if field:
+            values[field] += row['total']
+
+    upcoming = appointments.filter(
+        status__in=UPCOMING_STATUSES,
+        date__gte=timezone.localdate(),
+    ).values('user').annotate(next_date=Min('date'))
+    for row in upcoming:
+        entry(row['user'])['next_appointment_date'] = row['next_date']
+
+    return stats
+
+
+def reconcile_user_stats(dry_run=False):
+    """
+    Compara los contadores de todos los perfiles con compute_user_stats y
+    corrige las desviaciones, creando los perfiles que faltan. Devuelve
+    ([(user_id, campos desviados)], usuarios sin perfil).
+    """
+    expected = compute_user_stats()
+
+    # Usuarios sin perfil (creados antes de la señal o con el perfil borrado)
+    missing = User.objects.filter(profile__isnull=True).values_list('id', flat=True)
+    new_profiles = [
+        UserProfile(user_id=user_id, **expected.get(user_id, empty_stats()))
+        for user_id in missing
+    ]
+
+    drifted = []
+    changes = []
+    profiles = UserProfile.objects.only('id', 'user_id', *STAT_FIELDS).iterator(chunk_size=2000)
+    for profile in profiles:
+        values = expected.get(profile.user_id, empty_stats())
+        changed = [f for f in STAT_FIELDS if getattr(profile, f) != values[f]]
+        if changed:
+            for field in changed:
+                setattr(profile, field, values[field])
+            drifted.append(profile)
+            changes.append((profile.user_id, changed))
+
+    if not dry_run:
+        with transaction.atomic():
+            UserProfile.objects.bulk_create(new_profiles, batch_size=1000)
+            UserProfile.objects.bulk_update(drifted, STAT_FIELDS, batch_size=1000)
+    return changes, len(new_profiles)
+
+
+def refresh_user_stats(user_id):
+    """Recalcula las estadísticas de un usuario, creando el perfil si falta."""
+    values = compute_user_stats([user_id]).get(user_id) or empty_stats()
+    profile, created = UserProfile.objects.get_or_create(user_id=user_id, defaults=values)
+    if not created:
+        UserProfile.objects.filter(pk=profile.pk).update(**values)
+
+
+def refresh_upcoming_dates(profiles):
+    """
+    Revisa la próxima cita de varios perfiles (una página de un listado): las
+    fechas que ya pasaron se recalculan con una consulta agrupada y se guardan.
+    """
+    today = timezone.localdate()
+    stale = [
+        profile for profile in profiles
+        if profile.next_appointment_date is not None and profile.next_appointment_date < today
+    ]
+    if not stale:
+        return
+    upcoming = dict(
+        Appointment.objects.filter(
+            user_id__in=[profile.user_id for profile in stale],
+            status__in=UPCOMING_STATUSES,
+            date__gte=today,
+        ).order_by().values('user').annotate(next_date=Min('date')).values_list('user', 'next_date')
+    )
+    for profile in stale:
+        profile.next_appointment_date = upcoming.get(profile.user_id)
+    UserProfile.objects.bulk_update(stale, ['next_appointment_date'])
+
+
+def upcoming_appointment_date(profile):
+    """
+    Próxima cita del perfil. Si la fecha guardada ya pasó (el contador no se
+    entera de que avanza el calendario) se recalcula y se guarda.
+    """
+    refresh_upcoming_dates([profile])
+    return profile.next_appointment_date
@@ -7,6 +7,15 @@ from django.contrib import messages
 from django.utils import timezone
 
 from .forms import RegisterForm, AppointmentForm
+from .reservations import reserve_appointment, hold_slot, release_hold, SlotUnavailable
+from .userstats import refresh_user_stats, upcoming_appointment_date
+from .catalog import (
+    active_services,
+    active_veterinarians,
+    all_veterinarians,
+    clinic_schedules,
+    vets_json,
+)
 from .models import (
     Appointment,
     Pet,
@@ -68,7 +77,7 @@ def logout_view(request):
 
 @login_required
 def home_view(request):
-    total_vets = Veterinarian.objects.filter(is_active=True).count()
+    total_vets = len(active_veterinarians())
     return render(request, 'booking/home.html', {'total_vets': total_vets})
 
 
@@ -91,18 +100,22 @@ def booking_view(request):
         if form.is_valid():
             appointment = form.save(commit=False)
             appointment.user = request.user
-            appointment.save()
-
-            messages.success(
-                request,
-                f'¡Cita agendada para {appointment.pet.name}!'
-            )
-            return redirect('appointments')
+            try:
+                reserve_appointment(appointment, hold=form.slot_hold)
+            except SlotUnavailable as exc:
+                form.add_error(None, str(exc))
+            else:
+                messages.success(
+                    request,
+                    f'¡Cita agendada para {appointment.pet.name}!'
+                )
+                return redirect('appointments')
     else:
         form = AppointmentForm(user=request.user)
 
     return render(request, 'booking/booking.html', {
         'form': form,
+        'services': active_services(),
         'preselected_vet_id': preselected_vet_id,
         'preselected_vet': preselected_vet,
         'preselected_service_id': preselected_service_id
@@ -111,7 +124,7 @@ def booking_view(request):
 
 @login_required
 def appointments_view(request):
-    appointments = Appointment.objects.filter(user=request.user)
+    appointments = Appointment.objects.filter(user=request.user).select_related('pet', 'service')
     return render(
         request,
         'booking/appointments.html',
@@ -197,7 +210,8 @@ def register_pet_view(request):
 
 @login_required
 def services_schedules_view(request):
-    services = Service.objects.filter(is_active=True).order_by('name')
+    services = active_services()
+    configured = clinic_schedules()
 
     days = [
         ('Lunes',     'monday'),
@@ -213,7 +227,7 @@ def services_schedules_view(request):
 
     schedules = []
     for name, day_key in days:
-        schedule = ClinicSchedule.objects.filter(day_of_week=day_key).first()
+        schedule = configured.get(day_key)
 
         if not schedule:
             schedule = ClinicSchedule(day_of_week=day_key, is_open=False)
@@ -227,7 +241,7 @@ def services_schedules_view(request):
 
         schedules.append(schedule)
 
-    veterinarians = Veterinarian.objects.filter(is_active=True).order_by('name')
+    veterinarians = active_veterinarians()
 
     return render(request, 'booking/services_schedules.html', {
         'services': services,
@@ -281,23 +295,19 @@ def profile(request):
     # Obtener o crear el perfil del usuario
     profile, created = UserProfile.objects.get_or_create(user=request.user)
     
-    # Obtener estadísticas del usuario
-    total_appointments = Appointment.objects.filter(user=request.user).count()
-    completed_appointments = Appointment.objects.filter(
-        user=request.user, 
-        status='completed'
-    ).count()
-    pending_appointments = Appointment.objects.filter(
-        user=request.user, 
-        status__in=['pending', 'confirmed']
-    ).count()
+    # Estadísticas del usuario, desnormalizadas en el perfil
+    if created:
+        refresh_user_stats(request.user.id)
+        profile.refresh_from_db()
     
     context = {
         'user': request.user,
         'profile': profile,
-        'total_appointments': total_appointments,
-        'completed_appointments': completed_appointments,
-        'pending_appointments': pending_appointments,
+        'total_appointments': profile.appointments_count,
+        'completed_appointments': profile.completed_count,
+        'pending_appointments': profile.pending_count + profile.confirmed_count,
+        'pets_count': profile.pets_count,
+        'next_appointment_date': upcoming_appointment_date(profile),
     }
     
     return render(request, 'booking/profile.html', context)
@@ -434,50 +444,117 @@ def medical_history_view(request):
 # =============================
 # EXPORTAR PDF
 # =============================
-from django.http import HttpResponse
-from django.template.loader import render_to_string
-from xhtml2pdf import pisa
-from io import BytesIO
-from .models import MedicalConsultation, MedicalPrescription
+from django.http import FileResponse, HttpResponse, JsonResponse
+from .models import MedicalConsultation, MedicalPrescription, PdfJob
+from .pdfcache import consultation_pdf, open_cached, prescription_pdf
+from .pdfjobs import enqueue_pdf, is_stalled, render_sync
+from .recordexport import pet_record_zip, zip_response
+from VetifyBooking.replica import reads_from_replica
+from django.utils.text import slugify
+
+def _pdf_response(request, kind, object_id, document, filename):
+    """
+    Sirve el PDF desde la caché; si no está, lo genera en el camino rápido o
+    lo encola y responde 202 para que el cliente consulte el estado. Si el
+    trabajo ya falló o nadie lo atiende responde el error, sin reintentos.
+    """
+    html, path = document
+    pdf = open_cached(path)
+    if pdf is None and render_sync(html, path):
+        pdf = open_cached(path)
+    if pdf is not None:
+        return FileResponse(pdf, as_attachment=True, filename=filename, content_type='application/pdf')
+
+    job = enqueue_pdf(request.user, kind, object_id, html, path)
+    # Un trabajo fallido o sin worker no se reintenta solo: se informa y se corta
+    if job.status == 'failed':
+        status, message = 500, f'No se pudo generar el PDF: {job.error}'
+    elif is_stalled(job):
+        status, message = 503, 'La generación de PDF no está disponible ahora. Inténtalo más tarde.'
+    else:
+        status, message = 202, 'El PDF se está generando. La descarga empezará en unos segundos.'
+
+    if 'application/json' in request.headers.get('Accept', ''):
+        return JsonResponse({
+            'job': job.id,
+            'status': job.status,
+            'status_url': reverse('pdf_job_status', args=[job.id]),
+            'error': message if status != 202 else '',
+        }, status=status)
+
+    response = HttpResponse(message, status=status, content_type='text/plain; charset=utf-8')
+    if status == 202:
+        # Sin JavaScript: el navegador reintenta solo y descarga cuando esté listo
+        response['Refresh'] = '3'
+    return response
+
 
 @login_required
 def export_consultation_pdf(request, consultation_id):
     consultation = get_object_or_404(
-        MedicalConsultation,
+        MedicalConsultation.objects.select_related(
+            'appointment__pet', 'appointment__user', 'veterinarian'
+        ),
         id=consultation_id,
         appointment__user=request.user
     )
-    html_string = render_to_string('booking/pdf_consultation.html', {
-        'consultation': consultation,
-    })
-    buffer = BytesIO()
-    pisa.CreatePDF(html_string, dest=buffer)
-    pdf = buffer.getvalue()
-    buffer.close()
-
-    response = HttpResponse(pdf, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="consulta_{consultation.appointment.pet.name}_{consultation.appointment.date}.pdf"'
-    return response
+    return _pdf_response(
+        request,
+        'consulta',
+        consultation.id,
+        consultation_pdf(consultation),
+        f'consulta_{consultation.appointment.pet.name}_{consultation.appointment.date}.pdf',
+    )
 
 
 @login_required
 def export_prescription_pdf(request, prescription_id):
     prescription = get_object_or_404(
-        MedicalPrescription,
+        MedicalPrescription.objects.select_related(
+            'consultation__appointment__pet',
+            'consultation__appointment__user',
+            'consultation__veterinarian',
+        ).prefetch_related('items'),
         id=prescription_id,
         consultation__appointment__user=request.user
     )
-    html_string = render_to_string('booking/pdf_prescription.html', {
-        'prescription': prescription,
-    })
-    buffer = BytesIO()
-    pisa.CreatePDF(html_string, dest=buffer)
-    pdf = buffer.getvalue()
-    buffer.close()
+    appointment = prescription.consultation.appointment
+    return _pdf_response(
+        request,
+        'receta',
+        prescription.id,
+        prescription_pdf(prescription),
+        f'receta_{appointment.pet.name}_{appointment.date}.pdf',
+    )
 
-    response = HttpResponse(pdf, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="receta_{prescription.consultation.appointment.pet.name}_{prescription.consultation.appointment.date}.pdf"'
-    return response
+
+@login_required
+@reads_from_replica
+def export_pet_record(request, pet_id):
+    """ZIP con todas las consultas, recetas y vacunas de la mascota"""
+    pet = get_object_or_404(Pet, id=pet_id, owner=request.user)
+    return zip_response(request, pet_record_zip(pet), f'historial_{slugify(pet.name) or pet.id}.zip')
+
+
+PDF_DOWNLOAD_URLS = {
+    'consulta': 'export_consultation_pdf',
+    'receta': 'export_prescription_pdf',
+}
+
+
+@login_required
+def pdf_job_status(request, job_id):
+    """Estado de un PDF encolado; al estar listo incluye la URL de descarga"""
+    job = get_object_or_404(PdfJob, id=job_id, user=request.user)
+    return JsonResponse({
+        'job': job.id,
+        'status': job.status,
+        'ready': job.status == 'done',
+        # En cola sin worker que lo tome: el cliente deja de consultar
+        'stalled': is_stalled(job),
+        'download_url': reverse(PDF_DOWNLOAD_URLS[job.kind], args=[job.object_id]),
+        'error': job.error if job.status == 'failed' else '',
+    })
 
 from .models import Vaccine
 
@@ -496,44 +573,114 @@ def pet_detail_view(request, pet_id):
 
 @login_required
 def veterinarians_view(request):
-    veterinarians = Veterinarian.objects.all().order_by('name')
+    veterinarians = all_veterinarians()
     return render(request, 'booking/veterinarians.html', {
         'veterinarians': veterinarians,
     })
 
 from django.http import JsonResponse
+from VetifyBooking.asyncviews import run_query
 
 @login_required
-def vets_by_service(request, service_id):
-    vets = Veterinarian.objects.filter(
-        services__id=service_id,
-        is_active=True
-    )
-
+async def vets_by_service(request, service_id):
+    vets = await run_query(vets_json)
     return JsonResponse({
         'vets': [
             {
-                'id': vet.id,
-                'name': vet.name,
-                'specialty': vet.get_specialty_display(),
-                'photo': vet.photo.url if vet.photo else None
+                'id': vet['id'],
+                'name': vet['name'],
+                'specialty': vet['specialty'],
+                'photo': vet['photo']
             }
             for vet in vets
+            if service_id in vet['service_ids']
         ]
     })
 
+from .availability import build_slot_index, parse_start_date
+
+@login_required
+def available_slots(request, service_id):
+    """Horarios libres por veterinario para un servicio (por defecto, 7 días desde hoy)"""
+    service = get_object_or_404(Service, id=service_id, is_active=True)
+
+    try:
+        days = int(request.GET.get('days', 7))
+    except ValueError:
+        days = 7
+
+    vet_id = request.GET.get('vet', '')
+
+    index = build_slot_index(
+        service,
+        parse_start_date(request.GET.get('date')),
+        days=days,
+        vet_id=int(vet_id) if vet_id.isdigit() else None,
+    )
+
+    return JsonResponse({
+        'service': {
+            'id': service.id,
+            'name': service.name,
+            'duration': index.duration,
+        },
+        'days': index.as_json(),
+    })
+
+from datetime import time as dt_time
+from django.views.decorators.http import require_POST
+
+@login_required
+@require_POST
+def create_slot_hold(request):
+    """Aparta por unos minutos el horario que el cliente acaba de elegir"""
+    try:
+        service_id = int(request.POST.get('service', ''))
+        day = date.fromisoformat(request.POST.get('date', ''))
+        start_time = dt_time.fromisoformat(request.POST.get('time', ''))
+    except ValueError:
+        return JsonResponse({'error': 'Servicio, fecha u hora inválidos.'}, status=400)
+
+    service = get_object_or_404(Service, id=service_id, is_active=True)
+
+    vet_id = request.POST.get('vet', '')
+    index = build_slot_index(service, day, days=1, vet_id=int(vet_id) if vet_id.isdigit() else None)
+    if vet_id.isdigit():
+        vet = index.vets[0] if index.is_available(int(vet_id), day, start_time) else None
+    else:
+        vet = index.first_free_vet(day, start_time)
+
+    if vet is None:
+        return JsonResponse({'error': 'El horario ya no está disponible.'}, status=409)
+
+    try:
+        hold = hold_slot(request.user, vet, service, day, start_time)
+    except SlotUnavailable as exc:
+        return JsonResponse({'error': str(exc)}, status=409)
+
+    return JsonResponse({
+        'hold': hold.id,
+        'expires_at': hold.expires_at.isoformat(),
+        'vet': {'id': vet.id, 'name': vet.name},
+    }, status=201)
+
+
+@login_required
+@require_POST
+def release_slot_hold(request, hold_id):
+    return JsonResponse({'released': release_hold(request.user, hold_id)})
+
 from django.http import JsonResponse
 from .models import Veterinarian
 
-def all_vets(request):
-    vets = Veterinarian.objects.filter(is_active=True)
-
+async def all_vets(request):
+    vets = await run_query(vets_json)
     return JsonResponse({
         'vets': [
             {
-                'id': vet.id,
-                'name': vet.name,
-                'specialty': vet.get_specialty_display()
+                'id': vet['id'],
+                'name': vet['name'],
+                'specialty': vet['specialty']
             }
             for vet in vets
         ]
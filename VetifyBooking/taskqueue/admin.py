@@ -0,0 +1,17 @@
+from django.contrib import admin
+
+from .models import Task
+from .queue import requeue_dead
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'queue', 'priority', 'status', 'run_at', 'attempts', 'max_attempts', 'locked_by')
+    list_filter = ('status', 'queue')
+    search_fields = ('name', 'last_error')
+    actions = ['requeue']
+
+    @admin.action(description="Reencolar las tareas descartadas")
+    def requeue(self, request, queryset):
+        count = requeue_dead(list(queryset.filter(status='dead').values_list('id', flat=True)))
+        self.message_user(request, f'Tareas reencoladas: {count}')
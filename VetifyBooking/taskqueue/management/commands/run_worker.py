@@ -0,0 +1,138 @@
+import multiprocessing
+import os
+import socket
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand
+
+from taskqueue import process
+from taskqueue.queue import (
+    claim, complete, execute, fail, lease_seconds, purge_done, reap_expired_leases, release, renew_leases,
+    requeue_dead, schedule_periodic,
+)
+
+
+# Segundos entre rondas de mantenimiento (leases vencidos, tareas viejas y
+# periódicas de TASKQUEUE_SCHEDULE)
+MAINTENANCE_EVERY = 60
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta las tareas en cola (Task) en un pool de hilos o de procesos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=4,
+            help='Tareas en paralelo en hilos (para tareas que esperan base de datos o red)',
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=0,
+            help='Tareas en paralelo en procesos (para tareas de CPU); reemplaza a --threads',
+        )
+        parser.add_argument(
+            '--queues',
+            default='',
+            help='Colas a atender separadas por comas (por defecto, todas)',
+        )
+        parser.add_argument(
+            '--poll',
+            type=float,
+            default=1.0,
+            help='Segundos entre consultas a la cola cuando no hay trabajo',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Procesa las tareas listas y termina',
+        )
+        parser.add_argument(
+            '--requeue-dead',
+            action='store_true',
+            help='Vuelve a encolar las tareas descartadas y termina',
+        )
+
+    def handle(self, *args, **options):
+        if options['requeue_dead']:
+            self.stdout.write(f'Tareas reencoladas: {requeue_dead()}')
+            return
+
+        worker_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}'
+        queues = [queue.strip() for queue in options['queues'].split(',') if queue.strip()]
+        self.stdout.write(f'Worker {worker_id} ({", ".join(queues) or "todas las colas"})')
+
+        try:
+            while True:
+                if options['processes'] > 0:
+                    size = options['processes']
+                    pool = ProcessPoolExecutor(
+                        max_workers=size,
+                        mp_context=multiprocessing.get_context('spawn'),
+                        initializer=process.init_process,
+                    )
+                    run = process.execute
+                else:
+                    size = max(options['threads'], 1)
+                    pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix='task')
+                    run = execute
+                with pool:
+                    broken = self._run(pool, run, size, worker_id, queues, options)
+                if not broken:
+                    break
+                self.stderr.write('El pool de procesos se rompió; se vuelve a crear')
+        except KeyboardInterrupt:
+            # Lo que quedó a medias vuelve a la cola sin esperar a que venza el lease
+            self.stdout.write(f'Tareas devueltas a la cola: {release(worker_id)}')
+
+    def _run(self, pool, run, size, worker_id, queues, options):
+        running = {}
+        maintained = renewed = 0
+        while True:
+            now = time.monotonic()
+            if now - maintained >= MAINTENANCE_EVERY:
+                requeued, dead = reap_expired_leases()
+                if requeued or dead:
+                    self.stdout.write(f'Leases vencidos: {requeued} a la cola, {dead} descartadas')
+                purge_done()
+                for task in schedule_periodic():
+                    self.stdout.write(f'{task.name} #{task.id}: programada')
+                maintained = now
+            if running and now - renewed >= lease_seconds() / 3:
+                renew_leases(worker_id)
+                renewed = now
+
+            free = size - len(running)
+            if free:
+                for task in claim(worker_id, free, queues):
+                    running[pool.submit(run, task.name, task.args, task.kwargs)] = task
+                if not running:
+                    renewed = time.monotonic()
+
+            if not running:
+                if options['once']:
+                    return False
+                time.sleep(options['poll'])
+                continue
+
+            done, _ = wait(running, timeout=options['poll'], return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                task = running.pop(future)
+                error = future.exception()
+                if error is None:
+                    complete(task, worker_id)
+                    self.stdout.write(f'{task.name} #{task.id}: lista')
+                    continue
+                broken = broken or isinstance(error, BrokenProcessPool)
+                status = fail(task, worker_id, error)
+                self.stdout.write(f'{task.name} #{task.id}: {type(error).__name__} ({status})')
+            if broken:
+                for task in running.values():
+                    fail(task, worker_id, 'BrokenProcessPool')
+                return True
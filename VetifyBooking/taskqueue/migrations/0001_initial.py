@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:26
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Task',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='Tarea')),
+                ('args', models.JSONField(blank=True, default=list)),
+                ('kwargs', models.JSONField(blank=True, default=dict)),
+                ('queue', models.CharField(default='default', max_length=50, verbose_name='Cola')),
+                ('priority', models.SmallIntegerField(default=0, verbose_name='Prioridad')),
+                ('status', models.CharField(choices=[('queued', 'En cola'), ('running', 'En curso'), ('done', 'Terminada'), ('dead', 'Descartada')], default='queued', max_length=20, verbose_name='Estado')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Ejecutar desde')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=5, verbose_name='Intentos máximos')),
+                ('locked_by', models.CharField(blank=True, max_length=100)),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Tarea',
+                'verbose_name_plural': 'Tareas',
+                'ordering': ['-priority', 'run_at', 'id'],
+                'indexes': [models.Index(fields=['status', '-priority', 'run_at'], name='task_ready_idx'), models.Index(fields=['status', 'lease_expires_at'], name='task_lease_idx')],
+            },
+        ),
+    ]
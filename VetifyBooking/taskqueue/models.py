@@ -0,0 +1,54 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Task(models.Model):
+    """
+    Tarea en segundo plano guardada en la base (ver taskqueue.queue). La
+    ejecuta `manage.py run_worker`; las que agotan sus intentos quedan como
+    "dead" con el último error, a la espera de revisión.
+    """
+
+    STATUS_CHOICES = [
+        ('queued', 'En cola'),
+        ('running', 'En curso'),
+        ('done', 'Terminada'),
+        ('dead', 'Descartada'),
+    ]
+
+    # Nombre con el que se registró la función (módulo.función)
+    name = models.CharField(max_length=200, verbose_name="Tarea")
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    queue = models.CharField(max_length=50, default='default', verbose_name="Cola")
+    # Mayor número, antes se ejecuta
+    priority = models.SmallIntegerField(default=0, verbose_name="Prioridad")
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued', verbose_name="Estado")
+    # No se ejecuta antes de este instante (tareas diferidas y reintentos)
+    run_at = models.DateTimeField(default=timezone.now, verbose_name="Ejecutar desde")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Intentos")
+    max_attempts = models.PositiveSmallIntegerField(default=5, verbose_name="Intentos máximos")
+
+    # Worker que la tiene y hasta cuándo; si el lease vence, otro la retoma
+    locked_by = models.CharField(max_length=100, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Tarea"
+        verbose_name_plural = "Tareas"
+        ordering = ['-priority', 'run_at', 'id']
+        indexes = [
+            # Siguiente tarea lista: estado, prioridad y hora en el orden de la cola
+            models.Index(fields=['status', '-priority', 'run_at'], name='task_ready_idx'),
+            # Leases vencidos de workers caídos
+            models.Index(fields=['status', 'lease_expires_at'], name='task_lease_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
@@ -0,0 +1,17 @@
+"""
+Lado de los procesos hijos de `run_worker --processes`.
+
+Arrancan con spawn (no heredan conexiones ni hilos del worker), así que este
+módulo no importa modelos: Django se configura en `init_process`, que además
+carga los tasks.py de todas las apps.
+"""
+import django
+
+
+def init_process():
+    django.setup()
+
+
+def execute(name, args, kwargs):
+    from .queue import execute as run
+    return run(name, args, kwargs)
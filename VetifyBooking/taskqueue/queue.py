@@ -0,0 +1,234 @@
+"""
+Cola de tareas en la base de datos, sin broker externo.
+
+Una función se registra con @task en el tasks.py de su app y se encola con
+`func.enqueue(...)` (o `enqueue('modulo.funcion', ...)`). La fila se inserta
+en la transacción en curso, así que la tarea solo existe si el cambio que la
+pidió se confirma. Los argumentos se guardan como JSON: ids, no objetos.
+
+`manage.py run_worker` reclama tareas listas por prioridad y hora: con
+SELECT ... FOR UPDATE SKIP LOCKED donde la base lo admite y, en SQLite, con un
+UPDATE condicionado al estado (como PdfJob), de modo que dos workers nunca
+ejecutan la misma. Cada tarea reclamada lleva un lease que el worker renueva
+mientras corre; si el worker muere, al vencer vuelve a la cola. Un fallo se
+reintenta con espera exponencial y, agotados los intentos, la tarea queda
+"dead" con su error. La entrega es al menos una vez: las tareas deben poder
+repetirse sin daño.
+
+Las tareas periódicas se declaran en TASKQUEUE_SCHEDULE y las encola la ronda
+de mantenimiento del worker (`schedule_periodic`).
+"""
+import functools
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Task
+
+
+# Nombre registrado -> función
+registry = {}
+
+# Caracteres del error que se guardan en la tarea
+ERROR_LIMIT = 5000
+
+
+def lease_seconds():
+    return getattr(settings, 'TASKQUEUE_LEASE_SECONDS', 300)
+
+
+def default_max_attempts():
+    return getattr(settings, 'TASKQUEUE_MAX_ATTEMPTS', 5)
+
+
+def retry_delay(attempts):
+    """Segundos hasta el reintento: exponencial con tope y algo de azar."""
+    base = getattr(settings, 'TASKQUEUE_RETRY_BACKOFF', 10)
+    cap = getattr(settings, 'TASKQUEUE_RETRY_MAX_DELAY', 3600)
+    return min(base * 2 ** (attempts - 1), cap) * random.uniform(0.75, 1.25)
+
+
+# =========================
+#   REGISTRO Y ENCOLADO
+# =========================
+def task(func=None, *, name=None, queue='default', priority=0, max_attempts=None):
+    """
+    Registra `func` como tarea. La función se puede seguir llamando
+    directamente y gana `func.enqueue(*args, **kwargs)` con estas opciones.
+    """
+    def register(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        registry[task_name] = func
+        func.task_name = task_name
+
+        @functools.wraps(func)
+        def enqueue_call(*args, **kwargs):
+            return enqueue(task_name, args, kwargs, queue=queue, priority=priority, max_attempts=max_attempts)
+
+        func.enqueue = enqueue_call
+        return func
+
+    if func is not None:
+        return register(func)
+    return register
+
+
+def enqueue(name, args=(), kwargs=None, *, queue='default', priority=0, run_at=None, delay=None, max_attempts=None):
+    """
+    Encola la tarea `name` (o la función registrada). `run_at` o `delay`
+    (segundos) la difieren; por defecto se puede ejecutar ya.
+    """
+    name = getattr(name, 'task_name', name)
+    if run_at is None:
+        run_at = timezone.now() + timedelta(seconds=delay or 0)
+    return Task.objects.create(
+        name=name,
+        args=list(args),
+        kwargs=kwargs or {},
+        queue=queue,
+        priority=priority,
+        run_at=run_at,
+        max_attempts=max_attempts or default_max_attempts(),
+    )
+
+
+def execute(name, args, kwargs):
+    """Ejecuta la tarea registrada como `name` (en el hilo o proceso del pool)."""
+    # Cada hilo del pool tiene su conexión: se revisa y se cierra como en una petición
+    close_old_connections()
+    try:
+        return registry[name](*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+# =========================
+#   WORKER
+# =========================
+def _ready(now, queues):
+    ready = Task.objects.filter(status='queued', run_at__lte=now)
+    if queues:
+        ready = ready.filter(queue__in=queues)
+    return ready.order_by('-priority', 'run_at', 'id')
+
+
+def claim(worker_id, limit, queues=None):
+    """Reclama hasta `limit` tareas listas para `worker_id` y las devuelve."""
+    now = timezone.now()
+    changes = {
+        'status': 'running',
+        'locked_by': worker_id,
+        'lease_expires_at': now + timedelta(seconds=lease_seconds()),
+        'started_at': now,
+        'attempts': F('attempts') + 1,
+    }
+
+    if connection.features.has_select_for_update_skip_locked:
+        # Las filas que otro worker está reclamando se saltan en lugar de esperar
+        with transaction.atomic():
+            claimed = list(
+                _ready(now, queues).select_for_update(skip_locked=True).values_list('id', flat=True)[:limit]
+            )
+            Task.objects.filter(id__in=claimed).update(**changes)
+    else:
+        # SQLite no tiene SKIP LOCKED: el UPDATE condicionado al estado hace
+        # que, si dos workers eligen la misma tarea, solo uno se la quede
+        candidates = list(_ready(now, queues).values_list('id', flat=True)[:limit])
+        claimed = [
+            task_id for task_id in candidates
+            if Task.objects.filter(id=task_id, status='queued').update(**changes)
+        ]
+
+    return list(Task.objects.filter(id__in=claimed).order_by('-priority', 'run_at', 'id'))
+
+
+def renew_leases(worker_id):
+    """Alarga el lease de todas las tareas que `worker_id` está ejecutando."""
+    return Task.objects.filter(locked_by=worker_id, status='running').update(
+        lease_expires_at=timezone.now() + timedelta(seconds=lease_seconds()),
+    )
+
+
+def complete(task, worker_id):
+    # Si el lease venció y otro worker la retomó, este resultado ya no cuenta
+    return Task.objects.filter(id=task.id, locked_by=worker_id, status='running').update(
+        status='done', locked_by='', lease_expires_at=None, last_error='', finished_at=timezone.now(),
+    )
+
+
+def fail(task, worker_id, error):
+    """Devuelve la tarea a la cola con espera, o la descarta si agotó sus intentos. Devuelve el estado."""
+    if isinstance(error, BaseException):
+        error = ''.join(traceback.format_exception(error))
+    now = timezone.now()
+    if task.attempts >= task.max_attempts:
+        changes = {'status': 'dead', 'finished_at': now}
+    else:
+        changes = {'status': 'queued', 'run_at': now + timedelta(seconds=retry_delay(task.attempts))}
+    Task.objects.filter(id=task.id, locked_by=worker_id, status='running').update(
+        locked_by='', lease_expires_at=None, last_error=error[-ERROR_LIMIT:], **changes,
+    )
+    return changes['status']
+
+
+def release(worker_id):
+    """Devuelve a la cola, sin gastar el intento, lo que `worker_id` no llegó a terminar."""
+    return Task.objects.filter(locked_by=worker_id, status='running').update(
+        status='queued', locked_by='', lease_expires_at=None, attempts=F('attempts') - 1,
+    )
+
+
+def reap_expired_leases():
+    """
+    Tareas de workers caídos: las que tienen el lease vencido vuelven a la
+    cola, o quedan descartadas si ya gastaron todos sus intentos.
+    """
+    now = timezone.now()
+    expired = Task.objects.filter(status='running', lease_expires_at__lt=now)
+    dead = expired.filter(attempts__gte=F('max_attempts')).update(
+        status='dead', locked_by='', lease_expires_at=None, finished_at=now,
+        last_error='El lease venció sin que el worker terminara la tarea',
+    )
+    requeued = expired.update(status='queued', locked_by='', lease_expires_at=None, run_at=now)
+    return requeued, dead
+
+
+def purge_done():
+    keep = timedelta(seconds=getattr(settings, 'TASKQUEUE_KEEP_DONE', 60 * 60 * 24))
+    return Task.objects.filter(status='done', finished_at__lt=timezone.now() - keep).delete()[0]
+
+
+def schedule_periodic():
+    """
+    Encola las tareas de TASKQUEUE_SCHEDULE ({nombre: segundos}) que no tienen
+    una pendiente y cuya última ejecución es más vieja que su intervalo, con
+    las opciones con que se registraron. Si dos workers coinciden puede salir
+    una de más, que es inofensiva. Devuelve las tareas encoladas.
+    """
+    now = timezone.now()
+    scheduled = []
+    for name, every in getattr(settings, 'TASKQUEUE_SCHEDULE', {}).items():
+        if name not in registry:
+            raise ImproperlyConfigured(f'TASKQUEUE_SCHEDULE: la tarea {name} no está registrada')
+        latest = Task.objects.filter(name=name).order_by('-run_at').values_list('status', 'run_at').first()
+        if latest is not None:
+            status, run_at = latest
+            if status in ('queued', 'running') or run_at > now - timedelta(seconds=every):
+                continue
+        scheduled.append(registry[name].enqueue())
+    return scheduled
+
+
+def requeue_dead(ids=None):
+    """Vuelve a encolar las tareas descartadas (todas o las de `ids`) con sus intentos a cero."""
+    dead = Task.objects.filter(status='dead')
+    if ids:
+        dead = dead.filter(id__in=ids)
+    return dead.update(status='queued', attempts=0, run_at=timezone.now(), finished_at=None)
+
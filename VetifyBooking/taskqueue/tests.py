@@ -0,0 +1,128 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import Task
+from .queue import claim, enqueue, reap_expired_leases, schedule_periodic, task
+
+
+calls = []
+
+
+@task(name='tests.record')
+def record(value):
+    calls.append(value)
+
+
+@task(name='tests.tick', queue='maintenance')
+def tick():
+    calls.append('tick')
+
+
+@task(name='tests.explode', max_attempts=2)
+def explode():
+    raise ValueError('sin conexión con el proveedor')
+
+
+@override_settings(TASKQUEUE_SCHEDULE={})
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def run_worker(self, **options):
+        out = StringIO()
+        call_command('run_worker', once=True, threads=2, stdout=out, **options)
+        return out.getvalue()
+
+    def test_worker_runs_queued_tasks(self):
+        first = record.enqueue('a')
+        second = enqueue('tests.record', ['b'], priority=5)
+        later = record.enqueue('c')
+        Task.objects.filter(id=later.id).update(run_at=timezone.now() + timedelta(hours=1))
+
+        self.run_worker()
+
+        self.assertCountEqual(calls, ['a', 'b'])
+        for done in (first, second):
+            done.refresh_from_db()
+            self.assertEqual(done.status, 'done')
+            self.assertEqual(done.attempts, 1)
+            self.assertEqual(done.locked_by, '')
+        self.assertEqual(Task.objects.get(id=later.id).status, 'queued')
+
+    def test_failures_retry_with_backoff_then_dead_letter(self):
+        failing = explode.enqueue()
+
+        self.run_worker()
+        failing.refresh_from_db()
+        self.assertEqual(failing.status, 'queued')
+        self.assertEqual(failing.attempts, 1)
+        self.assertGreater(failing.run_at, timezone.now())
+        self.assertIn('sin conexión con el proveedor', failing.last_error)
+
+        # El reintento no está listo: otra pasada no lo toca
+        self.run_worker()
+        self.assertEqual(Task.objects.get(id=failing.id).attempts, 1)
+
+        Task.objects.filter(id=failing.id).update(run_at=timezone.now())
+        self.run_worker()
+        failing.refresh_from_db()
+        self.assertEqual(failing.status, 'dead')
+        self.assertEqual(failing.attempts, 2)
+
+        self.run_worker(requeue_dead=True)
+        failing.refresh_from_db()
+        self.assertEqual((failing.status, failing.attempts), ('queued', 0))
+
+    def test_claim_order_and_exclusivity(self):
+        now = timezone.now()
+        low = enqueue('tests.record', ['low'], run_at=now - timedelta(minutes=5))
+        urgent = enqueue('tests.record', ['urgent'], priority=10)
+        old = enqueue('tests.record', ['old'], run_at=now - timedelta(minutes=10))
+        enqueue('tests.record', ['other'], queue='reports')
+
+        claimed = claim('worker-a', 3, ['default'])
+        self.assertEqual([t.id for t in claimed], [urgent.id, old.id, low.id])
+        self.assertTrue(all(t.status == 'running' and t.locked_by == 'worker-a' for t in claimed))
+        # Lo ya reclamado no se entrega a otro worker
+        self.assertEqual(claim('worker-b', 5, ['default']), [])
+
+    def test_expired_leases_are_requeued_or_dead(self):
+        crashed = record.enqueue('x')
+        exhausted = enqueue('tests.record', ['y'], max_attempts=1)
+        claim('worker-caido', 2)
+        Task.objects.update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(reap_expired_leases(), (1, 1))
+        crashed.refresh_from_db()
+        exhausted.refresh_from_db()
+        self.assertEqual((crashed.status, crashed.locked_by), ('queued', ''))
+        self.assertEqual(exhausted.status, 'dead')
+        self.assertIn('lease', exhausted.last_error)
+
+    @override_settings(TASKQUEUE_SCHEDULE={'tests.tick': 60})
+    def test_periodic_tasks_scheduled_once_per_interval(self):
+        first, = schedule_periodic()
+        self.assertEqual((first.name, first.queue), ('tests.tick', 'maintenance'))
+        # Mientras haya una pendiente no se encola otra
+        self.assertEqual(schedule_periodic(), [])
+
+        Task.objects.filter(id=first.id).update(status='done')
+        self.assertEqual(schedule_periodic(), [])
+
+        Task.objects.filter(id=first.id).update(run_at=timezone.now() - timedelta(seconds=61))
+        self.assertEqual(len(schedule_periodic()), 1)
+
+        # La ronda de mantenimiento del worker la programa y la ejecuta
+        Task.objects.all().delete()
+        self.run_worker()
+        self.assertEqual(calls, ['tick'])
+
+    @override_settings(TASKQUEUE_SCHEDULE={'tests.no_existe': 60})
+    def test_unknown_periodic_task_is_a_configuration_error(self):
+        with self.assertRaises(ImproperlyConfigured):
+            schedule_periodic()